@@ -1,10 +1,15 @@
-import json
 import re
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
+from modules import json_io
+from modules.parse_cache import get_parse_cache
+
+# Bump when the patterns or extraction change, to invalidate cached entries
+PARSER_VERSION = 1
+
 # === Regex patterns ported from C# ===
 # AmandaMap patterns
 THRESHOLD_PATTERN = re.compile(
@@ -259,7 +264,7 @@ def extract_from_text(text: str, source: str, default_date: Optional[str]) -> Li
 def extract_from_json(content: str, source: str, default_date: Optional[str]) -> List[ParsedEntry]:
     entries: List[ParsedEntry] = []
     try:
-        data = json.loads(content)
+        data = json_io.loads(content)
     except Exception:
         return entries
 
@@ -300,6 +305,18 @@ def extract_from_json(content: str, source: str, default_date: Optional[str]) ->
 
 
 def extract_from_file(path: str | Path) -> List[ParsedEntry]:
+    """Return the entries in *path*, reusing the parse cache while the file is unchanged."""
+    return get_parse_cache().get_or_parse(
+        path,
+        "amandamap.entries",
+        _extract_from_file,
+        config={"parser_version": PARSER_VERSION},
+        encode=lambda entries: [asdict(entry) for entry in entries],
+        decode=lambda data: [ParsedEntry(**entry) for entry in data],
+    )
+
+
+def _extract_from_file(path: str | Path) -> List[ParsedEntry]:
     p = Path(path)
     try:
         content = p.read_text(encoding="utf-8", errors="ignore")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark: difflib scan vs bigram index for fuzzy term expansion.
+
+Builds a synthetic vocabulary, expands a set of misspelled query terms with
+``difflib.get_close_matches`` over the full vocabulary and with
+:func:`modules.fuzzy_index.close_matches`, and checks both return the same
+matches.
+
+Usage:
+    python benchmarks/bench_fuzzy_expansion.py [--vocab 500000] [--queries 50] [--cutoff 0.8]
+"""
+
+import argparse
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from modules.fuzzy_index import build_fuzzy_index, close_matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocab", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--cutoff", type=float, default=0.8)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocab = sorted({"".join(rng.choice(letters) for _ in range(rng.randint(3, 14))) for _ in range(args.vocab)})
+    queries = []
+    for _ in range(args.queries):
+        word = list(rng.choice(vocab))
+        word[rng.randrange(len(word))] = rng.choice(letters)
+        queries.append("".join(word))
+
+    start = time.perf_counter()
+    grams, lengths = build_fuzzy_index(enumerate(vocab))
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [difflib.get_close_matches(q, vocab, n=5, cutoff=args.cutoff) for q in queries]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [close_matches(q, grams, lengths, vocab.__getitem__, n=5, cutoff=args.cutoff) for q in queries]
+    index_time = time.perf_counter() - start
+
+    assert found == expected
+    print(f"{len(vocab)} tokens, {len(queries)} queries, cutoff {args.cutoff}")
+    print(f"index build      {build_time:8.3f} s")
+    print(f"difflib scan     {scan_time:8.3f} s")
+    print(f"bigram index     {index_time:8.3f} s  ({scan_time / index_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: posting-list merge cost of the index builder.
+
+Compares the old ``list(set(...))``-per-append merge used by
+``_build_generic_index`` with :class:`modules.index_builder.IndexBuilder`
+on synthetic corpora of growing size, checks that both produce the same
+postings, and prints the scaling curve.
+
+Usage:
+    python benchmarks/bench_index_builder.py [--sizes 500 1000 2000 4000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from modules.index_builder import IndexBuilder
+
+
+def make_corpus(num_files, vocab_size=5000, tokens_per_file=300, seed=42):
+    """Return ``[(relative_path, tokens)]`` with a Zipf-ish token distribution."""
+    rng = random.Random(seed)
+    vocab = [f"tok{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    return [
+        (f"chat_{i}.md", rng.choices(vocab, weights=weights, k=tokens_per_file))
+        for i in range(num_files)
+    ]
+
+
+def legacy_merge(corpus):
+    """The pre-IndexBuilder merge loop."""
+    index_data = {"tokens": {}, "files": {}}
+    for counter, (rel_path, tokens) in enumerate(corpus):
+        file_id = str(counter)
+        index_data["files"][file_id] = rel_path
+        for token in set(tokens):
+            index_data["tokens"].setdefault(token, []).append(file_id)
+            index_data["tokens"][token] = list(set(index_data["tokens"][token]))
+    return index_data
+
+
+def builder_merge(corpus):
+    builder = IndexBuilder()
+    for rel_path, tokens in corpus:
+        builder.add_tokens(builder.add_path(rel_path), tokens)
+    return builder.materialize()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000])
+    parser.add_argument("--vocab", type=int, default=5000)
+    parser.add_argument("--tokens-per-file", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'files':>8} {'legacy (s)':>12} {'builder (s)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        corpus = make_corpus(size, args.vocab, args.tokens_per_file)
+        legacy_time, legacy = timed(legacy_merge, corpus)
+        builder_time, built = timed(builder_merge, corpus)
+
+        assert legacy["files"] == built["files"]
+        assert legacy["tokens"].keys() == built["tokens"].keys()
+        for token, fids in legacy["tokens"].items():
+            assert sorted(fids, key=int) == built["tokens"][token], token
+
+        speedup = legacy_time / builder_time if builder_time else float("inf")
+        print(f"{size:>8} {legacy_time:>12.3f} {builder_time:>12.3f} {speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
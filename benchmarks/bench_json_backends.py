@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: stdlib ``json`` vs :mod:`modules.json_io` for index and tagmap files.
+
+Builds a synthetic JSON-format search index (as written by
+``save_index_file(..., "json")``) and a tagmap, then saves and loads each
+the old way (``json.dump(indent=2)`` / ``json.load`` on text files) and
+through :mod:`modules.json_io` (orjson if installed; compact bytes for
+the index, two-space indent for the hand-edited tagmap).
+Checks that both loads return the same document and prints the times and
+file sizes.
+
+Usage:
+    python benchmarks/bench_json_backends.py [--files 20000] [--vocab 50000] [--repeat 3]
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from modules import json_io
+
+
+def make_index(num_files, vocab_size, tokens_per_file=200, seed=42):
+    """Return a ``{"metadata", "index"}`` structure with Zipf-ish postings."""
+    rng = random.Random(seed)
+    vocab = [f"tok{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    tokens = {}
+    files = {}
+    details = {}
+    for i in range(num_files):
+        file_id = str(i)
+        files[file_id] = f"chats/2024/chat_{i}.json"
+        details[file_id] = {"size": rng.randint(1_000, 500_000), "modified": 1_700_000_000.0 + i,
+                            "title": f"Conversation {i} — moon ritual", "messages": rng.randint(2, 400)}
+        for token in set(rng.choices(vocab, weights=weights, k=tokens_per_file)):
+            tokens.setdefault(token, []).append(file_id)
+    return {
+        "metadata": {"created": "2024-01-01T00:00:00", "index_format": "json", "files": num_files},
+        "index": {"tokens": tokens, "files": files, "file_details": details},
+    }
+
+
+def make_tagmap(num_entries, seed=7):
+    rng = random.Random(seed)
+    return [
+        {"document": f"chats/chat_{i}.json", "category": rng.choice(["Threshold", "Ritual", "Field Pulse"]),
+         "preview": "Amanda " * 20, "tags": [f"tag{rng.randrange(300)}" for _ in range(5)],
+         "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "line_number": i}
+        for i in range(num_entries)
+    ]
+
+
+def stdlib_save(obj, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+
+
+def stdlib_load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def best_of(repeat, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # name -> (document, indent): tagmaps are saved pretty-printed
+    documents = {"index": (make_index(args.files, args.vocab), False), "tagmap": (make_tagmap(args.files), True)}
+    print(f"json_io backend: {json_io.BACKEND}")
+    print(f"{'document':>8} {'op':>5} {'stdlib (s)':>11} {'json_io (s)':>12} {'speedup':>8} {'size MB':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (document, indent) in documents.items():
+            old_path = Path(tmp) / f"{name}_stdlib.json"
+            new_path = Path(tmp) / f"{name}_json_io.json"
+            old_save, _ = best_of(args.repeat, stdlib_save, document, old_path)
+            new_save, _ = best_of(args.repeat, lambda: json_io.save_file(document, new_path, indent=indent))
+            old_load, old_doc = best_of(args.repeat, stdlib_load, old_path)
+            new_load, new_doc = best_of(args.repeat, json_io.load_file, new_path)
+            assert old_doc == new_doc == document, name
+
+            sizes = f"{old_path.stat().st_size / 1e6:.1f} -> {new_path.stat().st_size / 1e6:.1f}"
+            for op, old, new in (("save", old_save, new_save), ("load", old_load, new_load)):
+                print(f"{name:>8} {op:>5} {old:>11.3f} {new:>12.3f} {old / new:>7.1f}x {sizes:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: thread vs process tokenizer backends of the legacy index builder.
+
+Writes a synthetic corpus of markdown chats to a temporary folder, builds the
+index once per backend with ``_build_generic_index`` and checks that both
+backends produce identical postings.
+
+Usage:
+    python benchmarks/bench_tokenizer_backends.py [--files 2000] [--workers 8]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from modules import legacy_tool_v6_3 as legacy
+from modules.binary_index import load_index_file
+
+
+def write_corpus(folder, num_files, words_per_file, seed=42):
+    """Write ``num_files`` markdown chats with a Zipf-ish vocabulary."""
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(20000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    for i in range(num_files):
+        lines = [f"# Chat {i}", "", "[2024-01-01 10:00:00] **User:**"]
+        words = rng.choices(vocab, weights=weights, k=words_per_file)
+        for start in range(0, len(words), 20):
+            lines.append(" ".join(words[start:start + 20]) + ".")
+        (folder / f"chat_{i}.md").write_text("\n".join(lines), encoding="utf-8")
+
+
+def build(folder, backend, workers):
+    cfg = dict(legacy.default_config)
+    cfg.update({
+        "tokenizer_backend": backend,
+        "num_tokenizers": workers,
+        "num_indexers": workers,
+        "cpu_usage_percent": 100,
+        "index_format": "binary",
+    })
+    index_file = folder.parent / f"{backend}_index.bin"
+    start = time.perf_counter()
+    # Progress lines go to stdout when no widget is given; keep the table readable.
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy._build_generic_index(folder, cfg, ["*.md"], str(index_file), None, False)
+    elapsed = time.perf_counter() - start
+    return elapsed, load_index_file(index_file)["index"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--words-per-file", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # _build_generic_index saves the app config after a build; keep the real one untouched.
+    legacy.save_config = lambda _cfg: None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "corpus"
+        folder.mkdir()
+        write_corpus(folder, args.files, args.words_per_file)
+
+        print(f"{args.files} files, {args.words_per_file} words each, {args.workers} workers")
+        print(f"{'backend':>8} {'time (s)':>10} {'speedup':>9}")
+        results = {}
+        for backend in ("thread", "process"):
+            results[backend] = build(folder, backend, args.workers)
+
+        # File IDs follow completion order, so compare postings by path.
+        thread_index = results["thread"][1]
+        process_index = results["process"][1]
+        assert sorted(thread_index["files"].values()) == sorted(process_index["files"].values())
+        assert list(thread_index["tokens"]) == list(process_index["tokens"])
+        for token in thread_index["tokens"]:
+            thread_paths = sorted(thread_index["files"][fid] for fid in thread_index["tokens"][token])
+            process_paths = sorted(process_index["files"][fid] for fid in process_index["tokens"][token])
+            assert thread_paths == process_paths, token
+
+        baseline = results["thread"][0]
+        for backend, (elapsed, _index) in results.items():
+            print(f"{backend:>8} {elapsed:>10.3f} {baseline / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Headless, parallel conversion of ChatGPT exports to Markdown or JSON.
+
+``convert_export`` takes a bulk ``conversations.json``, a single chat export
+or a folder of exports.  A bulk file is streamed one conversation at a time
+(see ``ChatGPTExportConverter.iter_conversations``) and the conversations
+are sharded in chunks across a process pool.  Each worker extracts the
+messages, renders them and writes the output file itself, so the main
+process only parses and hands out work.  At most a few chunks per worker
+are in flight, which keeps memory flat for exports of any size.
+
+Progress events are put on an optional ``queue.Queue`` so a GUI can poll it
+from its own thread.  Each event is a dict with a ``stage`` key:
+
+* ``"converted"``: ``done``, ``total`` (``None`` for a bulk file, whose
+  size is unknown until it is read), ``title``, ``output`` and ``error`` for
+  one conversation or export file
+* ``"done"``: ``stats``, the final :meth:`ConversionStats.to_dict`
+* ``"failed"``: ``error`` if the conversion could not run at all
+
+The returned :class:`ConversionStats` carries the time spent in each stage
+(parse, render, write) summed over all workers, and the throughput of each.
+"""
+
+import os
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from chatgpt_converter_gui import ChatGPTExportConverter
+
+__all__ = [
+    "ConversionStats",
+    "convert_export",
+    "safe_filename",
+]
+
+DEFAULT_CHUNK_SIZE = 32
+
+
+@dataclass
+class ConversionStats:
+    """Counts and per-stage timings of one conversion run."""
+    conversations: int = 0
+    messages: int = 0
+    files_written: int = 0
+    skipped: int = 0  # bulk conversations with no messages left after filtering
+    failed: int = 0
+    bytes_written: int = 0
+    parse_seconds: float = 0.0
+    render_seconds: float = 0.0
+    write_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    workers: int = 1
+    errors: List[str] = field(default_factory=list)
+
+    def add(self, other: "ConversionStats") -> None:
+        """Add the counts and timings of a worker chunk."""
+        for name in ("conversations", "messages", "files_written", "skipped", "failed", "bytes_written",
+                     "parse_seconds", "render_seconds", "write_seconds"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.errors.extend(other.errors)
+
+    def throughput(self) -> Dict[str, float]:
+        """Conversations per second for each stage, and overall (wall clock).
+
+        Stage rates are per worker: conversations divided by the time all
+        workers together spent in that stage.
+        """
+        def rate(seconds: float) -> float:
+            return round(self.conversations / seconds, 1) if seconds > 0 else 0.0
+
+        return {
+            "parse": rate(self.parse_seconds),
+            "render": rate(self.render_seconds),
+            "write": rate(self.write_seconds),
+            "overall": rate(self.wall_seconds),
+            "write_mb_per_s": round(self.bytes_written / 1e6 / self.write_seconds, 1) if self.write_seconds > 0 else 0.0,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["throughput"] = self.throughput()
+        return data
+
+
+def safe_filename(title: str) -> str:
+    """Return the output file stem used for a conversation title."""
+    return "".join(c for c in title if c.isalnum() or c in ' -_')[:50].strip() or "Untitled"
+
+
+@dataclass
+class _Job:
+    """One conversation (already parsed) or one export file, and its output stem."""
+    output_stem: str
+    title: str
+    conversation: Optional[Dict[str, Any]] = None
+    source: Optional[str] = None
+    skip_empty: bool = False
+
+
+def _render(conversation: Dict[str, Any], title: str, output_format: str,
+            role_filter: Optional[str], stats: ConversionStats) -> Tuple[str, int]:
+    started = time.perf_counter()
+    messages = ChatGPTExportConverter.extract_messages(conversation)
+    messages = ChatGPTExportConverter.apply_filter(messages, role_filter)
+    if output_format == 'md':
+        content = ChatGPTExportConverter.messages_to_markdown(title, messages)
+    else:
+        content = ChatGPTExportConverter.messages_to_json(title, messages)
+    stats.render_seconds += time.perf_counter() - started
+    return content, len(messages)
+
+
+def _write(path: Path, content: str, stats: ConversionStats) -> None:
+    started = time.perf_counter()
+    data = content.encode('utf-8')
+    path.write_bytes(data)
+    stats.write_seconds += time.perf_counter() - started
+    stats.bytes_written += len(data)
+    stats.files_written += 1
+
+
+def _convert_chunk(jobs: List[_Job], output_dir: str, output_format: str,
+                   role_filter: Optional[str]) -> Tuple[ConversionStats, List[Dict[str, Any]]]:
+    """Convert and write every job of a chunk; runs in a worker."""
+    stats = ConversionStats()
+    events = []
+    for job in jobs:
+        title = job.title
+        output = None
+        error = None
+        try:
+            conversations = [job.conversation]
+            if job.source is not None:
+                # Export files are parsed by the worker
+                started = time.perf_counter()
+                conversations = list(ChatGPTExportConverter.iter_conversations(Path(job.source)))
+                stats.parse_seconds += time.perf_counter() - started
+            for i, conversation in enumerate(conversations, 1):
+                title = conversation.get('title', job.title)
+                stem = job.output_stem if len(conversations) == 1 else f"{job.output_stem}_{i}"
+                content, message_count = _render(conversation, title, output_format, role_filter, stats)
+                stats.conversations += 1
+                stats.messages += message_count
+                if job.skip_empty and not message_count:
+                    stats.skipped += 1
+                    continue
+                output_path = Path(output_dir) / f"{stem}.{output_format}"
+                _write(output_path, content, stats)
+                output = str(output_path)
+        except Exception as e:
+            stats.failed += 1
+            error = f"{type(e).__name__}: {e}"
+            stats.errors.append(f"{job.source or title}: {error}")
+        events.append({"title": title, "output": output, "error": error})
+    return stats, events
+
+
+def _unique_stem(stem: str, used: Set[str]) -> str:
+    candidate, n = stem, 2
+    while candidate.lower() in used:
+        candidate = f"{stem} ({n})"
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _jobs(source: Path, recursive: bool, stats: ConversionStats) -> Tuple[Iterator[_Job], Optional[int]]:
+    """Return the jobs for *source* and their number, if known up front."""
+    used: Set[str] = set()
+    if source.is_dir():
+        files = sorted(source.glob("**/*.json" if recursive else "*.json"))
+        return (_Job(_unique_stem(path.stem, used), path.stem, source=str(path)) for path in files), len(files)
+    if ChatGPTExportConverter.detect_file_format(source) != "bulk":
+        return iter([_Job(source.stem, source.stem, source=str(source))]), 1
+
+    def stream() -> Iterator[_Job]:
+        conversations = ChatGPTExportConverter.iter_conversations(source)
+        while True:
+            started = time.perf_counter()
+            conversation = next(conversations, None)
+            stats.parse_seconds += time.perf_counter() - started
+            if conversation is None:
+                return
+            title = conversation.get('title', 'Untitled')
+            stem = _unique_stem(safe_filename(title or 'Untitled'), used)
+            yield _Job(stem, title, conversation=conversation, skip_empty=True)
+
+    return stream(), None
+
+
+def _chunks(jobs: Iterator[_Job], size: int) -> Iterator[List[_Job]]:
+    chunk: List[_Job] = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def convert_export(
+    source: str | Path,
+    output_dir: str | Path,
+    *,
+    output_format: str = 'md',
+    role_filter: Optional[str] = None,
+    workers: Optional[int] = None,
+    processes: bool = True,
+    recursive: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[queue.Queue] = None,
+) -> ConversionStats:
+    """Convert every conversation in *source* into *output_dir* and return the stats.
+
+    *source* is a bulk export, a single chat export or a folder of exports
+    (searched recursively with *recursive*).  Chunks of *chunk_size*
+    conversations or files go to a pool of *workers* processes (threads
+    with ``processes=False``); the default is one worker per CPU.  Any
+    error, including bad arguments, is posted as a ``"failed"`` event
+    before it is raised.
+    """
+    source = Path(source)
+    output_dir = Path(output_dir)
+    workers = max(1, workers or os.cpu_count() or 1)
+    stats = ConversionStats(workers=workers)
+    started = time.perf_counter()
+
+    def report(event: Dict[str, Any]) -> None:
+        if progress is not None:
+            progress.put(event)
+
+    try:
+        if output_format not in ('md', 'json'):
+            raise ValueError(f"Unsupported output format: {output_format}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        jobs, total = _jobs(source, recursive, stats)
+        executor: Executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers)
+        done = 0
+
+        def collect(finished) -> None:
+            nonlocal done
+            for future in finished:
+                chunk_stats, events = future.result()
+                stats.add(chunk_stats)
+                for event in events:
+                    done += 1
+                    report({"stage": "converted", "done": done, "total": total, **event})
+
+        max_pending = 4 * workers
+        with executor:
+            pending = set()
+            for chunk in _chunks(jobs, chunk_size):
+                pending.add(executor.submit(_convert_chunk, chunk, str(output_dir), output_format, role_filter))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+    except Exception as e:
+        report({"stage": "failed", "error": f"{type(e).__name__}: {e}"})
+        raise
+
+    stats.wall_seconds = time.perf_counter() - started
+    report({"stage": "done", "stats": stats.to_dict()})
+    return stats
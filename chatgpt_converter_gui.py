@@ -7,9 +7,13 @@ Includes optional message isolation, filtering, and bulk operations.
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
+import argparse
+import codecs
 import json
+import queue
+import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 import threading
 from dataclasses import dataclass
 from datetime import datetime
@@ -19,6 +23,11 @@ try:
     HAS_BEAUTIFULSOUP = True
 except ImportError:
     HAS_BEAUTIFULSOUP = False
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
 
 @dataclass
 class ConversionJob:
@@ -43,6 +52,42 @@ class ChatGPTExportConverter:
         with open(json_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     
+    @staticmethod
+    def detect_file_format(json_file: Path) -> str:
+        """Detect the format of a JSON export from its first character,
+        without parsing the file."""
+        with open(json_file, 'r', encoding='utf-8-sig') as f:
+            while True:
+                char = f.read(1)
+                if not char or not char.isspace():
+                    break
+        if char == '[':
+            return "bulk"
+        elif char == '{':
+            return "individual"
+        return "unknown"
+    
+    @staticmethod
+    def iter_conversations(json_file: Path) -> Iterator[Dict[str, Any]]:
+        """Yield the conversations of a JSON export one at a time.
+        
+        Bulk files (conversations.json) are streamed with ijson, so memory
+        stays at roughly one conversation however large the export is.
+        Without ijson the whole file is loaded instead.
+        """
+        if ChatGPTExportConverter.detect_file_format(json_file) != "bulk" or not HAS_IJSON:
+            yield from ChatGPTExportConverter.extract_conversations(
+                ChatGPTExportConverter.parse_chatgpt_json(json_file)
+            )
+            return
+        with open(json_file, 'rb') as f:
+            if f.read(3) != codecs.BOM_UTF8:
+                f.seek(0)
+            # use_float: timestamps must stay floats for datetime and json.dumps
+            for conversation in ijson.items(f, 'item', use_float=True):
+                if isinstance(conversation, dict):
+                    yield conversation
+    
     @staticmethod
     def detect_format(data) -> str:
         """Detect if data is bulk format (array) or individual format (dict)."""
@@ -461,6 +506,18 @@ class ConverterGUI:
             filter_by_role=self.filter_var.get() if self.filter_var.get() != "All" else None
         )
         
+        if (job.input_format == 'json' and job.isolate
+                and self.converter.detect_file_format(job.input_file) == 'bulk'):
+            # Bulk format (conversations.json): convert every conversation in parallel
+            self.log_message(f"Detected bulk format, converting {job.input_file.name} in parallel...")
+            self.convert_btn.config(state='disabled')
+            self._start_engine(
+                job.input_file, job.output_dir, job.output_format, job.filter_by_role,
+                log=self.log_message, set_progress=self.progress_var.set,
+                on_finish=lambda: self.convert_btn.config(state='normal'),
+            )
+            return
+        
         threading.Thread(target=self._do_convert, args=(job,), daemon=True).start()
     
     def _do_convert(self, job: ConversionJob):
@@ -499,70 +556,37 @@ class ConverterGUI:
                 self.log_message(f"File size: {output_file.stat().st_size / 1024:.1f} KB")
                 
             elif job.input_format == 'json':
-                data = self.converter.parse_chatgpt_json(job.input_file)
-                file_format = self.converter.detect_format(data)
+                file_format = self.converter.detect_file_format(job.input_file)
                 
-                # Handle bulk format (conversations.json)
-                if file_format == 'bulk' and job.isolate:
-                    conversations = self.converter.extract_conversations(data)
-                    self.log_message(f"Detected bulk format with {len(conversations)} conversations")
-                    total_processed = 0
-                    
-                    for conv in conversations:
-                        title = conv.get('title', 'Untitled')
-                        messages = self.converter.extract_messages(conv)
-                        
-                        if job.filter_by_role:
-                            messages = self.converter.apply_filter(messages, job.filter_by_role)
-                        
-                        # Convert each conversation
-                        if messages:
-                            if job.output_format == 'md':
-                                output_content = self.converter.messages_to_markdown(title, messages)
-                                safe_title = "".join(c for c in title if c.isalnum() or c in ' -_')[:50]
-                                output_file = job.output_dir / f"{safe_title}.md"
-                            else:
-                                output_content = self.converter.messages_to_json(title, messages)
-                                safe_title = "".join(c for c in title if c.isalnum() or c in ' -_')[:50]
-                                output_file = job.output_dir / f"{safe_title}.json"
-                            
-                            output_file.write_text(output_content, encoding='utf-8')
-                            total_processed += len(messages)
-                            self.log_message(f"  ✓ {title} ({len(messages)} messages)")
-                    
-                    self.log_message(f"✅ Extracted {len(conversations)} conversations ({total_processed} total messages)")
+                if file_format == 'bulk':
+                    # Bulk format but not isolated - convert first conversation
+                    conv_data = next(self.converter.iter_conversations(job.input_file), {})
+                    self.log_message(f"Converting first conversation from bulk file...")
                 else:
-                    # Handle individual format
-                    if file_format == 'bulk':
-                        # Bulk format but not isolated - convert first conversation
-                        conversations = self.converter.extract_conversations(data)
-                        conv_data = conversations[0] if conversations else {}
-                        self.log_message(f"Converting first conversation from bulk file...")
-                    else:
-                        conv_data = data
-                    
-                    title = conv_data.get('title', job.input_file.stem)
-                    messages = self.converter.extract_messages(conv_data)
-                    
-                    self.log_message(f"Extracted {len(messages)} messages")
-                    
-                    # Apply filter
-                    if job.filter_by_role:
-                        messages = self.converter.apply_filter(messages, job.filter_by_role)
-                        self.log_message(f"After filter: {len(messages)} messages")
-                    
-                    # Convert to output format
-                    if job.output_format == 'md':
-                        output_content = self.converter.messages_to_markdown(title, messages)
-                        output_file = job.output_dir / f"{job.input_file.stem}.md"
-                    else:  # json
-                        output_content = self.converter.messages_to_json(title, messages)
-                        output_file = job.output_dir / f"{job.input_file.stem}.json"
-                    
-                    # Write output
-                    output_file.write_text(output_content, encoding='utf-8')
-                    self.log_message(f"✅ Saved to: {output_file}")
-                    self.log_message(f"File size: {output_file.stat().st_size / 1024:.1f} KB")
+                    conv_data = self.converter.parse_chatgpt_json(job.input_file)
+                
+                title = conv_data.get('title', job.input_file.stem)
+                messages = self.converter.extract_messages(conv_data)
+                
+                self.log_message(f"Extracted {len(messages)} messages")
+                
+                # Apply filter
+                if job.filter_by_role:
+                    messages = self.converter.apply_filter(messages, job.filter_by_role)
+                    self.log_message(f"After filter: {len(messages)} messages")
+                
+                # Convert to output format
+                if job.output_format == 'md':
+                    output_content = self.converter.messages_to_markdown(title, messages)
+                    output_file = job.output_dir / f"{job.input_file.stem}.md"
+                else:  # json
+                    output_content = self.converter.messages_to_json(title, messages)
+                    output_file = job.output_dir / f"{job.input_file.stem}.json"
+                
+                # Write output
+                output_file.write_text(output_content, encoding='utf-8')
+                self.log_message(f"✅ Saved to: {output_file}")
+                self.log_message(f"File size: {output_file.stat().st_size / 1024:.1f} KB")
             else:  # md
                 with open(job.input_file, 'r', encoding='utf-8') as f:
                     md_content = f.read()
@@ -595,47 +619,72 @@ class ConverterGUI:
             messagebox.showerror("Error", f"Folder not found: {input_folder}")
             return
         
-        threading.Thread(target=self._do_batch_convert, args=(input_folder,), daemon=True).start()
-    
-    def _do_batch_convert(self, input_folder: Path):
-        """Execute batch conversion."""
+        if self.is_processing:
+            messagebox.showwarning("Warning", "Processing in progress!")
+            return
+        
         self.batch_status.config(state='normal')
         self.batch_status.delete('1.0', 'end')
         self.batch_status.config(state='disabled')
+        self.batch_progress['value'] = 0
+        self.log_batch(f"Converting JSON files in {input_folder}...")
         
-        output_folder = Path(self.batch_output_var.get())
-        output_folder.mkdir(parents=True, exist_ok=True)
+        self._start_engine(
+            input_folder, Path(self.batch_output_var.get()), self.batch_format_var.get(), None,
+            log=self.log_batch, set_progress=lambda value: self.batch_progress.configure(value=value),
+            recursive=self.batch_recursive_var.get(),
+        )
+    
+    def _start_engine(self, source: Path, output_dir: Path, output_format: str, role_filter: Optional[str],
+                      log, set_progress, recursive: bool = False, on_finish=None):
+        """Run the parallel conversion engine in the background.
         
-        # Find files
-        pattern = "**/*.json" if self.batch_recursive_var.get() else "*.json"
-        files = list(input_folder.glob(pattern))
+        The engine reports progress through a queue; only the Tk thread
+        touches widgets, by polling it.
+        """
+        from chatgpt_conversion_engine import convert_export
         
-        self.log_batch(f"Found {len(files)} JSON files to convert")
+        events = queue.Queue()
         
-        for i, input_file in enumerate(files, 1):
-            self.batch_progress['value'] = (i / len(files)) * 100
-            self.root.update()
-            
+        def run():
             try:
-                data = self.converter.parse_chatgpt_json(input_file)
-                title = data.get('title', input_file.stem)
-                messages = self.converter.extract_messages(data)
-                
-                output_format = self.batch_format_var.get()
-                if output_format == 'md':
-                    content = self.converter.messages_to_markdown(title, messages)
-                    output_file = output_folder / f"{input_file.stem}.md"
-                else:
-                    content = self.converter.messages_to_json(title, messages)
-                    output_file = output_folder / f"{input_file.stem}.json"
-                
-                output_file.write_text(content, encoding='utf-8')
-                self.log_batch(f"✅ {i}/{len(files)}: {input_file.name}")
-                
-            except Exception as e:
-                self.log_batch(f"❌ {i}/{len(files)}: {input_file.name} - {str(e)}")
+                convert_export(source, output_dir, output_format=output_format, role_filter=role_filter,
+                               recursive=recursive, progress=events)
+            except Exception:
+                pass  # reported through a "failed" event
         
-        self.log_batch(f"✅ Batch complete! Saved to {output_folder}")
+        self.is_processing = True
+        threading.Thread(target=run, daemon=True).start()
+        self.root.after(100, self._poll_engine, events, log, set_progress, on_finish)
+    
+    def _poll_engine(self, events: queue.Queue, log, set_progress, on_finish):
+        """Show the engine's progress events; reschedules itself until the run ends."""
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            stage = event['stage']
+            if stage == 'converted':
+                total = event['total']
+                counter = f"{event['done']}/{total}" if total else str(event['done'])
+                if event['error']:
+                    log(f"❌ {counter}: {event['title']} - {event['error']}")
+                elif event['output']:
+                    log(f"✅ {counter}: {event['title']}")
+                if total:
+                    set_progress(event['done'] / total * 100)
+            else:
+                if stage == 'done':
+                    set_progress(100)
+                    log(format_stats(event['stats']))
+                else:
+                    log(f"❌ Conversion failed: {event['error']}")
+                self.is_processing = False
+                if on_finish:
+                    on_finish()
+                return
+        self.root.after(100, self._poll_engine, events, log, set_progress, on_finish)
     
     def log_batch(self, message: str):
         """Log to batch status."""
@@ -654,7 +703,8 @@ class ConverterGUI:
             input_file = Path(file.name)
             
             if input_file.suffix == '.json':
-                data = self.converter.parse_chatgpt_json(input_file)
+                # Only the first conversation of a bulk file is read
+                data = next(self.converter.iter_conversations(input_file), {})
                 title = data.get('title', input_file.stem)
                 messages = self.converter.extract_messages(data)
                 preview_content = self.converter.messages_to_markdown(title, messages[:5])  # First 5
@@ -671,7 +721,85 @@ class ConverterGUI:
             messagebox.showerror("Error", f"Failed to load file: {str(e)}")
 
 
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Summarize the stats of a finished engine run."""
+    rates = stats['throughput']
+    return (
+        f"✅ Converted {stats['conversations']} conversations ({stats['messages']} messages) "
+        f"into {stats['files_written']} files in {stats['wall_seconds']:.1f}s "
+        f"({stats['workers']} worker{'s' if stats['workers'] != 1 else ''}); "
+        f"{stats['skipped']} empty, {stats['failed']} failed\n"
+        f"   Throughput (conversations/s per worker): parse {rates['parse']}, render {rates['render']}, "
+        f"write {rates['write']} ({rates['write_mb_per_s']} MB/s); overall {rates['overall']}/s"
+    )
+
+
+def run_cli(argv: List[str]) -> int:
+    """Convert exports without the GUI, using the parallel engine."""
+    from chatgpt_conversion_engine import convert_export
+    
+    parser = argparse.ArgumentParser(description="Convert ChatGPT exports to Markdown or JSON")
+    parser.add_argument('--input', required=True, help='Bulk conversations.json, a chat export or a folder of exports')
+    parser.add_argument('--output', required=True, help='Output folder')
+    parser.add_argument('--format', choices=['md', 'json'], default='md', help='Output format')
+    parser.add_argument('--filter', choices=['user', 'assistant', 'system'], help='Keep only messages from this role')
+    parser.add_argument('--bulk-extract', action='store_true',
+                        help='Convert every conversation of a bulk file (default: only the first)')
+    parser.add_argument('--recursive', action='store_true', help='Search input folders recursively')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--quiet', action='store_true', help='Only print the summary')
+    args = parser.parse_args(argv)
+    
+    input_path = Path(args.input)
+    output_dir = Path(args.output)
+    converter = ChatGPTExportConverter()
+    if input_path.is_file() and not args.bulk_extract and converter.detect_file_format(input_path) == 'bulk':
+        # Same as the GUI without "Isolate Responses": first conversation only
+        conv_data = next(converter.iter_conversations(input_path), {})
+        messages = converter.apply_filter(converter.extract_messages(conv_data), args.filter)
+        title = conv_data.get('title', input_path.stem)
+        render = converter.messages_to_markdown if args.format == 'md' else converter.messages_to_json
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = output_dir / f"{input_path.stem}.{args.format}"
+        output_file.write_text(render(title, messages), encoding='utf-8')
+        print(f"✅ Saved first conversation to {output_file} (use --bulk-extract for all)")
+        return 0
+    
+    events = queue.Queue()
+    result = {}
+    
+    def run():
+        try:
+            result['stats'] = convert_export(
+                input_path, output_dir, output_format=args.format, role_filter=args.filter,
+                workers=args.workers, recursive=args.recursive, progress=events,
+            )
+        except Exception:
+            pass  # reported through a "failed" event
+    
+    worker = threading.Thread(target=run)
+    worker.start()
+    while True:
+        event = events.get()
+        if event['stage'] == 'converted':
+            if event['error']:
+                print(f"❌ {event['title']} - {event['error']}", file=sys.stderr)
+            elif event['output'] and not args.quiet:
+                print(f"✅ {event['done']}: {event['title']}")
+        elif event['stage'] == 'done':
+            print(format_stats(event['stats']))
+            break
+        else:
+            print(f"❌ Conversion failed: {event['error']}", file=sys.stderr)
+            break
+    worker.join()
+    stats = result.get('stats')
+    return 0 if stats is not None and not stats.failed else 1
+
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     root = tk.Tk()
     app = ConverterGUI(root)
     root.mainloop()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the index and search tests.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.binary_index import save_index_file
+from modules.index_builder import IndexBuilder
+from modules.legacy_tool_v6_3 import tokenize
+from modules.parse_cache import CACHE_DIR_ENV, set_parse_cache
+from modules.snippets import line_start_offsets
+
+
+@pytest.fixture(autouse=True)
+def _restore_cwd(monkeypatch):
+    """Undo any ``os.chdir`` a test makes, so later tests never write into the source tree."""
+    monkeypatch.chdir(Path.cwd())
+
+
+@pytest.fixture(autouse=True)
+def _isolated_parse_cache(tmp_path_factory, monkeypatch):
+    """Give every test a fresh parse cache outside the home directory."""
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path_factory.mktemp("parse_cache")))
+    set_parse_cache(None)
+    yield
+    set_parse_cache(None)
+
+
+def write_index(folder, texts, *, fmt=None, metadata=None, track_positions=False):
+    """Write *texts* (name -> text) into *folder* and index them like the legacy builder.
+
+    Returns the index structure, or with *fmt* (``"json"``/``"binary"``) saves
+    it to ``index.json``/``index.bin`` in *folder* and returns that path.
+    *metadata* is merged over ``{"indexed_folder_path": str(folder)}``.
+    """
+    folder = Path(folder)
+    builder = IndexBuilder(track_positions)
+    for name, text in texts.items():
+        data = text.encode("utf-8")
+        path = folder / name
+        path.write_bytes(data)
+        stat = path.stat()
+        fid = builder.add_path(name)
+        builder.add_tokens(fid, tokenize(text))
+        builder.file_details[fid] = {"filename": name, "file_mod_time": stat.st_mtime, "file_size": stat.st_size}
+        builder.set_line_offsets(fid, line_start_offsets(data))
+    structure = {
+        "metadata": {"indexed_folder_path": str(folder), **(metadata or {})},
+        "index": builder.materialize(),
+    }
+    if fmt is None:
+        return structure
+    index_file = folder / ("index.bin" if fmt == "binary" else "index.json")
+    save_index_file(structure, index_file, fmt)
+    return index_file
@@ -1,6 +1,5 @@
 import re
 import argparse
-import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
@@ -10,6 +9,7 @@ import asyncio
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass, asdict
+from modules import json_io
 from modules.amandamap_parser import find_entries, find_thresholds
 from modules.json_scanner import scan_json_for_amandamap
 
@@ -489,8 +489,7 @@ class DatasetBuilderGUI:
                 
             # Write JSON
             try:
-                with open(output_file, "w", encoding="utf-8") as f:
-                    json.dump([asdict(e) for e in entries], f, indent=2)
+                json_io.save_file([asdict(e) for e in entries], output_file, indent=True)
                 self.message_queue.put({'type': 'log', 'text': f"💾 Successfully wrote {len(entries)} entries to {output_file}"})
             except Exception as e:
                 self.message_queue.put({'type': 'error', 'text': f"Error writing JSON file: {e}"})
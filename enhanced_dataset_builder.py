@@ -15,7 +15,6 @@ Features:
 
 import re
 import argparse
-import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
@@ -37,7 +36,6 @@ import pickle
 import tempfile
 import shutil
 from tempfile import SpooledTemporaryFile
-import orjson
 
 # Try to import CUDA-related libraries
 try:
@@ -55,6 +53,7 @@ except ImportError:
     TORCH_AVAILABLE = False
 
 # Import existing modules
+from modules import json_io
 from modules.performance_optimizer import PerformanceOptimizer, OptimizationConfig
 from modules.settings_service import SettingsService
 
@@ -942,11 +941,11 @@ class FileProcessor:
                     for entry in entries:
                         # Determine which file to write to based on entry type
                         if entry["type"] == "AmandaMap":
-                            amandamap_tmpfile.write(orjson.dumps(entry))
+                            amandamap_tmpfile.write(json_io.dumps(entry))
                             amandamap_tmpfile.write(b"\n")
                             entry_counts["AmandaMap"] += 1
                         elif entry["type"] == "PhoenixCodex":
-                            phoenix_tmpfile.write(orjson.dumps(entry))
+                            phoenix_tmpfile.write(json_io.dumps(entry))
                             phoenix_tmpfile.write(b"\n")
                             entry_counts["PhoenixCodex"] += 1
                         else:
@@ -992,14 +991,12 @@ class FileProcessor:
         existing: List[Dict[str, Any]] = []
         if path.exists():
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    existing = json.load(f)
+                existing = json_io.load_file(path)
             except Exception:
                 existing = []
 
         existing.extend(entries)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(existing, f, indent=2, ensure_ascii=False)
+        json_io.save_file(existing, path, indent=True)
             
     def cleanup(self):
         """Clean up resources."""
@@ -28,6 +28,7 @@ import tkinter as tk
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
+from functools import partial
 import queue
 import time
 
@@ -40,8 +41,11 @@ from modules.legacy_tool_v6_3 import (
 )
 from modules.indexer import (
     build_index, search, search_with_context, export_results_with_context,
-    nlp_search_with_persistent_index, semantic_search
+    nlp_search_with_persistent_index, semantic_search,
+    build_vector_index, load_vector_index, similar_files
 )
+from modules.binary_index import index_path_for, load_index_file, export_index_json
+from modules import json_io
 from modules.tagmap_loader import load_tagmap, load_tag_definitions
 from modules.mirror_entity_utils import (
     detect_mirror_entity_reference, ensure_mirror_entity_vault,
@@ -65,6 +69,11 @@ from modules.chat_file_manager import ChatFileManager, ChatFileManagementResult
 
 # Import performance optimization module
 from modules.performance_optimizer import get_optimizer, optimize_operation, OptimizationConfig
+from modules.query_cache import index_generation
+from modules.batch_search import latency_summary, query_server, read_queries, run_batch
+from modules.search_server import (
+    DEFAULT_PORT, IndexRegistry, SearchServer, SearchServerError, SearchService, call as call_search_server
+)
 
 # Configure logging
 logging.basicConfig(
@@ -97,6 +106,9 @@ class SearchJob:
     use_semantic: bool = False
     context_lines: int = 3
     similarity_threshold: float = 0.8
+    rank_results: bool = False
+    max_results: Optional[int] = None
+    vector_index: Optional[Any] = None
 
 class AdvancedGPTExportIndexTool:
     """Advanced GPT Export & Index Tool with modern features."""
@@ -177,19 +189,18 @@ class AdvancedGPTExportIndexTool:
             is_json = False
         
         # Index file path
-        index_file = folder_path / f"{index_type}_index.json"
+        index_file = index_path_for(folder_path / f"{index_type}_index.json", self.config.get("index_format", "json"))
         
-        # Check if we should rebuild
+        # Reuse the existing index so unchanged files are skipped
+        existing_index = None
         if not force_rebuild and index_file.exists():
             try:
-                with open(index_file, 'r', encoding='utf-8') as f:
-                    existing_index = json.load(f)
-                logger.info(f"Using existing index: {index_file}")
-                return existing_index
+                existing_index = load_index_file(index_file)
+                logger.info(f"Updating existing index incrementally: {index_file}")
             except Exception as e:
                 logger.warning(f"Failed to load existing index: {e}")
         
-        # Build new index
+        # Build (or update) the index
         def progress_wrapper(message):
             if progress_callback:
                 progress_callback(message)
@@ -203,7 +214,7 @@ class AdvancedGPTExportIndexTool:
                 index_file,
                 progress_wrapper,
                 is_json,
-                existing=None,
+                existing=existing_index,
                 tags=self.tagmap_data
             )
             
@@ -220,8 +231,19 @@ class AdvancedGPTExportIndexTool:
         
         logger.info(f"Performing search: '{search_job.query}' (semantic: {search_job.use_semantic})")
         
-        # Check for cached result
-        cached_result = self.optimizer.get_cached_search(search_job.query, str(search_job.index_data.get('metadata', {}).get('indexed_folder_path', '')))
+        # Check for a cached result of the same query and options on this index build
+        generation = index_generation(search_job.index_data)
+        cache_options = {
+            'case_sensitive': search_job.case_sensitive,
+            'search_logic': search_job.search_logic,
+            'use_semantic': search_job.use_semantic,
+            'use_vectors': search_job.vector_index is not None,
+            'context_lines': search_job.context_lines,
+            'similarity_threshold': search_job.similarity_threshold,
+            'rank_results': search_job.rank_results,
+            'max_results': search_job.max_results,
+        }
+        cached_result = self.optimizer.get_cached_search(search_job.query, generation, **cache_options)
         if cached_result:
             logger.info("Using cached search result")
             return cached_result
@@ -231,7 +253,8 @@ class AdvancedGPTExportIndexTool:
                 search_job.query,
                 search_job.index_data,
                 top_n=10,
-                context_lines=search_job.context_lines
+                context_lines=search_job.context_lines,
+                vectors=search_job.vector_index
             )
         else:
             result = search_with_context(
@@ -240,12 +263,15 @@ class AdvancedGPTExportIndexTool:
                 context_lines=search_job.context_lines,
                 case_sensitive=search_job.case_sensitive,
                 search_logic=search_job.search_logic,
-                use_nlp=True
+                use_nlp=not search_job.rank_results,
+                rank_results=search_job.rank_results,
+                max_results=search_job.max_results,
+                postings_cache=self.optimizer.search_cache
             )
         
         # Cache the result
         if result[0] and not result[1]:  # If we have results and no error
-            self.optimizer.cache_search_result(search_job.query, str(search_job.index_data.get('metadata', {}).get('indexed_folder_path', '')), result)
+            self.optimizer.cache_search_result(search_job.query, generation, result, **cache_options)
         
         return result
     
@@ -505,6 +531,13 @@ Examples:
   # Search indexed files
   python gpt_export_index_tool.py search --query "machine learning" --index ./chats/json_index.json
   
+  # Keep the index loaded and search through the running server
+  python gpt_export_index_tool.py serve --index ./chats/json_index.json
+  python gpt_export_index_tool.py search --query "machine learning" --server http://127.0.0.1:8765
+  
+  # Run a list of queries against one loaded index
+  python gpt_export_index_tool.py search --queries-file markers.jsonl --index ./chats/json_index.json --output results.jsonl
+  
   # Export files to markdown
   python gpt_export_index_tool.py export --input ./chats --output ./exports --format markdown
   
@@ -526,19 +559,53 @@ Examples:
         index_parser.add_argument('--folder', required=True, help='Folder to index')
         index_parser.add_argument('--type', choices=['json', 'converted', 'all'], default='json', help='Index type')
         index_parser.add_argument('--force', action='store_true', help='Force rebuild index')
+        index_parser.add_argument('--index-format', choices=['binary', 'json'], help='On-disk index format; binary indexes are stored as *.bin (default: config value, json)')
+        index_parser.add_argument('--hash-contents', action='store_true', help='Compare content hashes of touched files before re-parsing them')
+        index_parser.add_argument('--positions', action='store_true', help='Store token positions for phrase and NEAR/k queries')
+        index_parser.add_argument('--vectors', action='store_true', help='Build TF-IDF vectors for --semantic search and similar (needs NumPy)')
+        index_parser.add_argument('--lsa-dims', type=int, help='Reduce the vectors to N latent (LSA) dimensions')
         index_parser.add_argument('--verbose', action='store_true', help='Verbose output')
         
+        # Export index command
+        export_index_parser = subparsers.add_parser('export-index', help='Export a binary index as JSON')
+        export_index_parser.add_argument('--index', required=True, help='Index file path')
+        export_index_parser.add_argument('--output', required=True, help='Output JSON file path')
+        export_index_parser.add_argument('--verbose', action='store_true', help='Verbose output')
+        
         # Search command
         search_parser = subparsers.add_parser('search', help='Search indexed files')
-        search_parser.add_argument('--query', required=True, help='Search query')
-        search_parser.add_argument('--index', required=True, help='Index file path')
+        search_parser.add_argument('--query', help='Search query')
+        search_parser.add_argument('--queries-file', help='Run every query in a JSONL or CSV file and stream JSONL results')
+        search_parser.add_argument('--workers', type=int, default=4, help='Parallel workers for --queries-file (default: 4)')
+        search_parser.add_argument('--processes', action='store_true', help='Use worker processes instead of threads for --queries-file')
+        search_parser.add_argument('--index', help='Index file path (optional with --server if it serves one index)')
+        search_parser.add_argument('--server', help='Search through a running "serve" process at this URL')
         search_parser.add_argument('--semantic', action='store_true', help='Use semantic search')
         search_parser.add_argument('--case-sensitive', action='store_true', help='Case sensitive search')
         search_parser.add_argument('--logic', choices=['AND', 'OR'], default='AND', help='Search logic')
         search_parser.add_argument('--context', type=int, default=3, help='Context lines')
-        search_parser.add_argument('--output', help='Output results to file')
+        search_parser.add_argument('--rank', action='store_true', help='Rank results by BM25 relevance (exact token matching)')
+        search_parser.add_argument('--limit', type=int, help='Return only the N best results (with --rank)')
+        search_parser.add_argument('--output', help='Output results to file (JSONL with --queries-file; default: stdout)')
         search_parser.add_argument('--verbose', action='store_true', help='Verbose output')
         
+        # Similar command
+        similar_parser = subparsers.add_parser('similar', help='Find files similar to an indexed file')
+        similar_parser.add_argument('--index', required=True, help='Index file path')
+        similar_parser.add_argument('--file', required=True, help='File ID, indexed path or file name')
+        similar_parser.add_argument('--limit', type=int, default=10, help='Number of similar files')
+        similar_parser.add_argument('--build', action='store_true', help='Build the vectors first if they are missing or stale')
+        similar_parser.add_argument('--verbose', action='store_true', help='Verbose output')
+        
+        # Serve command
+        serve_parser = subparsers.add_parser('serve', help='Keep indexes loaded and answer JSON-RPC search requests')
+        serve_parser.add_argument('--index', required=True, action='append', help='Index file path (repeat for several)')
+        serve_parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+        serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+        serve_parser.add_argument('--reload-interval', type=float, default=1.0, help='Seconds between checks for a rebuilt index')
+        serve_parser.add_argument('--allow-origin', action='append', default=[], help='Extra web origin allowed to call the server')
+        serve_parser.add_argument('--verbose', action='store_true', help='Verbose output')
+        
         # Export command
         export_parser = subparsers.add_parser('export', help='Export files')
         export_parser.add_argument('--input', required=True, help='Input folder or file')
@@ -573,6 +640,7 @@ Examples:
         advanced_index_parser.add_argument('--folder', required=True, help='Folder to index')
         advanced_index_parser.add_argument('--output', required=True, help='Output index file path')
         advanced_index_parser.add_argument('--force', action='store_true', help='Force rebuild index')
+        advanced_index_parser.add_argument('--positions', action='store_true', help='Store token positions for phrase and NEAR/k queries')
         advanced_index_parser.add_argument('--verbose', action='store_true', help='Verbose output')
         
         # TagMap command (Avalonia backported)
@@ -667,6 +735,12 @@ Examples:
                 self._handle_index(args)
             elif args.command == 'search':
                 self._handle_search(args)
+            elif args.command == 'export-index':
+                self._handle_export_index(args)
+            elif args.command == 'similar':
+                self._handle_similar(args)
+            elif args.command == 'serve':
+                self._handle_serve(args)
             elif args.command == 'export':
                 self._handle_export(args)
             elif args.command == 'classify':
@@ -706,6 +780,17 @@ Examples:
         def progress_callback(message):
             print(f"Indexing: {message}")
         
+        if args.index_format:
+            self.tool.config["index_format"] = args.index_format
+        if args.hash_contents:
+            self.tool.config["index_hash_contents"] = True
+        if args.positions:
+            self.tool.config["index_positions"] = True
+        if args.vectors:
+            self.tool.config["vector_index"] = True
+        if args.lsa_dims is not None:
+            self.tool.config["vector_lsa_dims"] = args.lsa_dims
+        
         try:
             index_data = self.tool.build_index_advanced(
                 folder_path,
@@ -714,19 +799,35 @@ Examples:
                 args.force
             )
             print(f"✅ Index built successfully: {len(index_data.get('index', {}).get('files', {}))} files")
+            stats = index_data.get('metadata', {}).get('build_stats')
+            if stats:
+                print(f"   Added: {stats['added']}, updated: {stats['updated']}, "
+                      f"removed: {stats['removed']}, skipped: {stats['skipped']}")
         except Exception as e:
             logger.error(f"Failed to build index: {e}")
     
     def _handle_search(self, args):
         """Handle search command."""
+        if bool(args.query) == bool(args.queries_file):
+            logger.error("Pass exactly one of --query and --queries-file")
+            return
+        if args.queries_file:
+            self._handle_batch_search(args)
+            return
+        if args.server:
+            self._handle_server_search(args)
+            return
+        if not args.index:
+            logger.error("--index is required unless --server is given")
+            return
         index_path = Path(args.index)
         if not index_path.exists():
             logger.error(f"Index file does not exist: {index_path}")
             return
         
         try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index_data = json.load(f)
+            index_data = load_index_file(index_path)
+            vectors = load_vector_index(index_path, index_data) if args.semantic else None
             
             search_job = SearchJob(
                 query=args.query,
@@ -734,7 +835,10 @@ Examples:
                 case_sensitive=args.case_sensitive,
                 search_logic=args.logic,
                 use_semantic=args.semantic,
-                context_lines=args.context
+                context_lines=args.context,
+                rank_results=args.rank,
+                max_results=args.limit,
+                vector_index=vectors
             )
             
             results, error = self.tool.search_advanced(search_job)
@@ -743,21 +847,185 @@ Examples:
                 print(f"❌ Search failed: {error}")
                 return
             
-            print(f"✅ Found {len(results)} results:")
-            for file_path, context, score in results:
-                print(f"📄 {file_path}")
-                print(f"   Score: {score:.3f}")
-                print(f"   Context: {context[:200]}...")
-                print()
-            
-            if args.output:
-                with open(args.output, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, indent=2, default=str)
-                print(f"💾 Results saved to {args.output}")
+            self._print_search_results(results, args.output)
                 
         except Exception as e:
             logger.error(f"Search failed: {e}")
     
+    def _handle_server_search(self, args):
+        """Handle search command against a running serve process."""
+        params = {
+            'query': args.query,
+            'case_sensitive': args.case_sensitive,
+            'logic': args.logic,
+            'semantic': args.semantic,
+            'context_lines': args.context,
+            'rank': args.rank,
+            'limit': args.limit,
+        }
+        if args.index:
+            params['index'] = str(Path(args.index).resolve())
+        
+        try:
+            response = call_search_server(args.server, 'search', **params)
+        except SearchServerError as e:
+            print(f"❌ Search failed: {e.message}")
+            return
+        except OSError as e:
+            logger.error(f"Could not reach search server at {args.server}: {e}")
+            return
+        
+        if response['error']:
+            print(f"❌ Search failed: {response['error']}")
+            return
+        
+        results = [
+            (r['file'], r['started_at'], r['ended_at'], r['path'], r['snippets'], r['file_id'], r['details'])
+            for r in response['results']
+        ]
+        self._print_search_results(results, args.output)
+    
+    def _handle_batch_search(self, args):
+        """Handle search --queries-file: stream one JSONL record per query."""
+        queries_path = Path(args.queries_file)
+        if not queries_path.exists():
+            logger.error(f"Queries file does not exist: {queries_path}")
+            return
+        defaults = {
+            'logic': args.logic,
+            'case_sensitive': args.case_sensitive,
+            'semantic': args.semantic,
+            'context': args.context,
+            'rank': args.rank,
+            'limit': args.limit,
+        }
+        
+        if args.server:
+            if args.index:
+                defaults['index'] = str(Path(args.index).resolve())
+            batch_options = {'query_fn': partial(query_server, args.server)}
+        elif not args.index:
+            logger.error("--index is required unless --server is given")
+            return
+        else:
+            index_path = Path(args.index)
+            if not index_path.exists():
+                logger.error(f"Index file does not exist: {index_path}")
+                return
+            batch_options = {'index_file': index_path, 'processes': args.processes}
+            if not args.processes:
+                index_data = load_index_file(index_path)
+                batch_options.update(
+                    loaded_index=index_data,
+                    vectors=load_vector_index(index_path, index_data),
+                    postings_cache=self.tool.optimizer.search_cache,
+                )
+        
+        timings = []
+        started = time.perf_counter()
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            records = run_batch(
+                read_queries(queries_path), defaults=defaults, workers=args.workers, **batch_options
+            )
+            for record in records:
+                out.write(json_io.dumps_str(record, default=str) + '\n')
+                out.flush()
+                timings.append({k: record[k] for k in ('line', 'query', 'latency_ms', 'error')})
+        except (OSError, ValueError) as e:
+            logger.error(f"Batch search failed: {e}")
+            return
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        
+        summary = latency_summary(timings)
+        elapsed = time.perf_counter() - started
+        print(f"✅ {summary['queries']} queries in {elapsed:.2f}s ({summary['errors']} with errors); "
+              f"latency p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, max {summary['max_ms']:.1f} ms",
+              file=sys.stderr)
+        for slow in summary['slowest']:
+            print(f"   {slow['latency_ms']:.1f} ms  line {slow['line']}: {slow['query']}", file=sys.stderr)
+    
+    def _print_search_results(self, results, output=None):
+        """Print search results and optionally save them as JSON."""
+        print(f"✅ Found {len(results)} results:")
+        for name, _started, _ended, file_path, snippets, _fid, _details in results:
+            print(f"📄 {name} ({file_path})")
+            if snippets:
+                print(f"   Context: {snippets[0][:200]}...")
+            print()
+        
+        if output:
+            json_io.save_file(results, output, indent=True, default=str)
+            print(f"💾 Results saved to {output}")
+    
+    def _handle_serve(self, args):
+        """Handle serve command."""
+        registry = IndexRegistry(reload_interval=args.reload_interval)
+        for index in args.index:
+            index_path = Path(index)
+            if not index_path.exists():
+                logger.error(f"Index file does not exist: {index_path}")
+                return
+            registry.add(index_path)
+        
+        service = SearchService(registry, cache=self.tool.optimizer.search_cache, classifier=self.tool.classify_content)
+        try:
+            server = SearchServer(service, args.host, args.port, args.allow_origin)
+        except OSError as e:
+            logger.error(f"Could not listen on {args.host}:{args.port}: {e}")
+            return
+        
+        print(f"🔎 Serving {len(args.index)} index(es) at {server.url}/rpc (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Search server stopped")
+        finally:
+            server.server_close()
+    
+    def _handle_similar(self, args):
+        """Handle similar command."""
+        index_path = Path(args.index)
+        if not index_path.exists():
+            logger.error(f"Index file does not exist: {index_path}")
+            return
+        
+        try:
+            index_data = load_index_file(index_path)
+            vectors = load_vector_index(index_path, index_data)
+            if vectors is None:
+                if not args.build:
+                    print("❌ No up-to-date vectors for this index; rebuild with 'index --vectors' or pass --build")
+                    return
+                build_vector_index(index_path, lsa_dims=self.tool.config.get("vector_lsa_dims", 0), loaded_index=index_data)
+                vectors = load_vector_index(index_path, index_data)
+            
+            results, error = similar_files(args.file, index_data, vectors, top_n=args.limit)
+            if error:
+                print(f"❌ {error}")
+                return
+            
+            print(f"✅ Files similar to {args.file}:")
+            for name, file_path, score, _fid, _details in results:
+                print(f"   {score:.3f}  {file_path}")
+        except Exception as e:
+            logger.error(f"Similarity search failed: {e}")
+    
+    def _handle_export_index(self, args):
+        """Handle export-index command."""
+        index_path = Path(args.index)
+        if not index_path.exists():
+            logger.error(f"Index file does not exist: {index_path}")
+            return
+        
+        try:
+            export_index_json(index_path, args.output)
+            print(f"💾 Index exported to {args.output}")
+        except Exception as e:
+            logger.error(f"Index export failed: {e}")
+    
     def _handle_export(self, args):
         """Handle export command."""
         input_path = Path(args.input)
@@ -837,8 +1105,7 @@ Examples:
                     logger.error(f"Failed to classify {file_path}: {e}")
             
             if args.output:
-                with open(args.output, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, indent=2, default=str)
+                json_io.save_file(results, args.output, indent=True, default=str)
                 print(f"💾 Classification results saved to {args.output}")
                     
         except Exception as e:
@@ -887,7 +1154,7 @@ Examples:
         
         try:
             # Create advanced indexer
-            indexer = AdvancedIndexer()
+            indexer = AdvancedIndexer(index_positions=args.positions)
             
             # Build index
             index = indexer.build_index(
@@ -896,6 +1163,8 @@ Examples:
                 progress_callback=lambda msg, current, total: progress_service.report_progress(msg, current, total),
                 force_rebuild=args.force
             )
+            # Let a background segment merge finish before the process exits
+            indexer.wait_for_compaction()
             
             # Show index statistics
             stats = indexer.get_index_stats(index)
@@ -1089,8 +1358,7 @@ Examples:
                 logger.error(f"Data file does not exist: {data_path}")
                 return
                 
-            with open(data_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_io.load_file(data_path)
                 
             print(f"📊 Loaded {len(data)} items for visualization")
             
@@ -1163,7 +1431,11 @@ Examples:
             
             if 'search_cache' in stats:
                 cache_stats = stats['search_cache']
-                print(f"   Search Cache: {cache_stats['size']}/{cache_stats['max_size']} entries")
+                print(f"   Search Cache: {cache_stats['size']}/{cache_stats['max_size']} entries, "
+                      f"{cache_stats['bytes'] / (1024*1024):.2f}/{cache_stats['max_bytes'] / (1024*1024):.0f} MB")
+                print(f"   Search Cache Hits: {cache_stats['hits']}, misses: {cache_stats['misses']} "
+                      f"({cache_stats['hit_rate']:.0%}), postings hits: {cache_stats['postings_hits']}, "
+                      f"evictions: {cache_stats['evictions']}")
             
             if 'file_cache_size' in stats:
                 print(f"   File Cache: {stats['file_cache_size']} entries")
@@ -2,7 +2,8 @@ import os
 from pathlib import Path
 from multiprocessing import Pool, cpu_count
 from tempfile import SpooledTemporaryFile
-import orjson
+
+from modules import json_io
 
 # Worker function to process a single file's content
 # and produce an AmandaMap/PhoenixCodex-style entry.
@@ -42,7 +43,7 @@ def process_directory(input_dir: str, output_file: str = "AmandaMap_PhoenixCodex
         with Pool(processes=num_workers) as pool:
             # Process files in parallel and write results incrementally
             for idx, entry in pool.imap_unordered(_process_file, files_in_memory):
-                tmpfile.write(orjson.dumps(entry))
+                tmpfile.write(json_io.dumps(entry))
                 tmpfile.write(b"\n")
                 files_in_memory[idx] = None  # Release memory for processed file
 
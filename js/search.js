@@ -65,9 +65,26 @@ class SearchManager {
                 this.searchOptions.includeTags = e.target.checked;
             });
         }
+        
+        // Search server (a running "gpt_export_index_tool.py serve")
+        const serverUrl = document.getElementById('search-server-url');
+        
+        if (serverUrl) {
+            serverUrl.value = this.getServerUrl();
+            serverUrl.addEventListener('change', (e) => {
+                if (window.PhoenixSettings) {
+                    window.PhoenixSettings.set('searchServerUrl', e.target.value.trim());
+                }
+            });
+        }
     }
     
-    performSearch() {
+    getServerUrl() {
+        const url = window.PhoenixSettings ? window.PhoenixSettings.get('searchServerUrl') : '';
+        return (url || '').trim().replace(/\/+$/, '');
+    }
+    
+    async performSearch() {
         const searchInput = document.getElementById('search-query');
         if (!searchInput) return;
         
@@ -77,11 +94,73 @@ class SearchManager {
             return;
         }
         
-        this.searchResults = this.searchData(query);
+        const serverUrl = this.getServerUrl();
+        if (serverUrl) {
+            try {
+                this.searchResults = await this.searchServer(serverUrl, query);
+            } catch (error) {
+                console.warn('Search server unavailable, searching loaded data instead:', error);
+                this.searchResults = this.searchData(query);
+            }
+        } else {
+            this.searchResults = this.searchData(query);
+        }
         this.currentPage = 1;
         this.displayResults();
     }
     
+    async searchServer(serverUrl, query) {
+        const maxResults = window.PhoenixSettings ? window.PhoenixSettings.get('maxResults') : null;
+        const response = await fetch(`${serverUrl}/rpc`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                jsonrpc: '2.0',
+                method: 'search',
+                params: {
+                    query,
+                    semantic: this.searchOptions.semantic,
+                    case_sensitive: this.searchOptions.caseSensitive,
+                    limit: maxResults || null
+                },
+                id: 1
+            })
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        
+        const reply = await response.json();
+        if (reply.error) {
+            throw new Error(reply.error.message);
+        }
+        if (reply.result.error) {
+            // The server answered; the query just found nothing
+            return [];
+        }
+        
+        // Server results come in rank order; keep that order as the score
+        const results = reply.result.results;
+        return results.map((result, index) => ({
+            item: {
+                source: result.file,
+                type: 'indexed',
+                date: result.started_at || '',
+                content: this.escapeHtml(result.snippets.join('\n…\n')),
+                tags: (result.details && result.details.tags) || []
+            },
+            score: results.length - index,
+            matchedFields: ['content'],
+            index
+        }));
+    }
+    
+    escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+    
     searchData(query) {
         const results = [];
         const searchTerms = this.searchOptions.caseSensitive ? 
@@ -13,6 +13,7 @@ class SettingsManager {
             fontSize: 'medium',
             showDebugInfo: false,
             maxResults: 100,
+            searchServerUrl: '',
             animationSpeed: 1.0,
             enableTooltips: true
         };
@@ -5,15 +5,37 @@ Backports the sophisticated indexing functionality from the Avalonia app's Advan
 Provides token-based indexing with fuzzy matching, context extraction, and multi-format support.
 """
 
-import json
 import re
 import os
 import hashlib
 from pathlib import Path
-from typing import Dict, List, Set, Optional, Tuple, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Mapping, Set, Optional, Tuple, Any, Union
+from dataclasses import dataclass, asdict, field, replace
 from datetime import datetime
 import logging
+from array import array
+from collections import Counter
+from itertools import islice
+from collections.abc import Iterable, Iterator
+
+from .binary_index import close_index_file, load_index_file
+from .facets import Bitmap, FacetIndex
+from . import json_io
+from .index_segments import (
+    DEFAULT_MAX_SEGMENTS,
+    SEGMENTED_VERSION,
+    SegmentStore,
+    SegmentedTokens,
+    close_segments,
+    is_segmented_manifest,
+    live_facets,
+    live_files,
+)
+from .index_builder import token_offsets
+from .positional import has_positional_syntax, match_clauses, parse_positional_query, snippet_phrases
+from .query_planner import QueryPlanner, TermSource, has_boolean_syntax, parse_boolean_query, positive_terms
+from .ranking import TermPostings, bm25_idf, top_k
+from .snippets import extract_snippets
 
 logger = logging.getLogger(__name__)
 
@@ -27,15 +49,38 @@ class SearchResult:
     line_number: Optional[int] = None
     relevance_score: float = 0.0
 
+class SearchResults(list):
+    """The :class:`SearchResult` list of one search, plus facet counts.
+
+    ``facets`` maps ``facet -> value -> count`` over every matching file
+    (not just the returned ones); ``total`` is the number of matching files.
+    """
+    
+    def __init__(self, results=(), facets: Optional[Dict[str, Dict[str, int]]] = None, total: int = 0):
+        super().__init__(results)
+        self.facets = facets or {}
+        self.total = total
+
+FacetFilter = Union[str, List[str], None]
+
 @dataclass
 class SearchOptions:
-    """Configuration options for search operations."""
+    """Configuration options for search operations.
+    
+    Facet filters take one value or a list (any of them matches); different
+    facets must all match.
+    """
     case_sensitive: bool = False
     use_fuzzy: bool = False
     use_and: bool = True
     context_lines: int = 1
-    extension_filter: Optional[str] = None
+    extension_filter: FacetFilter = None  # ".md" or "md"
+    category_filter: FacetFilter = None
+    tag_filter: FacetFilter = None  # tagmap tags and categories
+    month_filter: FacetFilter = None  # "YYYY-MM" of the modification time
+    facet_counts: bool = True
     similarity_threshold: float = 0.8
+    max_results: Optional[int] = None  # best N by BM25; None returns every match
 
 @dataclass
 class FileDetail:
@@ -46,14 +91,106 @@ class FileDetail:
     preview: Optional[str] = None
     size: int = 0
     line_count: int = 0
+    token_count: int = 0
+    tags: List[str] = field(default_factory=list)
+
+class DocPostings(Mapping):
+    """In-memory ``token -> set of paths`` mapping stored as integer file IDs.
+    
+    Every path is kept once, in the sorted path table ``paths``; a file's ID
+    is its position there.  Each token holds an ``array('I')`` of sorted IDs,
+    which is several times smaller than a set of path strings.  Lookups by
+    token still return a set of paths for callers of the mapping interface.
+    """
+    
+    def __init__(self, paths: List[str], postings: Dict[str, array]):
+        self.paths = paths
+        self.doc_ids: Dict[str, int] = {path: i for i, path in enumerate(paths)}
+        self._postings = postings
+    
+    @classmethod
+    def from_paths(cls, tokens: Mapping[str, Iterable[str]], files: Iterable[str] = ()) -> "DocPostings":
+        """Build from ``token -> paths``; *files* adds paths that have no postings."""
+        paths = set(files)
+        for token_paths in tokens.values():
+            paths.update(token_paths)
+        postings = cls(sorted(paths), {})
+        doc_ids = postings.doc_ids
+        for token, token_paths in tokens.items():
+            ids = sorted({doc_ids[path] for path in token_paths})
+            if ids:
+                postings._postings[token] = array("I", ids)
+        return postings
+    
+    def ids(self, token: str) -> array:
+        """Return the sorted IDs of the files containing *token*."""
+        return self._postings.get(token, _NO_IDS)
+    
+    def __getitem__(self, token):
+        ids = self._postings[token]
+        return {self.paths[i] for i in ids}
+    
+    def __contains__(self, token) -> bool:
+        return token in self._postings
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._postings)
+    
+    def __len__(self) -> int:
+        return len(self._postings)
+
+_NO_IDS = array("I")
 
 @dataclass
 class Index:
-    """Complete index structure with tokens and file metadata."""
-    tokens: Dict[str, Set[str]]  # token -> set of file paths
+    """Complete index structure with tokens and file metadata.
+    
+    ``tokens`` may be given as any ``token -> paths`` mapping; it is stored
+    as :class:`DocPostings` (or a segmented view) keyed by integer file IDs,
+    whose path table is ``doc_paths``.
+    """
+    tokens: Mapping[str, Set[str]]  # token -> set of file paths
     files: Dict[str, FileDetail]  # file path -> file details
     created: str
     version: str = "1.0"
+    # Facet bitmaps over the integer file IDs
+    facets: Optional[FacetIndex] = field(default=None, repr=False)
+    doc_paths: List[str] = field(init=False, repr=False)
+    doc_ids: Dict[str, int] = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        if not isinstance(self.tokens, (DocPostings, SegmentedTokens)):
+            self.tokens = DocPostings.from_paths(self.tokens, self.files)
+        self.doc_paths = self.tokens.paths
+        self.doc_ids = self.tokens.doc_ids
+    
+    def ensure_facets(self) -> FacetIndex:
+        """Return the facet bitmaps, building them from ``files`` if the index has none."""
+        if self.facets is None:
+            self.facets = FacetIndex.build(
+                (path, vars(self.files[path]) if path in self.files else {}) for path in self.doc_paths
+            )
+        return self.facets
+
+    def close(self) -> None:
+        """Unmap the segments behind a segmented index; a no-op for in-memory ones."""
+        if isinstance(self.tokens, SegmentedTokens):
+            self.tokens.close()
+
+class _IndexTerms(TermSource):
+    """Query-planner view of an :class:`Index`: postings as sorted file IDs."""
+    
+    def __init__(self, index: Index):
+        self.index = index
+    
+    def postings(self, term: str) -> array:
+        return self.index.tokens.ids(term)
+    
+    def estimate(self, term: str) -> int:
+        return len(self.postings(term))
+    
+    def universe(self) -> range:
+        return range(len(self.index.doc_paths))
 
 class AdvancedIndexer:
     """Advanced indexing and search functionality for text-based files."""
@@ -61,9 +198,15 @@ class AdvancedIndexer:
     # Compiled regex patterns for tokenization
     TOKEN_PATTERN = re.compile(r'[A-Za-z0-9]+')
     
-    def __init__(self):
+    def __init__(self, max_segments: int = DEFAULT_MAX_SEGMENTS, index_positions: bool = False):
         self.index: Optional[Index] = None
+        self.max_segments = max_segments
+        # Store token offsets so quoted phrases and NEAR/k are answered from the index.
+        # Phrase queries need every segment to carry them (rebuild with force_rebuild).
+        self.index_positions = index_positions
         self.tagmap_data: Optional[Dict] = None
+        self._file_tags: Dict[str, List[str]] = {}
+        self._store: Optional[SegmentStore] = None
         
     def build_index(
         self, 
@@ -75,11 +218,16 @@ class AdvancedIndexer:
         """
         Build a comprehensive index of all text files in the folder.
         
+        The index is stored as a stack of segments (see ``index_segments``).
+        Only files that are new or changed since the last build are processed;
+        they go into one new segment together with tombstones for deleted
+        files, so existing segments are never rewritten.
+        
         Args:
             folder_path: Directory to index
             index_path: Where to save the index
             progress_callback: Optional callback for progress updates
-            force_rebuild: Whether to rebuild existing index
+            force_rebuild: Whether to drop all segments and rebuild from scratch
             
         Returns:
             The built index
@@ -99,35 +247,36 @@ class AdvancedIndexer:
         except ImportError:
             logger.warning("Performance optimizer not available, skipping size checks")
         
-        # Load existing index if it exists and not forcing rebuild
-        existing_index = None
-        if index_path.exists() and not force_rebuild:
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    index_data = json.load(f)
-                    existing_index = self._deserialize_index(index_data)
-                    logger.info(f"Loaded existing index with {len(existing_index.files)} files")
-            except Exception as e:
-                logger.warning(f"Error loading existing index: {e}")
+        store = SegmentStore(index_path, self.max_segments)
+        self._store = store
+        # Unmap the previous index first so its segments can be reset or compacted away
+        self._release_index()
+        if force_rebuild:
+            store.reset()
+        else:
+            self._migrate_monolithic_index(index_path, store)
         
-        # Initialize index structure
+        # Only the segments' file metadata is read up front; postings stay on disk
+        with store.segments() as segments:
+            indexed_files = live_files(segments)
+        logger.info(f"Existing index has {len(indexed_files)} live files")
+        
+        # New segment: files added or changed since the last build
         tokens: Dict[str, Set[str]] = {}
+        term_freqs: Dict[str, Dict[str, int]] = {}
+        positions: Optional[Dict[str, Dict[str, List[int]]]] = {} if self.index_positions else None
         files: Dict[str, FileDetail] = {}
-        
-        # Copy existing data if available
-        if existing_index:
-            tokens = {k: set(v) for k, v in existing_index.tokens.items()}
-            files = existing_index.files.copy()
+        tombstones: Set[str] = set()
         
         # Load tagmap if available
         tagmap_path = folder_path / "tagmap.json"
         if tagmap_path.exists():
             try:
-                with open(tagmap_path, 'r', encoding='utf-8') as f:
-                    self.tagmap_data = json.load(f)
-                    logger.info("Loaded tagmap data")
+                self.tagmap_data = json_io.load_file(tagmap_path)
+                logger.info("Loaded tagmap data")
             except Exception as e:
                 logger.warning(f"Error loading tagmap: {e}")
+        self._file_tags = self._tags_by_document(self.tagmap_data)
         
         # Get all supported files
         supported_extensions = {'.txt', '.json', '.md', '.html', '.xml'}
@@ -145,12 +294,18 @@ class AdvancedIndexer:
         else:
             logger.warning("No progress callback provided")
         
-        # Process each file with size limits
+        # Process each new or changed file with size limits
+        seen_paths: Set[str] = set()
+        skipped_unchanged = 0
         for i, file_path in enumerate(all_files):
             try:
+                relative_path = str(file_path.relative_to(folder_path))
+                seen_paths.add(relative_path)
+                
                 # Check file size limits
                 try:
-                    file_size_mb = file_path.stat().st_size / (1024 * 1024)
+                    stat = file_path.stat()
+                    file_size_mb = stat.st_size / (1024 * 1024)
                     if file_size_mb > 50:  # 50MB limit
                         logger.warning(f"Skipping large file: {file_path.name} ({file_size_mb:.1f}MB)")
                         continue
@@ -158,7 +313,15 @@ class AdvancedIndexer:
                     logger.warning(f"Error checking file size for {file_path}: {e}")
                     continue
                 
-                self._process_file(file_path, folder_path, tokens, files)
+                previous = indexed_files.get(relative_path)
+                if previous is not None:
+                    if previous.get("modified") == int(stat.st_mtime) and previous.get("size") == stat.st_size:
+                        skipped_unchanged += 1
+                        continue
+                    # Hide the old version even if re-processing fails
+                    tombstones.add(relative_path)
+                
+                self._process_file(file_path, folder_path, tokens, files, term_freqs, positions)
                 
                 if progress_callback:
                     progress_msg = f"Indexed {file_path.name} ({i + 1}/{len(all_files)})"
@@ -170,29 +333,106 @@ class AdvancedIndexer:
             except Exception as e:
                 logger.error(f"Error processing file {file_path}: {e}")
         
-        # Create and save index
-        self.index = Index(
-            tokens=tokens,
-            files=files,
-            created=datetime.now().isoformat()
+        # Files that disappeared from the folder
+        tombstones.update(path for path in indexed_files if path not in seen_paths)
+        logger.info(
+            f"{len(files)} files indexed, {skipped_unchanged} unchanged, "
+            f"{len(tombstones - set(files))} removed"
         )
         
-        # Save index to file
+        # Write the new segment and compact in the background once the stack grows
+        if files or tombstones:
+            try:
+                store.add_segment(
+                    tokens,
+                    {k: asdict(v) for k, v in files.items()},
+                    tombstones - files.keys(),
+                    term_freqs,
+                    positions,
+                )
+            except Exception as e:
+                logger.error(f"Error saving index segment: {e}")
+        if store.needs_compaction:
+            store.compact_in_background()
+        
+        self.index = self._index_from_store(store)
+        return self.index
+    
+    def _tags_by_document(self, tagmap_data) -> Dict[str, List[str]]:
+        """Return ``document -> tags`` (entry tags and categories) from tagmap entries."""
+        tags: Dict[str, Set[str]] = {}
+        for entry in tagmap_data if isinstance(tagmap_data, list) else []:
+            if not isinstance(entry, dict) or not entry.get("document"):
+                continue
+            entry_tags = tags.setdefault(entry["document"], set())
+            entry_tags.update(tag for tag in entry.get("tags") or [] if tag)
+            if entry.get("category"):
+                entry_tags.add(entry["category"])
+        return {document: sorted(values) for document, values in tags.items()}
+    
+    def _migrate_monolithic_index(self, index_path: Path, store: SegmentStore) -> None:
+        """Turn a pre-segment JSON index at *index_path* into the base segment."""
+        if not index_path.exists():
+            return
         try:
-            with open(index_path, 'w', encoding='utf-8') as f:
-                json.dump(self._serialize_index(self.index), f, indent=2)
-            logger.info(f"Index saved to {index_path}")
+            data = json_io.load_file(index_path)
         except Exception as e:
-            logger.error(f"Error saving index: {e}")
-        
+            logger.warning(f"Error loading existing index: {e}")
+            return
+        if is_segmented_manifest(data):
+            return
+        legacy_index = self._deserialize_index(data)
+        store.add_segment(
+            legacy_index.tokens,
+            {k: asdict(v) for k, v in legacy_index.files.items()},
+        )
+        logger.info(f"Converted existing index with {len(legacy_index.files)} files into a base segment")
+    
+    def _index_from_store(self, store: SegmentStore) -> Index:
+        """Return an :class:`Index` that searches across all segments of *store*.
+
+        The index keeps the segments mapped until :meth:`Index.close`.
+        """
+        segments = store.open_segments()
+        try:
+            manifest = store.manifest()
+            files = {k: FileDetail(**v) for k, v in live_files(segments).items()}
+            doc_paths = sorted(files)
+            return Index(
+                tokens=SegmentedTokens(segments, doc_paths),
+                files=files,
+                created=manifest.get("created", ""),
+                version=manifest.get("version", SEGMENTED_VERSION),
+                facets=live_facets(segments, doc_paths),
+            )
+        except Exception:
+            close_segments(segments)
+            raise
+    
+    def _release_index(self) -> None:
+        """Close the current index (unmapping its segments) and forget it."""
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+    
+    def compact_index(self, index_path: Path) -> Index:
+        """Merge all segments of the index at *index_path* now."""
+        self._release_index()
+        SegmentStore(index_path).compact()
+        self.index = self._index_from_store(SegmentStore(index_path))
         return self.index
     
+    def wait_for_compaction(self, timeout: Optional[float] = None) -> None:
+        """Block until a background compaction started by :meth:`build_index` finishes."""
+        if self._store is not None:
+            self._store.wait_for_compaction(timeout)
+    
     def search(
         self, 
         index: Index, 
         phrase: str, 
         options: Optional[SearchOptions] = None
-    ) -> List[SearchResult]:
+    ) -> SearchResults:
         """
         Search the index for the given phrase.
         
@@ -202,58 +442,100 @@ class AdvancedIndexer:
             options: Search configuration options
             
         Returns:
-            List of search results with context
+            List of search results with context, carrying the facet counts
+            of every matching file
         """
         if not options:
             options = SearchOptions()
         
         logger.info(f"Searching for: '{phrase}' with options: {options}")
         
-        # Tokenize search phrase
-        search_tokens = set(self.TOKEN_PATTERN.findall(phrase.lower()))
-        if not options.case_sensitive:
-            search_tokens = {token.lower() for token in search_tokens}
-        
-        if not search_tokens:
-            return []
-        
-        # Find matching files
-        matching_files = set()
-        
-        if options.use_and:
-            # All tokens must be present
-            matching_files = set.intersection(*[
-                index.tokens.get(token, set()) for token in search_tokens
-            ]) if search_tokens else set()
+        # Facet filters are bitmap ANDs, applied before any postings are scored
+        facets = index.ensure_facets()
+        allowed = facets.select({
+            "extension": options.extension_filter,
+            "category": options.category_filter,
+            "tag": options.tag_filter,
+            "month": options.month_filter,
+        })
+        if allowed is not None and not allowed:
+            return SearchResults()
+        
+        # Quoted phrases and NEAR/k are matched against stored token offsets
+        tokenize = lambda text: self.TOKEN_PATTERN.findall(text.lower())
+        candidates = None
+        phrases = [phrase]
+        ranking_options = options
+        positional = has_positional_syntax(phrase) and getattr(index.tokens, "has_positions", False)
+        query_tree = None
+        if not positional and has_boolean_syntax(phrase):
+            try:
+                query_tree = parse_boolean_query(phrase, tokenize, "AND" if options.use_and else "OR")
+            except ValueError as e:
+                # Unbalanced parentheses or a dangling operator: search the words as typed
+                logger.info(f"Searching '{phrase}' as plain terms: {e}")
+            else:
+                if query_tree is None:
+                    return SearchResults()
+        if positional:
+            clauses = parse_positional_query(phrase, tokenize)
+            search_tokens = {token for clause in clauses for token in clause.tokens + clause.right_tokens}
+            candidates = self._doc_ids(index, match_clauses(
+                clauses, index.tokens.positions, "AND" if options.use_and else "OR"
+            ))
+            if allowed is not None:
+                candidates &= allowed
+            phrases = snippet_phrases(phrase)
+        elif query_tree is not None:
+            # AND/OR/NOT with parentheses: the planner finds the matching files,
+            # BM25 then ranks them by whichever non-negated terms they contain
+            within = None if allowed is None else list(allowed)
+            candidates = Bitmap.from_sorted(QueryPlanner(_IndexTerms(index)).evaluate(query_tree, within))
+            search_tokens = set(positive_terms(query_tree))
+            ranking_options = replace(options, use_and=False)
+            if not search_tokens:
+                phrases = []  # only negations: nothing to highlight or score
         else:
-            # Any token can match
-            for token in search_tokens:
-                matching_files.update(index.tokens.get(token, set()))
-        
-        # Apply extension filter
-        if options.extension_filter:
-            matching_files = {
-                f for f in matching_files 
-                if Path(f).suffix.lower() == options.extension_filter.lower()
-            }
+            # Tokenize search phrase
+            search_tokens = set(tokenize(phrase))
+        
+        if not search_tokens and candidates is None:
+            return SearchResults()
+        
+        if search_tokens:
+            # Rank matching files with BM25 straight from the postings
+            restrict = allowed if candidates is None else candidates
+            ranked, matched = self._rank_files(index, search_tokens, ranking_options, restrict)
+            if candidates is not None:
+                matched = candidates
+                limit = options.max_results or len(matched)
+                if len(ranked) < limit:
+                    # Matches without any positive term (e.g. via NOT) score zero
+                    scored = {file_path for _score, file_path in ranked}
+                    unscored = (index.doc_paths[i] for i in matched if index.doc_paths[i] not in scored)
+                    ranked += [(0.0, file_path) for file_path in islice(unscored, limit - len(ranked))]
+        else:
+            matched = candidates
+            ranked = [(0.0, index.doc_paths[i]) for i in candidates][:options.max_results]
         
         # Generate results with context
-        results = []
-        for file_path in matching_files:
+        results = SearchResults(
+            facets=facets.counts(matched) if options.facet_counts else {},
+            total=len(matched),
+        )
+        for relevance_score, file_path in ranked:
             try:
-                snippets = self._extract_snippets(
-                    Path(file_path), phrase, options.context_lines
-                )
+                snippets = []
+                for snippet_phrase in phrases:
+                    snippets.extend(self._extract_snippets(
+                        Path(file_path), snippet_phrase, options.context_lines
+                    ))
+                snippets = snippets[:5]
                 
                 file_detail = index.files.get(file_path)
                 category = file_detail.category if file_detail else None
                 preview = file_detail.preview if file_detail else None
                 
-                # Calculate relevance score
-                relevance_score = self._calculate_relevance(
-                    search_tokens, file_path, index
-                )
-                
                 result = SearchResult(
                     file=file_path,
                     snippets=snippets,
@@ -266,18 +548,22 @@ class AdvancedIndexer:
             except Exception as e:
                 logger.error(f"Error processing search result for {file_path}: {e}")
         
-        # Sort by relevance
-        results.sort(key=lambda x: x.relevance_score, reverse=True)
-        
         logger.info(f"Found {len(results)} search results")
         return results
     
+    def _doc_ids(self, index: Index, paths) -> Bitmap:
+        """Return the IDs of *paths* in *index* as a bitmap."""
+        doc_ids = index.doc_ids
+        return Bitmap.from_iterable(doc_ids[path] for path in paths if path in doc_ids)
+    
     def _process_file(
         self, 
         file_path: Path, 
         base_path: Path, 
         tokens: Dict[str, Set[str]], 
-        files: Dict[str, FileDetail]
+        files: Dict[str, FileDetail],
+        term_freqs: Optional[Dict[str, Dict[str, int]]] = None,
+        positions: Optional[Dict[str, Dict[str, List[int]]]] = None
     ):
         """Process a single file and add it to the index."""
         try:
@@ -290,13 +576,19 @@ class AdvancedIndexer:
             relative_path = str(file_path.relative_to(base_path))
             
             # Tokenize content
-            file_tokens = set(self.TOKEN_PATTERN.findall(content.lower()))
+            all_tokens = self.TOKEN_PATTERN.findall(content.lower())
+            token_counts = Counter(all_tokens)
             
-            # Add tokens to index
-            for token in file_tokens:
+            # Add tokens (and their frequencies) to index
+            for token, count in token_counts.items():
                 if token not in tokens:
                     tokens[token] = set()
                 tokens[token].add(relative_path)
+                if term_freqs is not None:
+                    term_freqs.setdefault(token, {})[relative_path] = count
+            if positions is not None:
+                for token, offsets in token_offsets(all_tokens).items():
+                    positions.setdefault(token, {})[relative_path] = offsets
             
             # Create file detail
             file_detail = FileDetail(
@@ -304,8 +596,10 @@ class AdvancedIndexer:
                 modified=int(stat.st_mtime),
                 size=stat.st_size,
                 line_count=len(content.splitlines()),
+                token_count=len(all_tokens),
                 category=self._determine_category(content),
-                preview=self._extract_preview(content)
+                preview=self._extract_preview(content),
+                tags=self._file_tags.get(relative_path) or self._file_tags.get(file_path.name, [])
             )
             
             files[relative_path] = file_detail
@@ -319,65 +613,60 @@ class AdvancedIndexer:
         phrase: str, 
         context_lines: int
     ) -> List[str]:
-        """Extract context snippets around the search phrase."""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            
-            snippets = []
-            phrase_lower = phrase.lower()
-            
-            for i, line in enumerate(lines):
-                if phrase_lower in line.lower():
-                    # Calculate context range
-                    start = max(0, i - context_lines)
-                    end = min(len(lines), i + context_lines + 1)
-                    
-                    # Extract context
-                    context_lines_list = lines[start:end]
-                    snippet = ''.join(context_lines_list).strip()
-                    
-                    if snippet:
-                        snippets.append(snippet)
-            
-            return snippets[:5]  # Limit to 5 snippets
-            
-        except Exception as e:
-            logger.error(f"Error extracting snippets from {file_path}: {e}")
-            return []
+        """Extract up to five context snippets around the search phrase."""
+        return extract_snippets(file_path, phrase, context_lines, max_snippets=5)
     
-    def _calculate_relevance(
+    def _rank_files(
         self, 
+        index: Index, 
         search_tokens: Set[str], 
-        file_path: str, 
-        index: Index
-    ) -> float:
-        """Calculate relevance score for a file."""
-        if file_path not in index.files:
-            return 0.0
-        
-        file_detail = index.files[file_path]
-        
-        # Base score from token matches
-        token_matches = 0
+        options: SearchOptions,
+        candidates: Optional[Bitmap] = None
+    ) -> Tuple[List[Tuple[float, str]], Bitmap]:
+        """Return ``(bm25_score, path)`` pairs for the best matching files,
+        and the IDs of every matching file.
+
+        *candidates*, when given, restricts ranking to those file IDs (e.g.
+        the files passing the facet filters or matching a phrase query).
+        """
+        doc_ids, doc_paths = index.doc_ids, index.doc_paths
+        doc_count = len(index.files) or 1
+        total_tokens = sum(detail.token_count for detail in index.files.values())
+        avg_doc_length = total_tokens / doc_count
+        
+        frequencies = getattr(index.tokens, "frequencies", None)
+        term_postings = []
+        matched: Optional[Bitmap] = None
         for token in search_tokens:
-            if token in index.tokens and file_path in index.tokens[token]:
-                token_matches += 1
-        
-        if not search_tokens:
-            return 0.0
-        
-        # Normalize by number of search tokens
-        base_score = token_matches / len(search_tokens)
-        
-        # Boost for recent files
-        time_boost = 1.0
-        if file_detail.modified:
-            days_old = (datetime.now().timestamp() - file_detail.modified) / (24 * 3600)
-            if days_old < 30:  # Recent files get a boost
-                time_boost = 1.2
-        
-        return base_score * time_boost
+            if frequencies is not None:
+                freqs = frequencies(token)
+                tf_by_id = {doc_ids[p]: tf for p, tf in freqs.items() if p in doc_ids}
+                ids = Bitmap.from_iterable(tf_by_id)
+            else:
+                # Monolithic indexes without stored frequencies
+                tf_by_id = None
+                ids = Bitmap.from_sorted(index.tokens.ids(token))
+            if not ids and options.use_and:
+                return [], Bitmap()  # AND with a missing term: skip fetching the others
+            idf = bm25_idf(len(ids), doc_count)
+            if candidates is not None:
+                ids &= candidates
+            if options.use_and:
+                matched = ids if matched is None else matched & ids
+            else:
+                matched = ids if matched is None else matched | ids
+            term_ids = list(ids)
+            tfs = [tf_by_id[i] for i in term_ids] if tf_by_id is not None else [1] * len(term_ids)
+            term_postings.append(TermPostings(term_ids, tfs, idf))
+        
+        def doc_length(doc_id: int) -> float:
+            detail = index.files.get(doc_paths[doc_id])
+            return detail.token_count if detail else 0
+        
+        matched = matched if matched is not None else Bitmap()
+        limit = options.max_results or len(matched)
+        ranked = top_k(term_postings, limit, doc_length, avg_doc_length, require_all=options.use_and)
+        return [(score, doc_paths[doc_id]) for score, doc_id in ranked], matched
     
     def _determine_category(self, content: str) -> Optional[str]:
         """Determine the category of content based on keywords."""
@@ -426,8 +715,9 @@ class AdvancedIndexer:
     
     def _serialize_index(self, index: Index) -> Dict[str, Any]:
         """Serialize index for JSON storage."""
+        doc_paths = index.doc_paths
         return {
-            "tokens": {k: list(v) for k, v in index.tokens.items()},
+            "tokens": {k: [doc_paths[i] for i in index.tokens.ids(k)] for k in index.tokens},
             "files": {k: asdict(v) for k, v in index.files.items()},
             "created": index.created,
             "version": index.version
@@ -435,8 +725,8 @@ class AdvancedIndexer:
     
     def _deserialize_index(self, data: Dict[str, Any]) -> Index:
         """Deserialize index from JSON data."""
-        tokens = {k: set(v) for k, v in data.get("tokens", {}).items()}
         files = {k: FileDetail(**v) for k, v in data.get("files", {}).items()}
+        tokens = DocPostings.from_paths(data.get("tokens", {}), files)
         
         return Index(
             tokens=tokens,
@@ -452,7 +742,8 @@ class AdvancedIndexer:
             "total_tokens": len(index.tokens),
             "index_size_mb": sum(f.size for f in index.files.values()) / (1024 * 1024),
             "created": index.created,
-            "version": index.version
+            "version": index.version,
+            "segments": getattr(index.tokens, "segment_count", 1)
         }
     
     def load_index(self, index_path: Path) -> Index:
@@ -460,10 +751,14 @@ class AdvancedIndexer:
         logger.info(f"Loading index from: {index_path}")
         
         try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_io.load_file(index_path)
             
-            self.index = self._deserialize_index(data)
+            if is_segmented_manifest(data):
+                index = self._index_from_store(SegmentStore(index_path))
+            else:
+                index = self._deserialize_index(data)
+            self._release_index()
+            self.index = index
             logger.info(f"Successfully loaded index with {len(self.index.files)} files")
             return self.index
             
@@ -484,10 +779,11 @@ class AdvancedIndexer:
         logger.info(f"Transferring regular index from: {regular_index_path}")
         
         try:
-            with open(regular_index_path, 'r', encoding='utf-8') as f:
-                regular_data = json.load(f)
-            
-            return self.transfer_from_regular_data(regular_data)
+            regular_data = load_index_file(regular_index_path)
+            try:
+                return self.transfer_from_regular_data(regular_data)
+            finally:
+                close_index_file(regular_data)
             
         except Exception as e:
             logger.error(f"Failed to transfer index: {e}")
@@ -554,6 +850,7 @@ class AdvancedIndexer:
                 version="1.0"
             )
             
+            self._release_index()
             self.index = advanced_index
             logger.info(f"Successfully transferred index with {len(files)} files and {len(tokens)} tokens")
             return advanced_index
@@ -0,0 +1,272 @@
+"""
+Run a file of queries against one loaded index.
+
+``search --queries-file`` reads queries from JSONL or CSV, loads the index
+once and spreads the queries over a pool of worker threads.  With
+``processes=True`` it uses worker processes instead, and each process loads
+the index once when it starts.  One JSON record per query is yielded as soon
+as that query finishes, so output streams in completion order.  Each record
+carries the input ``line`` and the query's ``latency_ms``, which makes slow
+queries easy to pick out.
+
+Each JSONL line is either a bare JSON string (the query) or an object.  A
+CSV file needs a header row.  Objects and CSV columns use these fields:
+``query`` (required), ``id``, ``logic``, ``case_sensitive``, ``semantic``,
+``context``, ``rank`` and ``limit``.  Fields that are missing take the
+defaults passed by the caller.
+"""
+
+import csv
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from .binary_index import load_index_file
+from . import json_io
+from .indexer import load_vector_index, result_to_dict, search_with_context, semantic_search
+from .search_server import SearchServerError, call
+
+__all__ = [
+    "QUERY_FIELDS",
+    "latency_summary",
+    "query_server",
+    "read_queries",
+    "run_batch",
+    "run_query",
+]
+
+QUERY_FIELDS = ("query", "id", "logic", "case_sensitive", "semantic", "context", "rank", "limit")
+
+_BOOL_FIELDS = {"case_sensitive", "semantic", "rank"}
+_INT_FIELDS = {"context", "limit"}
+_TRUE = {"1", "true", "yes", "y", "on"}
+
+_NOT_LOADED = object()
+
+# Set in each worker process by _init_process_worker
+_worker_index_file: Optional[str] = None
+_worker_index: Optional[Dict[str, Any]] = None
+_worker_vectors: Any = _NOT_LOADED
+
+
+def _coerce(field: str, value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if field in _BOOL_FIELDS:
+        return value.lower() in _TRUE
+    if field in _INT_FIELDS:
+        return int(value) if value else None
+    if field == "logic":
+        return value.upper() or None
+    return value
+
+
+def read_queries(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """Yield one query spec per entry of a JSONL or ``.csv`` file.
+
+    Every spec has a ``line`` number.  A line that cannot be parsed becomes
+    a spec with an ``error``, so the batch can still report it.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            reader = csv.DictReader(f)
+            if "query" not in (reader.fieldnames or []):
+                raise ValueError(f"{path} has no 'query' column")
+            for row in reader:
+                try:
+                    spec = {k: _coerce(k, v) for k, v in row.items() if k in QUERY_FIELDS and v not in (None, "")}
+                except ValueError as e:
+                    spec = {"error": f"Invalid row: {e}"}
+                spec["line"] = reader.line_num
+                yield spec
+            return
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json_io.loads(line)
+                if isinstance(entry, str):
+                    spec = {"query": entry}
+                elif isinstance(entry, Mapping):
+                    spec = {k: _coerce(k, v) for k, v in entry.items() if k in QUERY_FIELDS}
+                else:
+                    spec = {"error": "Expected a JSON string or object"}
+            except ValueError as e:
+                spec = {"error": f"Invalid line: {e}"}
+            spec["line"] = line_number
+            yield spec
+
+
+def run_query(
+    spec: Mapping[str, Any],
+    loaded_index: Dict[str, Any],
+    vectors=None,
+    postings_cache=None,
+) -> Dict[str, Any]:
+    """Run one query spec and return its output record."""
+    record = {"line": spec.get("line"), "id": spec.get("id"), "query": spec.get("query")}
+    query = spec.get("query")
+    error = spec.get("error")
+    results: List[tuple] = []
+    started = time.perf_counter()
+    if error is None and (not isinstance(query, str) or not query.strip()):
+        error = "Missing query"
+    if error is None:
+        try:
+            if spec.get("semantic"):
+                results, error = semantic_search(
+                    query, loaded_index, top_n=spec.get("limit") or 10,
+                    context_lines=spec.get("context", 3), vectors=vectors,
+                )
+            else:
+                results, error = search_with_context(
+                    query,
+                    loaded_index,
+                    context_lines=spec.get("context", 3),
+                    case_sensitive=spec.get("case_sensitive", False),
+                    search_logic=spec.get("logic") or "AND",
+                    use_nlp=not spec.get("rank"),
+                    rank_results=bool(spec.get("rank")),
+                    max_results=spec.get("limit"),
+                    postings_cache=postings_cache,
+                )
+        except Exception as e:
+            results, error = [], f"{type(e).__name__}: {e}"
+    record["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    record["count"] = len(results)
+    record["error"] = error
+    record["results"] = [result_to_dict(result) for result in results]
+    return record
+
+
+def query_server(url: str, spec: Mapping[str, Any]) -> Dict[str, Any]:
+    """Run one query spec on the search server at *url* and return its output record."""
+    record = {"line": spec.get("line"), "id": spec.get("id"), "query": spec.get("query")}
+    error = spec.get("error")
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    if error is None and not spec.get("query"):
+        error = "Missing query"
+    if error is None:
+        params = {
+            "query": spec["query"],
+            "logic": spec.get("logic") or "AND",
+            "case_sensitive": bool(spec.get("case_sensitive")),
+            "semantic": bool(spec.get("semantic")),
+            "context_lines": spec.get("context", 3),
+            "rank": bool(spec.get("rank")),
+            "limit": spec.get("limit"),
+        }
+        if spec.get("index"):
+            params["index"] = spec["index"]
+        try:
+            response = call(url, "search", **params)
+            results, error = response["results"], response["error"]
+        except SearchServerError as e:
+            error = e.message
+        except OSError as e:
+            error = f"Search server unavailable: {e}"
+    record["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    record["count"] = len(results)
+    record["error"] = error
+    record["results"] = results
+    return record
+
+
+def _init_process_worker(index_file: str) -> None:
+    global _worker_index_file, _worker_index
+    _worker_index_file = index_file
+    _worker_index = load_index_file(index_file)
+
+
+def _run_in_process(spec: Mapping[str, Any]) -> Dict[str, Any]:
+    global _worker_vectors
+    if not spec.get("semantic"):
+        return run_query(spec, _worker_index)
+    if _worker_vectors is _NOT_LOADED:
+        _worker_vectors = load_vector_index(_worker_index_file, _worker_index)
+    return run_query(spec, _worker_index, _worker_vectors)
+
+
+def run_batch(
+    specs: Iterable[Mapping[str, Any]],
+    *,
+    index_file: str | Path | None = None,
+    loaded_index: Optional[Dict[str, Any]] = None,
+    vectors=None,
+    defaults: Optional[Mapping[str, Any]] = None,
+    workers: int = 4,
+    processes: bool = False,
+    postings_cache=None,
+    query_fn: Optional[Callable[[Mapping[str, Any]], Dict[str, Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Run every spec and yield its output record as soon as the query finishes.
+
+    Threads share *loaded_index*, *vectors* and *postings_cache*.  With
+    *processes* each worker loads *index_file* itself, and its vectors with
+    the first semantic query.  *query_fn* replaces the local search, for
+    example to send the queries to a search server.  At most
+    ``4 * workers`` queries are in flight, so *specs* can be a lazy reader
+    over a very large file.
+    """
+    defaults = dict(defaults or {})
+    specs = ({**defaults, **spec} for spec in specs)
+    workers = max(1, workers)
+    executor: Executor
+    if query_fn is not None:
+        executor, fn = ThreadPoolExecutor(max_workers=workers), query_fn
+    elif processes:
+        if index_file is None:
+            raise ValueError("processes=True needs index_file")
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_process_worker, initargs=(str(index_file),)
+        )
+        fn = _run_in_process
+    else:
+        if loaded_index is None:
+            loaded_index = load_index_file(index_file)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        fn = partial(run_query, loaded_index=loaded_index, vectors=vectors, postings_cache=postings_cache)
+
+    max_pending = 4 * workers
+    with executor:
+        pending = set()
+        for spec in specs:
+            pending.add(executor.submit(fn, spec))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def latency_summary(records: List[Mapping[str, Any]], slowest: int = 5) -> Dict[str, Any]:
+    """Summarize the latencies of finished *records*."""
+    latencies = sorted(r["latency_ms"] for r in records)
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, math.ceil(p / 100 * len(latencies)) - 1)]
+
+    return {
+        "queries": len(records),
+        "errors": sum(1 for r in records if r.get("error")),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+        "slowest": [
+            {"line": r["line"], "query": r["query"], "latency_ms": r["latency_ms"]}
+            for r in sorted(records, key=lambda r: r["latency_ms"], reverse=True)[:slowest]
+        ],
+    }
@@ -0,0 +1,566 @@
+"""Binary on-disk format for the persistent search index.
+
+The legacy index is a single JSON document.  Loading it means parsing every
+posting list into Python lists before the first query can run, which is slow
+and memory hungry on large exports.  This module stores the same structure as
+a small set of sections:
+
+``meta``
+    JSON blob with ``metadata`` and every index section that is not a
+    posting table (``files``, ``file_details`` ...).
+``tokens``
+    Sorted term dictionary followed by delta/varint encoded posting lists.
+``file_tokens``
+    Per-file forward index: file ID -> delta/varint encoded token IDs.
+``term_freqs``
+    token -> varint term frequencies, aligned with the sorted ``tokens``
+    posting list of the same token.
+``positions``
+    Optional positional postings: token -> for every file in the ``tokens``
+    posting list, a varint count followed by delta/varint token offsets.
+``line_offsets``
+    file ID -> delta/varint byte offsets at which the file's lines start,
+    used to cut snippets without rescanning the file.
+``filename_grams``, ``meta_values``, ``meta_text``, ``chat_times``
+    key -> delta/varint file IDs; secondary indexes over file details (see
+    :mod:`modules.metadata_index`).
+``fuzzy_grams``, ``fuzzy_lengths``, ``filename_fuzzy_grams``, ``filename_fuzzy_lengths``
+    bigram or length -> delta/varint token IDs (ranks in ``tokens``) or file
+    IDs, for fuzzy expansion (see :mod:`modules.fuzzy_index`).
+``stems``
+    stem -> delta/varint file IDs (see :mod:`modules.stem_index`).
+
+Readers ``mmap`` the file and decode posting lists lazily, one term at a
+time.  :func:`load_index_file` understands both formats so callers never need
+to care which one is on disk.
+
+File layout::
+
+    MAGIC (8 bytes) | version u32 | section count u32
+    section table   : name (16 bytes, NUL padded) | offset u64 | length u64
+    section payloads
+
+Term table layout::
+
+    term count u32
+    term offsets    : (count + 1) x u64, relative to the terms blob
+    posting offsets : (count + 1) x u64, relative to the postings blob
+    terms blob (UTF-8, sorted by encoded bytes) | postings blob
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from . import json_io
+
+__all__ = [
+    "MAGIC",
+    "POSTING_SECTIONS",
+    "count_varints",
+    "encode_varint",
+    "decode_varints",
+    "encode_postings",
+    "decode_postings",
+    "encode_counts",
+    "encode_position_lists",
+    "decode_position_lists",
+    "write_binary_index",
+    "BinaryIndexReader",
+    "PostingMap",
+    "is_binary_index",
+    "load_index_file",
+    "detach_index_file",
+    "close_index_file",
+    "index_path_for",
+    "save_index_file",
+    "export_index_json",
+]
+
+MAGIC = b"PCXIDX\x00\x01"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sII")
+_SECTION = struct.Struct("<16sQQ")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+# Index sections stored as term tables instead of inside the JSON meta blob.
+POSTING_SECTIONS = (
+    "tokens",
+    "file_tokens",
+    "term_freqs",
+    "positions",
+    "line_offsets",
+    "filename_grams",
+    "meta_values",
+    "meta_text",
+    "chat_times",
+    "fuzzy_grams",
+    "fuzzy_lengths",
+    "filename_fuzzy_grams",
+    "filename_fuzzy_lengths",
+    "stems",
+)
+
+# The section table holds 16-byte names; longer section names get a short alias on disk.
+_DISK_NAMES = {
+    "filename_fuzzy_grams": "fname_fuzzy_grms",
+    "filename_fuzzy_lengths": "fname_fuzzy_lens",
+}
+_SECTION_NAMES = {disk_name: name for name, disk_name in _DISK_NAMES.items()}
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """Append *value* to *out* as an unsigned LEB128 varint."""
+    if value < 0:
+        raise ValueError(f"varint values must be non-negative, got {value}")
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+_CONTINUATION_BYTES = bytes(range(0x80, 0x100))
+
+
+def count_varints(buf) -> int:
+    """Return how many varints *buf* holds, without decoding them."""
+    # Every varint ends in exactly one byte without the continuation bit
+    return len(bytes(buf).translate(None, _CONTINUATION_BYTES))
+
+
+def decode_varints(buf) -> List[int]:
+    """Decode every varint in *buf* and return them as a list."""
+    values: List[int] = []
+    current = 0
+    shift = 0
+    for byte in bytes(buf):
+        current |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(current)
+            current = 0
+            shift = 0
+    return values
+
+
+def encode_postings(doc_ids: Iterable[int]) -> bytes:
+    """Encode sorted, unique document IDs as delta varints."""
+    out = bytearray()
+    previous = 0
+    for doc_id in sorted(set(doc_ids)):
+        encode_varint(doc_id - previous, out)
+        previous = doc_id
+    return bytes(out)
+
+
+def encode_counts(values: Iterable[int]) -> bytes:
+    """Encode *values* as plain varints, keeping their order."""
+    out = bytearray()
+    for value in values:
+        encode_varint(value, out)
+    return bytes(out)
+
+
+def encode_position_lists(position_lists: Iterable[Iterable[int]]) -> bytes:
+    """Encode one sorted offset list per posting as ``count, deltas...`` varints."""
+    out = bytearray()
+    for offsets in position_lists:
+        offsets = sorted(offsets)
+        encode_varint(len(offsets), out)
+        previous = 0
+        for offset in offsets:
+            encode_varint(offset - previous, out)
+            previous = offset
+    return bytes(out)
+
+
+def decode_position_lists(buf) -> List[List[int]]:
+    """Inverse of :func:`encode_position_lists`."""
+    values = decode_varints(buf)
+    position_lists: List[List[int]] = []
+    i = 0
+    while i < len(values):
+        count = values[i]
+        offsets = values[i + 1:i + 1 + count]
+        total = 0
+        for j, delta in enumerate(offsets):
+            total += delta
+            offsets[j] = total
+        position_lists.append(offsets)
+        i += 1 + count
+    return position_lists
+
+
+def decode_postings(buf) -> List[int]:
+    """Inverse of :func:`encode_postings`."""
+    doc_ids = decode_varints(buf)
+    total = 0
+    for i, delta in enumerate(doc_ids):
+        total += delta
+        doc_ids[i] = total
+    return doc_ids
+
+
+def _encode_fid_postings(fids: Iterable) -> bytes:
+    return encode_postings(int(fid) for fid in fids)
+
+
+def _decode_fid_postings(buf) -> List[str]:
+    return [str(doc_id) for doc_id in decode_postings(buf)]
+
+
+def _build_term_table(postings: Mapping, encoder: Callable[[Any], bytes]) -> bytes:
+    """Serialize a ``term -> payload`` mapping into a term table section."""
+    entries = sorted(((str(term).encode("utf-8"), value) for term, value in postings.items()), key=lambda e: e[0])
+    term_offsets = array("Q", [0])
+    posting_offsets = array("Q", [0])
+    terms_blob = bytearray()
+    postings_blob = bytearray()
+    for term_bytes, value in entries:
+        terms_blob += term_bytes
+        term_offsets.append(len(terms_blob))
+        postings_blob += encoder(value)
+        posting_offsets.append(len(postings_blob))
+    return b"".join(
+        (
+            _U32.pack(len(entries)),
+            struct.pack(f"<{len(term_offsets)}Q", *term_offsets),
+            struct.pack(f"<{len(posting_offsets)}Q", *posting_offsets),
+            bytes(terms_blob),
+            bytes(postings_blob),
+        )
+    )
+
+
+_SECTION_ENCODERS: Dict[str, Callable[[Any], bytes]] = {
+    "tokens": _encode_fid_postings,
+    "file_tokens": encode_postings,
+    "term_freqs": encode_counts,
+    "positions": encode_position_lists,
+    "line_offsets": encode_postings,
+    "filename_grams": _encode_fid_postings,
+    "meta_values": _encode_fid_postings,
+    "meta_text": _encode_fid_postings,
+    "chat_times": _encode_fid_postings,
+    "fuzzy_grams": encode_postings,
+    "fuzzy_lengths": encode_postings,
+    "filename_fuzzy_grams": encode_postings,
+    "filename_fuzzy_lengths": encode_postings,
+    "stems": _encode_fid_postings,
+}
+_SECTION_DECODERS: Dict[str, Callable[[Any], Any]] = {
+    "tokens": _decode_fid_postings,
+    "file_tokens": decode_postings,
+    "term_freqs": decode_varints,
+    "positions": decode_position_lists,
+    "line_offsets": decode_postings,
+    "filename_grams": _decode_fid_postings,
+    "meta_values": _decode_fid_postings,
+    "meta_text": _decode_fid_postings,
+    "chat_times": _decode_fid_postings,
+    "fuzzy_grams": decode_postings,
+    "fuzzy_lengths": decode_postings,
+    "filename_fuzzy_grams": decode_postings,
+    "filename_fuzzy_lengths": decode_postings,
+    "stems": _decode_fid_postings,
+}
+
+
+def write_binary_index(index_structure: Dict[str, Any], path: str | Path) -> None:
+    """Write ``{"metadata": ..., "index": ...}`` to *path* in binary form.
+
+    File IDs in posting lists must be numeric (the legacy builder uses
+    ``str(int)`` IDs).  The file is written to a temporary sibling first and
+    moved into place so readers never observe a half-written index.
+    """
+    index_section = index_structure.get("index", {})
+    meta_index = {k: v for k, v in index_section.items() if k not in POSTING_SECTIONS}
+    metadata = dict(index_structure.get("metadata", {}))
+    metadata["index_format"] = "binary"
+    meta_blob = json_io.dumps({"metadata": metadata, "index": meta_index})
+
+    sections: List[Tuple[str, bytes]] = [("meta", meta_blob)]
+    for name in POSTING_SECTIONS:
+        if name in index_section:
+            sections.append((_DISK_NAMES.get(name, name), _build_term_table(index_section[name], _SECTION_ENCODERS[name])))
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = bytearray()
+    for name, payload in sections:
+        table += _SECTION.pack(name.encode("ascii"), offset, len(payload))
+        offset += len(payload)
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(sections)))
+        f.write(table)
+        for _name, payload in sections:
+            f.write(payload)
+    os.replace(tmp_path, path)
+
+
+class _TermTable:
+    """Read-only view of a term table section inside an mmap."""
+
+    def __init__(self, buf, offset: int, length: int):
+        self._buf = buf
+        (self._count,) = _U32.unpack_from(buf, offset)
+        self._term_offsets = offset + _U32.size
+        self._posting_offsets = self._term_offsets + 8 * (self._count + 1)
+        self._terms_base = self._posting_offsets + 8 * (self._count + 1)
+        (terms_len,) = _U64.unpack_from(buf, self._term_offsets + 8 * self._count)
+        self._postings_base = self._terms_base + terms_len
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _span(self, table: int, i: int) -> Tuple[int, int]:
+        return struct.unpack_from("<QQ", self._buf, table + 8 * i)
+
+    def term_bytes(self, i: int) -> bytes:
+        start, end = self._span(self._term_offsets, i)
+        return self._buf[self._terms_base + start:self._terms_base + end]
+
+    def payload(self, i: int) -> bytes:
+        start, end = self._span(self._posting_offsets, i)
+        return self._buf[self._postings_base + start:self._postings_base + end]
+
+    def find(self, term: str) -> int:
+        """Return the slot of *term* or ``-1`` using binary search."""
+        key = term.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self.term_bytes(lo) == key:
+            return lo
+        return -1
+
+
+class PostingMap(Mapping):
+    """``term -> postings`` mapping backed by a term table.
+
+    Behaves like the ``dict`` found in JSON indexes, but only decodes the
+    posting list of a term when it is looked up.
+    """
+
+    def __init__(self, table: _TermTable, decoder: Callable[[Any], Any], owner: "BinaryIndexReader"):
+        self._table = table
+        self._decoder = decoder
+        self._owner = owner  # keeps the mmap alive while the map is in use
+
+    def __getitem__(self, term):
+        if not isinstance(term, str):
+            raise KeyError(term)
+        slot = self._table.find(term)
+        if slot < 0:
+            raise KeyError(term)
+        return self._decoder(self._table.payload(slot))
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self._table.find(term) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self._table)):
+            yield self._table.term_bytes(i).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def key_at(self, slot: int) -> str:
+        """Return the term stored at *slot* (its rank in sorted order)."""
+        return self._table.term_bytes(slot).decode("utf-8")
+
+    def posting_count(self, term: str) -> int:
+        """Return the number of postings of *term* without decoding them.
+
+        Only meaningful for one-varint-per-posting sections (``tokens`` and
+        the other file/token ID lists), not for ``positions``.
+        """
+        slot = self._table.find(term)
+        return count_varints(self._table.payload(slot)) if slot >= 0 else 0
+
+
+class BinaryIndexReader:
+    """Memory-mapped reader for indexes written by :func:`write_binary_index`.
+
+    With *in_memory* the file is read into memory instead of mapped, so no
+    file handle stays open and the file can be replaced while the reader is
+    in use (Windows refuses to replace or delete a mapped file).
+    """
+
+    def __init__(self, path: str | Path, in_memory: bool = False):
+        self.path = Path(path)
+        self._file = None
+        self._tables: List[_TermTable] = []
+        if in_memory:
+            self._mm = self.path.read_bytes()
+        else:
+            self._file = open(self.path, "rb")
+            try:
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except Exception:
+                self._file.close()
+                raise
+        magic, version, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a binary search index")
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"Unsupported binary index version {version} in {self.path}")
+        self._sections: Dict[str, Tuple[int, int]] = {}
+        for i in range(count):
+            raw_name, offset, length = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            name = raw_name.rstrip(b"\x00").decode("ascii")
+            self._sections[_SECTION_NAMES.get(name, name)] = (offset, length)
+        meta_offset, meta_length = self._sections["meta"]
+        meta = json_io.loads(self._mm[meta_offset:meta_offset + meta_length])
+        self.metadata: Dict[str, Any] = meta.get("metadata", {})
+        self.index_section: Dict[str, Any] = meta.get("index", {})
+        for name, (offset, length) in self._sections.items():
+            if name in _SECTION_DECODERS:
+                table = _TermTable(self._mm, offset, length)
+                self._tables.append(table)
+                self.index_section[name] = PostingMap(table, _SECTION_DECODERS[name], self)
+
+    @property
+    def tokens(self) -> PostingMap:
+        return self.index_section["tokens"]
+
+    def as_loaded_index(self) -> Dict[str, Any]:
+        """Return the ``{"metadata", "index"}`` structure used by search code."""
+        return {"metadata": self.metadata, "index": self.index_section}
+
+    @property
+    def is_mapped(self) -> bool:
+        return self._file is not None
+
+    def detach(self) -> None:
+        """Copy the index into memory and release the mapping and file handle.
+
+        Posting maps handed out earlier keep working.
+        """
+        if self._file is None:
+            return
+        data = bytes(self._mm)
+        for table in self._tables:
+            table._buf = data
+        mapped, self._mm = self._mm, data
+        mapped.close()
+        self._file.close()
+        self._file = None
+
+    def close(self) -> None:
+        """Release the mapping and file handle; posting maps stop working."""
+        if self._file is None:
+            return
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_binary_index(path: str | Path) -> bool:
+    """Return ``True`` if *path* starts with the binary index magic."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def load_index_file(path: str | Path, in_memory: bool = False) -> Dict[str, Any]:
+    """Load a persistent index in either binary or JSON format.
+
+    A binary index is memory-mapped unless *in_memory* is set, and keeps its
+    file open until :func:`close_index_file` or :func:`detach_index_file`.
+    """
+    if is_binary_index(path):
+        return BinaryIndexReader(path, in_memory).as_loaded_index()
+    return json_io.load_file(path)
+
+
+def _readers_of(loaded_index: Mapping) -> List[BinaryIndexReader]:
+    readers = []
+    for value in (loaded_index.get("index") or {}).values():
+        if isinstance(value, PostingMap) and value._owner not in readers:
+            readers.append(value._owner)
+    return readers
+
+
+def detach_index_file(loaded_index: Mapping) -> None:
+    """Move a memory-mapped loaded index into memory and release its file.
+
+    Call this before rewriting the file the index was loaded from.  JSON
+    and in-memory indexes are left as they are.
+    """
+    for reader in _readers_of(loaded_index):
+        reader.detach()
+
+
+def close_index_file(loaded_index: Mapping) -> None:
+    """Release the file behind a loaded binary index once it is no longer used."""
+    for reader in _readers_of(loaded_index):
+        reader.close()
+
+
+def _materialize(index_section: Mapping) -> Dict[str, Any]:
+    return {
+        name: ({k: list(v) for k, v in value.items()} if isinstance(value, PostingMap) else value)
+        for name, value in index_section.items()
+    }
+
+
+def index_path_for(path: str | Path, index_format: str) -> Path:
+    """Return where an index named *path* is stored in *index_format*.
+
+    Index files are named ``*.json``; a binary index swaps that suffix for
+    ``.bin`` so a file's name never misstates its contents.
+    """
+    path = Path(path)
+    if index_format == "binary" and path.suffix.lower() == ".json":
+        return path.with_suffix(".bin")
+    return path
+
+
+def save_index_file(index_structure: Dict[str, Any], path: str | Path, index_format: str = "json") -> None:
+    """Persist *index_structure* as compact ``"json"`` or ``"binary"``."""
+    if index_format == "binary":
+        if Path(path).suffix.lower() == ".json":
+            raise ValueError(f"Refusing to write a binary index to {path}; use index_path_for()")
+        write_binary_index(index_structure, path)
+        return
+    if index_format != "json":
+        raise ValueError(f"Unknown index format: {index_format}")
+    metadata = dict(index_structure.get("metadata", {}))
+    metadata["index_format"] = "json"
+    data = {"metadata": metadata, "index": _materialize(index_structure.get("index", {}))}
+    json_io.save_file(data, path)
+
+
+def export_index_json(source: str | Path | Dict[str, Any], output_path: str | Path) -> None:
+    """Export a binary (or already loaded) index as a JSON index file."""
+    loaded = load_index_file(source) if isinstance(source, (str, Path)) else source
+    save_index_file(loaded, output_path, index_format="json")
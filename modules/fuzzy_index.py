@@ -0,0 +1,185 @@
+"""
+Bigram index for fuzzy term expansion.
+
+``nlp_search_with_persistent_index`` expands each query term with
+``difflib.get_close_matches`` over the whole vocabulary and compares the term
+with every filename.  Both are linear scans.  This module persists, next to
+the token dictionary, a ``bigram -> string IDs`` index plus a
+``length -> string IDs`` index.  These narrow the candidates before the usual
+``SequenceMatcher`` test.
+
+The filter is exact: nothing with ``ratio() >= cutoff`` is dropped.  A ratio
+of ``2*M / (la + lb)`` means the two strings share a common subsequence of at
+least ``L = ceil(cutoff * (la + lb) / 2)`` characters.  Aligning along that
+subsequence, every character of the term outside it destroys at most two of
+the term's ``la - 1`` bigrams, and every inserted character at most one.  So
+the strings share at least ``3*L - la - lb - 1`` bigrams (counted with
+multiplicity).  Repeated bigrams are keyed by occurrence (``"ab"``,
+``"ab\\x002"``, ...), so counting shared keys counts shared bigrams with
+multiplicity.  For lengths where this bound drops to zero, every string of
+that length is a candidate.  Lengths outside the ``real_quick_ratio`` window
+are never considered.
+
+Candidates are then scored exactly as :func:`difflib.get_close_matches` does.
+"""
+
+import heapq
+import math
+from difflib import SequenceMatcher, get_close_matches
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+__all__ = [
+    "gram_keys",
+    "build_fuzzy_index",
+    "update_fuzzy_index",
+    "fuzzy_candidates",
+    "close_matches",
+]
+
+_EPSILON = 1e-9
+
+
+def gram_keys(text: str) -> List[str]:
+    """Return the bigrams of *text*, numbering repeated occurrences."""
+    seen: Dict[str, int] = {}
+    keys = []
+    for i in range(len(text) - 1):
+        gram = text[i:i + 2]
+        count = seen.get(gram, 0) + 1
+        seen[gram] = count
+        keys.append(gram if count == 1 else f"{gram}\x00{count}")
+    return keys
+
+
+def build_fuzzy_index(strings: Iterable[Tuple[int, str]]) -> Tuple[Dict[str, List[int]], Dict[str, List[int]]]:
+    """Return ``(grams, lengths)`` postings for ``(id, string)`` pairs.
+
+    Strings are indexed lower-cased; both maps hold sorted integer IDs.
+    """
+    grams: Dict[str, List[int]] = {}
+    lengths: Dict[str, List[int]] = {}
+    for string_id, text in strings:
+        text = text.lower()
+        for key in gram_keys(text):
+            grams.setdefault(key, []).append(string_id)
+        lengths.setdefault(str(len(text)), []).append(string_id)
+    for postings in (grams, lengths):
+        for key, ids in postings.items():
+            ids.sort()
+    return grams, lengths
+
+
+def update_fuzzy_index(
+    grams: Mapping[str, Sequence],
+    lengths: Mapping[str, Sequence],
+    removed: Iterable[Tuple[int, str]] = (),
+    added: Iterable[Tuple[int, str]] = (),
+    remap: Optional[Sequence[int]] = None,
+) -> Tuple[Dict[str, List[int]], Dict[str, List[int]]]:
+    """Return ``(grams, lengths)`` patched for removed and added strings.
+
+    Only the keys of the *removed* and *added* ``(id, string)`` pairs are
+    rewritten.  *remap*, when given, maps every old ID to its new one, or to
+    ``-1`` for strings that are gone, and is applied to all postings.
+    """
+    removed = list(removed)
+    dropped = {string_id for string_id, _text in removed}
+    result = []
+    for old_postings, removals, additions in zip(
+        (grams, lengths), build_fuzzy_index(removed), build_fuzzy_index(added)
+    ):
+        if remap is None:
+            postings = dict(old_postings)
+        else:
+            postings = {}
+            for key, ids in old_postings.items():
+                ids = sorted(remap[int(i)] for i in ids if remap[int(i)] >= 0)
+                if ids:
+                    postings[key] = ids
+        for key in set(removals) | set(additions):
+            ids = [int(i) for i in postings.get(key, ()) if int(i) not in dropped]
+            ids.extend(additions.get(key, ()))
+            if ids:
+                postings[key] = sorted(ids)
+            else:
+                postings.pop(key, None)
+        result.append(postings)
+    return result[0], result[1]
+
+
+def _length_window(la: int, cutoff: float) -> range:
+    """Candidate lengths ``lb`` with ``2 * min(la, lb) / (la + lb) >= cutoff``."""
+    low = max(1, math.floor(la * cutoff / (2.0 - cutoff)) - 1)
+    high = math.ceil(la * (2.0 - cutoff) / cutoff) + 1
+    return range(low, high + 1)
+
+
+def _min_shared(la: int, lb: int, cutoff: float) -> int:
+    common = math.ceil(cutoff * (la + lb) / 2.0 - _EPSILON)
+    return 3 * common - la - lb - 1
+
+
+def fuzzy_candidates(
+    term: str,
+    grams: Mapping[str, Sequence],
+    lengths: Mapping[str, Sequence],
+    length_of: Callable[[int], int],
+    cutoff: float,
+) -> Set[int]:
+    """Return IDs of every indexed string that may reach *cutoff* against *term*."""
+    folded = term.lower()
+    la = len(folded)
+    window = [
+        lb for lb in _length_window(la, cutoff)
+        if 2.0 * min(la, lb) / (la + lb) >= cutoff - _EPSILON
+    ]
+    if not window:
+        return set()
+    candidates: Set[int] = set()
+    needed = {lb: _min_shared(la, lb, cutoff) for lb in window}
+    for lb, shared in needed.items():
+        if shared <= 0:
+            candidates.update(int(i) for i in lengths.get(str(lb), ()))
+    floor_shared = max(1, min(needed.values()))
+    counts: Dict[int, int] = {}
+    for key in gram_keys(folded):
+        for string_id in grams.get(key, ()):
+            string_id = int(string_id)
+            counts[string_id] = counts.get(string_id, 0) + 1
+    for string_id, shared in counts.items():
+        if shared >= floor_shared and string_id not in candidates:
+            lb = length_of(string_id)
+            if lb in needed and shared >= needed[lb]:
+                candidates.add(string_id)
+    return candidates
+
+
+def close_matches(
+    term: str,
+    grams: Mapping[str, Sequence],
+    lengths: Mapping[str, Sequence],
+    string_at: Callable[[int], str],
+    n: int = 3,
+    cutoff: float = 0.6,
+) -> List[str]:
+    """Same result as ``difflib.get_close_matches(term, strings, n, cutoff)``.
+
+    *string_at* maps an indexed ID back to its string.
+    """
+    if not n > 0:
+        raise ValueError("n must be > 0: %r" % (n,))
+    if not 0.0 <= cutoff <= 1.0:
+        raise ValueError("cutoff must be in [0.0, 1.0]: %r" % (cutoff,))
+    if cutoff == 0.0:
+        # Everything qualifies; there is nothing to prune.
+        strings = [string_at(int(i)) for ids in lengths.values() for i in ids]
+        return get_close_matches(term, strings, n, cutoff)
+    matcher = SequenceMatcher()
+    matcher.set_seq2(term)
+    result = []
+    for string_id in fuzzy_candidates(term, grams, lengths, lambda i: len(string_at(i)), cutoff):
+        candidate = string_at(string_id)
+        matcher.set_seq1(candidate)
+        if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff and matcher.ratio() >= cutoff:
+            result.append((matcher.ratio(), candidate))
+    return [candidate for _score, candidate in heapq.nlargest(n, result)]
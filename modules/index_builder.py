@@ -0,0 +1,386 @@
+"""In-memory core for building the persistent search index.
+
+``_build_generic_index`` used to append every file ID to a JSON-style
+``token -> list`` map and deduplicate the whole list with ``list(set(...))``
+after each append, so merging grew quadratically with corpus size.
+:class:`IndexBuilder` keeps postings as hash maps keyed by integer file IDs
+while files are merged and only turns them into the persisted ``str`` ID
+lists once, in :meth:`IndexBuilder.materialize`.
+
+Each posting also carries the token's frequency in the file, and
+:meth:`IndexBuilder.add_tokens` accepts either a token sequence or a
+``token -> count`` mapping.  Together with the per-file ``doc_length`` kept in
+``file_details`` this feeds BM25 ranking (see :mod:`modules.ranking`).
+
+With ``track_positions`` the builder also keeps positional postings (the
+token offsets of every occurrence) for phrase and proximity queries.
+
+Updates are incremental.  A reverse ``path -> file_id`` map makes file
+lookups O(1), and a per-file forward index (``file_id -> token IDs``) means
+re-indexing or deleting a file only touches that file's own postings.
+Posting lists of an existing index are copied on first write, so tokens that
+no changed file touches are passed through to the output untouched.
+
+Persisted sections written by :meth:`IndexBuilder.materialize`:
+
+``tokens``      token -> sorted ``str`` file IDs, ordered by UTF-8 bytes
+``files``       file ID -> relative path
+``file_details`` file ID -> details dict
+``path_ids``    relative path -> file ID
+``file_tokens`` file ID -> sorted token IDs (positions in ``tokens``)
+``term_freqs``  token -> term frequencies aligned with ``tokens[token]``
+``positions``   token -> token offset lists aligned with ``tokens[token]``
+                (only with ``track_positions``)
+``line_offsets`` file ID -> byte offsets of the file's line starts (files
+                 recorded through :meth:`IndexBuilder.set_line_offsets`)
+
+plus the filename, metadata and timestamp sections of
+:func:`modules.metadata_index.build_metadata_index` and the fuzzy bigram
+sections of :func:`modules.fuzzy_index.build_fuzzy_index` over token IDs
+(``fuzzy_grams``/``fuzzy_lengths``) and filenames
+(``filename_fuzzy_grams``/``filename_fuzzy_lengths``), and the ``stems``
+postings of :func:`modules.stem_index.build_stem_postings` with the
+``stemmer`` used.
+
+When the base index already carries these derived sections they are
+patched rather than rebuilt: only the entries of added, changed and removed
+files (and of tokens entering or leaving the vocabulary) are recomputed.
+Unchanged files keep their stored ``file_tokens``, renumbered only when the
+vocabulary shifted.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Union
+
+from .fuzzy_index import build_fuzzy_index, update_fuzzy_index
+from .metadata_index import METADATA_SECTIONS, build_metadata_index, update_metadata_index
+from .stem_index import STEMMER_NAME, build_stem_postings, update_stem_postings
+
+__all__ = ["IndexBuilder", "token_offsets"]
+
+_DERIVED_SECTIONS = METADATA_SECTIONS + (
+    "fuzzy_grams",
+    "fuzzy_lengths",
+    "filename_fuzzy_grams",
+    "filename_fuzzy_lengths",
+    "stems",
+)
+
+
+def _utf8_key(token: str) -> bytes:
+    return token.encode("utf-8")
+
+
+def token_offsets(tokens: Iterable[str]) -> Dict[str, List[int]]:
+    """Return ``token -> offsets`` for a token sequence."""
+    offsets: Dict[str, List[int]] = {}
+    for offset, token in enumerate(tokens):
+        offsets.setdefault(token, []).append(offset)
+    return offsets
+
+
+class IndexBuilder:
+    """Accumulates postings keyed by numeric file IDs."""
+
+    def __init__(self, track_positions: bool = False):
+        self.track_positions = track_positions
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.positions: Dict[str, Dict[int, List[int]]] = {}
+        self.files: Dict[int, str] = {}
+        self.file_details: Dict[int, Dict[str, Any]] = {}
+        self.path_ids: Dict[str, int] = {}
+        self.forward: Dict[int, Set[str]] = {}
+        self.line_offsets: Dict[int, List[int]] = {}
+        self._stale_line_offsets: Set[int] = set()
+        self._base_index: Mapping[str, Any] = {}
+        self._base_tokens: Mapping[str, Iterable[str]] = {}
+        self._base_freqs: Optional[Mapping[str, Iterable[int]]] = None
+        self._base_positions: Optional[Mapping[str, List[List[int]]]] = None
+        self._base_forward: Optional[Mapping[str, Iterable[int]]] = None
+        self._base_vocab: Optional[List[str]] = None
+        self._base_line_offsets: Mapping[str, List[int]] = {}
+        self._forward_derived = False
+        self._next_file_id = 0
+
+    @classmethod
+    def from_index(cls, index_section: Optional[Mapping[str, Any]], track_positions: bool = False) -> "IndexBuilder":
+        """Seed a builder from the ``"index"`` section of a loaded index.
+
+        Posting lists are not decoded here; they are copied lazily the first
+        time a changed file touches them.  Positions can only be tracked on
+        top of an index that already stores them.
+        """
+        builder = cls(track_positions)
+        if not index_section:
+            return builder
+        if track_positions and index_section.get("tokens") and "positions" not in index_section:
+            raise ValueError("Existing index has no positional postings")
+        for fid, rel_path in index_section.get("files", {}).items():
+            builder.files[int(fid)] = rel_path
+        for fid, details in index_section.get("file_details", {}).items():
+            builder.file_details[int(fid)] = dict(details)
+        path_ids = index_section.get("path_ids")
+        if path_ids:
+            builder.path_ids = {path: int(fid) for path, fid in path_ids.items()}
+        else:
+            builder.path_ids = {path: fid for fid, path in builder.files.items()}
+        builder._base_index = index_section
+        builder._base_tokens = index_section.get("tokens", {})
+        builder._base_forward = index_section.get("file_tokens")
+        builder._base_freqs = index_section.get("term_freqs")
+        builder._base_line_offsets = index_section.get("line_offsets", {})
+        if track_positions:
+            builder._base_positions = index_section.get("positions")
+        builder._next_file_id = max(builder.files, default=-1) + 1
+        return builder
+
+    def file_id_for(self, rel_path: str) -> Optional[int]:
+        """Return the file ID stored for *rel_path*, if any."""
+        return self.path_ids.get(rel_path)
+
+    def add_path(self, rel_path: str) -> int:
+        """Allocate a new file ID for *rel_path*."""
+        file_id = self._next_file_id
+        self._next_file_id += 1
+        self.files[file_id] = rel_path
+        self.path_ids[rel_path] = file_id
+        return file_id
+
+    def _postings_for(self, token: str, create: bool = False) -> Optional[Dict[int, int]]:
+        """Return the mutable ``file_id -> frequency`` map for *token*, copying it from the base index."""
+        fids = self.postings.get(token)
+        if fids is None:
+            base = self._base_tokens.get(token)
+            if base is not None:
+                freqs = self._base_freqs.get(token) if self._base_freqs is not None else None
+                if freqs is None:
+                    # Indexes written before term frequencies were stored
+                    fids = {int(fid): 1 for fid in base}
+                else:
+                    fids = {int(fid): tf for fid, tf in zip(base, freqs)}
+            elif create:
+                fids = {}
+            else:
+                return None
+            self.postings[token] = fids
+        return fids
+
+    def _base_token_at(self, token_id: int) -> str:
+        if self._base_vocab is None:
+            key_at = getattr(self._base_tokens, "key_at", None)
+            if key_at is not None:
+                return key_at(token_id)
+            self._base_vocab = list(self._base_tokens)
+        return self._base_vocab[token_id]
+
+    def _load_forward_from_postings(self) -> None:
+        """Derive the forward index from base postings (indexes written before it existed)."""
+        for token, fids in self._base_tokens.items():
+            for fid in fids:
+                self.forward.setdefault(int(fid), set()).add(token)
+        for fid in self.files:
+            self.forward.setdefault(fid, set())
+        self._forward_derived = True
+
+    def tokens_of(self, file_id: int) -> Set[str]:
+        """Return the set of tokens currently indexed for *file_id*."""
+        tokens = self.forward.get(file_id)
+        if tokens is not None:
+            return tokens
+        if self._base_forward is not None:
+            token_ids = self._base_forward.get(str(file_id), ())
+            tokens = {self._base_token_at(token_id) for token_id in token_ids}
+        elif self._base_tokens and not self._forward_derived:
+            self._load_forward_from_postings()
+            tokens = self.forward.get(file_id, set())
+        else:
+            tokens = set()
+        self.forward[file_id] = tokens
+        return tokens
+
+    def remove_postings(self, file_id: int) -> None:
+        """Drop *file_id* from the posting lists of its own tokens."""
+        for token in self.tokens_of(file_id):
+            fids = self._postings_for(token)
+            if fids is not None:
+                fids.pop(file_id, None)
+            if self.track_positions:
+                offsets = self._positions_for(token)
+                if offsets is not None:
+                    offsets.pop(file_id, None)
+        self.forward[file_id] = set()
+        # Line offsets describe the old contents as well.
+        self.line_offsets.pop(file_id, None)
+        self._stale_line_offsets.add(file_id)
+
+    def remove_file(self, file_id: int) -> None:
+        """Remove *file_id* and everything recorded for it."""
+        self.remove_postings(file_id)
+        self.forward.pop(file_id, None)
+        rel_path = self.files.pop(file_id, None)
+        if rel_path is not None and self.path_ids.get(rel_path) == file_id:
+            del self.path_ids[rel_path]
+        self.file_details.pop(file_id, None)
+
+    def _positions_for(self, token: str, create: bool = False) -> Optional[Dict[int, List[int]]]:
+        """Return the mutable ``file_id -> offsets`` map for *token*, copying it from the base index."""
+        offsets = self.positions.get(token)
+        if offsets is None:
+            base = self._base_tokens.get(token)
+            base_offsets = self._base_positions.get(token) if self._base_positions is not None else None
+            if base is not None and base_offsets is not None:
+                offsets = {int(fid): list(lst) for fid, lst in zip(base, base_offsets)}
+            elif create or base is not None:
+                offsets = {}
+            else:
+                return None
+            self.positions[token] = offsets
+        return offsets
+
+    def add_tokens(self, file_id: int, tokens: Union[Iterable[str], Mapping[str, int]]) -> None:
+        """Record the tokens of *file_id*: a token sequence or a ``token -> count`` mapping.
+
+        When positions are tracked and *tokens* is a sequence, each token's
+        offset in the sequence is recorded as well.
+        """
+        if isinstance(tokens, Mapping):
+            counts = tokens
+        else:
+            tokens = list(tokens)
+            counts = Counter(tokens)
+            if self.track_positions:
+                self.add_positions(file_id, token_offsets(tokens))
+        for token, count in counts.items():
+            fids = self._postings_for(token, create=True)
+            fids[file_id] = fids.get(file_id, 0) + count
+        self.tokens_of(file_id).update(counts)
+
+    def add_positions(self, file_id: int, positions: Mapping[str, Iterable[int]]) -> None:
+        """Record token offsets (``token -> offsets``) for *file_id*."""
+        for token, offsets in positions.items():
+            self._positions_for(token, create=True).setdefault(file_id, []).extend(offsets)
+
+    def set_line_offsets(self, file_id: int, offsets: Iterable[int]) -> None:
+        """Record the byte offsets at which the lines of *file_id* start."""
+        self.line_offsets[file_id] = list(offsets)
+
+    def materialize(self) -> Dict[str, Any]:
+        """Return the persisted index section (see module docstring)."""
+        vocabulary = set(self._base_tokens)
+        vocabulary.update(self.postings)
+        tokens_out: Dict[str, List[str]] = {}
+        freqs_out: Dict[str, List[int]] = {}
+        positions_out: Dict[str, List[List[int]]] = {}
+        for token in sorted(vocabulary, key=_utf8_key):
+            fids = self.postings.get(token)
+            if fids is None:
+                tokens_out[token] = list(self._base_tokens[token])
+                base_freqs = self._base_freqs.get(token) if self._base_freqs is not None else None
+                freqs_out[token] = list(base_freqs) if base_freqs is not None else [1] * len(tokens_out[token])
+                if self.track_positions:
+                    positions_out[token] = list(self._base_positions[token])
+            elif fids:
+                ordered = sorted(fids)
+                tokens_out[token] = [str(fid) for fid in ordered]
+                freqs_out[token] = [fids[fid] for fid in ordered]
+                if self.track_positions:
+                    offsets = self._positions_for(token) or {}
+                    positions_out[token] = [sorted(offsets.get(fid, ())) for fid in ordered]
+        token_ids = {token: i for i, token in enumerate(tokens_out)}
+        patch = self._can_patch()
+        remap = self._token_remap(token_ids) if patch else None
+
+        file_tokens: Dict[str, List[int]] = {}
+        for fid in self.files:
+            tokens = self.forward.get(fid) if patch else self.tokens_of(fid)
+            if tokens is not None:
+                file_tokens[str(fid)] = sorted(token_ids[token] for token in tokens if token in token_ids)
+            else:
+                # Untouched file: its stored token IDs only move if the vocabulary did
+                ids = self._base_forward.get(str(fid), ())
+                file_tokens[str(fid)] = list(ids) if remap is None else sorted(remap[i] for i in ids)
+
+        section = {
+            "tokens": tokens_out,
+            "files": {str(fid): path for fid, path in self.files.items()},
+            "file_details": {str(fid): details for fid, details in self.file_details.items()},
+            "path_ids": {path: str(fid) for path, fid in self.path_ids.items()},
+            "file_tokens": file_tokens,
+            "term_freqs": freqs_out,
+        }
+        if self.track_positions:
+            section["positions"] = positions_out
+        line_offsets_out = {
+            fid: offsets for fid, offsets in self._base_line_offsets.items()
+            if int(fid) in self.files and int(fid) not in self._stale_line_offsets and int(fid) not in self.line_offsets
+        }
+        for fid, offsets in self.line_offsets.items():
+            if fid in self.files and offsets:
+                line_offsets_out[str(fid)] = list(offsets)
+        if line_offsets_out:
+            section["line_offsets"] = line_offsets_out
+        if patch:
+            self._patch_derived_sections(section, remap)
+        else:
+            section.update(build_metadata_index(section["file_details"]))
+            section["fuzzy_grams"], section["fuzzy_lengths"] = build_fuzzy_index(enumerate(tokens_out))
+            section["filename_fuzzy_grams"], section["filename_fuzzy_lengths"] = build_fuzzy_index(
+                (fid, details.get("filename", "")) for fid, details in self.file_details.items()
+            )
+            section["stems"] = build_stem_postings(tokens_out)
+        section["stemmer"] = STEMMER_NAME
+        return section
+
+    def _can_patch(self) -> bool:
+        """Whether the base index carries every derived section, so they can be patched."""
+        base = self._base_index
+        return (
+            self._base_forward is not None
+            and base.get("stemmer") == STEMMER_NAME
+            and all(name in base for name in _DERIVED_SECTIONS)
+        )
+
+    def _token_remap(self, token_ids: Mapping[str, int]) -> Optional[List[int]]:
+        """Map base token IDs to new ones (``-1`` if gone), or ``None`` if the vocabulary is unchanged."""
+        remap = [token_ids.get(token, -1) for token in self._base_tokens]
+        if len(remap) == len(token_ids) and -1 not in remap:
+            return None
+        return remap
+
+    def _patch_derived_sections(self, section: Dict[str, Any], remap: Optional[List[int]]) -> None:
+        """Update the base index's derived sections for the files that changed."""
+        base = self._base_index
+        base_files = base.get("files", {})
+        base_details = base.get("file_details", {})
+        removed = {fid for fid in base_files if int(fid) not in self.files}
+
+        details = section["file_details"]
+        described = removed | {fid for fid, value in details.items() if base_details.get(fid) != value}
+        old_details = {fid: base_details[fid] for fid in described if fid in base_details}
+        new_details = {fid: details[fid] for fid in described if fid in details}
+        section.update(update_metadata_index(base, old_details, new_details))
+        section["filename_fuzzy_grams"], section["filename_fuzzy_lengths"] = update_fuzzy_index(
+            base["filename_fuzzy_grams"],
+            base["filename_fuzzy_lengths"],
+            removed=[(int(fid), value.get("filename", "")) for fid, value in old_details.items()],
+            added=[(int(fid), value.get("filename", "")) for fid, value in new_details.items()],
+        )
+
+        kept_ids = set(remap) if remap is not None else None
+        section["fuzzy_grams"], section["fuzzy_lengths"] = update_fuzzy_index(
+            base["fuzzy_grams"],
+            base["fuzzy_lengths"],
+            added=[] if kept_ids is None else
+            [(i, token) for i, token in enumerate(section["tokens"]) if i not in kept_ids],
+            remap=remap,
+        )
+
+        retokenized = removed | {str(fid) for fid in self.forward}
+        old_tokens = {
+            fid: [self._base_token_at(i) for i in self._base_forward.get(fid, ())]
+            for fid in retokenized if fid in base_files
+        }
+        new_tokens = {str(fid): tokens for fid, tokens in self.forward.items() if fid in self.files}
+        section["stems"] = update_stem_postings(base["stems"], old_tokens, new_tokens)
@@ -0,0 +1,114 @@
+"""Manifest stage for incremental index builds.
+
+Before any file is opened for parsing, every candidate is ``stat``-ed and
+compared with the signature stored in the existing index (``file_mod_time``,
+``file_size`` and, when enabled, ``content_hash``).  Only new or changed
+files are handed to the tokenizer workers; files that disappeared from the
+folder are reported so the builder can purge them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .index_builder import IndexBuilder
+
+__all__ = ["BuildStats", "ManifestDiff", "content_hash", "diff_manifest", "relative_index_path"]
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class BuildStats:
+    """Counts reported at the end of an index build."""
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    skipped: int = 0
+
+
+@dataclass
+class ManifestDiff:
+    """Result of comparing the folder on disk with an existing index."""
+    added: List[Tuple[Path, str]] = field(default_factory=list)
+    updated: List[Tuple[Path, str, int]] = field(default_factory=list)
+    unchanged: List[Tuple[str, int]] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+    signatures: Dict[str, Dict[str, object]] = field(default_factory=dict)
+
+    @property
+    def to_process(self) -> List[Path]:
+        return [path for path, _rel in self.added] + [path for path, _rel, _fid in self.updated]
+
+
+def content_hash(file_path: Path) -> str:
+    """Return a BLAKE2b digest of the file's bytes."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def relative_index_path(file_path: Path, folder: Path) -> str:
+    """Return the path string used as the file's key in the index."""
+    try:
+        return str(file_path.relative_to(folder))
+    except ValueError:
+        return str(file_path)
+
+
+def _is_unchanged(details: Dict[str, object], signature: Dict[str, object], file_path: Path, use_hash: bool) -> bool:
+    prev_mod = details.get("file_mod_time")
+    prev_size = details.get("file_size")
+    if prev_mod is None:
+        return False
+    if prev_size is not None and prev_size != signature["file_size"]:
+        return False
+    if abs(prev_mod - signature["file_mod_time"]) < 1:
+        return True
+    if not use_hash or not details.get("content_hash"):
+        return False
+    # Touched but possibly identical: only now is the content read.
+    signature["content_hash"] = content_hash(file_path)
+    return signature["content_hash"] == details["content_hash"]
+
+
+def diff_manifest(
+    builder: IndexBuilder,
+    folder: Path,
+    candidates: Iterable[Path],
+    use_hash: bool = False,
+) -> ManifestDiff:
+    """Classify *candidates* against the files already held by *builder*."""
+    folder = Path(folder)
+    diff = ManifestDiff()
+    seen: set = set()
+    for file_path in candidates:
+        rel_path = relative_index_path(file_path, folder)
+        if rel_path in seen:
+            continue
+        seen.add(rel_path)
+        try:
+            stat = file_path.stat()
+        except OSError:
+            continue
+        signature: Dict[str, object] = {"file_mod_time": stat.st_mtime, "file_size": stat.st_size}
+        file_id: Optional[int] = builder.file_id_for(rel_path)
+        if file_id is not None and _is_unchanged(builder.file_details.get(file_id, {}), signature, file_path, use_hash):
+            diff.unchanged.append((rel_path, file_id))
+            if "content_hash" in signature:
+                builder.file_details[file_id]["file_mod_time"] = signature["file_mod_time"]
+            continue
+        if use_hash and "content_hash" not in signature:
+            signature["content_hash"] = content_hash(file_path)
+        diff.signatures[rel_path] = signature
+        if file_id is None:
+            diff.added.append((file_path, rel_path))
+        else:
+            diff.updated.append((file_path, rel_path, file_id))
+    diff.removed = [fid for rel_path, fid in builder.path_ids.items() if rel_path not in seen]
+    return diff
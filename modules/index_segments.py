@@ -0,0 +1,512 @@
+"""
+Segmented storage for the advanced index.
+
+``AdvancedIndexer`` used to reload its whole JSON index, copy every token
+set, rescan every file and rewrite the complete index on each build.  The
+index is now an LSM-style stack of immutable segments:
+
+* each build writes one small segment holding only new or changed files;
+* deleted (and superseded) paths are recorded as tombstones in that segment;
+* a compaction merges all segments into one, normally on a background thread.
+
+The file passed as ``index_path`` becomes a small JSON manifest listing the
+segments in age order.  Segments live next to it in ``<index_path>.segments/``
+and use the binary index format from :mod:`modules.binary_index`, so their
+posting lists are memory-mapped and decoded one term at a time.
+
+A path is live in the newest segment that contains it, unless a newer segment
+lists it as a tombstone.
+
+Segments may also carry token offsets (a ``positions`` section) for phrase and
+NEAR queries; the merged view only offers them when every segment has them.
+
+Each segment also stores facet bitmaps (see :mod:`modules.facets`) over its
+own file IDs; :func:`live_facets` renumbers them into the merged view.
+
+Open segments hold a memory map of their file, so they must be closed once
+read (:meth:`SegmentStore.segments`, :meth:`SegmentedTokens.close`).  A
+segment file that cannot be removed while still mapped elsewhere (Windows) is
+listed as ``obsolete`` in the manifest and removed by a later write.
+Background compactions are joined at interpreter exit.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .binary_index import BinaryIndexReader, save_index_file
+from .facets import FacetIndex
+from . import json_io
+
+logger = logging.getLogger(__name__)
+
+SEGMENTED_FORMAT = "segmented"
+SEGMENTED_VERSION = "2.0"
+DEFAULT_MAX_SEGMENTS = 8
+
+_store_locks: Dict[str, threading.Lock] = {}
+_compaction_threads: Dict[str, threading.Thread] = {}
+_store_locks_guard = threading.Lock()
+
+
+def _lock_for(index_path: Path) -> threading.Lock:
+    """Return the process-wide lock guarding the manifest at *index_path*."""
+    key = os.path.abspath(index_path)
+    with _store_locks_guard:
+        return _store_locks.setdefault(key, threading.Lock())
+
+
+def is_segmented_manifest(data: Dict) -> bool:
+    """Return ``True`` if *data* is a loaded segment manifest."""
+    return isinstance(data, dict) and data.get("format") == SEGMENTED_FORMAT
+
+
+class Segment:
+    """Read-only view of one segment file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.name = self.path.name
+        self._reader = BinaryIndexReader(self.path)
+        index_section = self._reader.index_section
+        self._postings = index_section.get("tokens", {})
+        self._freqs = index_section.get("term_freqs", {})
+        self._positions = index_section.get("positions")
+        self._paths: Dict[str, str] = index_section.get("files", {})
+        self.files: Dict[str, Dict] = {
+            self._paths[fid]: details for fid, details in index_section.get("file_details", {}).items()
+        }
+        self.tombstones: Set[str] = set(self._reader.metadata.get("tombstones", []))
+        facets = self._reader.metadata.get("facets")
+        # Facet bitmaps over this segment's file IDs (None for older segments)
+        self.facets: Optional[FacetIndex] = FacetIndex.from_json(facets) if facets is not None else None
+        # Paths that this segment hides in every older segment.
+        self.shadows: Set[str] = set(self.files) | self.tombstones
+        self.has_positions = self._positions is not None or not self.files
+
+    @staticmethod
+    def write(
+        path: Path,
+        tokens: Mapping,
+        files: Dict[str, Dict],
+        tombstones: Iterable[str] = (),
+        term_freqs: Optional[Mapping[str, Mapping[str, int]]] = None,
+        positions: Optional[Mapping[str, Mapping[str, List[int]]]] = None,
+    ) -> None:
+        """Write a segment holding *files* (``path -> details dict``) and their postings.
+
+        *term_freqs* maps ``token -> {path: frequency}``; missing entries count as 1.
+        *positions* maps ``token -> {path: token offsets}`` and is only stored if given.
+        """
+        ordered_paths = sorted(files)
+        file_ids = {rel_path: i for i, rel_path in enumerate(ordered_paths)}
+        postings: Dict[str, List[str]] = {}
+        freqs: Dict[str, List[int]] = {}
+        offsets: Dict[str, List[List[int]]] = {}
+        for token, paths in tokens.items():
+            ids = sorted(file_ids[rel_path] for rel_path in paths if rel_path in file_ids)
+            if not ids:
+                continue
+            token_freqs = term_freqs.get(token, {}) if term_freqs else {}
+            postings[token] = [str(fid) for fid in ids]
+            freqs[token] = [token_freqs.get(ordered_paths[fid], 1) for fid in ids]
+            if positions is not None:
+                token_positions = positions.get(token, {})
+                offsets[token] = [token_positions.get(ordered_paths[fid], []) for fid in ids]
+        structure = {
+            "metadata": {
+                "created": datetime.now().isoformat(),
+                "tombstones": sorted(tombstones),
+                "facets": FacetIndex.build((rel_path, files[rel_path]) for rel_path in ordered_paths).to_json(),
+            },
+            "index": {
+                "tokens": postings,
+                "term_freqs": freqs,
+                "files": {str(fid): rel_path for rel_path, fid in file_ids.items()},
+                "file_details": {str(file_ids[rel_path]): details for rel_path, details in files.items()},
+            },
+        }
+        if positions is not None:
+            structure["index"]["positions"] = offsets
+        save_index_file(structure, path, "binary")
+
+    def postings(self, token: str) -> List[str]:
+        """Return the paths in this segment that contain *token*."""
+        return [self._paths[fid] for fid in self._postings.get(token, ())]
+
+    def postings_with_freqs(self, token: str) -> List[Tuple[str, int]]:
+        """Return ``(path, term frequency)`` pairs for *token* in this segment."""
+        fids = self._postings.get(token, ())
+        freqs = self._freqs.get(token) or [1] * len(fids)
+        return [(self._paths[fid], tf) for fid, tf in zip(fids, freqs)]
+
+    def postings_with_positions(self, token: str) -> List[Tuple[str, List[int]]]:
+        """Return ``(path, token offsets)`` pairs for *token* in this segment."""
+        fids = self._postings.get(token, ())
+        if not fids or self._positions is None:
+            return []
+        return list(zip((self._paths[fid] for fid in fids), self._positions.get(token, ())))
+
+    def vocabulary(self) -> Iterator[str]:
+        return iter(self._postings)
+
+    def close(self) -> None:
+        self._reader.close()
+
+
+def close_segments(segments: Iterable[Segment]) -> None:
+    """Unmap every segment in *segments*."""
+    for segment in segments:
+        segment.close()
+
+
+def _layers(segments: List[Segment]) -> List[Tuple[Segment, Set[str]]]:
+    """Pair every segment with the set of paths hidden by newer segments."""
+    layers = []
+    shadowed: Set[str] = set()
+    for segment in reversed(segments):
+        layers.append((segment, set(shadowed)))
+        shadowed |= segment.shadows
+    return layers
+
+
+def live_files(segments: List[Segment]) -> Dict[str, Dict]:
+    """Return ``path -> details`` for every live path across *segments*."""
+    files: Dict[str, Dict] = {}
+    for segment, shadowed in _layers(segments):
+        for rel_path, details in segment.files.items():
+            if rel_path not in shadowed:
+                files[rel_path] = details
+    return files
+
+
+def live_facets(segments: List[Segment], paths: List[str]) -> FacetIndex:
+    """Return the facet bitmaps of the live files, numbered by their index in *paths*."""
+    if len(segments) == 1 and segments[0].facets is not None:
+        return segments[0].facets  # no shadowing, and its IDs already follow sorted paths
+    doc_ids = {rel_path: i for i, rel_path in enumerate(paths)}
+    facets = FacetIndex()
+    for segment, shadowed in _layers(segments):
+        ordered = [segment._paths[fid] for fid in sorted(segment._paths, key=int)]
+        if segment.facets is None:
+            live = [p for p in ordered if p not in shadowed and p in doc_ids]
+            segment_facets = FacetIndex.build((p, segment.files.get(p, {})) for p in live)
+            id_map = [doc_ids[p] for p in live]
+        else:
+            segment_facets = segment.facets
+            id_map = [doc_ids.get(p) if p not in shadowed else None for p in ordered]
+        facets.update(segment_facets.remap(id_map))
+    return facets
+
+
+class SegmentedTokens(Mapping):
+    """``token -> set of paths`` view merged across segments.
+
+    Live files are numbered by their position in the sorted path table
+    ``paths``.  Lookups are answered from every segment, skipping shadowed
+    paths, and cached as ``array('I')`` of those IDs for the lifetime of the
+    view since segments never change.
+
+    The live vocabulary is worked out once per view.  A segment's tokens are
+    all live unless a newer segment shadows some of its files, so only the
+    posting lists of partly shadowed segments are decoded for it.
+    """
+
+    def __init__(self, segments: List[Segment], paths: Optional[List[str]] = None):
+        self._segments = segments
+        self._layers = _layers(segments)
+        self.paths: List[str] = sorted(live_files(segments)) if paths is None else paths
+        self.doc_ids: Dict[str, int] = {rel_path: i for i, rel_path in enumerate(self.paths)}
+        self._cache: Dict[str, array] = {}
+        self._vocabulary: Optional[List[str]] = None
+
+    def _live(self, token: str) -> Set[str]:
+        live: Set[str] = set()
+        for segment, shadowed in self._layers:
+            for rel_path in segment.postings(token):
+                if rel_path not in shadowed:
+                    live.add(rel_path)
+        return live
+
+    def ids(self, token: str) -> array:
+        """Return the sorted IDs of the live files containing *token*."""
+        ids = self._cache.get(token)
+        if ids is None:
+            doc_ids = self.doc_ids
+            ids = array("I", sorted(doc_ids[rel_path] for rel_path in self._live(token) if rel_path in doc_ids))
+            self._cache[token] = ids
+        return ids
+
+    def __getitem__(self, token):
+        if not isinstance(token, str):
+            raise KeyError(token)
+        ids = self.ids(token)
+        if not ids:
+            raise KeyError(token)
+        return {self.paths[i] for i in ids}
+
+    def frequencies(self, token: str) -> Dict[str, int]:
+        """Return ``path -> term frequency`` for the live paths containing *token*."""
+        freqs: Dict[str, int] = {}
+        for segment, shadowed in self._layers:
+            for rel_path, tf in segment.postings_with_freqs(token):
+                if rel_path not in shadowed:
+                    freqs[rel_path] = tf
+        return freqs
+
+    @property
+    def has_positions(self) -> bool:
+        return all(segment.has_positions for segment in self._segments)
+
+    def positions(self, token: str) -> Dict[str, List[int]]:
+        """Return ``path -> token offsets`` for the live paths containing *token*."""
+        offsets: Dict[str, List[int]] = {}
+        for segment, shadowed in self._layers:
+            for rel_path, token_offsets in segment.postings_with_positions(token):
+                if rel_path not in shadowed:
+                    offsets[rel_path] = token_offsets
+        return offsets
+
+    def _live_vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            seen: Set[str] = set()
+            vocabulary: List[str] = []
+            for segment, shadowed in self._layers:
+                hidden = shadowed.intersection(segment.files)
+                for token in segment.vocabulary():
+                    if token in seen:
+                        continue
+                    # Segment postings are never empty, so a token is live here
+                    # unless every file holding it is shadowed.
+                    if not hidden or any(rel_path not in hidden for rel_path in segment.postings(token)):
+                        seen.add(token)
+                        vocabulary.append(token)
+            self._vocabulary = vocabulary
+        return self._vocabulary
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._live_vocabulary())
+
+    def __len__(self) -> int:
+        return len(self._live_vocabulary())
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    def close(self) -> None:
+        """Unmap the segments behind this view; it must not be used afterwards."""
+        close_segments(self._segments)
+
+
+class SegmentStore:
+    """Manifest plus segment files for one advanced index."""
+
+    def __init__(self, index_path: Path, max_segments: int = DEFAULT_MAX_SEGMENTS):
+        self.index_path = Path(index_path)
+        self.segment_dir = self.index_path.with_name(self.index_path.name + ".segments")
+        self.max_segments = max_segments
+        self._key = os.path.abspath(self.index_path)
+        self._lock = _lock_for(self.index_path)
+
+    # -- manifest -----------------------------------------------------------
+
+    def _read_manifest(self) -> Dict:
+        if self.index_path.exists():
+            try:
+                data = json_io.load_file(self.index_path)
+                if is_segmented_manifest(data):
+                    return data
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read segment manifest {self.index_path}: {e}")
+        return {
+            "format": SEGMENTED_FORMAT,
+            "version": SEGMENTED_VERSION,
+            "created": datetime.now().isoformat(),
+            "next_segment": 1,
+            "segments": [],
+        }
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        manifest["updated"] = datetime.now().isoformat()
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        json_io.save_file(manifest, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+    def _allocate_name(self, manifest: Dict) -> str:
+        number = manifest.get("next_segment", 1)
+        manifest["next_segment"] = number + 1
+        return f"seg_{number:06d}.bin"
+
+    def manifest(self) -> Dict:
+        with self._lock:
+            return self._read_manifest()
+
+    # -- segments -----------------------------------------------------------
+
+    def open_segments(self) -> List[Segment]:
+        """Open every segment listed in the manifest, oldest first; the caller closes them."""
+        names = self.manifest().get("segments", [])
+        segments: List[Segment] = []
+        try:
+            for name in names:
+                segments.append(Segment(self.segment_dir / name))
+        except Exception:
+            close_segments(segments)
+            raise
+        return segments
+
+    @contextmanager
+    def segments(self) -> Iterator[List[Segment]]:
+        """Open every segment for the duration of a ``with`` block."""
+        segments = self.open_segments()
+        try:
+            yield segments
+        finally:
+            close_segments(segments)
+
+    def add_segment(
+        self,
+        tokens: Mapping,
+        files: Dict[str, Dict],
+        tombstones: Iterable[str] = (),
+        term_freqs: Optional[Mapping[str, Mapping[str, int]]] = None,
+        positions: Optional[Mapping[str, Mapping[str, List[int]]]] = None,
+    ) -> str:
+        """Write a new segment on top of the stack and return its name."""
+        tombstones = set(tombstones)
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            manifest = self._read_manifest()
+            name = self._allocate_name(manifest)
+            Segment.write(self.segment_dir / name, tokens, files, tombstones, term_freqs, positions)
+            manifest["segments"].append(name)
+            self._write_manifest(manifest)
+        self._remove_segment_files([])
+        logger.info(f"Added segment {name}: {len(files)} files, {len(tombstones)} tombstones")
+        return name
+
+    def reset(self) -> None:
+        """Drop every segment (used for forced rebuilds)."""
+        with self._lock:
+            manifest = self._read_manifest()
+            old_names = manifest["segments"]
+            manifest["segments"] = []
+            manifest["created"] = datetime.now().isoformat()
+            self._write_manifest(manifest)
+        self._remove_segment_files(old_names)
+
+    def _remove_segment_files(self, names: Iterable[str]) -> None:
+        """Delete the unreferenced segments *names* and any left over from earlier attempts."""
+        with self._lock:
+            manifest = self._read_manifest()
+            pending = list(manifest.get("obsolete", []))
+            pending += [name for name in names if name not in pending]
+            failed = []
+            for name in pending:
+                try:
+                    (self.segment_dir / name).unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # Still mapped by a reader (Windows); retried on the next write
+                    logger.warning(f"Could not remove segment {name}, will retry: {e}")
+                    failed.append(name)
+            if failed or manifest.get("obsolete"):
+                manifest["obsolete"] = failed
+                self._write_manifest(manifest)
+
+    # -- compaction ---------------------------------------------------------
+
+    @property
+    def needs_compaction(self) -> bool:
+        return len(self.manifest().get("segments", [])) > self.max_segments
+
+    def compact(self) -> Optional[str]:
+        """Merge every current segment into one; returns the new segment name.
+
+        Segments added while the merge runs are kept on top of the result.
+        """
+        with self._lock:
+            manifest = self._read_manifest()
+            names = list(manifest["segments"])
+            if len(names) <= 1:
+                return None
+            merged_name = self._allocate_name(manifest)
+            self._write_manifest(manifest)
+
+        segments = [Segment(self.segment_dir / name) for name in names]
+        try:
+            term_freqs: Dict[str, Dict[str, int]] = {}
+            keep_positions = all(segment.has_positions for segment in segments)
+            positions: Optional[Dict[str, Dict[str, List[int]]]] = {} if keep_positions else None
+            for segment, shadowed in _layers(segments):
+                for token in segment.vocabulary():
+                    for rel_path, tf in segment.postings_with_freqs(token):
+                        if rel_path not in shadowed:
+                            term_freqs.setdefault(token, {})[rel_path] = tf
+                    if positions is not None:
+                        for rel_path, token_offsets in segment.postings_with_positions(token):
+                            if rel_path not in shadowed:
+                                positions.setdefault(token, {})[rel_path] = list(token_offsets)
+            files = live_files(segments)
+        finally:
+            close_segments(segments)
+        # Merging starts at the oldest segment, so tombstones have nothing left to hide.
+        Segment.write(self.segment_dir / merged_name, term_freqs, files, term_freqs=term_freqs, positions=positions)
+
+        with self._lock:
+            manifest = self._read_manifest()
+            current = manifest["segments"]
+            changed = current[:len(names)] != names
+            if not changed:
+                manifest["segments"] = [merged_name] + current[len(names):]
+                self._write_manifest(manifest)
+        if changed:
+            logger.warning("Segments changed during compaction; discarding merged segment")
+            self._remove_segment_files([merged_name])
+            return None
+        self._remove_segment_files(names)
+        logger.info(f"Compacted {len(names)} segments into {merged_name}")
+        return merged_name
+
+    def compact_in_background(self) -> threading.Thread:
+        """Start :meth:`compact` on a daemon thread unless one is already running for this index."""
+        with _store_locks_guard:
+            running = _compaction_threads.get(self._key)
+            if running and running.is_alive():
+                return running
+
+            def run():
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"Background compaction of {self.index_path} failed: {e}")
+
+            # Daemon so a hung merge never blocks exit; _join_compactions waits at exit
+            thread = threading.Thread(target=run, name="index-compaction", daemon=True)
+            _compaction_threads[self._key] = thread
+            thread.start()
+        return thread
+
+    def wait_for_compaction(self, timeout: Optional[float] = None) -> None:
+        with _store_locks_guard:
+            thread = _compaction_threads.get(self._key)
+        if thread:
+            thread.join(timeout)
+
+
+@atexit.register
+def _join_compactions() -> None:
+    """Let running compactions finish instead of dying with the interpreter."""
+    with _store_locks_guard:
+        threads = list(_compaction_threads.values())
+    for thread in threads:
+        thread.join()
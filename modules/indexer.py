@@ -4,23 +4,33 @@ from __future__ import annotations
 
 from pathlib import Path
 from typing import Iterable, List, Tuple
-try:
-    from nltk.stem import PorterStemmer
-    NLTK_AVAILABLE = True
-except ImportError:
-    NLTK_AVAILABLE = False
-    PorterStemmer = None
-import re
-from .legacy_tool_v6_3 import _build_generic_index, search_with_persistent_index
+from .binary_index import export_index_json, load_index_file
+from .fuzzy_index import close_matches, fuzzy_candidates
+from .legacy_tool_v6_3 import _build_generic_index, search_with_persistent_index, tokenize
+from .positional import has_positional_syntax, snippet_phrases
+from .query_planner import has_boolean_syntax, parse_boolean_query, positive_terms
+from .query_cache import index_generation
+from .snippets import extract_snippets
+from .stem_index import NLTK_AVAILABLE, STEMMER_NAME, stem_text
+from .vector_index import NUMPY_AVAILABLE, VectorIndex, vector_index_path
+
+DEFAULT_SNIPPET_BUDGET = 200
 
 __all__ = [
     "build_index",
+    "load_index",
+    "export_index_json",
     "search",
     "search_with_context",
     "export_results_with_context",
     "nlp_search_with_persistent_index",
     "search_semantic",
     "semantic_search",
+    "build_vector_index",
+    "load_vector_index",
+    "resolve_file_ref",
+    "result_to_dict",
+    "similar_files",
 ]
 
 def build_index(
@@ -37,9 +47,25 @@ def build_index(
     return _build_generic_index(folder, cfg, patterns, index_file, progress_widget, is_json, existing, tags)
 
 
-def search(phrase: str, loaded_index: dict, case_sensitive: bool = False, search_logic: str = "AND"):
-    """Search the persistent index and return matched files."""
-    return search_with_persistent_index(phrase, loaded_index, case_sensitive, search_logic)
+def load_index(index_file: str | Path) -> dict:
+    """Load a binary or JSON index; binary postings are decoded on demand."""
+    return load_index_file(index_file)
+
+
+def search(
+    phrase: str,
+    loaded_index: dict,
+    case_sensitive: bool = False,
+    search_logic: str = "AND",
+    rank_results: bool = False,
+    max_results: int | None = None,
+):
+    """Search the persistent index and return matched files.
+
+    With ``rank_results`` the files are ordered by BM25 score (stored in
+    ``details["relevance_score"]``) and ``max_results`` keeps only the best.
+    """
+    return search_with_persistent_index(phrase, loaded_index, case_sensitive, search_logic, rank_results, max_results)
 
 
 def nlp_search_with_persistent_index(
@@ -48,8 +74,16 @@ def nlp_search_with_persistent_index(
     case_sensitive: bool = False,
     search_logic: str = "AND",
     similarity_cutoff: float = 0.8,
+    postings_cache=None,
 ) -> Tuple[List[tuple], str | None]:
-    """Search using fuzzy token matching with ``difflib``."""
+    """Search using fuzzy token matching with ``difflib``.
+
+    Indexes that carry the fuzzy bigram sections (see :mod:`.fuzzy_index`)
+    only score the tokens and filenames that can reach ``similarity_cutoff``;
+    the matches are the same as a full ``difflib`` scan.  With a
+    :class:`~.query_cache.QueryCache` as ``postings_cache`` the file IDs of
+    popular terms are reused across queries.
+    """
 
     if not loaded_index or not isinstance(loaded_index.get("index"), dict):
         return [], "Index is not loaded or invalid."
@@ -67,10 +101,36 @@ def nlp_search_with_persistent_index(
     if not processed:
         return [], "No search terms entered."
 
-    token_keys = list(index_tokens_map.keys())
-    result_sets = []
-    for term in processed:
-        candidates = set(get_close_matches(term, token_keys, n=5, cutoff=similarity_cutoff))
+    index_section = loaded_index["index"]
+    use_fuzzy_index = similarity_cutoff > 0 and all(
+        section in index_section
+        for section in ("fuzzy_grams", "fuzzy_lengths", "filename_fuzzy_grams", "filename_fuzzy_lengths")
+    )
+    if use_fuzzy_index:
+        key_at = getattr(index_tokens_map, "key_at", None)
+        if key_at is None:
+            key_at = list(index_tokens_map).__getitem__
+
+        def filename_length(fid: int) -> int:
+            return len(files_id_to_details_map.get(str(fid), {}).get("filename", "").lower())
+    else:
+        token_keys = list(index_tokens_map.keys())
+
+    def match_term(term: str) -> frozenset:
+        if use_fuzzy_index:
+            candidates = set(close_matches(
+                term, index_section["fuzzy_grams"], index_section["fuzzy_lengths"], key_at, n=5, cutoff=similarity_cutoff
+            ))
+            filename_fids = [str(fid) for fid in fuzzy_candidates(
+                term,
+                index_section["filename_fuzzy_grams"],
+                index_section["filename_fuzzy_lengths"],
+                filename_length,
+                similarity_cutoff,
+            )]
+        else:
+            candidates = set(get_close_matches(term, token_keys, n=5, cutoff=similarity_cutoff))
+            filename_fids = files_id_to_details_map.keys()
         if term not in candidates:
             candidates.add(term)
         term_file_ids: set[str] = set()
@@ -79,12 +139,21 @@ def nlp_search_with_persistent_index(
             if key in index_tokens_map:
                 term_file_ids.update(index_tokens_map[key])
 
-        for fid, details in files_id_to_details_map.items():
-            fname = details.get("filename", "")
+        for fid in filename_fids:
+            fname = files_id_to_details_map.get(fid, {}).get("filename", "")
             comp = fname if case_sensitive else fname.lower()
             if SequenceMatcher(None, term, comp).ratio() >= similarity_cutoff:
                 term_file_ids.add(fid)
+        return frozenset(term_file_ids)
 
+    generation = index_generation(loaded_index) if postings_cache is not None else None
+    result_sets = []
+    for term in processed:
+        if generation:
+            key = (generation, "fuzzy", case_sensitive, similarity_cutoff, term)
+            term_file_ids = postings_cache.postings(key, lambda: match_term(term))
+        else:
+            term_file_ids = match_term(term)
         if not term_file_ids and search_logic == "AND":
             return [], f"Term '{term}' yields no results with AND logic."
         result_sets.append(term_file_ids)
@@ -92,7 +161,8 @@ def nlp_search_with_persistent_index(
     if not result_sets:
         return [], "No documents found for any search terms."
 
-    file_ids = set.intersection(*result_sets) if search_logic == "AND" else set.union(*result_sets)
+    first, rest = set(result_sets[0]), result_sets[1:]
+    file_ids = first.intersection(*rest) if search_logic == "AND" else first.union(*rest)
     if not file_ids:
         return [], "Tokens found, but no single document satisfies the search logic."
 
@@ -111,24 +181,15 @@ def nlp_search_with_persistent_index(
     return sorted(results, key=lambda x: x[0].lower()), None
 
 def _extract_snippets(
-    file_path: Path, phrase: str, context_lines: int = 1, case_sensitive: bool = False
+    file_path: Path,
+    phrase: str,
+    context_lines: int = 1,
+    case_sensitive: bool = False,
+    line_offsets: List[int] | None = None,
+    max_snippets: int | None = None,
 ) -> List[str]:
     """Return text snippets around matches of *phrase* in *file_path*."""
-    try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-    except Exception:
-        return []
-
-    search_term = phrase if case_sensitive else phrase.lower()
-    snippets: List[str] = []
-    for idx, line in enumerate(lines):
-        check = line if case_sensitive else line.lower()
-        if search_term in check:
-            start = max(0, idx - context_lines)
-            end = min(len(lines), idx + context_lines + 1)
-            snippets.append("".join(lines[start:end]).strip())
-    return snippets
+    return extract_snippets(file_path, phrase, context_lines, case_sensitive, line_offsets, max_snippets)
 
 
 def search_with_context(
@@ -139,21 +200,75 @@ def search_with_context(
     case_sensitive: bool = False,
     search_logic: str = "AND",
     use_nlp: bool = False,
+    rank_results: bool = False,
+    max_results: int | None = None,
+    snippet_budget: int | None = DEFAULT_SNIPPET_BUDGET,
+    postings_cache=None,
 ) -> Tuple[List[tuple], str | None]:
-    """Search and also collect context snippets from each matching file."""
-    search_fn = nlp_search_with_persistent_index if use_nlp else search_with_persistent_index
-    results, err = search_fn(phrase, loaded_index, case_sensitive, search_logic)
+    """Search and also collect context snippets from each matching file.
+
+    ``rank_results``/``max_results`` apply to the exact (non-NLP) search.
+    Queries with boolean operators, quotes or ``NEAR/k`` always take the
+    exact search, since the NLP search would treat the syntax as terms.
+    Quoted phrases and ``NEAR/k`` are matched from the index when it was built
+    with ``index_positions``; files are only read for the returned snippets.
+    At most ``snippet_budget`` snippets are rendered per query (``None`` for
+    no limit); results past the budget come back with an empty snippet list.
+    ``postings_cache`` is passed on to the underlying search.
+    """
+    if use_nlp and not (has_boolean_syntax(phrase) or has_positional_syntax(phrase)):
+        results, err = nlp_search_with_persistent_index(
+            phrase, loaded_index, case_sensitive, search_logic, postings_cache=postings_cache
+        )
+    else:
+        results, err = search_with_persistent_index(
+            phrase, loaded_index, case_sensitive, search_logic, rank_results, max_results, postings_cache
+        )
     if err:
         return [], err
 
+    if has_positional_syntax(phrase):
+        phrases = snippet_phrases(phrase)
+    else:
+        phrases = [phrase]
+        if has_boolean_syntax(phrase):
+            try:
+                phrases = positive_terms(parse_boolean_query(phrase, lambda word: [word], search_logic))
+            except ValueError:
+                pass  # searched as plain terms, see search_with_persistent_index
+    line_offsets_map = loaded_index.get("index", {}).get("line_offsets", {})
+    remaining = snippet_budget
     results_with_ctx = []
     for display, start, end, path_obj, fid, details in results:
-        snippets = _extract_snippets(path_obj, phrase, context_lines, case_sensitive)
+        snippets = []
+        for snippet_phrase in phrases:
+            if remaining is not None and remaining <= 0:
+                break
+            found = _extract_snippets(
+                path_obj, snippet_phrase, context_lines, case_sensitive, line_offsets_map.get(fid), remaining
+            )
+            snippets.extend(found)
+            if remaining is not None:
+                remaining -= len(found)
         results_with_ctx.append((display, start, end, path_obj, snippets, fid, details))
 
     return results_with_ctx, None
 
 
+def result_to_dict(result: tuple) -> dict:
+    """Return a :func:`search_with_context` result tuple as a JSON-friendly dict."""
+    name, started, ended, path, snippets, fid, details = result
+    return {
+        "file": name,
+        "started_at": started,
+        "ended_at": ended,
+        "path": str(path),
+        "snippets": snippets,
+        "file_id": fid,
+        "details": details,
+    }
+
+
 def export_results_with_context(
     phrase: str,
     loaded_index: dict,
@@ -173,6 +288,7 @@ def export_results_with_context(
         case_sensitive=case_sensitive,
         search_logic=search_logic,
         use_nlp=use_nlp,
+        snippet_budget=None,
     )
     if err:
         return err
@@ -192,20 +308,18 @@ def export_results_with_context(
         return str(exc)
 
 
-_stemmer = PorterStemmer() if NLTK_AVAILABLE else None
-
-
 def _stem(text: str) -> List[str]:
     """Return stemmed tokens for *text* using a simple regex tokenizer."""
-    tokens = re.findall(r"\b\w+\b", text.lower())
-    if NLTK_AVAILABLE and _stemmer:
-        return [_stemmer.stem(tok) for tok in tokens]
-    else:
-        return tokens  # Return unstemmed tokens if NLTK is not available
+    return stem_text(text)
 
 
 def search_semantic(query: str, loaded_index: dict, *, threshold: float = 0.1):
-    """Perform a simple stem-based semantic search across indexed files."""
+    """Perform a simple stem-based semantic search across indexed files.
+
+    A file scores the share of the query's stems it contains.  Indexes with
+    a ``stems`` section from the same stemmer are scored from the postings
+    alone; older indexes fall back to reading every file.
+    """
 
     folder = Path(loaded_index["metadata"]["indexed_folder_path"])
     files = loaded_index["index"]["files"]
@@ -215,6 +329,28 @@ def search_semantic(query: str, loaded_index: dict, *, threshold: float = 0.1):
     if not query_stems:
         return [], "Query produced no searchable tokens"
 
+    stems_map = loaded_index["index"].get("stems")
+    if stems_map is not None and loaded_index["index"].get("stemmer") == STEMMER_NAME:
+        matched: dict = {}
+        for stem in query_stems:
+            for fid in stems_map.get(stem, ()):
+                matched[fid] = matched.get(fid, 0) + 1
+        if threshold <= 0:
+            # Every indexed file qualifies; unmatched ones keep their index order.
+            candidates = files.keys()
+        else:
+            candidates = sorted(matched, key=int)
+        results = []
+        for fid in candidates:
+            name = files.get(fid)
+            if name is None:
+                continue
+            score = matched.get(fid, 0) / len(query_stems)
+            if score >= threshold:
+                results.append((name, folder / name, score, fid, details_map.get(fid)))
+        results.sort(key=lambda x: x[2], reverse=True)
+        return results, None
+
     results = []
     for fid, name in files.items():
         path_obj = folder / name
@@ -234,22 +370,97 @@ def search_semantic(query: str, loaded_index: dict, *, threshold: float = 0.1):
     results.sort(key=lambda x: x[2], reverse=True)
     return results, None
 
+def build_vector_index(index_file: str | Path, *, lsa_dims: int = 0, loaded_index: dict | None = None) -> Path:
+    """Build the TF-IDF vectors for an existing index file and return their path."""
+    if loaded_index is None:
+        loaded_index = load_index_file(index_file)
+    path = vector_index_path(index_file)
+    VectorIndex.build(loaded_index, lsa_dims=lsa_dims).save(path)
+    return path
+
+
+def load_vector_index(index_file: str | Path, loaded_index: dict | None = None) -> VectorIndex | None:
+    """Return the vectors stored next to *index_file*, or ``None``.
+
+    ``None`` is returned without NumPy, when no vectors were built, or when
+    they belong to a different build of *loaded_index*.
+    """
+    path = vector_index_path(index_file)
+    if not NUMPY_AVAILABLE or not path.exists():
+        return None
+    vectors = VectorIndex.load(path)
+    if loaded_index is not None and vectors.index_created_at != loaded_index["metadata"].get("created_at", ""):
+        return None
+    return vectors
+
+
+def _ranked_from_vectors(hits, loaded_index: dict) -> List[tuple]:
+    folder = Path(loaded_index["metadata"]["indexed_folder_path"])
+    files = loaded_index["index"]["files"]
+    details_map = loaded_index["index"].get("file_details", {})
+    return [
+        (files[fid], folder / files[fid], score, fid, details_map.get(fid) or {})
+        for score, fid in hits
+        if fid in files
+    ]
+
+
+def resolve_file_ref(file_ref: str, loaded_index: dict) -> str | None:
+    """Return the file ID for *file_ref* (a file ID, indexed path or file name)."""
+    files = loaded_index["index"]["files"]
+    if file_ref in files:
+        return file_ref
+    for candidate, rel_path in files.items():
+        if rel_path == file_ref or Path(rel_path).name == file_ref:
+            return candidate
+    return None
+
+
+def similar_files(
+    file_ref: str,
+    loaded_index: dict,
+    vectors: VectorIndex,
+    *,
+    top_n: int = 10,
+) -> Tuple[List[tuple], str | None]:
+    """Return the files most like *file_ref* (a file ID, indexed path or file name).
+
+    Results are ``(name, path, cosine, file ID, details)`` tuples, best first.
+    """
+    fid = resolve_file_ref(file_ref, loaded_index)
+    if fid is None:
+        return [], f"File not in index: {file_ref}"
+    return _ranked_from_vectors(vectors.similar_to(fid, top_n), loaded_index), None
+
+
 def semantic_search(
     query: str,
     loaded_index: dict,
     *,
     top_n: int = 5,
     context_lines: int = 1,
+    vectors: VectorIndex | None = None,
 ) -> Tuple[List[tuple], str | None]:
-    """Return top-N files most similar to *query* using stem overlap."""
+    """Return top-N files most similar to *query*.
 
-    ranked, err = search_semantic(query, loaded_index, threshold=0.0)
-    if err:
-        return [], err
+    With *vectors* files are ranked by TF-IDF (or LSA) cosine similarity;
+    otherwise by stem overlap.
+    """
+
+    if vectors is not None:
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return [], "Query produced no searchable tokens"
+        ranked = _ranked_from_vectors(vectors.search(query_tokens, top_n), loaded_index)
+    else:
+        ranked, err = search_semantic(query, loaded_index, threshold=0.0)
+        if err:
+            return [], err
 
+    line_offsets_map = loaded_index["index"].get("line_offsets", {})
     results = []
     for name, path, _score, fid, details in ranked[:top_n]:
-        snippets = _extract_snippets(path, query, context_lines, False)
+        snippets = _extract_snippets(path, query, context_lines, False, line_offsets_map.get(fid))
         results.append(
             (
                 details.get("filename", path.name),
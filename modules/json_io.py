@@ -0,0 +1,138 @@
+"""
+JSON encoding and decoding for index, tagmap, dataset and config files.
+
+Every hot load/save path goes through this module instead of calling
+:mod:`json` directly.  With ``orjson`` installed, documents are parsed from
+and serialized to ``bytes`` by orjson, which is several times faster than
+the stdlib and avoids decoding whole files to ``str`` first.  Without it,
+the stdlib is used with the same options.
+
+Output is compact by default.  Pass ``indent=True`` for files people read
+and edit by hand (settings, tagmaps, AmandaMap/Phoenix Codex datasets);
+orjson only knows two-space indentation, so that is what both backends
+write.
+
+orjson is stricter than the stdlib in a few corners: it will not write
+integers wider than 64 bits or lone surrogates, nor read ``NaN`` literals.
+Those documents fall back to the stdlib, so every file that loaded before
+still loads, and parse errors are always :class:`json.JSONDecodeError`.
+"""
+
+import codecs
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+    HAS_ORJSON = False
+
+__all__ = [
+    "BACKEND",
+    "HAS_ORJSON",
+    "JSONDecodeError",
+    "dumps",
+    "dumps_str",
+    "load_file",
+    "loads",
+    "save_file",
+]
+
+BACKEND = "orjson" if HAS_ORJSON else "json"
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """Parse a JSON document from *data* (UTF-8 bytes or text)."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+        if data.startswith(codecs.BOM_UTF8):
+            data = data[len(codecs.BOM_UTF8):]
+    elif data.startswith("\ufeff"):
+        data = data[1:]
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # let the stdlib accept what it can, or raise its own error
+    return json.loads(data)
+
+
+def dumps(
+    obj: Any,
+    *,
+    indent: bool = False,
+    sort_keys: bool = False,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> bytes:
+    """Serialize *obj* to UTF-8 JSON bytes (non-ASCII kept as is)."""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            pass  # e.g. wide integers or lone surrogates: the stdlib copes
+    options = dict(
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        sort_keys=sort_keys,
+        default=default,
+    )
+    try:
+        return json.dumps(obj, ensure_ascii=False, **options).encode("utf-8")
+    except UnicodeEncodeError:
+        # Lone surrogates are only representable as \u escapes
+        return json.dumps(obj, ensure_ascii=True, **options).encode("ascii")
+
+
+def dumps_str(obj: Any, **kwargs: Any) -> str:
+    """Like :func:`dumps`, returning text (for JSON Lines and messages)."""
+    return dumps(obj, **kwargs).decode("utf-8")
+
+
+def load_file(path: str | Path) -> Any:
+    """Read and parse the JSON file at *path*."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def save_file(
+    obj: Any,
+    path: str | Path,
+    *,
+    indent: bool = False,
+    sort_keys: bool = False,
+    default: Optional[Callable[[Any], Any]] = None,
+    atomic: bool = False,
+) -> None:
+    """Serialize *obj* to the file at *path*.
+
+    With *atomic* the document is written to a temporary sibling first and
+    moved into place, so readers never see a half-written file.
+    """
+    data = dumps(obj, indent=indent, sort_keys=sort_keys, default=default)
+    if not atomic:
+        with open(path, "wb") as f:
+            f.write(data)
+        return
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
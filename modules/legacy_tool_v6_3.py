@@ -1,6 +1,8 @@
 import base64
+from collections import Counter
+from collections.abc import Mapping
 import concurrent.futures
-import copy
+from dataclasses import asdict
 from datetime import datetime
 import difflib
 from email import policy
@@ -19,6 +21,18 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk, font as tkFont
 import xml.etree.ElementTree as ET
 
+from .binary_index import detach_index_file, index_path_for, load_index_file, save_index_file
+from .index_builder import IndexBuilder, token_offsets
+from .index_manifest import BuildStats, diff_manifest, relative_index_path
+from . import json_io
+from .metadata_index import GRAM_SIZE, METADATA_SECTIONS, file_matches_term, resolve_metadata_term
+from .parse_cache import get_parse_cache
+from .query_cache import index_generation, new_generation_id
+from .query_planner import And, Or, QueryPlanner, Term, TermSource, has_boolean_syntax, parse_boolean_query, positive_terms
+from .positional import has_positional_syntax, match_clauses, parse_positional_query, strip_positional_syntax
+from .ranking import TermPostings, bm25_idf, top_k
+from .snippets import line_start_offsets
+from .vector_index import NUMPY_AVAILABLE, VectorIndex, vector_index_path
 from .mirror_entity_utils import (
     classify_mirror_entity_content,
     detect_mirror_entity_reference,
@@ -76,7 +90,14 @@ default_config = {
     "mirror_entity_redaction_enabled": True,
     "mirror_entity_vault_path": "./mirror_entity/",
     "use_tagmap_tagging": False,
-    "tagmap_file_path": ""
+    "tagmap_file_path": "",
+    "index_format": "json",
+    "index_hash_contents": False,
+    "tokenizer_backend": "thread",
+    "index_window_size": 64,
+    "index_positions": False,
+    "vector_index": False,
+    "vector_lsa_dims": 0
 }
 
 
@@ -115,8 +136,7 @@ def load_config(): # Your original load_config
     loaded_config_data = default_config.copy()
     if os.path.exists(CONFIG_FILE):
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                from_file_cfg = json.load(f)
+            from_file_cfg = json_io.load_file(CONFIG_FILE)
             # Handle legacy key names
             if 'mirror_entity_redaction_enabled' not in from_file_cfg and 'redact_wg_entries' in from_file_cfg:
                 from_file_cfg['mirror_entity_redaction_enabled'] = from_file_cfg.pop('redact_wg_entries')
@@ -134,6 +154,7 @@ def load_config(): # Your original load_config
 
 def save_config(cfg_to_save): # Your original save_config
     try:
+        # Written with the stdlib to keep the tracked file's four-space indent
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
             json.dump(cfg_to_save, f, indent=4)
     except Exception as e:
@@ -141,8 +162,9 @@ def save_config(cfg_to_save): # Your original save_config
 
 def wipe_config(): # Your original
     if os.path.exists(CONFIG_FILE): os.remove(CONFIG_FILE)
-    if os.path.exists(ORIGINAL_JSON_INDEX_FILE): os.remove(ORIGINAL_JSON_INDEX_FILE)
-    if os.path.exists(CONVERTED_FILES_INDEX_FILE): os.remove(CONVERTED_FILES_INDEX_FILE)
+    for index_file in (ORIGINAL_JSON_INDEX_FILE, CONVERTED_FILES_INDEX_FILE):
+        for stored_file in (index_file, index_path_for(index_file, "binary")):
+            if os.path.exists(stored_file): os.remove(stored_file)
     log_debug("INFO: Config and index files wiped.")
 
 # --- Tokenizer (from your V6.2(timestamp Edition).py) ---
@@ -183,8 +205,7 @@ def load_json_tagmap(folder_path):
     if not tag_file.exists():
         return {}
     try:
-        with open(tag_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_io.load_file(tag_file)
         if isinstance(data, dict):
             normalized = {}
             for k, v in data.items():
@@ -254,11 +275,64 @@ class ImageData: # Your original ImageData class
         self.cid_name = None
         log_debug(f"    ImageData created: Filename='{self.full_filename}', EmbedMIME='{self.mime_type}', OrigMIME='{self.original_full_mime_type}', Base64(len):{len(self.base64_str)}")
 
+# --- Parsed-content cache ---
+# Config keys that change the structured content; other keys (export format,
+# styling ...) leave cached entries valid.  Bump STRUCTURED_PARSER_VERSION
+# when the parser's output changes.
+PARSE_CONFIG_KEYS = ("include_filename_in_header", "skip_system_tool_messages", "use_pillow_for_unknown_images")
+STRUCTURED_PARSER_VERSION = 1
+
+def encode_structured_content(structured_content):
+    """Return *structured_content* as JSON-ready data (ImageData becomes a list)."""
+    encoded = []
+    for item in structured_content:
+        if item.get("type") == "image":
+            img = item["data"]
+            data_uri = img.original_data_uri
+            if data_uri == f"data:{img.original_full_mime_type};base64,{img.base64_str}":
+                data_uri = None  # rebuilt on decode
+            item = {**item, "data": [img.filename_stem, img.mime_type, img.base64_str, img.original_full_mime_type, data_uri]}
+        encoded.append(item)
+    return encoded
+
+def decode_structured_content(encoded):
+    """Inverse of :func:`encode_structured_content`."""
+    structured_content = []
+    for item in encoded:
+        if item.get("type") == "image":
+            stem, mime_type, base64_str, original_mime, data_uri = item["data"]
+            if data_uri is None:
+                data_uri = f"data:{original_mime};base64,{base64_str}"
+            item = {**item, "data": ImageData(stem, mime_type, base64_str, original_full_mime_type=original_mime, original_data_uri=data_uri)}
+        structured_content.append(item)
+    return structured_content
+
+def parse_chatgpt_json_to_structured_content(file_path, cfg):
+    """Parse a ChatGPT JSON export into structured content, through the parse cache.
+
+    Each file is parsed once per change (mtime and size) and parser options;
+    indexing, both export paths and later tool runs reuse the cached result.
+    """
+    return get_parse_cache().get_or_parse(
+        file_path,
+        "chatgpt.structured",
+        lambda path: _parse_chatgpt_json_to_structured_content(path, cfg),
+        config={
+            "parser_version": STRUCTURED_PARSER_VERSION,
+            # Unknown image types are sniffed with Pillow only when it is installed
+            "pil_available": PIL_AVAILABLE,
+            **{key: cfg.get(key, True) for key in PARSE_CONFIG_KEYS},
+        },
+        encode=encode_structured_content,
+        decode=decode_structured_content,
+        should_store=lambda content: not any(item.get("type") == "error" for item in content),
+    )
+
 # --- Core Parsing Logic (from your V6.2(timestamp Edition).py - This is your extensive function) ---
-def parse_chatgpt_json_to_structured_content(file_path, cfg): # Your original
+def _parse_chatgpt_json_to_structured_content(file_path, cfg): # Your original
     log_debug(f"Starting parse for: {file_path.name}")
     try:
-        with open(file_path, 'r', encoding='utf-8') as f: data = json.load(f)
+        data = json_io.load_file(file_path)
     except Exception as e:
         log_debug(f"  ERROR reading/parsing {file_path.name}: {e}")
         return [{"type": "error", "content": f"Error reading/parsing {Path(file_path).name}: {e}"}]
@@ -964,6 +1038,61 @@ def save_multiple_files(file_paths, cfg, output_dir, combine_all=False, export_l
 # --- Persistent Indexing Logic & Search (from your V6.2(timestamp Edition).py, MODIFIED for timestamps) ---
 # --- MODIFIED: _build_generic_index - Start of significant modifications ---
 
+def _tokenize_file_for_index(file_path, folder_to_index, cfg, is_json_source):
+    """Parse and tokenize one file for ``_build_generic_index``.
+
+    Runs in a worker thread or process, so it only returns picklable values.
+    Tokens come back as a ``token -> count`` dict rather than the full token
+    list: the index only needs each token's frequency, and the deduplicated
+    dict keeps the result small when it has to cross a process boundary.
+    With ``index_positions`` enabled it is ``token -> offsets`` instead.
+    Converted (non-JSON) files also report their line-start byte offsets so
+    snippets can later be cut without rescanning the file.
+    """
+    actual_filename = file_path.name
+    content_to_index = ""
+    chat_started_at_ts, chat_ended_at_ts = None, None
+    line_starts = None
+    try:
+        file_mod_time = os.path.getmtime(file_path)
+    except Exception:
+        file_mod_time = 0
+
+    if is_json_source:
+        structured_data = parse_chatgpt_json_to_structured_content(file_path, cfg)
+        text_for_indexing = []
+        for item in structured_data:
+            if item["type"] == "text":
+                text_for_indexing.append(item["content"])
+            elif item["type"] == "image":
+                text_for_indexing.append(item["data"].placeholder_text)
+            elif item["type"] == "error":
+                return None
+        content_to_index = " ".join(text_for_indexing)
+    else:
+        chat_started_at_ts, chat_ended_at_ts = extract_chat_timestamps(str(file_path))
+        try:
+            with open(file_path, "rb") as f:
+                raw_content = f.read()
+            line_starts = line_start_offsets(raw_content)
+            content_to_index = raw_content.decode("utf-8", errors="ignore")
+            if file_path.suffix in [".md", ".html"]:
+                content_to_index = re.sub(r"<style[^<]*<\/style>|<script[^<]*<\/script>|<[^>]+>|\[.*?\]\(.*?\)|#+\s*|\*\*|\*|_|`", " ", content_to_index, flags=re.IGNORECASE | re.DOTALL)
+                content_to_index = re.sub(r"\s+", " ", content_to_index).strip()
+        except Exception:
+            return None
+
+    tokens_local = tokenize(content_to_index)
+    if not tokens_local:
+        return None
+    try:
+        relative_file_path_str = str(file_path.relative_to(Path(folder_to_index)))
+    except ValueError:
+        relative_file_path_str = str(file_path)
+    token_data = token_offsets(tokens_local) if cfg.get("index_positions", False) else dict(Counter(tokens_local))
+    return (relative_file_path_str, actual_filename, token_data, chat_started_at_ts, chat_ended_at_ts, file_mod_time, line_starts)
+
+
 def _build_generic_index(folder_to_index, cfg, file_patterns, index_file_to_save, progress_text_widget, is_json_source, existing_loaded_index_data=None, tags_per_file=None, tagmap_entries=None):
     # --- INTEGRATED: Initialize new structure for file_details ---
     
@@ -980,20 +1109,16 @@ def _build_generic_index(folder_to_index, cfg, file_patterns, index_file_to_save
     except ImportError:
         log_debug("Performance optimizer not available, skipping size checks")
 
+    track_positions = cfg.get("index_positions", False)
+    build_vectors = cfg.get("vector_index", False) and NUMPY_AVAILABLE
     if existing_loaded_index_data and isinstance(existing_loaded_index_data.get("index"), dict):
-        existing_index_section = existing_loaded_index_data["index"]
-        index_data = {
-            "tokens": copy.deepcopy(existing_index_section.get("tokens", {})),
-            "files": copy.deepcopy(existing_index_section.get("files", {})),
-            "file_details": copy.deepcopy(existing_index_section.get("file_details", {}))
-        }
         try:
-            file_id_counter = max(int(fid) for fid in index_data["files"].keys()) + 1 if index_data["files"] else 0
-        except ValueError:
-            file_id_counter = 0
+            builder = IndexBuilder.from_index(existing_loaded_index_data["index"], track_positions)
+        except ValueError as e_existing:
+            log_debug(f"WARNING: Existing index cannot be updated ({e_existing}); starting a fresh index.")
+            builder = IndexBuilder(track_positions)
     else:
-        index_data = {"tokens": {}, "files": {}, "file_details": {}}
-        file_id_counter = 0
+        builder = IndexBuilder(track_positions)
 
     def update_progress_indexing(message):
         """Write progress text to the widget safely from worker threads."""
@@ -1011,137 +1136,114 @@ def _build_generic_index(folder_to_index, cfg, file_patterns, index_file_to_save
             print(f"INDEX_PROGRESS: {message} (Error: {e})")
 
     update_progress_indexing(f"Starting indexing for: {folder_to_index}...")
-    all_files_to_index = []
+    all_files_found = []
     for pattern in file_patterns:
-        all_files_to_index.extend(list(Path(folder_to_index).rglob(pattern)))
+        all_files_found.extend(list(Path(folder_to_index).rglob(pattern)))
+    update_progress_indexing(f"Found {len(all_files_found)} files matching patterns {file_patterns}.")
+
+    # Manifest stage: stat everything first and only parse new or changed files.
+    use_content_hash = cfg.get("index_hash_contents", False)
+    manifest = diff_manifest(builder, Path(folder_to_index), all_files_found, use_content_hash)
+    build_stats = BuildStats(skipped=len(manifest.unchanged))
+    for removed_fid in manifest.removed:
+        builder.remove_file(removed_fid)
+        build_stats.removed += 1
+    all_files_to_index = manifest.to_process
     total_files = len(all_files_to_index)
-    update_progress_indexing(f"Found {total_files} files matching patterns {file_patterns}.")
+    update_progress_indexing(
+        f"Manifest: {len(manifest.added)} new, {len(manifest.updated)} changed, "
+        f"{len(manifest.removed)} deleted, {len(manifest.unchanged)} unchanged."
+    )
     processed_file_count_this_run = 0
 
-    def process_file(file_path):
-        actual_filename = file_path.name
-        content_to_index = ""
-        chat_started_at_ts, chat_ended_at_ts = None, None
-        try:
-            file_mod_time = os.path.getmtime(file_path)
-        except Exception:
-            file_mod_time = 0
-
-        if not is_json_source:
-            current_scan_start_ts, current_scan_end_ts = extract_chat_timestamps(str(file_path))
-            final_start_ts_to_store, final_end_ts_to_store = current_scan_start_ts, current_scan_end_ts
-            if existing_loaded_index_data and isinstance(existing_loaded_index_data.get("index", {}).get("files"), dict) and isinstance(existing_loaded_index_data["index"].get("file_details"), dict):
-                try:
-                    base_folder_for_relative = Path(folder_to_index)
-                    relative_path_str_current = str(file_path.relative_to(base_folder_for_relative))
-                    old_file_id_found = None
-                    for old_fid, old_rel_path in existing_loaded_index_data["index"]["files"].items():
-                        if old_rel_path == relative_path_str_current:
-                            old_file_id_found = old_fid
-                            break
-                    if old_file_id_found and old_file_id_found in existing_loaded_index_data["index"]["file_details"]:
-                        old_file_detail = existing_loaded_index_data["index"]["file_details"][old_file_id_found]
-                        preserved_start_ts = old_file_detail.get("chat_started_at")
-                        if preserved_start_ts:
-                            final_start_ts_to_store = preserved_start_ts
-                except Exception as e_ts_preserve:
-                    log_debug(f"  Error during timestamp preservation for {actual_filename}: {e_ts_preserve}")
-            chat_started_at_ts, chat_ended_at_ts = final_start_ts_to_store, final_end_ts_to_store
-
-        if is_json_source:
-            structured_data = parse_chatgpt_json_to_structured_content(file_path, cfg)
-            text_for_indexing = []
-            for item in structured_data:
-                if item["type"] == "text":
-                    text_for_indexing.append(item["content"])
-                elif item["type"] == "image":
-                    text_for_indexing.append(item["data"].placeholder_text)
-                elif item["type"] == "error":
-                    return None
-            content_to_index = " ".join(text_for_indexing)
-        else:
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    content_to_index = f.read()
-                if file_path.suffix in [".md", ".html"]:
-                    content_to_index = re.sub(r"<style[^<]*<\/style>|<script[^<]*<\/script>|<[^>]+>|\[.*?\]\(.*?\)|#+\s*|\*\*|\*|_|`", " ", content_to_index, flags=re.IGNORECASE | re.DOTALL)
-                    content_to_index = re.sub(r"\s+", " ", content_to_index).strip()
-            except Exception:
-                return None
-
-        tokens_local = tokenize(content_to_index)
-        if not tokens_local:
-            return None
-        try:
-            relative_file_path_str = str(file_path.relative_to(Path(folder_to_index)))
-        except ValueError:
-            relative_file_path_str = str(file_path)
-        return (relative_file_path_str, actual_filename, tokens_local, chat_started_at_ts, chat_ended_at_ts, file_mod_time)
-
     cpu_percent = cfg.get("cpu_usage_percent", 100)
     allowed_workers = max(1, int((os.cpu_count() or 1) * cpu_percent / 100))
     worker_count = min(max(cfg.get("num_tokenizers", 2), cfg.get("num_indexers", 2)), allowed_workers)
-
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=worker_count) as executor:
-        for fp in all_files_to_index:
-            futures.append((fp, executor.submit(process_file, fp)))
-        for processed_count, (fp, fut) in enumerate(futures, 1):
+    # Tokenizing is pure Python and holds the GIL; the process backend spreads it over cores.
+    if cfg.get("tokenizer_backend", "thread") == "process" and total_files > 1:
+        executor_class = concurrent.futures.ProcessPoolExecutor
+    else:
+        executor_class = concurrent.futures.ThreadPoolExecutor
+    update_progress_indexing(f"Tokenizing with {worker_count} {'process' if executor_class is concurrent.futures.ProcessPoolExecutor else 'thread'} worker(s).")
+
+    # Bounded in-flight window: results are merged as they complete and their
+    # token tuples dropped right away, so memory follows the window, not the corpus.
+    window_size = max(worker_count, cfg.get("index_window_size", 64))
+    files_to_submit = iter(all_files_to_index)
+    pending = {}
+    processed_count = 0
+    with executor_class(max_workers=worker_count) as executor:
+        def submit_more():
+            while len(pending) < window_size:
+                fp = next(files_to_submit, None)
+                if fp is None:
+                    return
+                pending[executor.submit(_tokenize_file_for_index, fp, folder_to_index, cfg, is_json_source)] = fp
+
+        submit_more()
+        while pending:
             try:
                 if progress_text_widget and hasattr(progress_text_widget, 'winfo_exists') and not progress_text_widget.winfo_exists():
                     log_debug("Indexing cancelled: Progress widget closed.")
+                    for fut in pending:
+                        fut.cancel()
                     return None
             except Exception:
                 pass
-            update_progress_indexing(f"Processing file {processed_count}/{total_files}: {fp.name}...")
-            result = fut.result()
-            if not result:
-                continue
-            relative_file_path_str, actual_filename, tokens, chat_started_at_ts, chat_ended_at_ts, file_mod_time = result
-            file_id = next((fid for fid, fpath_str in index_data["files"].items() if fpath_str == relative_file_path_str), None)
-            skip_file = False
-            if file_id is not None:
-                prev_details = index_data["file_details"].get(file_id, {})
-                prev_mod = prev_details.get("file_mod_time")
-                prev_end = prev_details.get("chat_ended_at")
-                if prev_mod is not None and abs(prev_mod - file_mod_time) < 1 and prev_end == chat_ended_at_ts:
-                    skip_file = True
-                if not skip_file:
-                    for tok, fid_list in list(index_data["tokens"].items()):
-                        if file_id in fid_list:
-                            new_list = [fid for fid in fid_list if fid != file_id]
-                            if new_list:
-                                index_data["tokens"][tok] = list(set(new_list))
-                            else:
-                                del index_data["tokens"][tok]
-            if skip_file:
-                continue
-            if file_id is None:
-                file_id = str(file_id_counter)
-                index_data["files"][file_id] = relative_file_path_str
-                file_id_counter += 1
-            current_file_details = {
-                "filename": actual_filename,
-                "file_mod_time": file_mod_time,
-                "indexed_at": datetime.now().isoformat(),
-            }
-            if tags_per_file:
-                tag_key = relative_file_path_str
-                tags_for_file = tags_per_file.get(tag_key) or tags_per_file.get(actual_filename)
-                if tags_for_file:
-                    current_file_details["tags"] = list(tags_for_file)
-            if not is_json_source:
-                if chat_started_at_ts:
-                    current_file_details["chat_started_at"] = chat_started_at_ts
-                if chat_ended_at_ts:
-                    current_file_details["chat_ended_at"] = chat_ended_at_ts
-            index_data["file_details"][file_id] = current_file_details
-            for token in set(tokens):
-                index_data["tokens"].setdefault(token, []).append(file_id)
-                index_data["tokens"][token] = list(set(index_data["tokens"][token]))
-            processed_file_count_this_run += 1
-            if (processed_count) % 20 == 0 or processed_count == total_files:
-                update_progress_indexing(f"  Indexed {processed_file_count_this_run}/{total_files} files...")
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                fp = pending.pop(fut)
+                processed_count += 1
+                update_progress_indexing(f"Processing file {processed_count}/{total_files}: {fp.name}...")
+                result = fut.result()
+                if not result:
+                    stale_fid = builder.file_id_for(relative_index_path(fp, Path(folder_to_index)))
+                    if stale_fid is not None:
+                        builder.remove_file(stale_fid)
+                        build_stats.removed += 1
+                    continue
+                relative_file_path_str, actual_filename, tokens, chat_started_at_ts, chat_ended_at_ts, file_mod_time, line_starts = result
+                positions = None
+                if track_positions:
+                    positions, tokens = tokens, {token: len(offsets) for token, offsets in tokens.items()}
+                file_id = builder.file_id_for(relative_file_path_str)
+                if file_id is not None:
+                    # Keep the first-seen start of a chat that has since grown.
+                    preserved_start_ts = builder.file_details.get(file_id, {}).get("chat_started_at")
+                    if preserved_start_ts and not is_json_source:
+                        chat_started_at_ts = preserved_start_ts
+                    builder.remove_postings(file_id)
+                    build_stats.updated += 1
+                else:
+                    file_id = builder.add_path(relative_file_path_str)
+                    build_stats.added += 1
+                current_file_details = {
+                    "filename": actual_filename,
+                    "file_mod_time": file_mod_time,
+                    "indexed_at": datetime.now().isoformat(),
+                    "doc_length": sum(tokens.values()),
+                }
+                current_file_details.update(manifest.signatures.get(relative_file_path_str, {}))
+                if tags_per_file:
+                    tag_key = relative_file_path_str
+                    tags_for_file = tags_per_file.get(tag_key) or tags_per_file.get(actual_filename)
+                    if tags_for_file:
+                        current_file_details["tags"] = list(tags_for_file)
+                if not is_json_source:
+                    if chat_started_at_ts:
+                        current_file_details["chat_started_at"] = chat_started_at_ts
+                    if chat_ended_at_ts:
+                        current_file_details["chat_ended_at"] = chat_ended_at_ts
+                builder.file_details[file_id] = current_file_details
+                builder.add_tokens(file_id, tokens)
+                if positions:
+                    builder.add_positions(file_id, positions)
+                if line_starts:
+                    builder.set_line_offsets(file_id, line_starts)
+                processed_file_count_this_run += 1
+                if (processed_count) % 20 == 0 or processed_count == total_files:
+                    update_progress_indexing(f"  Indexed {processed_file_count_this_run}/{total_files} files...")
+            submit_more()
     tagmap_lookup = {}
     if tagmap_entries:
         for entry in tagmap_entries:
@@ -1154,24 +1256,46 @@ def _build_generic_index(folder_to_index, cfg, file_patterns, index_file_to_save
                     continue
                 tagmap_lookup.setdefault(doc, {})[line_num] = {"category": entry.get("category"), "preview": entry.get("preview"), "date": entry.get("date")}
     if tagmap_lookup:
-        for fid, rel_path in index_data.get("files", {}).items():
+        for fid, rel_path in builder.files.items():
             doc_name = Path(rel_path).name
             if doc_name in tagmap_lookup:
-                index_data.setdefault("file_details", {}).setdefault(fid, {}).setdefault("tagmap", {}).update(tagmap_lookup[doc_name])
+                builder.file_details.setdefault(fid, {}).setdefault("tagmap", {}).update(tagmap_lookup[doc_name])
+
+    index_data = builder.materialize()
+    total_doc_length = sum(details.get("doc_length", 0) for details in index_data["file_details"].values())
 
     index_metadata = {
         "created_at": datetime.now().isoformat(),
+        "generation": new_generation_id(),
         "indexed_folder_path": str(folder_to_index),
         "total_files_processed_in_this_run": processed_file_count_this_run,
+        "build_stats": asdict(build_stats),
+        "index_positions": track_positions,
+        "vector_index": build_vectors,
         "total_files_in_index": len(index_data["files"]),
         "total_unique_tokens": len(index_data["tokens"]),
+        "avg_doc_length": total_doc_length / len(index_data["files"]) if index_data["files"] else 0,
         "index_file_name": Path(index_file_to_save).name,
     }
     final_index_structure = {"metadata": index_metadata, "index": index_data}
+    index_format = cfg.get("index_format", "json")
+    stored_index_file = index_path_for(index_file_to_save, index_format)
+    if existing_loaded_index_data:
+        # The previous index may still map the file about to be replaced
+        detach_index_file(existing_loaded_index_data)
     try:
-        with open(index_file_to_save, "w", encoding="utf-8") as f:
-            json.dump(final_index_structure, f, indent=2)
-        update_progress_indexing(f"Indexing complete! Index saved to {Path(index_file_to_save).name}")
+        save_index_file(final_index_structure, stored_index_file, index_format)
+        if build_vectors:
+            update_progress_indexing("Building TF-IDF vectors...")
+            vectors = VectorIndex.build(final_index_structure, lsa_dims=cfg.get("vector_lsa_dims", 0))
+            vectors.save(vector_index_path(stored_index_file))
+        elif cfg.get("vector_index", False):
+            update_progress_indexing("NumPy is not installed; skipping the vector index.")
+        update_progress_indexing(
+            f"Indexing complete! {build_stats.added} added, {build_stats.updated} updated, "
+            f"{build_stats.removed} removed, {build_stats.skipped} unchanged. "
+            f"Index saved to {stored_index_file.name}"
+        )
         global config
         if is_json_source:
             config["last_indexed_original_json_folder_path"] = str(folder_to_index)
@@ -1197,63 +1321,157 @@ def _build_generic_index(folder_to_index, cfg, file_patterns, index_file_to_save
 # --- MODIFIED: _build_generic_index - End of significant modifications ---
 
 # --- MODIFIED: search_with_persistent_index - Start of modifications ---
-def search_with_persistent_index(search_phrase, loaded_index_data, case_sensitive=False, search_logic="AND"):
+class _PersistentIndexTerms(TermSource):
+    """Query-planner view of a loaded index: postings as sorted integer file IDs.
+
+    A term matches the files containing it as a token and the files whose
+    filename, timestamps or metadata match it (see ``file_matches_term``).
+    """
+
+    def __init__(self, loaded_index_data, case_sensitive, postings_cache=None):
+        self.index = loaded_index_data["index"]
+        self.case_sensitive = case_sensitive
+        self.has_metadata_index = all(section in self.index for section in METADATA_SECTIONS)
+        generation = index_generation(loaded_index_data) if postings_cache is not None else None
+        self.postings_cache = postings_cache if generation else None
+        self.cache_scope = (generation, "exact", case_sensitive)
+        self._universe = None
+
+    def _token_fids(self, term):
+        return self.index["tokens"].get(term if self.case_sensitive else term.lower(), ())
+
+    def estimate(self, term):
+        # Document frequency; binary indexes count it without decoding the postings
+        tokens = self.index["tokens"]
+        key = term if self.case_sensitive else term.lower()
+        posting_count = getattr(tokens, "posting_count", None)
+        return posting_count(key) if posting_count else len(tokens.get(key, ()))
+
+    def resolve_cost(self, term):
+        # Without the secondary indexes (or for terms too short for filename grams)
+        # resolving a term also checks every file's details.
+        if self.has_metadata_index and len(term) >= GRAM_SIZE:
+            return self.estimate(term)
+        return self.estimate(term) + len(self.index["file_details"])
+
+    def _resolve(self, term):
+        fids = set(self._token_fids(term))
+        if self.has_metadata_index:
+            fids.update(resolve_metadata_term(self.index, term, self.case_sensitive))
+        else:
+            for fid, details in self.index["file_details"].items():
+                if file_matches_term(details, term, self.case_sensitive):
+                    fids.add(fid)
+        return tuple(sorted(int(fid) for fid in fids))
+
+    def postings(self, term):
+        if self.postings_cache is None:
+            return self._resolve(term)
+        return self.postings_cache.postings(self.cache_scope + (term,), lambda: self._resolve(term))
+
+    def restrict(self, term, candidates):
+        token_fids = set(self._token_fids(term))
+        details_map = self.index["file_details"]
+        return [
+            fid for fid in candidates
+            if str(fid) in token_fids or file_matches_term(details_map.get(str(fid), {}), term, self.case_sensitive)
+        ]
+
+    def universe(self):
+        if self._universe is None:
+            self._universe = sorted(int(fid) for fid in self.index["files"])
+        return self._universe
+
+
+def search_with_persistent_index(search_phrase, loaded_index_data, case_sensitive=False, search_logic="AND", rank_results=False, max_results=None, postings_cache=None):
     if not loaded_index_data or not isinstance(loaded_index_data.get("index"), dict) or \
-       not isinstance(loaded_index_data["index"].get("tokens"), dict) or \
+       not isinstance(loaded_index_data["index"].get("tokens"), Mapping) or \
        not isinstance(loaded_index_data["index"].get("files"), dict) or \
        not isinstance(loaded_index_data["index"].get("file_details"), dict):
         return [], "Index is not loaded or is invalid (missing tokens, files, or file_details)."
 
     index_tokens_map = loaded_index_data["index"]["tokens"]
-    files_id_to_path_map = loaded_index_data["index"]["files"]
     files_id_to_details_map = loaded_index_data["index"]["file_details"]
 
     indexed_folder_path_str = loaded_index_data.get("metadata", {}).get("indexed_folder_path", ".")
     indexed_folder_path = Path(indexed_folder_path_str if indexed_folder_path_str else ".")
 
-    search_terms_raw = search_phrase.split()
-    processed_search_terms = [term.lower() for term in search_terms_raw] if not case_sensitive else search_terms_raw
-    if not processed_search_terms: return [], "No search terms entered."
-
-    term_match_sets = []
-    for term_query in processed_search_terms:
-        current_term_fids = set()
-        term_for_token_lookup = term_query.lower() if not case_sensitive else term_query
-        if term_for_token_lookup in index_tokens_map:
-            current_term_fids.update(index_tokens_map[term_for_token_lookup])
-
-        for fid, details in files_id_to_details_map.items():
-            filename_check = details.get("filename", "")
-            if not case_sensitive:
-                filename_check = filename_check.lower()
-            if term_query in filename_check:
-                current_term_fids.add(fid)
-            if re.fullmatch(r"\d{4}-\d{2}-\d{2}|\d{2}:\d{2}(:\d{2})?", term_query):
-                if term_query in details.get("chat_started_at", "") or term_query in details.get("chat_ended_at", ""):
-                    current_term_fids.add(fid)
-            for meta_field in ["type", "tags", "chakra", "spirits", "linked_rituals"]:
-                meta_val = details.get(meta_field)
-                if meta_val is None:
-                    meta_val = details.get("metadata", {}).get(meta_field)
-                if isinstance(meta_val, list):
-                    vals = [v.lower() for v in meta_val] if not case_sensitive else [str(v) for v in meta_val]
-                    if term_query in vals:
-                        current_term_fids.add(fid)
-                elif isinstance(meta_val, str):
-                    check_val = meta_val.lower() if not case_sensitive else meta_val
-                    if term_query in check_val:
-                        current_term_fids.add(fid)
-        if not current_term_fids and search_logic == "AND": return [], f"Term '{term_query}' yields no results with AND logic."
-        term_match_sets.append(current_term_fids)
-
-    if not term_match_sets: return [], "No documents found for any search terms."
-    result_file_ids = set.intersection(*term_match_sets) if search_logic == "AND" else set.union(*term_match_sets)
-    if not result_file_ids: return [], "Tokens/terms found, but no single document satisfies the search logic."
+    positions_map = loaded_index_data["index"].get("positions")
+    if has_positional_syntax(search_phrase) and positions_map is not None:
+        # Phrases and NEAR/k are answered from the stored token offsets; no file is opened.
+        clauses = parse_positional_query(search_phrase, tokenize)
+        if not clauses: return [], "No search terms entered."
+        processed_search_terms = [token for clause in clauses for token in clause.tokens + clause.right_tokens]
+
+        def positions_for(token):
+            fids = index_tokens_map.get(token)
+            return dict(zip(fids, positions_map.get(token) or [])) if fids else {}
+
+        result_file_ids = match_clauses(clauses, positions_for, search_logic)
+        if not result_file_ids: return [], "No document matches the phrase or proximity query."
+        return _collect_search_results(
+            result_file_ids, processed_search_terms, loaded_index_data, indexed_folder_path, rank_results, max_results
+        )
+    if has_positional_syntax(search_phrase):
+        # Built without index_positions: fall back to plain term matching.
+        search_phrase = strip_positional_syntax(search_phrase)
+
+    # AND/OR/NOT and parentheses build an expression; plain words are joined by search_logic.
+    is_expression = has_boolean_syntax(search_phrase)
+    if is_expression:
+        try:
+            query_tree = parse_boolean_query(
+                search_phrase, lambda word: [word] if case_sensitive else [word.lower()], search_logic
+            )
+            processed_search_terms = positive_terms(query_tree)
+        except ValueError as e_query:
+            # Unbalanced parentheses or a dangling operator: search the words as typed
+            log_debug(f"Searching '{search_phrase}' as plain terms: {e_query}")
+            is_expression = False
+    if not is_expression:
+        search_terms_raw = search_phrase.split()
+        processed_search_terms = [term.lower() for term in search_terms_raw] if not case_sensitive else search_terms_raw
+        leaves = tuple(Term(term) for term in processed_search_terms)
+        query_tree = (And(leaves) if search_logic == "AND" else Or(leaves)) if len(leaves) > 1 else (leaves[0] if leaves else None)
+    if query_tree is None: return [], "No search terms entered."
+
+    # Terms are resolved cheapest first; the rest only check the files still in the running.
+    term_source = _PersistentIndexTerms(loaded_index_data, case_sensitive, postings_cache)
+    planner = QueryPlanner(term_source)
+    if term_source.postings_cache is not None and not isinstance(query_tree, Term):
+        # Popular term combinations reuse their file IDs from the query cache.
+        matched_fids = term_source.postings_cache.postings(
+            term_source.cache_scope + (query_tree,), lambda: tuple(planner.evaluate(query_tree)) or None
+        )
+    else:
+        matched_fids = planner.evaluate(query_tree)
+    if not matched_fids:
+        if planner.empty_terms and search_logic == "AND" and not is_expression:
+            return [], f"Term '{planner.empty_terms[0]}' yields no results with AND logic."
+        return [], "Tokens/terms found, but no single document satisfies the search logic."
+    result_file_ids = {str(fid) for fid in matched_fids}
+
+    return _collect_search_results(
+        result_file_ids, processed_search_terms, loaded_index_data, indexed_folder_path, rank_results, max_results
+    )
+
+
+def _collect_search_results(result_file_ids, processed_search_terms, loaded_index_data, indexed_folder_path, rank_results, max_results):
+    """Turn matched file IDs into sorted result tuples, optionally BM25-ranked."""
+    files_id_to_path_map = loaded_index_data["index"]["files"]
+    files_id_to_details_map = loaded_index_data["index"]["file_details"]
+
+    scores = None
+    if rank_results:
+        scores = _bm25_top_scores(processed_search_terms, loaded_index_data, result_file_ids, max_results)
+        result_file_ids = list(scores)
 
     results_with_details = []
     for fid_str in result_file_ids:
         relative_path_str = files_id_to_path_map.get(fid_str)
         details = files_id_to_details_map.get(fid_str, {})
+        if scores is not None:
+            details = dict(details, relevance_score=scores[fid_str])
         if relative_path_str:
             full_path_obj = indexed_folder_path / relative_path_str
             display_filename = details.get("filename", Path(relative_path_str).name)
@@ -1262,7 +1480,47 @@ def search_with_persistent_index(search_phrase, loaded_index_data, case_sensitiv
             results_with_details.append((display_filename, started_at, ended_at, full_path_obj, fid_str, details))
         else: log_debug(f"Warning: File ID {fid_str} in search results but not in files_id_to_path_map.")
     if not results_with_details: return [], "Matched file IDs but could not retrieve file paths/details."
+    if scores is not None:
+        return sorted(results_with_details, key=lambda x: (-x[5]["relevance_score"], x[0].lower())), None
     return sorted(results_with_details, key=lambda x: x[0].lower()), None
+
+
+def _bm25_top_scores(terms, loaded_index_data, candidate_fids, max_results=None):
+    """Return BM25 scores of the best *max_results* of *candidate_fids* (all when unset).
+
+    Each posting list is cut down to the candidates and handed to
+    :func:`top_k`, so only the kept documents are held in a heap rather
+    than every candidate being scored and sorted.
+    """
+    index_section = loaded_index_data["index"]
+    tokens_map = index_section["tokens"]
+    freqs_map = index_section.get("term_freqs", {})
+    details_map = index_section["file_details"]
+    doc_count = len(index_section["files"]) or 1
+    avg_doc_length = loaded_index_data.get("metadata", {}).get("avg_doc_length")
+    if not avg_doc_length:
+        lengths = [d.get("doc_length", 0) for d in details_map.values()]
+        avg_doc_length = sum(lengths) / len(lengths) if lengths else 0
+    candidates = candidate_fids if isinstance(candidate_fids, (set, frozenset)) else set(candidate_fids)
+    k = min(max_results, len(candidates)) if max_results else len(candidates)
+    term_postings = []
+    for term in dict.fromkeys(terms):
+        fids = tokens_map.get(term)
+        if not fids:
+            continue
+        freqs = freqs_map.get(term) or [1] * len(fids)
+        # top_k merges the lists by document ID, so compare IDs as numbers
+        postings = sorted((int(fid), tf) for fid, tf in zip(fids, freqs) if fid in candidates)
+        if postings:
+            doc_ids, tfs = zip(*postings)
+            term_postings.append(TermPostings(doc_ids, tfs, bm25_idf(len(fids), doc_count)))
+    doc_length = lambda doc_id: details_map.get(str(doc_id), {}).get("doc_length", 0)
+    scores = {str(doc_id): score for score, doc_id in top_k(term_postings, k, doc_length, avg_doc_length)}
+    if len(scores) < k:
+        # Matches without any positive term (e.g. via NOT) score zero
+        for fid in sorted(candidates.difference(scores), key=int)[:k - len(scores)]:
+            scores[fid] = 0.0
+    return scores
 # --- MODIFIED: search_with_persistent_index - End of modifications ---
 
 # --- Editor Launch (from your V6.2(timestamp Edition).py, ensure global config is used) ---
@@ -1355,6 +1613,7 @@ class App: # Your original App class structure
         self.num_tokenizers_var = tk.IntVar(value=config.get("num_tokenizers", 2))
         self.num_indexers_var = tk.IntVar(value=config.get("num_indexers", 2))
         self.cpu_usage_percent_var = tk.IntVar(value=config.get("cpu_usage_percent", 100))
+        self.tokenizer_backend_var = tk.StringVar(value=config.get("tokenizer_backend", "thread"))
         self.tagmap_file_var = tk.StringVar(value=config.get("tagmap_file_path", ""))
         self.active_indexing_thread = None
         self.create_main_layout_and_widgets()
@@ -1382,6 +1641,7 @@ class App: # Your original App class structure
         config["num_tokenizers"] = self.num_tokenizers_var.get()
         config["num_indexers"] = self.num_indexers_var.get()
         config["cpu_usage_percent"] = self.cpu_usage_percent_var.get()
+        config["tokenizer_backend"] = self.tokenizer_backend_var.get()
         config["tagmap_file_path"] = self.tagmap_file_var.get()
         if hasattr(self, 'notebook') and self.notebook.winfo_exists():
             try: config["active_tab_text"] = self.notebook.tab(self.notebook.select(), "text")
@@ -1565,7 +1825,10 @@ class App: # Your original App class structure
         tk.Spinbox(perf_frame, from_=10, to=100, increment=10, textvariable=self.cpu_usage_percent_var, width=5, command=self.on_performance_settings_changed_action).grid(row=2, column=1, padx=5, pady=2)
         self.num_tokenizers_var.trace_add("write", lambda *a: self.on_performance_settings_changed_action())
         self.num_indexers_var.trace_add("write", lambda *a: self.on_performance_settings_changed_action())
+        ttk.Label(perf_frame, text="Tokenizer Backend:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(perf_frame, textvariable=self.tokenizer_backend_var, values=["thread", "process"], state="readonly", width=8).grid(row=3, column=1, padx=5, pady=2)
         self.cpu_usage_percent_var.trace_add("write", lambda *a: self.on_performance_settings_changed_action())
+        self.tokenizer_backend_var.trace_add("write", lambda *a: self.on_performance_settings_changed_action())
 
         tagmap_frame = ttk.LabelFrame(parent_tab, text="TagMap", padding="10", style='TLabelframe')
         tagmap_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -1585,6 +1848,7 @@ class App: # Your original App class structure
         config["num_tokenizers"] = self.num_tokenizers_var.get()
         config["num_indexers"] = self.num_indexers_var.get()
         config["cpu_usage_percent"] = self.cpu_usage_percent_var.get()
+        config["tokenizer_backend"] = self.tokenizer_backend_var.get()
         self.update_status_bar("Performance settings updated. Will be saved on exit.")
         log_debug("DEBUG: Performance settings changed in GUI.")
 
@@ -1670,9 +1934,8 @@ class App: # Your original App class structure
                 expected_type_name_for_this_build = self.index_type_options[0] if is_json_index else self.index_type_options[1]
                 existing_idx_to_pass = None
                 if current_selected_type_name_gui == expected_type_name_for_this_build and loaded_search_index:
-                    if not is_json_index:
-                         existing_idx_to_pass = loaded_search_index
-                         log_debug(f"INFO: Passing existing '{current_selected_type_name_gui}' index to _build_generic_index.")
+                    existing_idx_to_pass = loaded_search_index
+                    log_debug(f"INFO: Passing existing '{current_selected_type_name_gui}' index to _build_generic_index.")
 
                 tags_data = (
                     load_json_tagmap(folder_to_index)
@@ -1730,6 +1993,7 @@ class App: # Your original App class structure
         global loaded_search_index, config
         current_selected_type = self.selected_index_type_var.get()
         index_file_to_load = ORIGINAL_JSON_INDEX_FILE if current_selected_type == "Original JSONs (Indexed)" else CONVERTED_FILES_INDEX_FILE
+        index_file_to_load = index_path_for(index_file_to_load, config.get("index_format", "json"))
         loaded_search_index = None
         progress_widget = self.index_progress_text if hasattr(self, 'index_progress_text') else None
         def _log_progress_local(msg):
@@ -1739,13 +2003,12 @@ class App: # Your original App class structure
         if os.path.exists(index_file_to_load):
             try:
                 _log_progress_local(f"Loading {current_selected_type} index ({Path(index_file_to_load).name})...")
-                with open(index_file_to_load, 'r', encoding='utf-8') as f:
-                    loaded_data_from_file = json.load(f)
+                loaded_data_from_file = load_index_file(index_file_to_load)
                 # --- INTEGRATED: More robust validation of loaded index structure ---
                 if isinstance(loaded_data_from_file, dict) and \
                    isinstance(loaded_data_from_file.get("metadata"), dict) and \
                    isinstance(loaded_data_from_file.get("index"), dict) and \
-                   isinstance(loaded_data_from_file["index"].get("tokens"), dict) and \
+                   isinstance(loaded_data_from_file["index"].get("tokens"), Mapping) and \
                    isinstance(loaded_data_from_file["index"].get("files"), dict) and \
                    isinstance(loaded_data_from_file["index"].get("file_details"), dict): # Check for file_details
                     loaded_search_index = loaded_data_from_file
@@ -2320,6 +2583,7 @@ class App: # Your original App class structure
         config["num_tokenizers"] = self.num_tokenizers_var.get()
         config["num_indexers"] = self.num_indexers_var.get()
         config["cpu_usage_percent"] = self.cpu_usage_percent_var.get()
+        config["tokenizer_backend"] = self.tokenizer_backend_var.get()
         self.update_status_bar("Performance settings updated. Will be saved on exit.")
         log_debug("DEBUG: Performance settings changed in GUI.")
 
@@ -2405,9 +2669,8 @@ class App: # Your original App class structure
                 expected_type_name_for_this_build = self.index_type_options[0] if is_json_index else self.index_type_options[1]
                 existing_idx_to_pass = None
                 if current_selected_type_name_gui == expected_type_name_for_this_build and loaded_search_index:
-                    if not is_json_index:
-                         existing_idx_to_pass = loaded_search_index
-                         log_debug(f"INFO: Passing existing '{current_selected_type_name_gui}' index to _build_generic_index.")
+                    existing_idx_to_pass = loaded_search_index
+                    log_debug(f"INFO: Passing existing '{current_selected_type_name_gui}' index to _build_generic_index.")
 
                 tags_data = (
                     load_json_tagmap(folder_to_index)
@@ -2465,6 +2728,7 @@ class App: # Your original App class structure
         global loaded_search_index, config
         current_selected_type = self.selected_index_type_var.get()
         index_file_to_load = ORIGINAL_JSON_INDEX_FILE if current_selected_type == "Original JSONs (Indexed)" else CONVERTED_FILES_INDEX_FILE
+        index_file_to_load = index_path_for(index_file_to_load, config.get("index_format", "json"))
         loaded_search_index = None
         progress_widget = self.index_progress_text if hasattr(self, 'index_progress_text') else None
         def _log_progress_local(msg):
@@ -2474,13 +2738,12 @@ class App: # Your original App class structure
         if os.path.exists(index_file_to_load):
             try:
                 _log_progress_local(f"Loading {current_selected_type} index ({Path(index_file_to_load).name})...")
-                with open(index_file_to_load, 'r', encoding='utf-8') as f:
-                    loaded_data_from_file = json.load(f)
+                loaded_data_from_file = load_index_file(index_file_to_load)
                 # --- INTEGRATED: More robust validation of loaded index structure ---
                 if isinstance(loaded_data_from_file, dict) and \
                    isinstance(loaded_data_from_file.get("metadata"), dict) and \
                    isinstance(loaded_data_from_file.get("index"), dict) and \
-                   isinstance(loaded_data_from_file["index"].get("tokens"), dict) and \
+                   isinstance(loaded_data_from_file["index"].get("tokens"), Mapping) and \
                    isinstance(loaded_data_from_file["index"].get("files"), dict) and \
                    isinstance(loaded_data_from_file["index"].get("file_details"), dict): # Check for file_details
                     loaded_search_index = loaded_data_from_file
@@ -0,0 +1,202 @@
+"""
+Secondary indexes over file names, metadata fields and chat timestamps.
+
+Besides the token postings, ``search_with_persistent_index`` matches a query
+term against each file's name (substring), its ``chat_started_at`` /
+``chat_ended_at`` timestamps (for date and time terms), and the
+``type``/``tags``/``chakra``/``spirits``/``linked_rituals`` metadata fields.
+It used to test every file for every term.  The sections built here turn
+those checks into lookups:
+
+``filename_grams``  character trigram of the lower-cased filename -> file IDs
+``meta_values``     lower-cased list item of a metadata field -> file IDs
+``meta_text``       lower-cased string metadata value -> file IDs
+``chat_times``      ``HH:MM``, ``MM:SS`` and ``HH:MM:SS`` of a timestamp -> file IDs
+``chat_dates``      ``{"keys": sorted timestamps, "fids": aligned file IDs}``
+
+Lookups only produce candidates.  Each candidate is then checked with
+:func:`file_matches_term`, the original per-file rule, so results are the
+same as a full scan.  Filename terms shorter than a trigram still scan every
+filename.
+"""
+
+import heapq
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Mapping, Set
+
+__all__ = [
+    "METADATA_FIELDS",
+    "METADATA_SECTIONS",
+    "build_metadata_index",
+    "update_metadata_index",
+    "file_matches_term",
+    "resolve_metadata_term",
+]
+
+METADATA_FIELDS = ("type", "tags", "chakra", "spirits", "linked_rituals")
+METADATA_SECTIONS = ("filename_grams", "meta_values", "meta_text", "chat_times", "chat_dates")
+GRAM_SIZE = 3
+
+_DATE_OR_TIME = re.compile(r"\d{4}-\d{2}-\d{2}|\d{2}:\d{2}(:\d{2})?")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_CLOCK = re.compile(r"(\d{2}):(\d{2}):(\d{2})")
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _metadata_value(details: Mapping[str, Any], field: str) -> Any:
+    value = details.get(field)
+    if value is None:
+        value = details.get("metadata", {}).get(field)
+    return value
+
+
+def _timestamps(details: Mapping[str, Any]) -> List[str]:
+    return [ts for ts in (details.get("chat_started_at"), details.get("chat_ended_at")) if ts]
+
+
+def file_matches_term(details: Mapping[str, Any], term: str, case_sensitive: bool = False) -> bool:
+    """Return ``True`` if *term* matches the filename, timestamps or metadata in *details*.
+
+    *term* is expected lower-cased already unless *case_sensitive*.
+    """
+    filename = details.get("filename", "")
+    if term in (filename if case_sensitive else filename.lower()):
+        return True
+    if _DATE_OR_TIME.fullmatch(term) and any(term in ts for ts in _timestamps(details)):
+        return True
+    for field in METADATA_FIELDS:
+        value = _metadata_value(details, field)
+        if isinstance(value, list):
+            values = [str(v) for v in value] if case_sensitive else [str(v).lower() for v in value]
+            if term in values:
+                return True
+        elif isinstance(value, str):
+            if term in (value if case_sensitive else value.lower()):
+                return True
+    return False
+
+
+def build_metadata_index(file_details: Mapping[str, Mapping[str, Any]]) -> Dict[str, Any]:
+    """Return the secondary index sections for ``file ID -> details``."""
+    grams: Dict[str, Set[str]] = {}
+    meta_values: Dict[str, Set[str]] = {}
+    meta_text: Dict[str, Set[str]] = {}
+    chat_times: Dict[str, Set[str]] = {}
+    dates: List[tuple] = []
+    for fid, details in file_details.items():
+        for gram in _grams(details.get("filename", "").lower()):
+            grams.setdefault(gram, set()).add(fid)
+        for field in METADATA_FIELDS:
+            value = _metadata_value(details, field)
+            if isinstance(value, list):
+                for item in value:
+                    meta_values.setdefault(str(item).lower(), set()).add(fid)
+            elif isinstance(value, str):
+                meta_text.setdefault(value.lower(), set()).add(fid)
+        for ts in _timestamps(details):
+            dates.append((ts, int(fid)))
+            clock = _CLOCK.search(ts)
+            if clock:
+                hh, mm, ss = clock.groups()
+                for key in (f"{hh}:{mm}", f"{mm}:{ss}", f"{hh}:{mm}:{ss}"):
+                    chat_times.setdefault(key, set()).add(fid)
+    dates.sort()
+
+    def as_postings(mapping: Dict[str, Set[str]]) -> Dict[str, List[str]]:
+        return {key: sorted(fids, key=int) for key, fids in mapping.items()}
+
+    return {
+        "filename_grams": as_postings(grams),
+        "meta_values": as_postings(meta_values),
+        "meta_text": as_postings(meta_text),
+        "chat_times": as_postings(chat_times),
+        "chat_dates": {"keys": [ts for ts, _fid in dates], "fids": [str(fid) for _ts, fid in dates]},
+    }
+
+
+def update_metadata_index(
+    index_section: Mapping[str, Any],
+    old_details: Mapping[str, Mapping[str, Any]],
+    new_details: Mapping[str, Mapping[str, Any]],
+) -> Dict[str, Any]:
+    """Patch the :data:`METADATA_SECTIONS` of *index_section* for changed files.
+
+    *old_details* holds the previous details of every changed or removed
+    file, *new_details* the current details of every changed or added file.
+    Only the keys those files contribute to are rewritten.
+    """
+    changed = set(old_details) | set(new_details)
+    removed = build_metadata_index(old_details)
+    added = build_metadata_index(new_details)
+    patched: Dict[str, Any] = {}
+    for name in METADATA_SECTIONS[:-1]:
+        postings = dict(index_section[name])
+        for key in set(removed[name]) | set(added[name]):
+            fids = [fid for fid in postings.get(key, ()) if fid not in changed]
+            fids.extend(added[name].get(key, ()))
+            if fids:
+                postings[key] = sorted(fids, key=int)
+            else:
+                postings.pop(key, None)
+        patched[name] = postings
+    dates = index_section["chat_dates"]
+    kept = ((ts, int(fid)) for ts, fid in zip(dates["keys"], dates["fids"]) if fid not in changed)
+    new = zip(added["chat_dates"]["keys"], (int(fid) for fid in added["chat_dates"]["fids"]))
+    merged = list(heapq.merge(kept, new))
+    patched["chat_dates"] = {"keys": [ts for ts, _fid in merged], "fids": [str(fid) for _ts, fid in merged]}
+    return patched
+
+
+def _filename_candidates(index_section: Mapping[str, Any], folded: str) -> Iterable[str]:
+    if len(folded) < GRAM_SIZE:
+        return index_section["file_details"].keys()
+    gram_map = index_section["filename_grams"]
+    lists = []
+    for gram in _grams(folded):
+        fids = gram_map.get(gram)
+        if not fids:
+            return ()
+        lists.append(fids)
+    lists.sort(key=len)
+    candidates = set(lists[0])
+    for fids in lists[1:]:
+        candidates.intersection_update(fids)
+        if not candidates:
+            break
+    return candidates
+
+
+def _date_candidates(index_section: Mapping[str, Any], term: str) -> List[str]:
+    dates = index_section["chat_dates"]
+    keys, fids = dates["keys"], dates["fids"]
+    found = []
+    i = bisect_left(keys, term)
+    while i < len(keys) and keys[i].startswith(term):
+        found.append(fids[i])
+        i += 1
+    return found
+
+
+def resolve_metadata_term(index_section: Mapping[str, Any], term: str, case_sensitive: bool = False) -> Set[str]:
+    """Return the file IDs whose filename, timestamps or metadata match *term*.
+
+    Equivalent to testing :func:`file_matches_term` on every file of an index
+    section that carries :data:`METADATA_SECTIONS`.
+    """
+    folded = term.lower()
+    candidates: Set[str] = set(_filename_candidates(index_section, folded))
+    if _DATE.fullmatch(term):
+        candidates.update(_date_candidates(index_section, term))
+    elif _DATE_OR_TIME.fullmatch(term):
+        candidates.update(index_section["chat_times"].get(term, ()))
+    candidates.update(index_section["meta_values"].get(folded, ()))
+    meta_text = index_section["meta_text"]
+    for value in meta_text:
+        if folded in value:
+            candidates.update(meta_text[value])
+    details_map = index_section["file_details"]
+    return {fid for fid in candidates if file_matches_term(details_map.get(fid, {}), term, case_sensitive)}
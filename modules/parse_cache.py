@@ -0,0 +1,336 @@
+"""
+On-disk cache of parsed source files with an in-memory LRU front.
+
+Indexing, both export paths and dataset builds all parse the same ChatGPT
+JSON files, and each tool invocation used to parse every file from scratch.
+:class:`ParseCache` stores each parser's normalized output once per file
+version.  Entries are keyed by parser namespace, absolute path and a hash
+of the parser options that affect the output.  They are valid only while
+the file's mtime and size are unchanged, so an edited file is parsed again
+on next use.
+
+Each entry is one file in the cache directory::
+
+    MAGIC (4 bytes) | version u8 | mtime_ns u64 | size u64 | payload length u32
+    payload: zlib-compressed JSON of the encoded value
+
+The parser supplies ``encode``/``decode`` to turn its value into JSON and
+back.  The in-memory LRU holds those encoded bytes, not the decoded value,
+so every caller gets its own copy to mutate.  It is bounded by entry count
+and total bytes.  Writes go through a temporary file and ``os.replace``, so
+several worker processes can share one cache directory.
+
+The disk cache is on by default, in ``~/.cache/phoenix_codex/parse_cache``;
+set ``PHOENIX_PARSE_CACHE_DIR`` to move it, or to an empty string to keep
+the cache in memory only.  Entries hold whole parsed chats (inline images
+included), so the directory is capped at ``max_disk_bytes`` (512 MB, or
+``PHOENIX_PARSE_CACHE_MAX_MB``).  Past the cap the least recently used
+entries (oldest mtime; hits refresh it) are deleted until the directory is
+back under 90% of the budget.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple, TypeVar
+
+from . import json_io
+
+__all__ = [
+    "CACHE_DIR_ENV",
+    "CACHE_MAX_MB_ENV",
+    "ParseCache",
+    "config_hash",
+    "get_parse_cache",
+    "set_parse_cache",
+]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CACHE_DIR_ENV = "PHOENIX_PARSE_CACHE_DIR"
+CACHE_MAX_MB_ENV = "PHOENIX_PARSE_CACHE_MAX_MB"
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 1
+_MAGIC = b"PXPC"
+_HEADER = struct.Struct("<4sBQQI")
+
+
+def _identity(value):
+    return value
+
+
+def config_hash(config: Optional[Mapping[str, Any]]) -> str:
+    """Return a short, stable hash of the parser options in *config*."""
+    encoded = json.dumps(config or {}, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def _default_cache_dir() -> Optional[Path]:
+    configured = os.environ.get(CACHE_DIR_ENV)
+    if configured is not None:
+        return Path(configured) if configured else None
+    return Path.home() / ".cache" / "phoenix_codex" / "parse_cache"
+
+
+def _default_max_disk_bytes() -> int:
+    configured = os.environ.get(CACHE_MAX_MB_ENV)
+    if configured:
+        try:
+            return int(float(configured) * 1024 * 1024)
+        except ValueError:
+            logger.warning(f"Ignoring invalid {CACHE_MAX_MB_ENV}={configured!r}")
+    return DEFAULT_MAX_DISK_BYTES
+
+
+class ParseCache:
+    """Parse results keyed by (namespace, path, options), valid while the file is unchanged."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        # Bytes of cache files on disk, counted on the first write
+        self._disk_bytes: Optional[int] = None
+        # key -> (mtime_ns, size, uncompressed payload)
+        self._memory: "OrderedDict[Tuple[str, str, str], Tuple[int, int, bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "disk_evictions": 0}
+
+    def get_or_parse(
+        self,
+        path: str | Path,
+        namespace: str,
+        parse: Callable[[Path], T],
+        config: Optional[Mapping[str, Any]] = None,
+        encode: Callable[[T], Any] = _identity,
+        decode: Callable[[Any], T] = _identity,
+        should_store: Callable[[T], bool] = lambda value: True,
+    ) -> T:
+        """Return the cached result of ``parse(path)``, parsing only if the file changed.
+
+        *config* holds the options that change *parse*'s output.  Results
+        for which *should_store* is false (e.g. read errors) are returned but
+        not cached.
+        """
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return parse(path)  # let the parser report the missing file
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = (namespace, os.path.abspath(path), config_hash(config))
+
+        payload = self._memory_get(key, version)
+        if payload is not None:
+            self._count("memory_hits")
+            return decode(json_io.loads(payload))
+
+        payload = self._disk_get(key, version)
+        if payload is not None:
+            self._count("disk_hits")
+            self._memory_put(key, version, payload)
+            return decode(json_io.loads(payload))
+
+        self._count("misses")
+        value = parse(path)
+        if should_store(value):
+            try:
+                payload = json_io.dumps(encode(value))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Cannot cache {namespace} result for {path}: {e}")
+                return value
+            self._memory_put(key, version, payload)
+            self._disk_put(key, version, payload)
+        return value
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _memory_get(self, key, version) -> Optional[bytes]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[:2] != version:
+                self._memory_bytes -= len(entry[2])
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[2]
+
+    def _memory_put(self, key, version, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old[2])
+            self._memory[key] = (version[0], version[1], payload)
+            self._memory_bytes += len(payload)
+            while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted[2])
+
+    def _entry_path(self, key) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.ppc"
+
+    def _disk_get(self, key, version) -> Optional[bytes]:
+        entry_path = self._entry_path(key)
+        if entry_path is None:
+            return None
+        try:
+            with open(entry_path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return None
+                magic, cache_version, mtime_ns, size, length = _HEADER.unpack(header)
+                if magic != _MAGIC or cache_version != CACHE_VERSION or (mtime_ns, size) != version:
+                    return None
+                payload = zlib.decompress(f.read(length))
+            try:
+                os.utime(entry_path)  # keep recently used entries out of eviction
+            except OSError:
+                pass
+            return payload
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error) as e:
+            logger.warning(f"Ignoring unreadable parse cache entry {entry_path}: {e}")
+            return None
+
+    def _disk_put(self, key, version, payload: bytes) -> None:
+        entry_path = self._entry_path(key)
+        if entry_path is None:
+            return
+        compressed = zlib.compress(payload, 6)
+        entry_size = _HEADER.size + len(compressed)
+        if entry_size > self.max_disk_bytes:
+            return
+        try:
+            replaced = entry_path.stat().st_size
+        except OSError:
+            replaced = 0
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=entry_path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, CACHE_VERSION, version[0], version[1], len(compressed)))
+                    f.write(compressed)
+                os.replace(tmp, entry_path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._count("writes")
+        except OSError as e:
+            logger.warning(f"Could not write parse cache entry {entry_path}: {e}")
+            return
+        with self._lock:
+            counted = self._disk_bytes is not None
+            if counted:
+                self._disk_bytes += entry_size - replaced
+        if not counted:
+            usage = sum(size for _mtime, size, _path in self._disk_entries())
+            with self._lock:
+                self._disk_bytes = usage
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        """Return ``(mtime, size, path)`` for every cache file on disk."""
+        entries = []
+        for entry_path in self.cache_dir.glob("*/*.ppc"):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue  # removed by another process
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return entries
+
+    def _evict_disk(self) -> None:
+        """Delete the least recently used cache files until under 90% of the disk budget."""
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[0])
+        total = sum(size for _mtime, size, _path in entries)
+        target = self.max_disk_bytes * 9 // 10
+        evicted = 0
+        for _mtime, size, entry_path in entries:
+            if total <= target:
+                break
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            # Other processes may share the directory, so re-base on what is there
+            self._disk_bytes = total
+            self.stats["disk_evictions"] += evicted
+
+    def clear(self, disk: bool = False) -> None:
+        """Drop the in-memory entries, and with *disk* every cache file too."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if disk and self.cache_dir is not None and self.cache_dir.exists():
+            for entry_path in self.cache_dir.glob("*/*.ppc"):
+                try:
+                    entry_path.unlink()
+                except OSError:
+                    pass
+            with self._lock:
+                self._disk_bytes = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "cache_dir": str(self.cache_dir) if self.cache_dir is not None else None,
+            }
+
+
+_parse_cache: Optional[ParseCache] = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """Return the process-wide parse cache."""
+    global _parse_cache
+    with _parse_cache_lock:
+        if _parse_cache is None:
+            _parse_cache = ParseCache(_default_cache_dir(), max_disk_bytes=_default_max_disk_bytes())
+        return _parse_cache
+
+
+def set_parse_cache(cache: Optional[ParseCache]) -> None:
+    """Replace the process-wide parse cache (``None`` recreates the default)."""
+    global _parse_cache
+    with _parse_cache_lock:
+        _parse_cache = cache
@@ -25,6 +25,8 @@ import os
 from functools import wraps, lru_cache
 from collections import defaultdict, OrderedDict
 
+from .query_cache import QueryCache
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -62,6 +64,8 @@ class OptimizationConfig:
     # Caching
     enable_search_cache: bool = True
     search_cache_size: int = 1000
+    search_cache_max_mb: int = 64
+    postings_cache_min_requests: int = 2  # cache a term's file IDs from its Nth lookup on
     enable_file_cache: bool = True
     file_cache_size: int = 100
     
@@ -182,51 +186,6 @@ class FileSizeManager:
             logger.error(f"Error reading file {file_path}: {e}")
             return ""
 
-class SearchCache:
-    """Provides caching for search results to improve performance."""
-    
-    def __init__(self, max_size: int = 1000):
-        self.max_size = max_size
-        self.cache: OrderedDict[str, Any] = OrderedDict()
-        self._lock = threading.Lock()
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Get a cached result."""
-        with self._lock:
-            if key in self.cache:
-                # Move to end (most recently used)
-                self.cache.move_to_end(key)
-                return self.cache[key]
-            return None
-    
-    def set(self, key: str, value: Any):
-        """Set a cached result."""
-        with self._lock:
-            if key in self.cache:
-                # Update existing
-                self.cache.move_to_end(key)
-                self.cache[key] = value
-            else:
-                # Add new
-                self.cache[key] = value
-                if len(self.cache) > self.max_size:
-                    # Remove least recently used
-                    self.cache.popitem(last=False)
-    
-    def clear(self):
-        """Clear the cache."""
-        with self._lock:
-            self.cache.clear()
-    
-    def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics."""
-        with self._lock:
-            return {
-                'size': len(self.cache),
-                'max_size': self.max_size,
-                'keys': list(self.cache.keys())
-            }
-
 class FileCache:
     """Provides caching for file content to avoid repeated disk reads."""
     
@@ -344,7 +303,11 @@ class PerformanceOptimizer:
         self.config = config or OptimizationConfig()
         self.memory_manager = MemoryManager(self.config)
         self.file_size_manager = FileSizeManager(self.config)
-        self.search_cache = SearchCache(self.config.search_cache_size) if self.config.enable_search_cache else None
+        self.search_cache = QueryCache(
+            self.config.search_cache_max_mb * 1024 * 1024,
+            self.config.search_cache_size,
+            self.config.postings_cache_min_requests,
+        ) if self.config.enable_search_cache else None
         self.file_cache = FileCache(self.config.file_cache_size) if self.config.enable_file_cache else None
         self.performance_monitor = PerformanceMonitor(self.config)
         
@@ -414,18 +377,16 @@ class PerformanceOptimizer:
         
         return content
     
-    def get_cached_search(self, query: str, index_path: str) -> Optional[Any]:
-        """Get cached search result."""
-        if self.search_cache:
-            cache_key = f"{query}:{index_path}"
-            return self.search_cache.get(cache_key)
+    def get_cached_search(self, query: str, generation: Optional[str], **options) -> Optional[Any]:
+        """Get the cached result of *query* with *options* on index *generation*."""
+        if self.search_cache and generation:
+            return self.search_cache.get(QueryCache.make_key(query, generation, **options))
         return None
     
-    def cache_search_result(self, query: str, index_path: str, result: Any):
-        """Cache search result."""
-        if self.search_cache:
-            cache_key = f"{query}:{index_path}"
-            self.search_cache.set(cache_key, result)
+    def cache_search_result(self, query: str, generation: Optional[str], result: Any, **options):
+        """Cache the result of *query* with *options* on index *generation*."""
+        if self.search_cache and generation:
+            self.search_cache.set(QueryCache.make_key(query, generation, **options), result)
     
     def log_memory_usage(self, context: str = ""):
         """Log current memory usage."""
@@ -0,0 +1,177 @@
+"""
+Phrase and proximity matching over positional postings.
+
+Indexes built with positions store, for every token, the token offsets of
+each occurrence in each file.  This module answers ``"exact phrase"`` and
+``word NEAR/k word`` queries from those offsets alone.  Files are only
+opened afterwards, to render snippets for the results that are shown.
+
+Query syntax understood by :func:`parse_positional_query`::
+
+    "exact phrase"            tokens must be adjacent and in order
+    amanda NEAR/5 ritual      at most 5 tokens between the two sides
+    "white rose" NEAR/3 moon  either side may be a quoted phrase
+    other words               plain token membership
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Set
+
+__all__ = [
+    "PositionalClause",
+    "has_positional_syntax",
+    "parse_positional_query",
+    "strip_positional_syntax",
+    "snippet_phrases",
+    "phrase_starts",
+    "within_distance",
+    "match_clauses",
+]
+
+_QUERY_ITEM = re.compile(r'"([^"]*)"|(\S+)')
+_NEAR = re.compile(r"NEAR/(\d+)$")
+
+PositionsLookup = Callable[[str], Mapping[Hashable, Sequence[int]]]
+
+
+@dataclass
+class PositionalClause:
+    """One condition of a positional query."""
+    kind: str  # "term", "phrase" or "near"
+    tokens: List[str]
+    right_tokens: List[str] = field(default_factory=list)
+    distance: int = 0
+
+
+def has_positional_syntax(query: str) -> bool:
+    """Return ``True`` if *query* uses quotes or ``NEAR/k``."""
+    return '"' in query or any(_NEAR.match(word) for word in query.split())
+
+
+def strip_positional_syntax(query: str) -> str:
+    """Drop quotes and ``NEAR/k`` operators, leaving plain search terms."""
+    return " ".join(word for word in query.replace('"', " ").split() if not _NEAR.match(word))
+
+
+def snippet_phrases(query: str) -> List[str]:
+    """Return the quoted phrases and remaining words of *query* for snippet extraction."""
+    phrases = []
+    for quoted, word in _QUERY_ITEM.findall(query):
+        text = (quoted or word).strip()
+        if text and not _NEAR.match(text):
+            phrases.append(text)
+    return phrases
+
+
+def parse_positional_query(query: str, tokenize: Callable[[str], List[str]]) -> List[PositionalClause]:
+    """Split *query* into term, phrase and NEAR clauses."""
+    items = []
+    for match in _QUERY_ITEM.finditer(query):
+        quoted, word = match.groups()
+        if word is not None and _NEAR.match(word):
+            items.append(("near", int(_NEAR.match(word).group(1))))
+        elif quoted is not None:
+            items.append(("phrase", quoted))
+        else:
+            items.append(("term", word))
+
+    clauses: List[PositionalClause] = []
+    i = 0
+    while i < len(items):
+        kind, value = items[i]
+        if kind == "near":
+            # A dangling NEAR/k has no left or right side; ignore it.
+            i += 1
+            continue
+        if i + 2 < len(items) and items[i + 1][0] == "near" and items[i + 2][0] != "near":
+            clauses.append(PositionalClause("near", tokenize(value), tokenize(items[i + 2][1]), items[i + 1][1]))
+            i += 3
+            continue
+        tokens = tokenize(value)
+        if tokens:
+            clause_kind = "phrase" if kind == "phrase" or len(tokens) > 1 else "term"
+            clauses.append(PositionalClause(clause_kind, tokens))
+        i += 1
+    return [c for c in clauses if c.tokens and (c.kind != "near" or c.right_tokens)]
+
+
+def phrase_starts(position_lists: Sequence[Sequence[int]]) -> List[int]:
+    """Return the offsets where the tokens of ``position_lists`` occur consecutively."""
+    if not position_lists:
+        return []
+    starts = set(position_lists[0])
+    for shift, offsets in enumerate(position_lists[1:], 1):
+        starts &= {offset - shift for offset in offsets}
+        if not starts:
+            break
+    return sorted(starts)
+
+
+def within_distance(left: Sequence[int], left_len: int, right: Sequence[int], right_len: int, distance: int) -> bool:
+    """Return ``True`` if any left/right occurrence has at most *distance* tokens between them."""
+    i = j = 0
+    while i < len(left) and j < len(right):
+        a, b = left[i], right[j]
+        if a <= b:
+            if b - (a + left_len - 1) - 1 <= distance:
+                return True
+            i += 1
+        else:
+            if a - (b + right_len - 1) - 1 <= distance:
+                return True
+            j += 1
+    return False
+
+
+def _phrase_occurrences(tokens: List[str], positions: PositionsLookup) -> Dict[Hashable, List[int]]:
+    """Return ``doc -> start offsets`` of the phrase *tokens*."""
+    maps = [positions(token) for token in tokens]
+    if not maps or any(not m for m in maps):
+        return {}
+    smallest = min(maps, key=len)
+    occurrences: Dict[Hashable, List[int]] = {}
+    for doc in smallest:
+        if all(doc in m for m in maps):
+            starts = phrase_starts([m[doc] for m in maps])
+            if starts:
+                occurrences[doc] = starts
+    return occurrences
+
+
+def _clause_docs(clause: PositionalClause, positions: PositionsLookup) -> Set[Hashable]:
+    if clause.kind == "term":
+        return set(positions(clause.tokens[0]))
+    if clause.kind == "phrase":
+        return set(_phrase_occurrences(clause.tokens, positions))
+    left = _phrase_occurrences(clause.tokens, positions)
+    right = _phrase_occurrences(clause.right_tokens, positions)
+    return {
+        doc for doc in left.keys() & right.keys()
+        if within_distance(left[doc], len(clause.tokens), right[doc], len(clause.right_tokens), clause.distance)
+    }
+
+
+def match_clauses(
+    clauses: Iterable[PositionalClause],
+    positions: PositionsLookup,
+    search_logic: str = "AND",
+    candidates: Optional[Set[Hashable]] = None,
+) -> Set[Hashable]:
+    """Return the documents satisfying *clauses* combined with AND or OR.
+
+    *positions* maps a token to ``doc -> sorted offsets``.
+    """
+    result: Optional[Set[Hashable]] = None
+    for clause in clauses:
+        docs = _clause_docs(clause, positions)
+        if result is None:
+            result = docs
+        elif search_logic == "AND":
+            result &= docs
+        else:
+            result |= docs
+        if search_logic == "AND" and not result:
+            break
+    result = result or set()
+    return result & candidates if candidates is not None else result
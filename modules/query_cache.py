@@ -0,0 +1,192 @@
+"""
+Query result cache keyed on index generation and search options.
+
+Search results used to be cached under ``"<query>:<folder>"``.  Two searches
+that differed only in options (case, AND/OR, semantic, context lines) shared
+an entry, and nothing noticed when the index was rebuilt.  Keys are now
+``(generation, normalized query, sorted options)``.  The generation is a
+random ID that the index builder writes into the index metadata on every
+build, so a rebuilt index never sees results cached for its predecessor.
+
+The cache is bounded by an estimate of the bytes its values hold rather than
+by entry count; one query can return thousands of snippets while another
+returns none.  Least recently used entries are evicted first.
+
+Besides whole results, :meth:`QueryCache.postings` caches intermediate file-ID
+sets (the files a term resolves to, or the intersection for a term set).
+These are only stored once a key has been requested ``popular_after`` times,
+so one-off terms do not push useful entries out.
+"""
+
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import PurePath
+from typing import Any, Callable, Collection, Dict, Hashable, Mapping, Optional, Tuple
+
+from .positional import _NEAR
+from .query_planner import OPERATORS
+
+__all__ = [
+    "QueryCache",
+    "estimate_size",
+    "index_generation",
+    "new_generation_id",
+    "normalize_query",
+]
+
+_MAX_TRACKED_KEYS = 10000
+
+
+def new_generation_id() -> str:
+    """Return a fresh index generation ID."""
+    return uuid.uuid4().hex
+
+
+def index_generation(loaded_index: Mapping[str, Any]) -> Optional[str]:
+    """Return the generation of a loaded index, or ``None`` if it has none.
+
+    Indexes written before generations existed fall back to ``created_at``,
+    which also changes on every build.
+    """
+    metadata = loaded_index.get("metadata") or {}
+    return metadata.get("generation") or metadata.get("created_at") or None
+
+
+def normalize_query(query: str, case_sensitive: bool = False) -> str:
+    """Collapse whitespace and, for case-insensitive searches, case.
+
+    ``AND``/``OR``/``NOT`` and ``NEAR/k`` operators keep their case because
+    lower-case ``or`` or ``near/5`` is a plain search term.
+    """
+    words = query.split()
+    if not case_sensitive:
+        words = [word if word in OPERATORS or _NEAR.match(word) else word.lower() for word in words]
+    return " ".join(words)
+
+
+def estimate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """Roughly estimate the bytes held by *value* and everything it contains."""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, PurePath):
+        return size + sys.getsizeof(str(value))
+    if isinstance(value, Mapping):
+        return size + sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, _seen) for item in value)
+    return size
+
+
+class QueryCache:
+    """LRU cache of query results bounded by estimated size in bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 1000, popular_after: int = 2):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.popular_after = popular_after
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._requests: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.postings_hits = 0
+        self.postings_misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, generation: str, **options: Any) -> Tuple:
+        """Return the cache key for *query* with *options* on index *generation*."""
+        case_sensitive = bool(options.get("case_sensitive", False))
+        return ("result", generation, normalize_query(query, case_sensitive), tuple(sorted(options.items())))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for *key*, or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        """Cache *value* under *key*; values larger than the whole cache are not stored."""
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            self._store(key, value, size)
+
+    def postings(self, key: Hashable, compute: Callable[[], Optional[Collection]]) -> Optional[Collection]:
+        """Return the file IDs for *key*, computing them with *compute* on a miss.
+
+        *compute* must return an immutable collection (a sorted tuple or a
+        frozenset); it is cached as is once *key* has been requested
+        ``popular_after`` times.  ``None`` (no answer worth keeping) is
+        returned but never cached.
+        """
+        key = ("postings", key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.postings_hits += 1
+                return entry[0]
+            self.postings_misses += 1
+            requests = self._requests.pop(key, 0) + 1
+            self._requests[key] = requests
+            if len(self._requests) > _MAX_TRACKED_KEYS:
+                self._requests.popitem(last=False)
+        fids = compute()
+        if fids is None:
+            return None
+        if requests >= self.popular_after:
+            with self._lock:
+                self._requests.pop(key, None)
+                self._store(key, fids, estimate_size(fids))
+        return fids
+
+    def _store(self, key: Hashable, value: Any, size: int) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._requests.clear()
+            self.bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "postings_hits": self.postings_hits,
+                "postings_misses": self.postings_misses,
+                "evictions": self.evictions,
+            }
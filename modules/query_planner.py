@@ -0,0 +1,278 @@
+"""
+Cost-based planning of boolean search queries.
+
+Queries are parsed into a small expression tree of terms combined with
+``AND``, ``OR`` and ``NOT`` (upper-case operators, parentheses for grouping;
+plain juxtaposition uses the search's default logic).  :class:`QueryPlanner`
+evaluates the tree over sorted posting lists:
+
+* the operands of an ``AND`` are evaluated cheapest first, using document
+  frequency as the cost, and every operand after the first only looks at the
+  files that are still candidates;
+* when the candidates are far fewer than the documents resolving a term
+  would touch, they are checked one by one (:meth:`TermSource.restrict`)
+  instead;
+* sorted lists are intersected with galloping search, and evaluation stops
+  as soon as the running result is empty.
+
+Where postings come from is up to a :class:`TermSource`; the legacy index
+and the segmented advanced index each provide one.
+"""
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+__all__ = [
+    "And",
+    "Not",
+    "Or",
+    "QueryPlanner",
+    "Term",
+    "TermSource",
+    "gallop_left",
+    "has_boolean_syntax",
+    "intersect_sorted",
+    "parse_boolean_query",
+    "positive_terms",
+]
+
+OPERATORS = ("AND", "OR", "NOT")
+# Terms costing this many times the candidate count are checked per candidate.
+RESTRICT_RATIO = 8
+
+_LEXEME = re.compile(r"\(|\)|[^\s()]+")
+
+
+@dataclass(frozen=True)
+class Term:
+    text: str
+
+
+@dataclass(frozen=True)
+class And:
+    children: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    children: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    child: "Node"
+
+
+Node = Union[Term, And, Or, Not]
+
+
+def has_boolean_syntax(query: str) -> bool:
+    """Return ``True`` if *query* uses ``AND``/``OR``/``NOT`` or standalone parentheses.
+
+    Parentheses glued to a word (``smile :)``, ``notes(1)``) are part of the
+    term, so such queries stay plain unless they also use an operator.
+    """
+    return any(word in OPERATORS or word in ("(", ")") for word in query.split())
+
+
+def parse_boolean_query(
+    query: str,
+    split_word: Callable[[str], List[str]],
+    default_operator: str = "AND",
+) -> Optional[Node]:
+    """Parse *query* into an expression tree, or ``None`` if it has no terms.
+
+    *split_word* turns one query word into its search terms (several terms
+    from one word are ANDed).  ``NOT`` binds tightest, then ``AND``, then
+    ``OR``; juxtaposed operands are combined with *default_operator*, except
+    that ``a NOT b`` always reads as ``a AND NOT b``.
+    Raises ``ValueError`` for unbalanced parentheses or dangling operators.
+    """
+    lexemes = _LEXEME.findall(query)
+    pos = 0
+
+    def peek() -> Optional[str]:
+        return lexemes[pos] if pos < len(lexemes) else None
+
+    def starts_operand(lexeme: Optional[str]) -> bool:
+        return lexeme is not None and lexeme not in (")", "AND", "OR")
+
+    def juxtaposed(operator: str) -> bool:
+        # "a NOT b" always means "a AND NOT b"
+        lexeme = peek()
+        if lexeme == "NOT":
+            return operator == "AND"
+        return default_operator == operator and starts_operand(lexeme)
+
+    def parse_binary(operator: str, parse_operand, node_type):
+        nonlocal pos
+        operands = [parse_operand()]
+        while True:
+            if peek() == operator:
+                pos += 1
+            elif not juxtaposed(operator):
+                break
+            operands.append(parse_operand())
+        operands = [operand for operand in operands if operand is not None]
+        if not operands:
+            return None
+        return operands[0] if len(operands) == 1 else node_type(tuple(operands))
+
+    def parse_or():
+        return parse_binary("OR", parse_and, Or)
+
+    def parse_and():
+        return parse_binary("AND", parse_unary, And)
+
+    def parse_unary():
+        nonlocal pos
+        lexeme = peek()
+        if not starts_operand(lexeme):
+            raise ValueError(f"expected a term or '(' but found {lexeme or 'end of query'!r}")
+        pos += 1
+        if lexeme == "NOT":
+            child = parse_unary()
+            return Not(child) if child is not None else None
+        if lexeme == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError("missing ')'")
+            pos += 1
+            return node
+        terms = [Term(text) for text in split_word(lexeme)]
+        if not terms:
+            return None
+        return terms[0] if len(terms) == 1 else And(tuple(terms))
+
+    if not lexemes:
+        return None
+    node = parse_or()
+    if pos != len(lexemes):
+        raise ValueError(f"unexpected {lexemes[pos]!r}")
+    return node
+
+
+def positive_terms(node: Optional[Node]) -> List[str]:
+    """Return the terms of *node* that are not negated, in query order."""
+    if node is None or isinstance(node, Not):
+        return []
+    if isinstance(node, Term):
+        return [node.text]
+    return [text for child in node.children for text in positive_terms(child)]
+
+
+def gallop_left(seq: Sequence, x, lo: int = 0) -> int:
+    """``bisect_left(seq, x, lo)`` that probes 1, 2, 4, ... ahead of *lo* first.
+
+    Cheaper than a full binary search when *x* is close to *lo*, which is
+    the common case when walking two sorted lists together.
+    """
+    n = len(seq)
+    bound = 1
+    while lo + bound < n and seq[lo + bound] < x:
+        bound *= 2
+    return bisect_left(seq, x, lo + bound // 2, min(lo + bound + 1, n))
+
+
+def intersect_sorted(a: Sequence, b: Sequence) -> List:
+    """Intersect two sorted, duplicate-free sequences."""
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    lo, n = 0, len(b)
+    for x in a:
+        lo = gallop_left(b, x, lo)
+        if lo == n:
+            break
+        if b[lo] == x:
+            result.append(x)
+            lo += 1
+    return result
+
+
+class TermSource:
+    """Supplies posting lists (sorted, comparable doc IDs) for leaf terms."""
+
+    def estimate(self, term: str) -> int:
+        """Return the expected number of documents matching *term*."""
+        raise NotImplementedError
+
+    def resolve_cost(self, term: str) -> int:
+        """Return the work :meth:`postings` does for *term*, in documents touched."""
+        return self.estimate(term)
+
+    def postings(self, term: str) -> Sequence:
+        """Return every document matching *term*, sorted."""
+        raise NotImplementedError
+
+    def restrict(self, term: str, candidates: Sequence) -> List:
+        """Return the *candidates* (sorted) that match *term*."""
+        return intersect_sorted(candidates, self.postings(term))
+
+    def universe(self) -> Sequence:
+        """Return every document, sorted (only needed for ``NOT``)."""
+        raise NotImplementedError
+
+
+class QueryPlanner:
+    """Evaluate expression trees against a :class:`TermSource`."""
+
+    def __init__(self, source: TermSource):
+        self.source = source
+        # Terms whose complete posting list turned out empty
+        self.empty_terms: List[str] = []
+
+    def cost(self, node: Node) -> int:
+        if isinstance(node, Term):
+            return self.source.estimate(node.text)
+        if isinstance(node, And):
+            positives = [self.cost(child) for child in node.children if not isinstance(child, Not)]
+            return min(positives) if positives else len(self.source.universe())
+        if isinstance(node, Or):
+            return sum(self.cost(child) for child in node.children)
+        return len(self.source.universe()) - self.cost(node.child)
+
+    def evaluate(self, node: Node, candidates: Optional[Sequence] = None) -> List:
+        """Return the sorted documents matching *node*, within *candidates* if given."""
+        if isinstance(node, Term):
+            return self._term(node.text, candidates)
+        if isinstance(node, And):
+            positives = sorted((c for c in node.children if not isinstance(c, Not)), key=self.cost)
+            negatives = sorted((c.child for c in node.children if isinstance(c, Not)), key=self.cost)
+            result = candidates
+            for child in positives:
+                result = self.evaluate(child, result)
+                if not result:
+                    return []
+            if result is None:
+                result = list(self.source.universe())
+            for child in negatives:
+                if not result:
+                    break
+                result = _difference(result, self.evaluate(child, result))
+            return list(result)
+        if isinstance(node, Or):
+            matched = set()
+            for child in sorted(node.children, key=self.cost):
+                matched.update(self.evaluate(child, candidates))
+                if candidates is not None and len(matched) == len(candidates):
+                    break  # every candidate already matches
+            return sorted(matched)
+        base = list(self.source.universe()) if candidates is None else candidates
+        return _difference(base, self.evaluate(node.child, base))
+
+    def _term(self, term: str, candidates: Optional[Sequence]) -> List:
+        if candidates is not None and len(candidates) * RESTRICT_RATIO < self.source.resolve_cost(term):
+            return self.source.restrict(term, candidates)
+        postings = self.source.postings(term)
+        if not postings:
+            self.empty_terms.append(term)
+            return []
+        return list(postings) if candidates is None else intersect_sorted(candidates, postings)
+
+
+def _difference(a: Sequence, b: Iterable) -> List:
+    excluded = set(b)
+    return [x for x in a if x not in excluded]
@@ -0,0 +1,177 @@
+"""
+Okapi BM25 ranking over the persistent indexes.
+
+Both indexes store, next to each posting list, the term frequency of the
+token in every file, and record each file's length in tokens.  That is enough
+to score a file with BM25 without opening it.
+
+:func:`top_k` returns the best ``k`` documents for a query.  For OR queries
+it uses MaxScore pruning.  Query terms are ordered by their score upper bound,
+and terms whose combined bound cannot lift a document above the current k-th
+best score stop driving candidate generation.  They are only probed for
+documents that are already promising.  AND queries walk the rarest term's
+postings and probe the others with galloping search.  In both cases a size-``k`` heap replaces
+materializing and sorting the full match set.
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from .query_planner import gallop_left
+
+__all__ = [
+    "DEFAULT_K1",
+    "DEFAULT_B",
+    "TermPostings",
+    "bm25_idf",
+    "bm25_term_score",
+    "score_documents",
+    "top_k",
+]
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+
+@dataclass
+class TermPostings:
+    """Sorted document IDs of one query term and the term frequency in each."""
+    doc_ids: Sequence[Hashable]
+    freqs: Sequence[int]
+    idf: float
+
+
+def bm25_idf(doc_freq: int, doc_count: int) -> float:
+    """Return the (always positive) BM25 inverse document frequency."""
+    return math.log(1.0 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def bm25_term_score(
+    tf: int,
+    doc_length: float,
+    avg_doc_length: float,
+    idf: float,
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+) -> float:
+    """Return the BM25 contribution of one term to one document."""
+    if avg_doc_length > 0 and doc_length > 0:
+        norm = k1 * (1.0 - b + b * doc_length / avg_doc_length)
+    else:
+        norm = k1
+    return idf * tf * (k1 + 1.0) / (tf + norm)
+
+
+def score_documents(
+    terms: Iterable[TermPostings],
+    doc_length: Callable[[Hashable], float],
+    avg_doc_length: float,
+    candidates: Optional[Iterable[Hashable]] = None,
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+) -> Dict[Hashable, float]:
+    """Return BM25 scores for every document in *terms*, or only for *candidates*."""
+    wanted = set(candidates) if candidates is not None else None
+    scores: Dict[Hashable, float] = {}
+    for term in terms:
+        for doc, tf in zip(term.doc_ids, term.freqs):
+            if wanted is not None and doc not in wanted:
+                continue
+            scores[doc] = scores.get(doc, 0.0) + bm25_term_score(
+                tf, doc_length(doc), avg_doc_length, term.idf, k1, b
+            )
+    if wanted is not None:
+        for doc in wanted:
+            scores.setdefault(doc, 0.0)
+    return scores
+
+
+def top_k(
+    terms: Sequence[TermPostings],
+    k: int,
+    doc_length: Callable[[Hashable], float],
+    avg_doc_length: float,
+    require_all: bool = False,
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+) -> List[Tuple[float, Hashable]]:
+    """Return up to *k* ``(score, doc_id)`` pairs, best first.
+
+    *require_all* gives AND semantics: only documents containing every term
+    are ranked.
+    """
+    if k <= 0 or not terms:
+        return []
+
+    def term_score(term: TermPostings, i: int, doc) -> float:
+        return bm25_term_score(term.freqs[i], doc_length(doc), avg_doc_length, term.idf, k1, b)
+
+    heap: List[Tuple[float, Hashable]] = []
+
+    def offer(score: float, doc) -> None:
+        if len(heap) < k:
+            heapq.heappush(heap, (score, doc))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, doc))
+
+    if require_all:
+        if any(not term.doc_ids for term in terms):
+            return []
+        ordered = sorted(terms, key=lambda term: len(term.doc_ids))
+        driver, others = ordered[0], ordered[1:]
+        cursors = [0] * len(others)
+        for i, doc in enumerate(driver.doc_ids):
+            total = term_score(driver, i, doc)
+            for j, term in enumerate(others):
+                pos = gallop_left(term.doc_ids, doc, cursors[j])
+                cursors[j] = pos
+                if pos == len(term.doc_ids) or term.doc_ids[pos] != doc:
+                    break
+                total += term_score(term, pos, doc)
+            else:
+                offer(total, doc)
+        return sorted(heap, key=lambda entry: (-entry[0], entry[1]))
+
+    # MaxScore: order terms by upper bound; prefix[i] bounds terms[0..i] together.
+    ordered = sorted((term for term in terms if term.doc_ids), key=lambda term: term.idf)
+    if not ordered:
+        return []
+    prefix = list(accumulate(term.idf * (k1 + 1.0) for term in ordered))
+    cursors = [0] * len(ordered)
+    threshold = 0.0
+    first_essential = 0
+    while first_essential < len(ordered):
+        candidate = None
+        for i in range(first_essential, len(ordered)):
+            ids = ordered[i].doc_ids
+            if cursors[i] < len(ids) and (candidate is None or ids[cursors[i]] < candidate):
+                candidate = ids[cursors[i]]
+        if candidate is None:
+            break
+
+        total = 0.0
+        for i in range(first_essential, len(ordered)):
+            term = ordered[i]
+            pos = cursors[i]
+            if pos < len(term.doc_ids) and term.doc_ids[pos] == candidate:
+                total += term_score(term, pos, candidate)
+                cursors[i] = pos + 1
+        for i in range(first_essential - 1, -1, -1):
+            if total + prefix[i] <= threshold:
+                break
+            term = ordered[i]
+            pos = bisect_left(term.doc_ids, candidate, cursors[i])
+            cursors[i] = pos
+            if pos < len(term.doc_ids) and term.doc_ids[pos] == candidate:
+                total += term_score(term, pos, candidate)
+
+        offer(total, candidate)
+        if len(heap) == k and heap[0][0] > threshold:
+            threshold = heap[0][0]
+            while first_essential < len(ordered) and prefix[first_essential] <= threshold:
+                first_essential += 1
+    return sorted(heap, key=lambda entry: (-entry[0], entry[1]))
@@ -0,0 +1,532 @@
+"""
+Local search daemon that keeps indexes loaded between queries.
+
+Every ``gpt_export_index_tool.py search`` run imports the whole tool and
+loads the index again before it answers a single query.  ``serve`` starts a
+long-lived process instead.  The process holds one or more indexes (and
+their vectors) in memory and answers JSON-RPC 2.0 requests posted to
+``http://127.0.0.1:<port>/rpc``.  ``search --server URL`` and the web
+front-end (``js/search.js``) send their queries there.
+
+Methods:
+
+* ``search``: ``query``, optional ``index``, ``case_sensitive``, ``logic``,
+  ``semantic``, ``context_lines``, ``rank``, ``limit``.
+* ``snippets``: ``file`` (file ID, indexed path or name), ``query``,
+  ``context_lines``, ``case_sensitive``, ``limit``.
+* ``classify``: ``text``, or ``file`` within an index.
+* ``similar``: ``file`` and ``limit`` (needs vectors).
+* ``indexes``, ``reload``, ``stats`` and ``ping``.
+
+``index`` may be omitted when only one index is loaded.  Requests are handled
+on separate threads and searches only read the loaded index.  Before an
+index is used, the registry checks its file, at most once per
+``reload_interval`` seconds.  If the file has been rewritten, the request
+that noticed loads it while other requests keep using the old copy.  The
+new copy replaces the old one only when its generation differs, and
+requests already running finish on the copy they started with.  Results are cached per generation in a
+:class:`~.query_cache.QueryCache`.
+
+The server only binds to loopback addresses by default.  It rejects
+requests whose ``Host`` or ``Origin`` is not local (plus any origins that
+were explicitly allowed), so that a web page cannot use the browser to read
+the indexes.
+"""
+
+import inspect
+import logging
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .binary_index import load_index_file
+from .content_recognition import classify_content
+from . import json_io
+from .indexer import (
+    load_vector_index, resolve_file_ref, result_to_dict, search_with_context, semantic_search, similar_files,
+)
+from .query_cache import QueryCache, index_generation
+from .snippets import extract_snippets
+from .vector_index import vector_index_path
+
+__all__ = [
+    "DEFAULT_PORT",
+    "IndexRegistry",
+    "SearchServer",
+    "SearchServerError",
+    "SearchService",
+    "call",
+]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+RPC_PATH = "/rpc"
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+_MAX_BODY = 1024 * 1024
+
+
+class SearchServerError(Exception):
+    """A JSON-RPC error returned by, or raised inside, the search server."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+@dataclass
+class LoadedIndex:
+    """One resident index and the vectors built for it."""
+
+    path: Path
+    data: Dict[str, Any]
+    generation: Optional[str]
+    vectors: Any = None
+    signature: Tuple = ()
+    loaded_at: float = field(default_factory=time.time)
+    reloads: int = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "generation": self.generation,
+            "files": len(self.data.get("index", {}).get("files", {})),
+            "vectors": self.vectors is not None,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+        }
+
+
+class IndexRegistry:
+    """Loaded indexes keyed by path, reloaded when their generation changes."""
+
+    def __init__(self, reload_interval: float = 1.0):
+        self.reload_interval = reload_interval
+        self._entries: Dict[str, LoadedIndex] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._reloading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path) -> str:
+        return str(Path(path).resolve())
+
+    @staticmethod
+    def _signature(path: Path) -> Tuple:
+        return _file_signature(path), _file_signature(vector_index_path(path))
+
+    def add(self, path) -> LoadedIndex:
+        """Load the index at *path* and keep it resident."""
+        key = self._key(path)
+        entry = self._load(Path(key))
+        with self._lock:
+            self._entries[key] = entry
+            self._checked_at[key] = time.monotonic()
+            self._reloading.setdefault(key, threading.Lock())
+        logger.info(f"Serving {key} ({entry.describe()['files']} files, generation {entry.generation})")
+        return entry
+
+    def _load(self, path: Path) -> LoadedIndex:
+        signature = self._signature(path)
+        # Read into memory so a rebuild can replace the file while it is served
+        data = load_index_file(path, in_memory=True)
+        return LoadedIndex(path, data, index_generation(data), load_vector_index(path, data), signature)
+
+    def paths(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, path: Optional[str] = None) -> LoadedIndex:
+        """Return the current copy of an index, reloading it first if it was rebuilt.
+
+        *path* may be omitted when exactly one index is loaded.
+        """
+        with self._lock:
+            if path is None:
+                if len(self._entries) != 1:
+                    raise SearchServerError(INVALID_PARAMS, "'index' is required when several indexes are served")
+                key = next(iter(self._entries))
+            else:
+                key = self._key(path)
+                if key not in self._entries:
+                    raise SearchServerError(INVALID_PARAMS, f"Index not served: {path}")
+            due = time.monotonic() - self._checked_at[key] >= self.reload_interval
+            if due:
+                self._checked_at[key] = time.monotonic()
+        if due:
+            self._refresh(key)
+        with self._lock:
+            return self._entries[key]
+
+    def reload(self, path: Optional[str] = None) -> List[LoadedIndex]:
+        """Check one index (or all of them) for a new generation now."""
+        keys = [self._key(path)] if path is not None else self.paths()
+        for key in keys:
+            if key not in self._entries:
+                raise SearchServerError(INVALID_PARAMS, f"Index not served: {path}")
+            self._refresh(key, force=True)
+        with self._lock:
+            return [self._entries[key] for key in keys]
+
+    def _refresh(self, key: str, force: bool = False) -> None:
+        lock = self._reloading[key]
+        # Only one thread reloads an index; the others keep using the old copy.
+        if not lock.acquire(blocking=force):
+            return
+        try:
+            current = self._entries[key]
+            path = current.path
+            signature = self._signature(path)
+            if signature == current.signature or signature[0] is None:
+                return
+            try:
+                fresh = self._load(path)
+            except Exception as e:
+                # Probably caught mid-write; try again on the next check.
+                logger.warning(f"Could not reload {path}: {e}")
+                return
+            if fresh.generation is not None and fresh.generation == current.generation:
+                # Same build (touched or vectors rebuilt): keep the loaded data.
+                updated = LoadedIndex(
+                    path, current.data, current.generation,
+                    load_vector_index(path, current.data), signature, current.loaded_at, current.reloads,
+                )
+            else:
+                fresh.reloads = current.reloads + 1
+                updated = fresh
+                logger.info(f"Reloaded {path}: generation {current.generation} -> {fresh.generation}")
+            with self._lock:
+                self._entries[key] = updated
+        finally:
+            lock.release()
+
+
+class SearchService:
+    """JSON-RPC methods over an :class:`IndexRegistry`.
+
+    *classifier* turns text into a JSON-serializable classification; the CLI
+    passes the same classifier its ``classify`` command uses.
+    """
+
+    def __init__(
+        self,
+        registry: IndexRegistry,
+        cache: Optional[QueryCache] = None,
+        classifier: Optional[Callable[[str], Any]] = None,
+    ):
+        self.registry = registry
+        self.cache = cache if cache is not None else QueryCache()
+        self.classifier = classifier or _default_classifier
+        self.started_at = time.time()
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self._methods: Dict[str, Callable[..., Any]] = {
+            "search": self.search,
+            "snippets": self.snippets,
+            "classify": self.classify,
+            "similar": self.similar,
+            "indexes": self.indexes,
+            "reload": self.reload,
+            "stats": self.stats,
+            "ping": lambda: "pong",
+        }
+
+    def dispatch(self, method: str, params: Any) -> Any:
+        """Call *method* with *params* (a dict or list) and return its result."""
+        handler = self._methods.get(method)
+        if handler is None:
+            raise SearchServerError(METHOD_NOT_FOUND, f"Unknown method: {method}")
+        with self._requests_lock:
+            self.requests += 1
+        args, kwargs = (), {}
+        if isinstance(params, dict):
+            kwargs = params
+        elif isinstance(params, list):
+            args = tuple(params)
+        elif params is not None:
+            raise SearchServerError(INVALID_PARAMS, "'params' must be an object or an array")
+        try:
+            inspect.signature(handler).bind(*args, **kwargs)
+        except TypeError as e:
+            raise SearchServerError(INVALID_PARAMS, str(e))
+        return handler(*args, **kwargs)
+
+    def search(
+        self,
+        query: str,
+        index: Optional[str] = None,
+        case_sensitive: bool = False,
+        logic: str = "AND",
+        semantic: bool = False,
+        context_lines: int = 3,
+        rank: bool = False,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        if logic not in ("AND", "OR"):
+            raise SearchServerError(INVALID_PARAMS, "'logic' must be 'AND' or 'OR'")
+        entry = self.registry.get(index)
+        options = dict(
+            index=str(entry.path), case_sensitive=case_sensitive, logic=logic, semantic=semantic,
+            vectors=entry.vectors is not None, context_lines=context_lines, rank=rank, limit=limit,
+        )
+        key = QueryCache.make_key(query, entry.generation, **options) if entry.generation else None
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        if semantic:
+            results, error = semantic_search(
+                query, entry.data, top_n=limit or 10, context_lines=context_lines, vectors=entry.vectors
+            )
+        else:
+            results, error = search_with_context(
+                query,
+                entry.data,
+                context_lines=context_lines,
+                case_sensitive=case_sensitive,
+                search_logic=logic,
+                use_nlp=not rank,
+                rank_results=rank,
+                max_results=limit,
+                postings_cache=self.cache,
+            )
+        response = {
+            "generation": entry.generation,
+            "results": [result_to_dict(result) for result in results],
+            "error": error,
+        }
+        if key is not None and not error:
+            self.cache.set(key, response)
+        return dict(response, cached=False)
+
+    def snippets(
+        self,
+        file: str,
+        query: str,
+        index: Optional[str] = None,
+        context_lines: int = 3,
+        case_sensitive: bool = False,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        entry = self.registry.get(index)
+        fid, path = self._resolve(entry, file)
+        line_offsets = entry.data["index"].get("line_offsets", {}).get(fid)
+        found = extract_snippets(path, query, context_lines, case_sensitive, line_offsets, limit)
+        return {"file_id": fid, "path": str(path), "snippets": found}
+
+    def classify(self, text: Optional[str] = None, file: Optional[str] = None, index: Optional[str] = None) -> Any:
+        if text is None:
+            if file is None:
+                raise SearchServerError(INVALID_PARAMS, "Pass 'text' or 'file'")
+            _fid, path = self._resolve(self.registry.get(index), file)
+            try:
+                text = path.read_text(encoding="utf-8", errors="ignore")
+            except OSError as e:
+                raise SearchServerError(SERVER_ERROR, f"Could not read {path}: {e}")
+        return self.classifier(text)
+
+    def similar(self, file: str, index: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+        entry = self.registry.get(index)
+        if entry.vectors is None:
+            raise SearchServerError(SERVER_ERROR, "No up-to-date vectors for this index; rebuild with 'index --vectors'")
+        results, error = similar_files(file, entry.data, entry.vectors, top_n=limit)
+        return {
+            "generation": entry.generation,
+            "results": [
+                {"file": name, "path": str(path), "score": score, "file_id": fid, "details": details}
+                for name, path, score, fid, details in results
+            ],
+            "error": error,
+        }
+
+    def indexes(self) -> List[Dict[str, Any]]:
+        return [self.registry.get(path).describe() for path in self.registry.paths()]
+
+    def reload(self, index: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [entry.describe() for entry in self.registry.reload(index)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uptime": time.time() - self.started_at,
+            "requests": self.requests,
+            "indexes": self.indexes(),
+            "cache": self.cache.get_stats(),
+        }
+
+    @staticmethod
+    def _resolve(entry: LoadedIndex, file_ref: str) -> Tuple[str, Path]:
+        fid = resolve_file_ref(file_ref, entry.data)
+        if fid is None:
+            raise SearchServerError(INVALID_PARAMS, f"File not in index: {file_ref}")
+        folder = Path(entry.data["metadata"].get("indexed_folder_path") or ".")
+        return fid, folder / entry.data["index"]["files"][fid]
+
+
+def _default_classifier(text: str) -> Dict[str, Any]:
+    is_phoenix_codex, confidence, reason, category = classify_content(text)
+    return {"is_phoenix_codex": is_phoenix_codex, "confidence": confidence, "reason": reason, "category": category}
+
+
+def _is_local_host(host: str) -> bool:
+    return (urlsplit("//" + host).hostname or "") in _LOCAL_HOSTS
+
+
+class _RPCHandler(BaseHTTPRequestHandler):
+    server: "SearchServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _origin_allowed(self) -> bool:
+        if not _is_local_host(self.headers.get("Host", "")) and not self.server.allow_remote:
+            return False
+        origin = self.headers.get("Origin")
+        if origin is None or origin in self.server.allowed_origins:
+            return True
+        return urlsplit(origin).hostname in _LOCAL_HOSTS
+
+    def _send(self, status: int, payload: Any = None) -> None:
+        body = b"" if payload is None else json_io.dumps(payload, default=str)
+        self.send_response(status)
+        origin = self.headers.get("Origin")
+        if origin is not None:
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        if not self._origin_allowed():
+            self._send(403)
+            return
+        self.send_response(204)
+        if "Origin" in self.headers:
+            self.send_header("Access-Control-Allow-Origin", self.headers["Origin"])
+            self.send_header("Vary", "Origin")
+        self.send_header("Access-Control-Allow-Methods", "POST, GET, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Max-Age", "600")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if not self._origin_allowed():
+            self._send(403, {"error": "Forbidden"})
+        elif self.path in ("/", "/health"):
+            self._send(200, {"status": "ok", "indexes": self.server.service.indexes()})
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self._origin_allowed():
+            self._send(403, {"error": "Forbidden"})
+            return
+        if self.path != RPC_PATH:
+            self._send(404, {"error": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > _MAX_BODY:
+            self._send(413, {"error": "Request too large"})
+            return
+        try:
+            request = json_io.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            self._send(200, _error_response(None, PARSE_ERROR, f"Parse error: {e}"))
+            return
+        if isinstance(request, list):
+            responses = [r for r in (self._handle(item) for item in request) if r is not None]
+            if not request:
+                responses = _error_response(None, INVALID_REQUEST, "Empty batch")
+        else:
+            responses = self._handle(request)
+        if responses:
+            self._send(200, responses)
+        else:
+            self._send(204)
+
+    def _handle(self, request: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error_response(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        try:
+            result = self.server.service.dispatch(request["method"], request.get("params"))
+        except SearchServerError as e:
+            return _error_response(request_id, e.code, e.message)
+        except Exception as e:
+            logger.exception(f"RPC method {request['method']} failed")
+            return _error_response(request_id, SERVER_ERROR, str(e))
+        if "id" not in request:
+            return None  # notification
+        return {"jsonrpc": "2.0", "result": result, "id": request_id}
+
+
+def _error_response(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": request_id}
+
+
+class SearchServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering JSON-RPC requests with a :class:`SearchService`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        service: SearchService,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        allowed_origins: Iterable[str] = (),
+    ):
+        self.service = service
+        self.allowed_origins = set(allowed_origins)
+        # Binding beyond loopback is an explicit choice; accept any Host then.
+        self.allow_remote = host not in _LOCAL_HOSTS
+        super().__init__((host, port), _RPCHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def call(url: str, method: str, timeout: float = 30.0, **params: Any) -> Any:
+    """Call *method* on the server at *url* and return its result.
+
+    Raises :class:`SearchServerError` for RPC errors and ``OSError`` if the
+    server cannot be reached.
+    """
+    url = url.rstrip("/")
+    if not url.endswith(RPC_PATH):
+        url += RPC_PATH
+    body = json_io.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": 1})
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        reply = json_io.loads(response.read())
+    if "error" in reply:
+        raise SearchServerError(reply["error"].get("code", SERVER_ERROR), reply["error"].get("message", ""))
+    return reply["result"]
@@ -5,13 +5,14 @@ Backports the settings management functionality from the Avalonia app's Settings
 Provides configuration management and persistence with theme and UI settings.
 """
 
-import json
 import os
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass, asdict
 import logging
 
+from . import json_io
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -106,8 +107,7 @@ class SettingsService:
         """Load settings from file."""
         try:
             if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = json_io.load_file(self.settings_file)
                 
                 # Check if this is the old flat format and migrate if needed
                 if self._is_old_format(data):
@@ -227,7 +227,7 @@ class SettingsService:
                           'selected_index_type', 'active_tab_text', 'search_term_case_sensitive',
                           'search_logic', 'num_tokenizers', 'num_indexers', 'cpu_usage_percent',
                           'amandamap_mode', 'mirror_entity_redaction_enabled', 'mirror_entity_vault_path',
-                          'use_tagmap_tagging', 'tagmap_file_path']:
+                          'use_tagmap_tagging', 'tagmap_file_path', 'tokenizer_backend']:
                 new_data[key] = value
         
         # Add some general settings
@@ -248,8 +248,7 @@ class SettingsService:
             settings_path = Path(self.settings_file)
             settings_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self._serialize_settings(), f, indent=2)
+            json_io.save_file(self._serialize_settings(), self.settings_file, indent=True)
             
             logger.info(f"Settings saved to {self.settings_file}")
             
@@ -352,8 +351,7 @@ class SettingsService:
     def export_settings(self, export_path: str) -> None:
         """Export settings to a file."""
         try:
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(self._serialize_settings(), f, indent=2)
+            json_io.save_file(self._serialize_settings(), export_path, indent=True)
             logger.info(f"Settings exported to {export_path}")
         except Exception as e:
             logger.error(f"Error exporting settings: {e}")
@@ -361,8 +359,7 @@ class SettingsService:
     def import_settings(self, import_path: str) -> None:
         """Import settings from a file."""
         try:
-            with open(import_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_io.load_file(import_path)
             
             # Validate and apply imported settings
             if 'theme' in data:
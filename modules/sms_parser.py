@@ -3,19 +3,22 @@ SMS/MMS Parser for AmandaMap and Phoenix Codex
 
 This module parses SMS backup XML files and converts them into
 AmandaMap and Phoenix Codex entries with support for appending
-to existing data and handling large MMS files.
+to existing data and handling large MMS files.  Backups are streamed
+one message at a time and MMS attachment data is never loaded, so
+multi-gigabyte backups parse in bounded memory.
 """
 
-import xml.etree.ElementTree as ET
-import json
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from dataclasses import dataclass
 import logging
 import os
 
+from . import json_io
+from .xml_parser import iter_sms_backup
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -62,30 +65,28 @@ class SMSParser:
         # Check AmandaMap file
         if amandamap_file and amandamap_file.exists():
             try:
-                with open(amandamap_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if data:
-                        # Find the latest timestamp
-                        timestamps = [entry.get('timestamp', '') for entry in data if entry.get('timestamp')]
-                        if timestamps:
-                            latest_timestamp = max(timestamps)
-                            logger.info(f"Found existing AmandaMap data with latest timestamp: {latest_timestamp}")
+                data = json_io.load_file(amandamap_file)
+                if data:
+                    # Find the latest timestamp
+                    timestamps = [entry.get('timestamp', '') for entry in data if entry.get('timestamp')]
+                    if timestamps:
+                        latest_timestamp = max(timestamps)
+                        logger.info(f"Found existing AmandaMap data with latest timestamp: {latest_timestamp}")
             except Exception as e:
                 logger.warning(f"Could not load existing AmandaMap data: {e}")
         
         # Check Phoenix Codex file
         if phoenix_file and phoenix_file.exists():
             try:
-                with open(phoenix_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if data:
-                        # Find the latest timestamp
-                        timestamps = [entry.get('timestamp', '') for entry in data if entry.get('timestamp')]
-                        if timestamps:
-                            phoenix_latest = max(timestamps)
-                            if latest_timestamp is None or phoenix_latest > latest_timestamp:
-                                latest_timestamp = phoenix_latest
-                                logger.info(f"Found existing Phoenix Codex data with latest timestamp: {latest_timestamp}")
+                data = json_io.load_file(phoenix_file)
+                if data:
+                    # Find the latest timestamp
+                    timestamps = [entry.get('timestamp', '') for entry in data if entry.get('timestamp')]
+                    if timestamps:
+                        phoenix_latest = max(timestamps)
+                        if latest_timestamp is None or phoenix_latest > latest_timestamp:
+                            latest_timestamp = phoenix_latest
+                            logger.info(f"Found existing Phoenix Codex data with latest timestamp: {latest_timestamp}")
             except Exception as e:
                 logger.warning(f"Could not load existing Phoenix Codex data: {e}")
         
@@ -104,54 +105,24 @@ class SMSParser:
             # Check file size for large MMS files
             file_size = file_path.stat().st_size
             if file_size > 100 * 1024 * 1024:  # 100MB
-                logger.warning(f"Large SMS file detected ({file_size / 1024 / 1024:.1f}MB). Processing in chunks...")
-            
-            # Parse XML with memory-efficient approach
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            
-            # Parse SMS messages
-            sms_count = 0
-            for sms in root.findall('.//sms'):
-                entry = self._parse_sms_element(sms)
-                if entry:
-                    if append_mode and self.existing_latest_timestamp:
-                        # Check if this entry is newer than existing data
-                        if entry.timestamp > self.existing_latest_timestamp:
-                            self.conversations.append(entry)
-                            self.new_entries_count += 1
-                        else:
-                            self.skipped_entries_count += 1
-                    else:
-                        self.conversations.append(entry)
-                    sms_count += 1
-                    
-                    # Progress logging for large files
-                    if sms_count % 1000 == 0:
-                        logger.info(f"Processed {sms_count} SMS messages...")
-            
-            # Parse MMS messages with enhanced handling
-            mms_count = 0
-            for mms in root.findall('.//mms'):
-                entry = self._parse_mms_element(mms)
-                if entry:
-                    if append_mode and self.existing_latest_timestamp:
-                        # Check if this entry is newer than existing data
-                        if entry.timestamp > self.existing_latest_timestamp:
-                            self.conversations.append(entry)
-                            self.new_entries_count += 1
-                        else:
-                            self.skipped_entries_count += 1
+                logger.warning(f"Large SMS file detected ({file_size / 1024 / 1024:.1f}MB). Streaming it...")
+            
+            # Stream messages in one pass; nothing is kept if the file turns out malformed
+            entries = []
+            for entry in self.iter_entries(file_path):
+                if append_mode and self.existing_latest_timestamp:
+                    # Check if this entry is newer than existing data
+                    if entry.timestamp > self.existing_latest_timestamp:
+                        entries.append(entry)
+                        self.new_entries_count += 1
                     else:
-                        self.conversations.append(entry)
-                    mms_count += 1
-                    
-                    # Progress logging for large files
-                    if mms_count % 100 == 0:
-                        logger.info(f"Processed {mms_count} MMS messages...")
+                        self.skipped_entries_count += 1
+                else:
+                    entries.append(entry)
+            self.conversations.extend(entries)
             
-            # Sort by timestamp
-            self.conversations.sort(key=lambda x: x.timestamp)
+            # Sort by timestamp (SMS before MMS at equal times)
+            self.conversations.sort(key=lambda x: (x.timestamp, x.conversation_type == "mms"))
             
             logger.info(f"Parsed {len(self.conversations)} conversation entries from SMS file")
             if append_mode:
@@ -163,6 +134,32 @@ class SMSParser:
             logger.error(f"Error parsing SMS file: {e}")
             return []
     
+    def iter_entries(self, file_path: Path) -> Iterator[ConversationEntry]:
+        """Yield a conversation entry for each SMS and MMS message, in file order.
+
+        The backup is streamed (see :func:`modules.xml_parser.iter_sms_backup`),
+        so MMS attachments are never loaded.  Raises
+        ``xml.etree.ElementTree.ParseError`` on malformed XML.
+        """
+        sms_count = 0
+        mms_count = 0
+        for elem in iter_sms_backup(file_path):
+            if elem.tag == 'sms':
+                entry = self._parse_sms_element(elem)
+                if entry:
+                    sms_count += 1
+                    # Progress logging for large files
+                    if sms_count % 1000 == 0:
+                        logger.info(f"Processed {sms_count} SMS messages...")
+            else:
+                entry = self._parse_mms_element(elem)
+                if entry:
+                    mms_count += 1
+                    if mms_count % 100 == 0:
+                        logger.info(f"Processed {mms_count} MMS messages...")
+            if entry:
+                yield entry
+    
     def _parse_sms_element(self, sms_elem) -> Optional[ConversationEntry]:
         """Parse a single SMS element."""
         try:
@@ -208,7 +205,7 @@ class SMSParser:
             return None
     
     def _parse_mms_element(self, mms_elem) -> Optional[ConversationEntry]:
-        """Parse a single MMS element with enhanced handling for large files."""
+        """Parse a single MMS element (attachment data is already stripped)."""
         try:
             # Extract basic attributes
             date = mms_elem.get('date', '')
@@ -217,26 +214,9 @@ class SMSParser:
             contact_name = mms_elem.get('contact_name', '')
             msg_box = mms_elem.get('msg_box', '1')  # 1=incoming, 2=outgoing
             
-            # Extract text from parts with enhanced handling
+            # Extract text from parts; attachments become [Image: name] style references
             body = ""
-            parts = mms_elem.findall('.//part')
-            
-            # Check for large MMS files
-            total_size = 0
-            for part in parts:
-                size_attr = part.get('size', '0')
-                try:
-                    total_size += int(size_attr)
-                except:
-                    pass
-            
-            # Skip extremely large MMS files (>50MB) to prevent memory issues
-            if total_size > 50 * 1024 * 1024:  # 50MB
-                logger.warning(f"Skipping large MMS file ({total_size / 1024 / 1024:.1f}MB) to prevent memory issues")
-                return None
-            
-            # Extract text content
-            for part in parts:
+            for part in mms_elem.findall('.//part'):
                 content_type = part.get('ct', '')
                 if content_type == 'text/plain':
                     text = part.get('text', '')
@@ -402,8 +382,7 @@ class SMSParser:
             # Load existing entries if in append mode
             if append_mode and output_file.exists():
                 try:
-                    with open(output_file, 'r', encoding='utf-8') as f:
-                        existing_entries = json.load(f)
+                    existing_entries = json_io.load_file(output_file)
                     logger.info(f"Loaded {len(existing_entries)} existing AmandaMap entries")
                 except Exception as e:
                     logger.warning(f"Could not load existing AmandaMap file: {e}")
@@ -433,8 +412,7 @@ class SMSParser:
                 all_entries = new_entries
             
             # Save to file
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(all_entries, f, indent=2, ensure_ascii=False)
+            json_io.save_file(all_entries, output_file, indent=True)
             
             logger.info(f"Exported {len(all_entries)} entries to AmandaMap format: {output_file}")
             return True
@@ -451,8 +429,7 @@ class SMSParser:
             # Load existing entries if in append mode
             if append_mode and output_file.exists():
                 try:
-                    with open(output_file, 'r', encoding='utf-8') as f:
-                        existing_entries = json.load(f)
+                    existing_entries = json_io.load_file(output_file)
                     logger.info(f"Loaded {len(existing_entries)} existing Phoenix Codex entries")
                 except Exception as e:
                     logger.warning(f"Could not load existing Phoenix Codex file: {e}")
@@ -483,8 +460,7 @@ class SMSParser:
                 all_entries = new_entries
             
             # Save to file
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(all_entries, f, indent=2, ensure_ascii=False)
+            json_io.save_file(all_entries, output_file, indent=True)
             
             logger.info(f"Exported {len(all_entries)} entries to Phoenix Codex format: {output_file}")
             return True
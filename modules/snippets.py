@@ -0,0 +1,119 @@
+"""
+Snippet extraction without rereading whole files.
+
+The old extractor called ``readlines()`` on every matching file and
+lowercased each line, so a broad query reread the entire result set.  Here
+the file is memory-mapped and a byte pattern for the phrase is searched with
+``re``.  For every hit only the surrounding context window is sliced out and
+decoded.
+
+The legacy index records each file's line-start byte offsets at build time
+(the ``line_offsets`` section).  When they are available the context window
+is found by bisecting them.  Otherwise line boundaries are located with
+``rfind``/``find`` around the hit.  Offsets that no longer fit the file
+(it changed since indexing) are ignored.
+"""
+
+import mmap
+import os
+import re
+from bisect import bisect_right
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+__all__ = ["line_start_offsets", "extract_snippets"]
+
+_NEWLINE = re.compile(rb"\n")
+
+
+def line_start_offsets(data: bytes) -> List[int]:
+    """Return the byte offset at which every line of *data* starts."""
+    return [0] + [match.end() for match in _NEWLINE.finditer(data) if match.end() < len(data)]
+
+
+def _phrase_pattern(phrase: str, case_sensitive: bool) -> "re.Pattern[bytes]":
+    """Compile *phrase* into a UTF-8 byte pattern, case-folded per character."""
+    parts = []
+    for ch in phrase:
+        variants = {ch} if case_sensitive else {v for v in (ch, ch.lower(), ch.upper()) if len(v) == 1}
+        encoded = sorted(re.escape(v.encode("utf-8")) for v in variants)
+        parts.append(encoded[0] if len(encoded) == 1 else b"(?:" + b"|".join(encoded) + b")")
+    return re.compile(b"".join(parts))
+
+
+def _offsets_fit(buf: mmap.mmap, offsets: Sequence[int]) -> bool:
+    return bool(offsets) and offsets[0] == 0 and offsets[-1] <= len(buf)
+
+
+def _window_from_offsets(
+    buf: mmap.mmap, offsets: Sequence[int], pos: int, context_lines: int
+) -> Optional[Tuple[int, int, int]]:
+    """Return ``(start, end, end of hit line)`` using stored line offsets."""
+    line = bisect_right(offsets, pos) - 1
+    line_start = offsets[line]
+    if line_start and buf[line_start - 1:line_start] != b"\n":
+        return None  # stale offsets
+    start = offsets[max(0, line - context_lines)]
+    after = line + context_lines + 1
+    end = offsets[after] if after < len(offsets) else len(buf)
+    next_line = offsets[line + 1] if line + 1 < len(offsets) else len(buf)
+    return start, end, next_line
+
+
+def _window_by_scanning(buf: mmap.mmap, pos: int, context_lines: int) -> Tuple[int, int, int]:
+    """Return ``(start, end, end of hit line)`` by searching for newlines around *pos*."""
+    start = buf.rfind(b"\n", 0, pos) + 1
+    for _ in range(context_lines):
+        if start == 0:
+            break
+        start = buf.rfind(b"\n", 0, start - 1) + 1
+    newline = buf.find(b"\n", pos)
+    next_line = len(buf) if newline < 0 else newline + 1
+    end = next_line
+    for _ in range(context_lines):
+        if end >= len(buf):
+            break
+        newline = buf.find(b"\n", end)
+        end = len(buf) if newline < 0 else newline + 1
+    return start, end, next_line
+
+
+def extract_snippets(
+    file_path: Path,
+    phrase: str,
+    context_lines: int = 1,
+    case_sensitive: bool = False,
+    line_offsets: Optional[Sequence[int]] = None,
+    max_snippets: Optional[int] = None,
+) -> List[str]:
+    """Return text snippets around lines of *file_path* that contain *phrase*.
+
+    Each matching line yields one snippet of ``context_lines`` lines on either
+    side.  Scanning stops after *max_snippets* snippets.
+    """
+    if not phrase or (max_snippets is not None and max_snippets <= 0):
+        return []
+    pattern = _phrase_pattern(phrase, case_sensitive)
+    snippets: List[str] = []
+    try:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                offsets = line_offsets if line_offsets is not None and _offsets_fit(buf, line_offsets) else None
+                pos = 0
+                while max_snippets is None or len(snippets) < max_snippets:
+                    match = pattern.search(buf, pos)
+                    if match is None:
+                        break
+                    window = _window_from_offsets(buf, offsets, match.start(), context_lines) if offsets else None
+                    if window is None:
+                        offsets = None
+                        window = _window_by_scanning(buf, match.start(), context_lines)
+                    start, end, pos = window
+                    text = buf[start:end].decode("utf-8", errors="ignore").replace("\r\n", "\n").strip()
+                    if text:
+                        snippets.append(text)
+    except (OSError, ValueError):
+        return snippets
+    return snippets
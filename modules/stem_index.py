@@ -0,0 +1,92 @@
+"""
+Stemmed-token postings for the stem-overlap semantic search.
+
+``search_semantic`` used to read and stem every indexed file on each query.
+The index now carries a ``stems`` section (stem -> sorted file IDs) derived
+from the token postings at build time.  The length of a stem's posting list
+is its document frequency.  Queries only stem their own words and look those
+stems up.
+
+Stemming is memoized per unique token, so each vocabulary entry is stemmed
+once per process however many files contain it.  The stemmer in use is
+recorded in the index (``stemmer``) because stems from the Porter stemmer and
+unstemmed tokens (NLTK missing) are not interchangeable.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Set
+
+try:
+    from nltk.stem import PorterStemmer
+    NLTK_AVAILABLE = True
+except ImportError:
+    NLTK_AVAILABLE = False
+    PorterStemmer = None
+
+__all__ = [
+    "NLTK_AVAILABLE",
+    "STEMMER_NAME",
+    "stem_token",
+    "stem_text",
+    "build_stem_postings",
+    "update_stem_postings",
+]
+
+STEMMER_NAME = "porter" if NLTK_AVAILABLE else "none"
+
+_stemmer = PorterStemmer() if NLTK_AVAILABLE else None
+_WORD = re.compile(r"\b\w+\b")
+
+
+@lru_cache(maxsize=1 << 18)
+def stem_token(token: str) -> str:
+    """Return the stem of a lower-cased *token* (the token itself without NLTK)."""
+    return _stemmer.stem(token) if _stemmer else token
+
+
+def stem_text(text: str) -> List[str]:
+    """Return stemmed tokens for *text* using a simple regex tokenizer."""
+    return [stem_token(token) for token in _WORD.findall(text.lower())]
+
+
+def build_stem_postings(tokens: Mapping[str, Iterable[str]]) -> Dict[str, List[str]]:
+    """Return ``stem -> sorted file IDs`` for a ``token -> file IDs`` map."""
+    stems: Dict[str, Set[str]] = {}
+    for token, fids in tokens.items():
+        if not _WORD.fullmatch(token):
+            continue  # punctuation tokens never reach the stemmer
+        stems.setdefault(stem_token(token), set()).update(fids)
+    return {stem: sorted(fids, key=int) for stem, fids in stems.items()}
+
+
+def update_stem_postings(
+    stems: Mapping[str, Iterable[str]],
+    old_tokens: Mapping[str, Iterable[str]],
+    new_tokens: Mapping[str, Iterable[str]],
+) -> Dict[str, List[str]]:
+    """Patch ``stem -> file IDs`` for files whose tokens changed.
+
+    *old_tokens* and *new_tokens* map each changed file ID to its previous
+    and current tokens; a file missing from *new_tokens* was removed.  Only
+    the stems of those tokens are rewritten.
+    """
+    changed = set(old_tokens) | set(new_tokens)
+    touched: Set[str] = set()
+    for tokens in old_tokens.values():
+        touched.update(stem_token(token) for token in tokens if _WORD.fullmatch(token))
+    added: Dict[str, Set[str]] = {}
+    for fid, tokens in new_tokens.items():
+        for token in tokens:
+            if _WORD.fullmatch(token):
+                added.setdefault(stem_token(token), set()).add(fid)
+    touched.update(added)
+    patched = dict(stems)
+    for stem in touched:
+        fids = {fid for fid in patched.get(stem, ()) if fid not in changed}
+        fids.update(added.get(stem, ()))
+        if fids:
+            patched[stem] = sorted(fids, key=int)
+        else:
+            patched.pop(stem, None)
+    return patched
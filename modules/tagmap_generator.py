@@ -5,7 +5,6 @@ Backports the sophisticated tagmap generation functionality from the Avalonia ap
 Provides contextual markers, cross-references, and intelligent category detection.
 """
 
-import json
 import re
 import os
 from pathlib import Path
@@ -14,6 +13,8 @@ from dataclasses import dataclass, asdict
 from datetime import datetime
 import logging
 
+from . import json_io
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -155,8 +156,7 @@ class TagMapGenerator:
         
         # Save tagmap
         try:
-            with open(tagmap_path, 'w', encoding='utf-8') as f:
-                json.dump([asdict(entry) for entry in entries], f, indent=2)
+            json_io.save_file([asdict(entry) for entry in entries], tagmap_path, indent=True)
             logger.info(f"Tagmap saved to {tagmap_path}")
         except Exception as e:
             logger.error(f"Error saving tagmap: {e}")
@@ -370,8 +370,7 @@ class TagMapGenerator:
             return []
         
         try:
-            with open(tagmap_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_io.load_file(tagmap_path)
             
             entries = []
             for entry_data in data:
@@ -407,8 +406,7 @@ class TagMapGenerator:
         
         tagmap_path = folder_path / "tagmap.json"
         try:
-            with open(tagmap_path, 'w', encoding='utf-8') as f:
-                json.dump([asdict(entry) for entry in all_entries], f, indent=2)
+            json_io.save_file([asdict(entry) for entry in all_entries], tagmap_path, indent=True)
             logger.info(f"Updated tagmap saved to {tagmap_path}")
         except Exception as e:
             logger.error(f"Error saving updated tagmap: {e}")
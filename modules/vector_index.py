@@ -0,0 +1,283 @@
+"""
+Offline TF-IDF vector space over the persistent index.
+
+The stem-overlap "semantic" search only counts shared word stems.  This
+module builds a real vector-space model from the token postings and term
+frequencies already stored in the index, with no network model involved:
+
+* every file is a TF-IDF vector, ``(1 + log tf) * idf``, L2-normalized;
+* the matrix is stored column-major (term -> files, weights), so scoring a
+  query sums only the columns of its own terms, and similarity is cosine;
+* optionally (``lsa_dims > 0``) a randomized truncated SVD gives dense
+  latent-semantic document vectors, and cosine top-k is a single
+  matrix-vector product over them.
+
+Vectors are stored with NumPy in ``<index file>.vectors.npz``, tagged with
+the index's ``created_at`` so vectors left over from an older build are not
+used.  NumPy is optional; without it none of this is available and callers
+fall back to the stem-overlap search.
+"""
+
+import json
+import math
+import os
+import re
+from itertools import repeat
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+__all__ = [
+    "NUMPY_AVAILABLE",
+    "VECTOR_SUFFIX",
+    "VectorIndex",
+    "vector_index_path",
+]
+
+VECTOR_SUFFIX = ".vectors.npz"
+_WORD = re.compile(r"\w+")
+
+
+def vector_index_path(index_file) -> Path:
+    """Return where the vectors of *index_file* are stored."""
+    return Path(str(index_file) + VECTOR_SUFFIX)
+
+
+def _idf(doc_freq: int, doc_count: int) -> float:
+    return math.log((1.0 + doc_count) / (1.0 + doc_freq)) + 1.0
+
+
+class VectorIndex:
+    """TF-IDF (and optional LSA) document vectors for one index."""
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        idf,
+        col_ptr,
+        col_docs,
+        col_weights,
+        doc_ids: Sequence[str],
+        components=None,
+        doc_vectors=None,
+        index_created_at: str = "",
+    ):
+        self.terms = list(terms)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.idf = idf
+        self.col_ptr = col_ptr
+        self.col_docs = col_docs
+        self.col_weights = col_weights
+        self.doc_ids = list(doc_ids)
+        self.doc_rows = {fid: row for row, fid in enumerate(self.doc_ids)}
+        self.components = components  # terms x dims, or None without LSA
+        self.doc_vectors = doc_vectors  # docs x dims, rows L2-normalized
+        self.index_created_at = index_created_at
+
+    # -- building -------------------------------------------------------------
+
+    @classmethod
+    def build(
+        cls,
+        loaded_index: Mapping[str, Any],
+        lsa_dims: int = 0,
+        min_df: int = 1,
+        seed: int = 0,
+    ) -> "VectorIndex":
+        """Build vectors from a loaded index (``{"metadata", "index"}``)."""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy is required for the vector index")
+        section = loaded_index["index"]
+        tokens = section["tokens"]
+        term_freqs = section.get("term_freqs", {})
+        doc_ids = sorted(section["files"], key=int)
+        doc_rows = {fid: row for row, fid in enumerate(doc_ids)}
+        doc_count = len(doc_ids)
+
+        terms: List[str] = []
+        idf: List[float] = []
+        col_ptr = [0]
+        docs_parts = []
+        weight_parts = []
+        for token, fids in tokens.items():
+            if not _WORD.fullmatch(token) or len(fids) < min_df:
+                continue
+            freqs = term_freqs.get(token) or repeat(1)
+            pairs = [(doc_rows[fid], tf) for fid, tf in zip(fids, freqs) if fid in doc_rows]
+            if not pairs:
+                continue
+            rows = np.asarray([row for row, _ in pairs], dtype=np.int32)
+            tf = np.asarray([max(tf, 1) for _, tf in pairs], dtype=np.float32)
+            term_idf = _idf(len(rows), doc_count)
+            terms.append(token)
+            idf.append(term_idf)
+            docs_parts.append(rows)
+            weight_parts.append((1.0 + np.log(tf)) * term_idf)
+            col_ptr.append(col_ptr[-1] + len(rows))
+
+        col_docs = np.concatenate(docs_parts) if docs_parts else np.zeros(0, np.int32)
+        col_weights = np.concatenate(weight_parts).astype(np.float32) if weight_parts else np.zeros(0, np.float32)
+        norms = np.sqrt(np.bincount(col_docs, weights=col_weights.astype(np.float64) ** 2, minlength=doc_count))
+        norms[norms == 0] = 1.0
+        col_weights = (col_weights / norms[col_docs]).astype(np.float32)
+
+        vectors = cls(
+            terms,
+            np.asarray(idf, dtype=np.float32),
+            np.asarray(col_ptr, dtype=np.int64),
+            col_docs,
+            col_weights,
+            doc_ids,
+            index_created_at=loaded_index.get("metadata", {}).get("created_at", ""),
+        )
+        if lsa_dims > 0 and terms and doc_count > 1:
+            vectors._fit_lsa(min(lsa_dims, len(terms), doc_count), seed)
+        return vectors
+
+    def _term_of_nnz(self):
+        return np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.col_ptr))
+
+    def _times(self, dense):
+        """Return ``X @ dense`` for the docs x terms matrix ``X``."""
+        term_of = self._term_of_nnz()
+        result = np.empty((len(self.doc_ids), dense.shape[1]))
+        for j in range(dense.shape[1]):
+            result[:, j] = np.bincount(
+                self.col_docs, weights=self.col_weights * dense[term_of, j], minlength=len(self.doc_ids)
+            )
+        return result
+
+    def _transpose_times(self, dense):
+        """Return ``X.T @ dense``; columns are contiguous, so each term is a segment sum."""
+        starts = self.col_ptr[:-1]
+        result = np.empty((len(self.terms), dense.shape[1]))
+        for j in range(dense.shape[1]):
+            result[:, j] = np.add.reduceat(self.col_weights * dense[self.col_docs, j], starts)
+        return result
+
+    def _fit_lsa(self, dims: int, seed: int, oversample: int = 10, power_iterations: int = 2) -> None:
+        """Randomized truncated SVD (Halko et al.) of the TF-IDF matrix."""
+        rng = np.random.default_rng(seed)
+        width = min(dims + oversample, len(self.terms), len(self.doc_ids))
+        sample = self._times(rng.standard_normal((len(self.terms), width)))
+        basis, _ = np.linalg.qr(sample)
+        for _ in range(power_iterations):
+            basis, _ = np.linalg.qr(self._transpose_times(basis))
+            basis, _ = np.linalg.qr(self._times(basis))
+        small = self._transpose_times(basis).T  # width x terms
+        u_small, singular, vt = np.linalg.svd(small, full_matrices=False)
+        doc_vectors = (basis @ u_small[:, :dims]) * singular[:dims]
+        self.components = vt[:dims].T.astype(np.float32)
+        self.doc_vectors = _normalize_rows(doc_vectors).astype(np.float32)
+
+    # -- persistence ----------------------------------------------------------
+
+    def save(self, path) -> None:
+        """Write the vectors to *path* (``.npz``) atomically."""
+        path = Path(path)
+        blob = "\x00".join(self.terms).encode("utf-8")
+        arrays = {
+            "terms": np.frombuffer(blob, dtype=np.uint8),
+            "idf": self.idf,
+            "col_ptr": self.col_ptr,
+            "col_docs": self.col_docs,
+            "col_weights": self.col_weights,
+            "doc_ids": np.asarray([int(fid) for fid in self.doc_ids], dtype=np.int64),
+            "meta": np.frombuffer(json.dumps({"index_created_at": self.index_created_at}).encode("utf-8"), dtype=np.uint8),
+        }
+        if self.doc_vectors is not None:
+            arrays["components"] = self.components
+            arrays["doc_vectors"] = self.doc_vectors
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "VectorIndex":
+        with np.load(path) as data:
+            blob = data["terms"].tobytes().decode("utf-8")
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            return cls(
+                blob.split("\x00") if blob else [],
+                data["idf"],
+                data["col_ptr"],
+                data["col_docs"],
+                data["col_weights"],
+                [str(fid) for fid in data["doc_ids"]],
+                data["components"] if "components" in data else None,
+                data["doc_vectors"] if "doc_vectors" in data else None,
+                meta.get("index_created_at", ""),
+            )
+
+    @property
+    def has_lsa(self) -> bool:
+        return self.doc_vectors is not None
+
+    # -- queries --------------------------------------------------------------
+
+    def _query_weights(self, tokens: Iterable[str]) -> Dict[int, float]:
+        counts: Dict[int, int] = {}
+        for token in tokens:
+            term_id = self.term_ids.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        weights = {t: (1.0 + math.log(c)) * float(self.idf[t]) for t, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {t: w / norm for t, w in weights.items()}
+
+    def _sparse_scores(self, weights: Mapping[int, float]):
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term_id, weight in weights.items():
+            start, end = self.col_ptr[term_id], self.col_ptr[term_id + 1]
+            scores[self.col_docs[start:end]] += weight * self.col_weights[start:end]
+        return scores
+
+    def _dense_scores(self, weights: Mapping[int, float]):
+        if not weights:
+            return np.zeros(len(self.doc_ids), dtype=np.float32)
+        term_ids = np.fromiter(weights.keys(), dtype=np.int64)
+        values = np.fromiter(weights.values(), dtype=np.float32)
+        latent = values @ self.components[term_ids]
+        norm = np.linalg.norm(latent)
+        return self.doc_vectors @ (latent / norm) if norm else np.zeros(len(self.doc_ids), dtype=np.float32)
+
+    def _top(self, scores, k: int, exclude: Optional[int] = None) -> List[Tuple[float, str]]:
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[row]), self.doc_ids[row]) for row in top if scores[row] > 0]
+
+    def search(self, tokens: Iterable[str], k: int = 10, use_lsa: Optional[bool] = None) -> List[Tuple[float, str]]:
+        """Return up to *k* ``(cosine, file ID)`` pairs for query *tokens*, best first."""
+        weights = self._query_weights(tokens)
+        dense = self.has_lsa if use_lsa is None else use_lsa and self.has_lsa
+        return self._top(self._dense_scores(weights) if dense else self._sparse_scores(weights), k)
+
+    def similar_to(self, fid: str, k: int = 10, use_lsa: Optional[bool] = None) -> List[Tuple[float, str]]:
+        """Return the *k* files most similar to file *fid* (itself excluded)."""
+        row = self.doc_rows.get(str(fid))
+        if row is None:
+            return []
+        if self.has_lsa if use_lsa is None else use_lsa and self.has_lsa:
+            return self._top(self.doc_vectors @ self.doc_vectors[row], k, exclude=row)
+        positions = np.flatnonzero(self.col_docs == row)
+        term_ids = np.searchsorted(self.col_ptr, positions, side="right") - 1
+        weights = dict(zip(term_ids.tolist(), self.col_weights[positions].tolist()))
+        return self._top(self._sparse_scores(weights), k, exclude=row)
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
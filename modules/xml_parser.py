@@ -1,8 +1,95 @@
 """Utilities for parsing XML conversation backups."""
 
 from pathlib import Path
+import re
 import xml.etree.ElementTree as ET
 
+# SMS Backup & Restore stores each MMS attachment base64-encoded in the
+# ``data`` attribute of its <part>; backups run to several gigabytes.
+SKIPPED_SMS_ATTRIBUTES = ("data",)
+SMS_CHUNK_SIZE = 1 << 20
+
+
+class _AttributeFilter:
+    """Drop ``name="..."`` attributes from an XML byte stream fed in chunks.
+
+    The values are cut out of the raw bytes before the XML parser sees
+    them, so they are never decoded into Python strings.  SMS Backup &
+    Restore writes every attribute double-quoted and escapes quotes inside
+    values, so the first ``"`` after the opening one ends the value.
+    """
+
+    def __init__(self, names):
+        alternatives = b"|".join(re.escape(name.encode("ascii")) for name in names)
+        self._attribute = re.compile(rb'\s(?:' + alternatives + rb')="[^"]*"')
+        self._unterminated = re.compile(rb'\s(?:' + alternatives + rb')="[^"]*\Z')
+        # A chunk may end part-way through `` name="``; hold those bytes back
+        self._hold = max(len(name) for name in names) + 2
+        self._pending = b""
+        self._skipping = False
+
+    def feed(self, chunk):
+        if self._skipping:
+            end = chunk.find(b'"')
+            if end < 0:
+                return b""
+            chunk = chunk[end + 1:]
+            self._skipping = False
+        data = self._attribute.sub(b"", self._pending + chunk)
+        self._pending = b""
+        unterminated = self._unterminated.search(data)
+        if unterminated:
+            self._skipping = True
+            return data[:unterminated.start()]
+        self._pending = data[-self._hold:]
+        return data[:-self._hold]
+
+    def flush(self):
+        data, self._pending = self._pending, b""
+        return data
+
+
+def iter_sms_backup(file_path, tags=("sms", "mms"), chunk_size=SMS_CHUNK_SIZE):
+    """Yield the message elements of an SMS Backup & Restore XML file.
+
+    The file is parsed incrementally in *chunk_size* pieces and MMS
+    attachment data is skipped (see :data:`SKIPPED_SMS_ATTRIBUTES`).  Only
+    elements named in *tags* are yielded, but every message under the root
+    is cleared and detached once it is done with (a yielded one as soon as
+    the caller asks for the next), so memory stays bounded by a single
+    message however large the backup.  Raises ``ET.ParseError`` on
+    malformed XML.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    attribute_filter = _AttributeFilter(SKIPPED_SMS_ATTRIBUTES)
+    open_elements = []
+
+    def messages():
+        for event, elem in parser.read_events():
+            if event == "start":
+                open_elements.append(elem)
+                continue
+            open_elements.pop()
+            wanted = elem.tag in tags
+            if wanted:
+                yield elem
+            if wanted or len(open_elements) == 1:
+                # Children of the root are released whether or not they were asked for
+                elem.clear()
+                if open_elements:
+                    open_elements[-1].remove(elem)
+
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(attribute_filter.feed(chunk))
+            yield from messages()
+    parser.feed(attribute_filter.flush())
+    parser.close()
+    yield from messages()
+
 
 def parse_xml_backup(file_path, logger=None):
     """Parse simple XML backups with <message> elements."""
@@ -31,33 +118,31 @@ def parse_sms_smsbackup(file_path, logger=None):
     """Parse SMS Backup & Restore XML files with <sms> elements."""
     if logger:
         logger(f"Starting parse for SMS XML: {Path(file_path).name}")
+    structured = []
+    structured.append({"type": "header", "content": f"*** FILE: {Path(file_path).name} ***"})
     try:
-        tree = ET.parse(file_path)
-        root_elem = tree.getroot()
+        for sms in iter_sms_backup(file_path, tags=("sms",)):
+            sms_type = sms.get('type')
+            if sms_type == '1':
+                role = 'received'
+            elif sms_type == '2':
+                role = 'sent'
+            else:
+                role = sms_type or 'unknown'
+            body = sms.get('body', '')
+            ts = sms.get('readable_date') or sms.get('date')
+            address = sms.get('address')
+            structured.append({
+                "type": "text",
+                "content": body,
+                "role": role,
+                "timestamp": ts,
+                "address": address,
+            })
     except Exception as e:
         if logger:
             logger(f"  ERROR reading/parsing {Path(file_path).name}: {e}")
         return [{"type": "error", "content": f"Error reading/parsing {Path(file_path).name}: {e}"}]
-    structured = []
-    structured.append({"type": "header", "content": f"*** FILE: {Path(file_path).name} ***"})
-    for sms in root_elem.findall('.//sms'):
-        sms_type = sms.get('type')
-        if sms_type == '1':
-            role = 'received'
-        elif sms_type == '2':
-            role = 'sent'
-        else:
-            role = sms_type or 'unknown'
-        body = sms.get('body', '')
-        ts = sms.get('readable_date') or sms.get('date')
-        address = sms.get('address')
-        structured.append({
-            "type": "text",
-            "content": body,
-            "role": role,
-            "timestamp": ts,
-            "address": address,
-        })
     if logger:
         logger(f"Finished parsing {Path(file_path).name}. Total structured items: {len(structured)}")
     return structured
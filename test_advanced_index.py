@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory advanced index representation.
+"""
+
+import sys
+from array import array
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.advanced_indexer import AdvancedIndexer, DocPostings, FileDetail, Index, SearchOptions
+
+
+def test_postings_are_integer_ids_over_one_path_table():
+    files = {name: FileDetail(filename=name, modified=0, token_count=3) for name in ("b.md", "a.md", "c.md")}
+    index = Index(tokens={"moon": {"c.md", "a.md"}, "sun": ["b.md", "b.md"], "empty": set()}, files=files, created="")
+    assert isinstance(index.tokens, DocPostings)
+    assert index.doc_paths == ["a.md", "b.md", "c.md"]
+    assert index.tokens.ids("moon") == array("I", [0, 2]) and len(index.tokens.ids("missing")) == 0
+    assert index.tokens["moon"] == {"a.md", "c.md"} and "empty" not in index.tokens
+    assert dict(index.tokens) == {"moon": {"a.md", "c.md"}, "sun": {"b.md"}}
+
+
+def test_serialized_index_round_trips(tmp_path):
+    for name, text in {"a.md": "moon ritual", "b.txt": "moon flame", "c.md": "flame"}.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    indexer = AdvancedIndexer()
+    segmented = indexer.build_index(tmp_path, tmp_path / "adv.json")
+    data = indexer._serialize_index(segmented)
+    assert data["tokens"]["moon"] == ["a.md", "b.txt"]
+
+    index = indexer._deserialize_index(data)
+    assert dict(index.tokens) == dict(segmented.tokens)
+    for query, options in (("moon", SearchOptions()), ("moon OR flame", SearchOptions(use_and=False)),
+                           ("flame NOT ritual", SearchOptions(extension_filter="md"))):
+        expected = [r.file for r in indexer.search(segmented, query, options)]
+        assert sorted(r.file for r in indexer.search(index, query, options)) == sorted(expected)
+    assert sorted(r.file for r in indexer.search(index, "flame NOT ritual", SearchOptions())) == ["b.txt", "c.md"]
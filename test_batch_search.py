@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for batch query mode.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.batch_search import latency_summary, read_queries, run_batch
+from conftest import write_index
+from modules.binary_index import load_index_file
+from modules.indexer import search_with_context
+
+TEXTS = {"a.md": "moon ritual candle", "b.md": "moon flame", "c.md": "ritual flame"}
+
+
+def test_read_queries_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "q.jsonl"
+    jsonl.write_text('"moon"\n\n{"query": "ritual", "rank": "yes", "limit": "2", "other": 1}\n[1]\n{bad\n', encoding="utf-8")
+    specs = list(read_queries(jsonl))
+    assert specs[0] == {"query": "moon", "line": 1}
+    assert specs[1] == {"query": "ritual", "rank": True, "limit": 2, "line": 3}
+    assert [s["line"] for s in specs[2:]] == [4, 5] and all("error" in s for s in specs[2:])
+
+    csv_file = tmp_path / "q.csv"
+    csv_file.write_text('query,logic,case_sensitive\n"moon, flame",or,false\nritual,,\n', encoding="utf-8")
+    assert list(read_queries(csv_file)) == [
+        {"query": "moon, flame", "logic": "OR", "case_sensitive": False, "line": 2},
+        {"query": "ritual", "line": 3},
+    ]
+
+
+def test_batch_matches_single_searches_in_threads_and_processes(tmp_path):
+    index_file = write_index(tmp_path, TEXTS, fmt="json", metadata={"generation": "g1"})
+    loaded = load_index_file(index_file)
+    specs = [{"query": q, "line": i} for i, q in enumerate(["moon", "ritual flame", "missing", "moon ritual"] * 5)]
+    specs.append({"line": 99})
+    expected = {}
+    for spec in specs[:-1]:
+        results, error = search_with_context(spec["query"], loaded, context_lines=0, search_logic="OR", use_nlp=True)
+        expected[spec["line"]] = (sorted(r[0] for r in results), error)
+
+    for processes in (False, True):
+        records = list(run_batch(
+            specs, index_file=index_file, defaults={"logic": "OR", "context": 0}, workers=3, processes=processes,
+        ))
+        assert sorted(r["line"] for r in records) == [s["line"] for s in specs]
+        for record in records:
+            assert record["latency_ms"] >= 0
+            if record["line"] == 99:
+                assert record["error"] == "Missing query"
+                continue
+            assert (sorted(r["file"] for r in record["results"]), record["error"]) == expected[record["line"]]
+
+    summary = latency_summary(records, slowest=2)
+    assert summary["queries"] == len(specs)
+    assert summary["errors"] == 1 + sum(1 for _, error in expected.values() if error)
+    assert len(summary["slowest"]) == 2 and summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the binary on-disk search index format.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.binary_index import (
+    close_index_file,
+    count_varints,
+    decode_postings,
+    detach_index_file,
+    encode_postings,
+    export_index_json,
+    index_path_for,
+    is_binary_index,
+    load_index_file,
+    save_index_file,
+)
+
+
+def _sample_index():
+    return {
+        "metadata": {"indexed_folder_path": "chats", "total_files_in_index": 3},
+        "index": {
+            "tokens": {
+                "amanda": ["0", "2"],
+                "phoenix": ["1"],
+                "ritual": ["2", "0", "1"],
+                "ñandú": ["1"],
+            },
+            "files": {"0": "a.md", "1": "b.md", "2": "c.md"},
+            "file_details": {
+                "0": {"filename": "a.md"},
+                "1": {"filename": "b.md"},
+                "2": {"filename": "c.md"},
+            },
+        },
+    }
+
+
+def test_postings_round_trip():
+    """Delta/varint encoding preserves sorted unique doc IDs."""
+    ids = [5, 1, 300, 70000, 1, 2]
+    assert decode_postings(encode_postings(ids)) == [1, 2, 5, 300, 70000]
+    assert decode_postings(encode_postings([])) == []
+    assert count_varints(encode_postings(ids)) == 5
+
+
+def test_posting_count_is_document_frequency(tmp_path):
+    """Posting counts stay document counts when IDs need multi-byte varints."""
+    structure = _sample_index()
+    structure["index"]["tokens"]["amanda"] = ["0", "200", "70000"]
+    path = tmp_path / "index.bin"
+    save_index_file(structure, path, "binary")
+
+    tokens = load_index_file(path)["index"]["tokens"]
+    for term in structure["index"]["tokens"]:
+        assert tokens.posting_count(term) == len(tokens[term])
+    assert tokens.posting_count("amanda") == 3
+    assert tokens.posting_count("missing") == 0
+
+
+def test_binary_index_lazy_lookup(tmp_path):
+    """Binary indexes load through mmap and answer dict-style lookups."""
+    path = tmp_path / "index.bin"
+    save_index_file(_sample_index(), path, "binary")
+    assert is_binary_index(path)
+
+    loaded = load_index_file(path)
+    tokens = loaded["index"]["tokens"]
+    assert len(tokens) == 4
+    assert tokens["ritual"] == ["0", "1", "2"]
+    assert "ñandú" in tokens
+    assert "missing" not in tokens
+    assert sorted(tokens) == sorted(_sample_index()["index"]["tokens"])
+    assert loaded["index"]["files"]["2"] == "c.md"
+    assert loaded["metadata"]["index_format"] == "binary"
+
+
+def test_export_binary_index_as_json(tmp_path):
+    """A binary index can be exported back to the JSON format."""
+    binary_path = tmp_path / "index.bin"
+    json_path = tmp_path / "index.json"
+    save_index_file(_sample_index(), binary_path, "binary")
+    export_index_json(binary_path, json_path)
+
+    assert not is_binary_index(json_path)
+    exported = load_index_file(json_path)
+    assert exported["index"]["tokens"]["amanda"] == ["0", "2"]
+    assert exported["metadata"]["index_format"] == "json"
+
+
+def test_binary_indexes_are_not_stored_under_json_names(tmp_path):
+    """Binary indexes take a .bin name; JSON stays the default format."""
+    assert index_path_for(tmp_path / "json_index.json", "binary") == tmp_path / "json_index.bin"
+    assert index_path_for(tmp_path / "json_index.json", "json") == tmp_path / "json_index.json"
+    with pytest.raises(ValueError):
+        save_index_file(_sample_index(), tmp_path / "index.json", "binary")
+
+    save_index_file(_sample_index(), tmp_path / "index.json")
+    assert not is_binary_index(tmp_path / "index.json")
+
+
+def test_loaded_index_releases_its_file(tmp_path):
+    """Mapped indexes can be detached or closed; in-memory ones hold no file."""
+    path = tmp_path / "index.bin"
+    save_index_file(_sample_index(), path, "binary")
+
+    mapped = load_index_file(path)
+    reader = mapped["index"]["tokens"]._owner
+    assert reader.is_mapped
+    detach_index_file(mapped)
+    assert not reader.is_mapped and mapped["index"]["tokens"]["amanda"] == ["0", "2"]
+
+    in_memory = load_index_file(path, in_memory=True)
+    assert not in_memory["index"]["tokens"]._owner.is_mapped
+    assert in_memory["index"]["tokens"]["phoenix"] == ["1"]
+
+    closing = load_index_file(path)
+    close_index_file(closing)
+    assert not closing["index"]["tokens"]._owner.is_mapped
+    close_index_file(_sample_index())  # plain dict indexes are left alone
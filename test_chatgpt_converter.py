@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming ChatGPT export ingestion.
+"""
+
+import codecs
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from chatgpt_converter_gui import ChatGPTExportConverter
+
+
+def _conversation(i, text="moon ritual"):
+    return {
+        "title": f"Chat {i}",
+        "mapping": {
+            "n1": {"message": {"author": {"role": "user"}, "content": {"parts": [text]}, "create_time": 1700000000.5}},
+            "n2": {"message": {"author": {"role": "assistant"}, "content": {"parts": [f"reply {i}"]}}},
+        },
+    }
+
+
+def test_iter_conversations_matches_json_load(tmp_path):
+    converter = ChatGPTExportConverter()
+    bulk = tmp_path / "conversations.json"
+    bulk.write_bytes(codecs.BOM_UTF8 + json.dumps([_conversation(i) for i in range(3)]).encode("utf-8"))
+    single = tmp_path / "chat.json"
+    single.write_text(json.dumps(_conversation(7)), encoding="utf-8")
+
+    assert converter.detect_file_format(bulk) == "bulk"
+    assert converter.detect_file_format(single) == "individual"
+    streamed = list(converter.iter_conversations(bulk))
+    assert streamed == [_conversation(i) for i in range(3)]
+    assert [c["title"] for c in converter.iter_conversations(single)] == ["Chat 7"]
+
+    messages = converter.extract_messages(streamed[0])
+    assert isinstance(messages[0]["timestamp"], float)
+    assert "moon ritual" in converter.messages_to_markdown("Chat 0", messages)
+    json.loads(converter.messages_to_json("Chat 0", messages))
+
+
+def test_bulk_streaming_memory_stays_flat(tmp_path):
+    bulk = tmp_path / "conversations.json"
+    with open(bulk, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(400):
+            f.write(("," if i else "") + json.dumps(_conversation(i, "x" * 20_000)))
+        f.write("]")
+
+    tracemalloc.start()
+    count = sum(1 for _ in ChatGPTExportConverter.iter_conversations(bulk))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert count == 400
+    assert peak < bulk.stat().st_size / 10
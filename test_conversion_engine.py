@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the parallel conversion engine.
+"""
+
+import json
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from chatgpt_conversion_engine import convert_export
+
+
+def _conversation(title, *texts):
+    mapping = {
+        f"n{i}": {"message": {"author": {"role": role}, "content": {"parts": [text]}}}
+        for i, (role, text) in enumerate(zip(["user", "assistant"] * len(texts), texts))
+    }
+    return {"title": title, "mapping": mapping}
+
+
+def test_bulk_export_in_processes_and_threads(tmp_path):
+    conversations = [_conversation("Moon", "hi", "hello")] * 3 + [_conversation("Empty"), _conversation("Sun/Fire", "x")]
+    bulk = tmp_path / "conversations.json"
+    bulk.write_text(json.dumps(conversations), encoding="utf-8")
+
+    for processes in (True, False):
+        out = tmp_path / f"out_{processes}"
+        events = queue.Queue()
+        stats = convert_export(bulk, out, role_filter="user", workers=2, processes=processes, chunk_size=2, progress=events)
+        assert sorted(p.name for p in out.iterdir()) == ["Moon (2).md", "Moon (3).md", "Moon.md", "SunFire.md"]
+        assert "hi" in (out / "Moon.md").read_text(encoding="utf-8")
+        assert "hello" not in (out / "Moon.md").read_text(encoding="utf-8")
+        assert (stats.conversations, stats.messages, stats.files_written, stats.skipped) == (5, 4, 4, 1)
+        assert stats.throughput()["render"] > 0 and stats.parse_seconds > 0
+
+        seen = [events.get_nowait() for _ in range(events.qsize())]
+        assert [e["done"] for e in seen[:-1]] == [1, 2, 3, 4, 5]
+        assert seen[-1]["stage"] == "done" and seen[-1]["stats"]["files_written"] == 4
+
+
+def test_folder_of_exports_is_parsed_by_workers(tmp_path):
+    source = tmp_path / "exports"
+    source.mkdir()
+    (source / "a.json").write_text(json.dumps(_conversation("A", "moon")), encoding="utf-8")
+    (source / "b.json").write_text(json.dumps([_conversation("B1", "x"), _conversation("B2", "y")]), encoding="utf-8")
+    (source / "bad.json").write_text("{not json", encoding="utf-8")
+
+    events = queue.Queue()
+    stats = convert_export(source, tmp_path / "out", output_format="json", workers=2, progress=events)
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["a.json", "b_1.json", "b_2.json"]
+    assert json.loads((tmp_path / "out" / "b_2.json").read_text(encoding="utf-8"))["title"] == "B2"
+    assert (stats.conversations, stats.failed) == (3, 1) and "bad.json" in stats.errors[0]
+    assert {e["total"] for e in list(events.queue)[:-1]} == {3}
+
+
+def test_setup_errors_are_reported_not_hung(tmp_path):
+    from chatgpt_converter_gui import run_cli
+
+    source = tmp_path / "conversations.json"
+    source.write_text(json.dumps([_conversation("A", "moon")]), encoding="utf-8")
+    not_a_folder = tmp_path / "out.txt"
+    not_a_folder.write_text("", encoding="utf-8")
+
+    events = queue.Queue()
+    with pytest.raises(OSError):
+        convert_export(source, not_a_folder, progress=events, processes=False)
+    assert events.get_nowait()["stage"] == "failed"
+    assert run_cli(["--input", str(source), "--output", str(not_a_folder), "--bulk-extract", "--quiet"]) == 1
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for facet bitmaps and facet filters.
+"""
+
+import json
+import os
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.advanced_indexer import AdvancedIndexer, SearchOptions
+from modules.facets import Bitmap, FacetIndex
+from modules.index_segments import SegmentStore, live_facets, live_files
+
+
+def test_bitmap_matches_set_semantics():
+    rng = random.Random(7)
+    # Sparse, dense (bitset) and multi-chunk sets
+    samples = [
+        set(rng.sample(range(200_000), 300)),
+        set(range(10, 70_000, 2)),
+        set(rng.sample(range(65_536), 5_000)) | {70_000, 140_000},
+        set(),
+    ]
+    for a in samples:
+        for b in samples:
+            x, y = Bitmap.from_iterable(a), Bitmap.from_iterable(b)
+            assert list(x & y) == sorted(a & b)
+            assert list(x | y) == sorted(a | b)
+            assert len(x & y) == len(a & b)
+        bitmap = Bitmap.from_iterable(a)
+        assert Bitmap.from_bytes(bitmap.to_bytes()) == bitmap
+        assert all(v in bitmap for v in list(a)[:50]) and 65_535 not in Bitmap.from_iterable([65_534])
+
+
+def test_select_and_counts():
+    files = [
+        ("a.md", {"category": "Rituals", "tags": ["moon"], "modified": 1_700_000_000}),
+        ("b.TXT", {"category": "Rituals", "tags": ["moon", "fire"]}),
+        ("c.md", {"category": "Dreams"}),
+    ]
+    facets = FacetIndex.from_json(json.loads(json.dumps(FacetIndex.build(files).to_json())))
+    assert facets.select({"extension": None}) is None
+    assert list(facets.select({"extension": ["md", ".txt"], "tag": "moon"})) == [0, 1]
+    assert list(facets.select({"category": "Rituals", "extension": "txt"})) == [1]
+    assert not facets.select({"category": "Missing"})
+    counts = facets.counts(Bitmap.from_sorted([0, 1, 2]))
+    assert counts["extension"] == {".md": 2, ".txt": 1}
+    assert list(counts["tag"].items()) == [("moon", 2), ("fire", 1)]
+    assert "month" in counts
+
+
+def test_live_facets_follow_segment_shadowing(tmp_path):
+    store = SegmentStore(tmp_path / "index.json", max_segments=10)
+    store.add_segment({"moon": {"a.md", "b.txt"}}, {"a.md": {"category": "Rituals"}, "b.txt": {"category": "Rituals"}})
+    store.add_segment({"moon": {"b.txt"}, "sun": {"c.md"}}, {"b.txt": {"category": "Dreams"}, "c.md": {}}, tombstones=["a.md"])
+    segments = store.open_segments()
+    paths = sorted(live_files(segments))
+    facets = live_facets(segments, paths)
+    assert paths == ["b.txt", "c.md"]
+    assert {v: list(b) for v, b in facets.bitmaps["category"].items()} == {"Dreams": [0]}
+    assert list(facets.bitmaps["extension"][".md"]) == [1]
+
+
+def test_advanced_search_filters_and_facet_counts(tmp_path):
+    (tmp_path / "a.md").write_text("moon ritual candle", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("moon ritual", encoding="utf-8")
+    (tmp_path / "c.md").write_text("moon dream journal", encoding="utf-8")
+    os.utime(tmp_path / "c.md", (1_600_000_000, 1_600_000_000))
+    (tmp_path / "tagmap.json").write_text(
+        json.dumps([{"document": "a.md", "tags": ["altar"], "category": "Ritual"}]), encoding="utf-8"
+    )
+    indexer = AdvancedIndexer()
+    index = indexer.build_index(tmp_path, tmp_path / "adv.json")
+    index = indexer.load_index(tmp_path / "adv.json")
+
+    results = indexer.search(index, "moon", SearchOptions(context_lines=0))
+    assert results.total == 3 and results.facets["extension"] == {".md": 2, ".txt": 1}
+    assert results.facets["tag"] == {"Ritual": 1, "altar": 1}
+
+    md = indexer.search(index, "moon", SearchOptions(extension_filter="md"))
+    assert sorted(r.file for r in md) == ["a.md", "c.md"]
+    assert [r.file for r in indexer.search(index, "moon", SearchOptions(tag_filter="altar"))] == ["a.md"]
+    month = indexer.search(index, "moon OR ritual", SearchOptions(month_filter=datetime.fromtimestamp(1_600_000_000).strftime("%Y-%m")))
+    assert [r.file for r in month] == ["c.md"]
+    assert indexer.search(index, "moon", SearchOptions(category_filter="Nope")) == []
+    assert [r.file for r in indexer.search(index, "moon NOT candle", SearchOptions(extension_filter=".md"))] == ["c.md"]
+
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for the bigram fuzzy-expansion index.
+"""
+
+import difflib
+import random
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.binary_index import load_index_file
+from modules.fuzzy_index import build_fuzzy_index, close_matches
+from modules.indexer import nlp_search_with_persistent_index
+
+
+def test_close_matches_equal_difflib():
+    """The pruned search never loses a match, even with many repeated bigrams."""
+    rng = random.Random(7)
+    vocab = sorted({"".join(rng.choice("abcde") for _ in range(rng.randint(1, 12))) for _ in range(2000)})
+    grams, lengths = build_fuzzy_index(enumerate(vocab))
+    for _ in range(200):
+        term = "".join(rng.choice("abcde") for _ in range(rng.randint(1, 12)))
+        cutoff = rng.choice([0.0, 0.5, 0.6, 0.75, 0.8, 0.9, 1.0])
+        expected = difflib.get_close_matches(term, vocab, n=5, cutoff=cutoff)
+        assert close_matches(term, grams, lengths, vocab.__getitem__, n=5, cutoff=cutoff) == expected
+
+
+def test_nlp_search_with_and_without_fuzzy_sections(tmp_path):
+    texts = {"amanda_notes.md": "ritual candle", "phoenix.md": "rituals flame", "other.md": "unrelated"}
+    loaded = load_index_file(write_index(tmp_path, texts, fmt="binary"))
+    assert dict(loaded["index"]["filename_fuzzy_lengths"]) == {"15": [0], "10": [1], "8": [2]}
+    plain = {
+        "metadata": loaded["metadata"],
+        "index": {k: dict(loaded["index"][k]) for k in ("tokens", "files", "file_details")},
+    }
+    for query in ("ritul", "phoenx", "amanda_notes.mdd", "flame candle"):
+        for logic in ("AND", "OR"):
+            fast = nlp_search_with_persistent_index(query, loaded, search_logic=logic)
+            slow = nlp_search_with_persistent_index(query, plain, search_logic=logic)
+            assert fast == slow, (query, logic)
+    results, err = nlp_search_with_persistent_index("ritul", loaded)
+    assert err is None and sorted(r[0] for r in results) == ["amanda_notes.md", "phoenix.md"]
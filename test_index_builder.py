@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for the set-based index builder core.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.index_builder import IndexBuilder
+
+
+def test_materialize_matches_legacy_layout():
+    """Postings are deduplicated, sorted and keyed by string file IDs."""
+    builder = IndexBuilder()
+    first = builder.add_path("a.md")
+    second = builder.add_path("b.md")
+    builder.add_tokens(first, ["amanda", "ritual", "amanda"])
+    builder.add_tokens(second, ["ritual", "phoenix"])
+    builder.file_details[first] = {"filename": "a.md"}
+
+    index = builder.materialize()
+    assert index["files"] == {"0": "a.md", "1": "b.md"}
+    assert index["tokens"] == {"amanda": ["0"], "ritual": ["0", "1"], "phoenix": ["1"]}
+    assert index["term_freqs"] == {"amanda": [2], "ritual": [1, 1], "phoenix": [1]}
+    assert index["file_details"] == {"0": {"filename": "a.md"}}
+
+
+def test_reindex_replaces_postings():
+    """Re-indexing a file drops its stale tokens and keeps its ID."""
+    builder = IndexBuilder.from_index(
+        {
+            "tokens": {"old": ["0"], "shared": ["0", "1"]},
+            "files": {"0": "a.md", "1": "b.md"},
+            "file_details": {},
+        }
+    )
+    file_id = builder.file_id_for("a.md")
+    assert file_id == 0
+    builder.remove_postings(file_id)
+    builder.add_tokens(file_id, ["new", "shared"])
+
+    index = builder.materialize()
+    assert "old" not in index["tokens"]
+    assert index["tokens"]["shared"] == ["0", "1"]
+    assert index["tokens"]["new"] == ["0"]
+    assert builder.add_path("c.md") == 2
+
+
+def test_forward_index_survives_binary_round_trip(tmp_path):
+    """Updates after reloading touch only the changed file's postings."""
+    from modules.binary_index import load_index_file, save_index_file
+
+    builder = IndexBuilder()
+    for rel_path, tokens in [("a.md", ["amanda", "ritual"]), ("b.md", ["ritual", "phoenix"])]:
+        builder.add_tokens(builder.add_path(rel_path), tokens)
+    path = tmp_path / "index.bin"
+    save_index_file({"metadata": {}, "index": builder.materialize()}, path, "binary")
+
+    loaded = load_index_file(path)["index"]
+    reloaded = IndexBuilder.from_index(loaded)
+    assert reloaded.file_id_for("b.md") == 1
+    assert reloaded.tokens_of(1) == {"ritual", "phoenix"}
+
+    reloaded.remove_postings(1)
+    reloaded.add_tokens(1, ["zebra"])
+    assert set(reloaded.postings) == {"ritual", "phoenix", "zebra"}
+
+    index = reloaded.materialize()
+    assert index["tokens"] == {"amanda": ["0"], "ritual": ["0"], "zebra": ["1"]}
+    assert index["term_freqs"]["ritual"] == [1]
+    vocabulary = list(index["tokens"])
+    assert [vocabulary[i] for i in index["file_tokens"]["0"]] == ["amanda", "ritual"]
+    assert index["path_ids"] == {"a.md": "0", "b.md": "1"}
+
+
+def test_incremental_materialize_patches_derived_sections(tmp_path):
+    """Patched secondary sections equal a full rebuild after adds, edits and deletes."""
+    from modules.binary_index import load_index_file, save_index_file
+    from modules.fuzzy_index import build_fuzzy_index
+    from modules.metadata_index import build_metadata_index
+    from modules.stem_index import build_stem_postings
+
+    def details(name, day):
+        return {"filename": name, "chat_started_at": f"2024-01-{day:02d} 10:15:30", "tags": [name[0]]}
+
+    builder = IndexBuilder()
+    for day, (name, text) in enumerate([("a.md", "moon ritual"), ("b.md", "flame moon"), ("c.md", "candles")], 1):
+        fid = builder.add_path(name)
+        builder.add_tokens(fid, text.split())
+        builder.file_details[fid] = details(name, day)
+        builder.set_line_offsets(fid, [0, 5])
+    structure = {"metadata": {}, "index": builder.materialize()}
+
+    for index_format in ("json", "binary"):
+        path = tmp_path / f"index.{index_format}"
+        save_index_file(structure, path, index_format)
+        updated = IndexBuilder.from_index(load_index_file(path)["index"])
+        assert updated._can_patch()
+        updated.remove_file(updated.file_id_for("c.md"))
+        b_id = updated.file_id_for("b.md")
+        updated.remove_postings(b_id)
+        updated.add_tokens(b_id, ["flames", "amber"])
+        updated.file_details[b_id] = details("b.md", 9)
+        d_id = updated.add_path("d.md")
+        updated.add_tokens(d_id, ["zebra", "moon"])
+        updated.file_details[d_id] = details("d.md", 4)
+        index = updated.materialize()
+
+        vocabulary = list(index["tokens"])
+        assert {fid: [vocabulary[i] for i in ids] for fid, ids in index["file_tokens"].items()} == {
+            "0": ["moon", "ritual"], "1": ["amber", "flames"], "3": ["moon", "zebra"]
+        }
+        assert index["line_offsets"] == {"0": [0, 5]}
+        assert {name: index[name] for name in build_metadata_index(index["file_details"])} == \
+            build_metadata_index(index["file_details"])
+        assert (index["fuzzy_grams"], index["fuzzy_lengths"]) == build_fuzzy_index(enumerate(vocabulary))
+        assert (index["filename_fuzzy_grams"], index["filename_fuzzy_lengths"]) == build_fuzzy_index(
+            (int(fid), value["filename"]) for fid, value in index["file_details"].items()
+        )
+        assert index["stems"] == build_stem_postings(index["tokens"])
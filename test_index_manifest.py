@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the incremental indexing manifest stage.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.index_builder import IndexBuilder
+from modules.index_manifest import content_hash, diff_manifest
+
+
+def _indexed_builder(folder, texts):
+    return IndexBuilder.from_index(write_index(folder, texts)["index"])
+
+
+def test_manifest_classifies_files(tmp_path):
+    """New, changed, unchanged and deleted files are told apart by stat alone."""
+    builder = _indexed_builder(tmp_path, {"a.md": "amanda ritual", "b.md": "phoenix", "c.md": "gone"})
+
+    (tmp_path / "b.md").write_text("phoenix rising")
+    (tmp_path / "c.md").unlink()
+    (tmp_path / "d.md").write_text("new")
+
+    diff = diff_manifest(builder, tmp_path, sorted(tmp_path.glob("*.md")))
+    assert [rel for rel, _fid in diff.unchanged] == ["a.md"]
+    assert [rel for _path, rel, _fid in diff.updated] == ["b.md"]
+    assert [rel for _path, rel in diff.added] == ["d.md"]
+    assert diff.removed == [builder.file_id_for("c.md")]
+    assert sorted(p.name for p in diff.to_process) == ["b.md", "d.md"]
+
+
+def test_touched_file_skipped_when_hash_matches(tmp_path):
+    """With hashing enabled a touched but identical file is not re-parsed."""
+    builder = _indexed_builder(tmp_path, {"a.md": "amanda ritual"})
+    path = tmp_path / "a.md"
+    builder.file_details[0]["content_hash"] = content_hash(path)
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+
+    assert diff_manifest(builder, tmp_path, [path]).updated
+    diff = diff_manifest(builder, tmp_path, [path], use_hash=True)
+    assert diff.unchanged == [("a.md", 0)]
+    assert builder.file_details[0]["file_mod_time"] == path.stat().st_mtime
+
+
+def test_incremental_rebuild_releases_the_mapped_index(tmp_path, monkeypatch):
+    """The previous index is moved off its mmap before the file is replaced."""
+    from modules import legacy_tool_v6_3
+    from modules.indexer import build_index, load_index
+    from modules.legacy_tool_v6_3 import default_config
+
+    # build_index saves the tool config; keep it and any other relative output in tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(legacy_tool_v6_3, "CONFIG_FILE", str(tmp_path / "app_config.json"))
+    monkeypatch.setattr(legacy_tool_v6_3, "config", {})
+
+    (tmp_path / "a.md").write_text("moon ritual")
+    (tmp_path / "b.md").write_text("flame")
+    config = dict(default_config, index_format="binary")
+    build_index(tmp_path, config, ["*.md"], tmp_path / "index.json", None, False)
+    index_file = tmp_path / "index.bin"  # binary indexes never take a .json name
+    assert not (tmp_path / "index.json").exists()
+    previous = load_index(index_file)
+    assert previous["index"]["tokens"]._owner.is_mapped
+
+    (tmp_path / "c.md").write_text("moon keeper")
+    rebuilt = build_index(tmp_path, config, ["*.md"], tmp_path / "index.json", None, False, previous)
+    assert not previous["index"]["tokens"]._owner.is_mapped
+    assert len(previous["index"]["tokens"]["moon"]) == 1
+    assert rebuilt["metadata"]["build_stats"]["added"] == 1
+    assert len(load_index(index_file)["index"]["tokens"]["moon"]) == 2
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the segmented advanced index.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.advanced_indexer import AdvancedIndexer
+from modules.index_segments import Segment, SegmentStore, SegmentedTokens, live_files
+
+
+def _details(name):
+    return {"filename": name, "modified": 0, "size": 0}
+
+
+def test_newer_segments_shadow_older_ones(tmp_path):
+    """Updated files and tombstones hide postings from older segments."""
+    store = SegmentStore(tmp_path / "adv.json")
+    store.add_segment(
+        {"amanda": {"a.md", "b.md"}, "ritual": {"b.md", "c.md"}},
+        {"a.md": _details("a.md"), "b.md": _details("b.md"), "c.md": _details("c.md")},
+    )
+    store.add_segment({"phoenix": {"b.md"}}, {"b.md": _details("b.md")}, tombstones={"c.md"})
+
+    segments = store.open_segments()
+    tokens = SegmentedTokens(segments)
+    assert tokens["amanda"] == {"a.md"}
+    assert tokens["phoenix"] == {"b.md"}
+    assert "ritual" not in tokens
+    assert sorted(tokens) == ["amanda", "phoenix"]
+    assert sorted(live_files(segments)) == ["a.md", "b.md"]
+
+
+def test_vocabulary_size_skips_unshadowed_postings(tmp_path):
+    """len() only decodes postings of partly shadowed segments, once per view."""
+    store = SegmentStore(tmp_path / "adv.json")
+    store.add_segment({"amanda": {"a.md"}, "ritual": {"a.md", "b.md"}}, {"a.md": _details("a.md"), "b.md": _details("b.md")})
+    store.add_segment({"phoenix": {"c.md"}}, {"c.md": _details("c.md")})
+    decoded = []
+
+    def open_view():
+        segments = store.open_segments()
+        for segment in segments:
+            segment.postings = lambda token, postings=segment.postings: decoded.append(token) or postings(token)
+        return SegmentedTokens(segments)
+
+    assert len(open_view()) == 3 and decoded == []
+
+    store.add_segment({}, {}, tombstones={"a.md"})
+    tokens = open_view()
+    assert len(tokens) == 2 and sorted(tokens) == ["phoenix", "ritual"]
+    assert sorted(decoded) == ["amanda", "ritual"]
+
+
+def test_compaction_preserves_live_view(tmp_path):
+    """Compaction merges the stack into one segment with the same contents."""
+    store = SegmentStore(tmp_path / "adv.json")
+    store.add_segment({"amanda": {"a.md"}, "old": {"b.md"}}, {"a.md": _details("a.md"), "b.md": _details("b.md")})
+    store.add_segment({"new": {"b.md"}}, {"b.md": _details("b.md")})
+    store.add_segment({}, {}, tombstones={"a.md"})
+    before = dict(SegmentedTokens(store.open_segments()))
+
+    merged = store.compact()
+    assert store.manifest()["segments"] == [merged]
+    assert os.listdir(store.segment_dir) == [merged]
+    after = SegmentedTokens(store.open_segments())
+    assert dict(after) == before == {"new": {"b.md"}}
+
+
+def test_builds_unmap_every_segment_they_replace(tmp_path, monkeypatch):
+    """Only the current index keeps segments mapped, through rebuilds and compaction."""
+    opened = []
+    open_segment = Segment.__init__
+    monkeypatch.setattr(Segment, "__init__", lambda self, path: open_segment(self, path) or opened.append(self))
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    indexer = AdvancedIndexer(max_segments=1)
+    for name in ("a.md", "b.md", "c.md"):
+        (docs / name).write_text(f"moon {name}", encoding="utf-8")
+        indexer.build_index(docs, tmp_path / "adv.json")
+        indexer.wait_for_compaction()
+    index = indexer.compact_index(tmp_path / "adv.json")
+
+    current = {id(segment) for segment in index.tokens._segments}
+    assert [s for s in opened if s._reader.is_mapped and id(s) not in current] == []
+    assert sorted(index.tokens["moon"]) == ["a.md", "b.md", "c.md"]
+    index.close()
+    assert not any(s._reader.is_mapped for s in opened)
+
+
+def test_segments_that_cannot_be_removed_are_retried(tmp_path, monkeypatch):
+    """A segment still mapped elsewhere (Windows) is removed by a later write."""
+    store = SegmentStore(tmp_path / "adv.json")
+    store.add_segment({"amanda": {"a.md"}}, {"a.md": _details("a.md")})
+    store.add_segment({"ritual": {"b.md"}}, {"b.md": _details("b.md")})
+    old = store.manifest()["segments"]
+
+    def locked(self, *args, **kwargs):
+        raise PermissionError("mapped by another process")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Path, "unlink", locked)
+        merged = store.compact()
+    assert store.manifest()["obsolete"] == old
+    assert sorted(os.listdir(store.segment_dir)) == sorted(old + [merged])
+
+    newest = store.add_segment({}, {}, tombstones={"a.md"})
+    assert store.manifest()["obsolete"] == []
+    assert sorted(os.listdir(store.segment_dir)) == sorted([merged, newest])
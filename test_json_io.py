@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the JSON I/O layer.
+"""
+
+import codecs
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules import json_io
+
+
+def test_round_trip_and_formatting(tmp_path):
+    document = {"tokens": {"moon": ["1", "2"]}, "title": "Amanda — threshold", 3: None, "nested": [{"a": 1.5}]}
+    path = tmp_path / "index.json"
+    json_io.save_file(document, path, atomic=True)
+    assert path.read_bytes() == json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    assert json_io.load_file(path) == json.loads(json.dumps(document))
+
+    settings = {"theme": {"font_size": 12, "dark": False}, "paths": []}
+    json_io.save_file(settings, path, indent=True)
+    assert path.read_text(encoding="utf-8") == json.dumps(settings, indent=2)
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_stdlib_fallbacks(tmp_path):
+    assert json_io.loads(codecs.BOM_UTF8 + b'{"a": [1]}') == {"a": [1]}
+    assert json_io.loads('{"x": NaN}')["x"] != json_io.loads('{"x": NaN}')["x"]
+    assert json_io.loads(json_io.dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+    assert json_io.loads(json_io.dumps("\ud800")) == "\ud800"
+    assert json_io.dumps_str({"when": Path("a")}, default=str) == '{"when":"a"}'
+    with pytest.raises(json.JSONDecodeError):
+        json_io.loads(b"{broken")
+
+
+def test_legacy_config_keeps_four_space_indent(tmp_path, monkeypatch):
+    from modules import legacy_tool_v6_3
+
+    path = tmp_path / "app_config.json"
+    monkeypatch.setattr(legacy_tool_v6_3, "CONFIG_FILE", str(path))
+    monkeypatch.setattr(legacy_tool_v6_3, "config", {})
+    cfg = {"theme": "Sea Green", "recent": ["a"]}
+    legacy_tool_v6_3.save_config(cfg)
+    assert path.read_text(encoding="utf-8") == json.dumps(cfg, indent=4)
+    assert legacy_tool_v6_3.load_config()["theme"] == "Sea Green"
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the filename, metadata and timestamp secondary indexes.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.binary_index import load_index_file, save_index_file
+from modules.index_builder import IndexBuilder
+from modules.legacy_tool_v6_3 import search_with_persistent_index
+from modules.metadata_index import file_matches_term, resolve_metadata_term
+
+DETAILS = [
+    {"filename": "Amanda_Ritual.md", "chat_started_at": "2024-03-01 09:15:30", "chat_ended_at": "2024-03-02 10:00:00",
+     "tags": ["Moon", "rose"], "type": "Ritual Log"},
+    {"filename": "phoenix-notes.txt", "chat_started_at": "2024-03-02 21:09:15", "metadata": {"chakra": "Heart"}},
+    {"filename": "ab.md", "spirits": ["Phoenix"], "linked_rituals": ["moon bath"]},
+]
+
+
+def _build():
+    builder = IndexBuilder()
+    for i, details in enumerate(DETAILS):
+        fid = builder.add_path(details["filename"])
+        builder.add_tokens(fid, [f"word{i}"])
+        builder.file_details[fid] = dict(details)
+    return builder.materialize()
+
+
+def test_lookups_agree_with_full_scan(tmp_path):
+    index_file = tmp_path / "index.bin"
+    save_index_file({"metadata": {}, "index": _build()}, index_file, "binary")
+    section = load_index_file(index_file)["index"]
+    terms = ["amanda", "ritual", "ab", ".md", "2024-03-02", "2024-03", "09:15", "15:30", "10:00:00", "21:09",
+             "moon", "rose", "ritual log", "log", "heart", "phoenix", "moon bath", "missing", "Moon", "Heart"]
+    for term in terms:
+        for case_sensitive in (False, True):
+            query = term if case_sensitive else term.lower()
+            expected = {str(i) for i, d in enumerate(DETAILS) if file_matches_term(d, query, case_sensitive)}
+            assert resolve_metadata_term(section, query, case_sensitive) == expected, (term, case_sensitive)
+
+
+def test_search_uses_secondary_indexes_and_legacy_indexes_still_work():
+    section = _build()
+    results, err = search_with_persistent_index("2024-03-02 moon", {"metadata": {}, "index": section})
+    assert err is None and [r[0] for r in results] == ["Amanda_Ritual.md"]
+
+    legacy = {k: section[k] for k in ("tokens", "files", "file_details")}
+    results, err = search_with_persistent_index("2024-03-02 moon", {"metadata": {}, "index": legacy})
+    assert err is None and [r[0] for r in results] == ["Amanda_Ritual.md"]
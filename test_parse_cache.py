@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the parsed-content cache.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.parse_cache import ParseCache, get_parse_cache, set_parse_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ParseCache(tmp_path / "cache", max_entries=2)
+    set_parse_cache(cache)
+    yield cache
+    set_parse_cache(None)
+
+
+def test_hits_invalidation_and_eviction(tmp_path, cache):
+    source = tmp_path / "a.txt"
+    source.write_text("moon", encoding="utf-8")
+    calls = []
+
+    def parse(path):
+        calls.append(path.name)
+        return {"text": path.read_text(encoding="utf-8")}
+
+    assert cache.get_or_parse(source, "test", parse) == {"text": "moon"}
+    first = cache.get_or_parse(source, "test", parse)
+    first["text"] = "mutated"  # callers get their own copy
+    assert cache.get_or_parse(source, "test", parse) == {"text": "moon"}
+    assert ParseCache(tmp_path / "cache").get_or_parse(source, "test", parse) == {"text": "moon"}
+    assert calls == ["a.txt"]
+    assert cache.get_stats()["memory_hits"] == 2
+
+    cache.get_or_parse(source, "test", parse, config={"header": False})
+    source.write_text("moon flame", encoding="utf-8")
+    assert cache.get_or_parse(source, "test", parse) == {"text": "moon flame"}
+    assert len(calls) == 3 and cache.get_stats()["memory_entries"] == 2
+
+    cache.get_or_parse(source, "errors", parse, should_store=lambda value: False)
+    cache.get_or_parse(source, "errors", parse, should_store=lambda value: False)
+    assert len(calls) == 5
+
+
+def test_structured_content_and_entries_are_cached(tmp_path, cache, monkeypatch):
+    from amandamap_parser import extract_from_file
+    from modules import legacy_tool_v6_3
+    from modules.legacy_tool_v6_3 import ImageData, _parse_chatgpt_json_to_structured_content, parse_chatgpt_json_to_structured_content
+
+    chat = tmp_path / "chat.json"
+    chat.write_text(json.dumps({"title": "Moon", "mapping": {
+        "a": {"message": {"author": {"role": "user"}, "create_time": 1.0,
+                          "content": {"content_type": "text", "parts": ["AmandaMap Threshold 3: Moon Gate"]}}},
+        "b": {"message": {"author": {"role": "assistant"}, "create_time": 2.0,
+                          "content": {"content_type": "text", "parts": ["data:image/png;base64,iVBORw0KGgo="]}}},
+    }}), encoding="utf-8")
+    cfg = {"include_filename_in_header": True}
+
+    expected = _parse_chatgpt_json_to_structured_content(chat, cfg)
+    for _ in range(2):
+        parsed = parse_chatgpt_json_to_structured_content(chat, cfg)
+        assert [item["type"] for item in parsed] == ["header", "text", "image"]
+        assert parsed[:2] == expected[:2]
+        image = parsed[2]["data"]
+        assert isinstance(image, ImageData) and image.full_filename == "image_001.png"
+        assert image.original_data_uri == expected[2]["data"].original_data_uri
+    assert cache.get_stats()["misses"] == 1
+
+    # Results parsed with Pillow are not served once it is gone, and the reverse
+    with monkeypatch.context() as patch:
+        patch.setattr(legacy_tool_v6_3, "PIL_AVAILABLE", not legacy_tool_v6_3.PIL_AVAILABLE)
+        parse_chatgpt_json_to_structured_content(chat, cfg)
+    assert cache.get_stats()["misses"] == 2
+
+    entries = extract_from_file(chat)
+    assert extract_from_file(chat) == entries and entries[0].number == 3
+    assert get_parse_cache().get_stats()["misses"] == 3
+
+
+def test_disk_cache_is_bounded(tmp_path, monkeypatch):
+    """Past the disk budget the least recently used entries are deleted."""
+    cache_dir = tmp_path / "cache"
+    parse = lambda path: {"text": path.read_text(encoding="utf-8") * 50}
+    sources = []
+    for i in range(6):
+        source = tmp_path / f"{i}.txt"
+        source.write_text(f"moon {i} " + "x" * 2000, encoding="utf-8")
+        sources.append(source)
+
+    probe = ParseCache(cache_dir, max_entries=1)
+    probe.get_or_parse(sources[0], "test", parse)
+    entry_size = next(cache_dir.glob("*/*.ppc")).stat().st_size
+    probe.clear(disk=True)
+
+    cache = ParseCache(cache_dir, max_entries=1, max_disk_bytes=entry_size * 3 + entry_size // 2)
+    for i, source in enumerate(sources):
+        cache.get_or_parse(source, "test", parse)
+        for j, entry_path in enumerate(sorted(cache_dir.glob("*/*.ppc"), key=lambda p: p.stat().st_mtime)):
+            os.utime(entry_path, (1_000_000 + j, 1_000_000 + j))  # keep write order across coarse mtimes
+    entries = list(cache_dir.glob("*/*.ppc"))
+    assert sum(p.stat().st_size for p in entries) <= cache.max_disk_bytes
+    assert cache.get_stats()["disk_evictions"] >= 3
+    calls = []
+    fresh = ParseCache(cache_dir)
+    fresh.get_or_parse(sources[-1], "test", lambda path: calls.append(path) or parse(path))
+    fresh.get_or_parse(sources[0], "test", lambda path: calls.append(path) or parse(path))
+    assert calls == [sources[0]]  # the newest entry survived, the oldest was evicted
+
+    monkeypatch.setenv("PHOENIX_PARSE_CACHE_MAX_MB", "2")
+    set_parse_cache(None)
+    assert get_parse_cache().max_disk_bytes == 2 * 1024 * 1024
+    set_parse_cache(None)
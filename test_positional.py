@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for positional postings and phrase/NEAR matching.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.advanced_indexer import AdvancedIndexer, SearchOptions
+from modules.binary_index import decode_position_lists, encode_position_lists, load_index_file, save_index_file
+from modules.index_builder import IndexBuilder
+from modules.legacy_tool_v6_3 import search_with_persistent_index, tokenize
+from modules.positional import match_clauses, parse_positional_query, phrase_starts, within_distance
+
+
+def test_position_lists_round_trip():
+    lists = [[0, 5, 130], [], [7], list(range(0, 1000, 3))]
+    assert decode_position_lists(encode_position_lists(lists)) == lists
+
+
+def test_phrase_and_near_primitives():
+    assert phrase_starts([[1, 7, 20], [2, 9, 21], [3, 22]]) == [1, 20]
+    assert phrase_starts([[1], [5]]) == []
+    # "a" at 0, "b" at 4: three tokens in between
+    assert within_distance([0], 1, [4], 1, 3)
+    assert not within_distance([0], 1, [4], 1, 2)
+    # Order does not matter and phrase lengths are taken into account
+    assert within_distance([10], 2, [3], 1, 6)
+    assert not within_distance([10], 2, [3], 1, 5)
+
+
+def test_match_clauses_from_offsets():
+    offsets = {
+        "white": {"a": [0], "b": [4]},
+        "rose": {"a": [1], "b": [0]},
+        "moon": {"a": [5], "b": [9]},
+    }
+    lookup = lambda token: offsets.get(token, {})
+    assert match_clauses(parse_positional_query('"white rose"', tokenize), lookup) == {"a"}
+    assert match_clauses(parse_positional_query('"white rose" NEAR/3 moon', tokenize), lookup) == {"a"}
+    assert match_clauses(parse_positional_query('rose NEAR/3 white', tokenize), lookup) == {"a", "b"}
+    assert match_clauses(parse_positional_query('"rose white" moon', tokenize), lookup, "OR") == {"a", "b"}
+
+
+def test_legacy_phrase_search_uses_stored_positions(tmp_path):
+    builder = IndexBuilder(track_positions=True)
+    texts = {"a.md": "the white rose blooms", "b.md": "a rose is white tonight"}
+    for rel, text in texts.items():
+        fid = builder.add_path(rel)
+        builder.add_tokens(fid, tokenize(text))
+        builder.file_details[fid] = {"filename": rel}
+    index_file = tmp_path / "index.bin"
+    save_index_file({"metadata": {"indexed_folder_path": str(tmp_path)}, "index": builder.materialize()}, index_file, "binary")
+    loaded = load_index_file(index_file)
+
+    results, err = search_with_persistent_index('"white rose"', loaded)
+    assert err is None and [r[0] for r in results] == ["a.md"]
+    results, err = search_with_persistent_index("rose NEAR/1 white", loaded)
+    assert err is None and [r[0] for r in results] == ["a.md", "b.md"]
+    results, err = search_with_persistent_index("rose NEAR/0 tonight", loaded)
+    assert results == [] and err
+
+
+def test_advanced_indexer_phrase_search(tmp_path):
+    folder = tmp_path / "chats"
+    folder.mkdir()
+    (folder / "a.md").write_text("the white rose blooms", encoding="utf-8")
+    (folder / "b.md").write_text("a rose is white tonight", encoding="utf-8")
+    indexer = AdvancedIndexer(index_positions=True)
+    index = indexer.build_index(folder, tmp_path / "adv.json")
+
+    results = indexer.search(index, '"white rose"', SearchOptions())
+    assert [r.file for r in results] == ["a.md"]
+    # A second segment plus compaction keeps the positions
+    (folder / "b.md").write_text("white rose again", encoding="utf-8")
+    indexer.build_index(folder, tmp_path / "adv.json")
+    index = indexer.compact_index(tmp_path / "adv.json")
+    assert index.tokens.segment_count == 1 and index.tokens.has_positions
+    results = indexer.search(index, '"white rose"', SearchOptions())
+    assert sorted(r.file for r in results) == ["a.md", "b.md"]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the generation-aware query cache.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.indexer import search_with_context
+from modules.legacy_tool_v6_3 import search_with_persistent_index
+from modules.query_cache import QueryCache, estimate_size
+
+
+TEXTS = {"ritual.md": "moon ritual", "flame.md": "moon flame", "x.md": "other"}
+
+
+def test_keys_cover_options_generation_and_normalization():
+    key = QueryCache.make_key("Moon  Ritual", "g1", case_sensitive=False, search_logic="AND")
+    assert key == QueryCache.make_key(" moon ritual ", "g1", search_logic="AND", case_sensitive=False)
+    assert key != QueryCache.make_key("moon ritual", "g1", case_sensitive=False, search_logic="OR")
+    assert key != QueryCache.make_key("moon ritual", "g2", case_sensitive=False, search_logic="AND")
+    assert QueryCache.make_key("Moon", "g1", case_sensitive=True) != QueryCache.make_key("moon", "g1", case_sensitive=True)
+    assert QueryCache.make_key("a NEAR/2 b", "g1") != QueryCache.make_key("a near/2 b", "g1")
+    for operator in ("AND", "OR", "NOT"):
+        assert QueryCache.make_key(f"a {operator} b", "g1") != QueryCache.make_key(f"a {operator.lower()} b", "g1")
+    assert QueryCache.make_key("Cats OR Bear", "g1") == QueryCache.make_key("cats OR bear", "g1")
+
+
+def test_byte_bounded_eviction_and_stats():
+    value = ["x" * 1000]
+    assert estimate_size(value) > 1000
+    cache = QueryCache(max_bytes=3000, max_entries=100)
+    for i in range(4):
+        cache.set(i, value, size=1000)
+    assert cache.get(0) is None and cache.get(3) == value
+    stats = cache.get_stats()
+    assert stats["size"] == 3 and stats["evictions"] == 1 and stats["bytes"] <= stats["max_bytes"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    cache.set("huge", "y" * stats["max_bytes"])
+    assert cache.get("huge") is None
+
+
+def test_postings_are_cached_once_popular():
+    cache = QueryCache(popular_after=2)
+    calls = []
+    compute = lambda: calls.append(1) or frozenset({"1", "2"})
+    for _ in range(4):
+        assert cache.postings("term", compute) == {"1", "2"}
+    assert len(calls) == 2
+    assert cache.postings("none", lambda: None) is None
+
+
+def test_cached_search_matches_uncached_and_follows_generation(tmp_path):
+    cache = QueryCache(popular_after=1)
+    loaded = write_index(tmp_path, TEXTS, metadata={"generation": "g1"})
+    for query, logic in [("moon ritual", "AND"), ("moon flame", "OR"), ("moon nothing", "AND")]:
+        expected = search_with_persistent_index(query, loaded, search_logic=logic)
+        for _ in range(2):
+            assert search_with_persistent_index(query, loaded, search_logic=logic, postings_cache=cache) == expected
+            assert search_with_context(query, loaded, search_logic=logic, use_nlp=True, postings_cache=cache)[1] == \
+                search_with_context(query, loaded, search_logic=logic, use_nlp=True)[1]
+    assert cache.get_stats()["postings_hits"] > 0
+
+    rebuilt = write_index(tmp_path, TEXTS, metadata={"generation": "g2"})
+    rebuilt["index"]["tokens"] = {"moon": ["2"], "ritual": ["2"], "flame": [], "other": []}
+    results, err = search_with_persistent_index("moon ritual", rebuilt, postings_cache=cache)
+    assert err is None and [r[0] for r in results] == ["x.md"]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the boolean query planner.
+"""
+
+import random
+import sys
+from bisect import bisect_left
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.advanced_indexer import AdvancedIndexer, SearchOptions
+from modules.legacy_tool_v6_3 import search_with_persistent_index
+from modules.query_planner import (
+    And, Not, Or, QueryPlanner, Term, TermSource, gallop_left, has_boolean_syntax, intersect_sorted,
+    parse_boolean_query,
+)
+
+DOC_COUNT = 60
+
+
+class _Source(TermSource):
+    def __init__(self, postings):
+        self._postings = postings
+        self.fetched = []
+
+    def estimate(self, term):
+        return len(self._postings.get(term, ()))
+
+    def postings(self, term):
+        self.fetched.append(term)
+        return self._postings.get(term, [])
+
+    def universe(self):
+        return list(range(DOC_COUNT))
+
+
+def _expected(node, postings):
+    if isinstance(node, Term):
+        return set(postings.get(node.text, ()))
+    if isinstance(node, Not):
+        return set(range(DOC_COUNT)) - _expected(node.child, postings)
+    sets = [_expected(child, postings) for child in node.children]
+    return set.intersection(*sets) if isinstance(node, And) else set.union(*sets)
+
+
+def test_parse_precedence_and_errors():
+    assert has_boolean_syntax("a ( b OR c )") and has_boolean_syntax("(a b) NOT c")
+    assert not has_boolean_syntax("smile :)") and not has_boolean_syntax("see notes(1)")
+    split = lambda word: [word.lower()]
+    assert parse_boolean_query("a b OR c NOT d", split) == Or((
+        And((Term("a"), Term("b"))), And((Term("c"), Not(Term("d")))),
+    ))
+    assert parse_boolean_query("a (b OR c)", split, "OR") == Or((Term("a"), Or((Term("b"), Term("c")))))
+    for bad in ("(a", "a AND", "a )", "OR a"):
+        try:
+            parse_boolean_query(bad, split)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+
+
+def test_planner_matches_set_semantics():
+    rng = random.Random(3)
+    postings = {t: sorted(rng.sample(range(DOC_COUNT), rng.randint(0, DOC_COUNT // 2))) for t in "abcdefg"}
+
+    def random_query(depth=0):
+        if depth > 2 or rng.random() < 0.4:
+            return rng.choice("abcdefgz")
+        if rng.random() < 0.25:
+            return "NOT " + random_query(depth + 1)
+        operator = rng.choice([" AND ", " OR ", " "])
+        return "(" + operator.join(random_query(depth + 1) for _ in range(rng.randint(2, 3))) + ")"
+
+    for _ in range(1000):
+        tree = parse_boolean_query(random_query(), lambda word: [word], rng.choice(["AND", "OR"]))
+        assert QueryPlanner(_Source(postings)).evaluate(tree) == sorted(_expected(tree, postings))
+
+
+def test_and_stops_at_first_empty_term_and_gallops():
+    source = _Source({"common": list(range(DOC_COUNT)), "rare": [5]})
+    planner = QueryPlanner(source)
+    assert planner.evaluate(parse_boolean_query("common missing rare", lambda w: [w])) == []
+    assert source.fetched == ["missing"] and planner.empty_terms == ["missing"]
+
+    rng = random.Random(1)
+    for _ in range(500):
+        a = sorted(rng.sample(range(300), rng.randint(0, 40)))
+        b = sorted(rng.sample(range(300), rng.randint(0, 200)))
+        assert intersect_sorted(a, b) == sorted(set(a) & set(b))
+        x, lo = rng.randint(-1, 301), rng.randint(0, len(b))
+        assert gallop_left(b, x, lo) == bisect_left(b, x, lo)
+
+
+def test_legacy_and_advanced_boolean_search(tmp_path):
+    texts = {"a.md": "moon ritual candle", "b.md": "moon flame", "c.md": "ritual flame", "d.md": "nothing"}
+    loaded = write_index(tmp_path, texts)
+
+    indexer = AdvancedIndexer()
+    index = indexer.build_index(tmp_path, tmp_path / "adv.json")
+    cases = {
+        "moon AND (ritual OR flame)": ["a.md", "b.md"],
+        "(moon OR ritual) NOT candle": ["b.md", "c.md"],
+        "NOT (moon OR ritual OR flame)": ["d.md"],
+        "candle OR (NOT moon)": ["a.md", "c.md", "d.md"],  # c.md and d.md hold no positive term
+    }
+    for query, expected in cases.items():
+        results, err = search_with_persistent_index(query, loaded)
+        assert err is None and sorted(r[0] for r in results) == expected, query
+        found = indexer.search(index, query, SearchOptions())
+        assert sorted(r.file for r in found) == expected and found.total == len(expected), query
+
+    # A malformed expression is searched as plain terms instead of failing
+    results, err = search_with_persistent_index("moon AND (ritual", loaded, search_logic="OR")
+    assert err is None and sorted(r[0] for r in results) == ["a.md", "b.md"]
+    malformed = indexer.search(index, "moon AND (ritual", SearchOptions(use_and=False))
+    assert sorted(r.file for r in malformed) == ["a.md", "b.md", "c.md"]
+    assert search_with_persistent_index("moon missing", loaded)[1] == "Term 'missing' yields no results with AND logic."
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for BM25 ranking and top-k retrieval.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.ranking import TermPostings, bm25_idf, score_documents, top_k
+
+
+def _random_terms(rng, doc_count):
+    terms = []
+    for _ in range(rng.randint(1, 4)):
+        docs = sorted(rng.sample(range(doc_count), rng.randint(0, doc_count)))
+        freqs = [rng.randint(1, 9) for _ in docs]
+        terms.append(TermPostings(docs, freqs, bm25_idf(len(docs), doc_count)))
+    return terms
+
+
+def test_top_k_matches_exhaustive_scoring():
+    """MaxScore pruning returns the same top-k scores as scoring every match."""
+    rng = random.Random(7)
+    for _ in range(100):
+        doc_count = rng.randint(1, 120)
+        lengths = {doc: rng.randint(1, 400) for doc in range(doc_count)}
+        avg_length = sum(lengths.values()) / doc_count
+        terms = _random_terms(rng, doc_count)
+        k = rng.randint(1, 10)
+        for require_all in (False, True):
+            scores = score_documents(terms, lengths.get, avg_length)
+            if require_all:
+                common = set.intersection(*(set(t.doc_ids) for t in terms))
+                scores = {doc: s for doc, s in scores.items() if doc in common}
+            expected = sorted(scores.values(), reverse=True)[:k]
+            got = top_k(terms, k, lengths.get, avg_length, require_all=require_all)
+            assert [round(s, 9) for s, _doc in got] == [round(s, 9) for s in expected]
+
+
+def test_term_frequency_and_length_drive_ranking():
+    """More occurrences in a shorter document rank higher."""
+    terms = [TermPostings(["a.md", "b.md"], [3, 1], bm25_idf(2, 10))]
+    lengths = {"a.md": 10, "b.md": 100}
+    ranked = top_k(terms, 2, lengths.get, 55)
+    assert [doc for _score, doc in ranked] == ["a.md", "b.md"]
+
+
+def test_ranked_legacy_search_keeps_the_best_matches():
+    """Capped ranked searches return the top scores of the full ranking."""
+    from modules.index_builder import IndexBuilder
+    from modules.legacy_tool_v6_3 import search_with_persistent_index
+
+    rng = random.Random(3)
+    builder = IndexBuilder()
+    for i in range(40):
+        words = rng.choices(["moon", "flame", "ritual", "candle"], k=rng.randint(1, 30))
+        fid = builder.add_path(f"{i}.md")
+        builder.add_tokens(fid, words)
+        builder.file_details[fid] = {"filename": f"{i:02d}.md"}
+    loaded = {"metadata": {}, "index": builder.materialize()}
+
+    def ranked(query, max_results=None):
+        results, _error = search_with_persistent_index(
+            query, loaded, search_logic="OR", rank_results=True, max_results=max_results
+        )
+        return [round(r[5]["relevance_score"], 9) for r in results]
+
+    for query in ("moon flame", "ritual", "candle NOT moon"):
+        everything = ranked(query)
+        assert everything and ranked(query, 5) == everything[:5]
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the local search daemon.
+"""
+
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.query_cache import new_generation_id
+from modules.search_server import IndexRegistry, SearchServer, SearchServerError, SearchService, call
+
+
+def _write_index(folder, texts, track_positions=False):
+    metadata = {"generation": new_generation_id()}
+    return write_index(folder, texts, fmt="binary", metadata=metadata, track_positions=track_positions)
+
+
+@pytest.fixture
+def server(tmp_path):
+    index_file = _write_index(tmp_path, {"a.md": "moon ritual\ncandle", "b.md": "moon flame"})
+    registry = IndexRegistry(reload_interval=0)
+    registry.add(index_file)
+    server = SearchServer(SearchService(registry), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, index_file
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_snippets_classify_and_errors(server):
+    server, _ = server
+    found = call(server.url, "search", query="moon ritual", context_lines=0)
+    assert found["error"] is None and not found["cached"]
+    assert [r["file"] for r in found["results"]] == ["a.md"]
+    assert found["results"][0]["snippets"] == ["moon ritual"]
+    assert call(server.url, "search", query="moon ritual", context_lines=0)["cached"]
+    assert call(server.url, "search", query="moon", logic="OR")["results"][0]["file"] in ("a.md", "b.md")
+
+    assert call(server.url, "snippets", file="a.md", query="candle", context_lines=0)["snippets"] == ["candle"]
+    assert "confidence" in call(server.url, "classify", text="moon ritual")
+    assert call(server.url, "ping") == "pong"
+
+    with pytest.raises(SearchServerError) as err:
+        call(server.url, "search", quer="moon")
+    assert err.value.code == -32602
+    with pytest.raises(SearchServerError):
+        call(server.url, "snippets", file="missing.md", query="moon")
+    with pytest.raises(SearchServerError):
+        call(server.url, "drop_tables")
+
+
+def test_default_search_honours_query_syntax(tmp_path):
+    texts = {"a.md": "brown bear sleeps", "b.md": "cats and dogs", "c.md": "dogs bark"}
+    registry = IndexRegistry(reload_interval=0)
+    registry.add(_write_index(tmp_path, texts, track_positions=True))
+    service = SearchService(registry)
+
+    def files(query):
+        found = service.search(query)
+        assert found["error"] is None, query
+        return sorted(r["file"] for r in found["results"])
+
+    assert files("cats OR bear") == ["a.md", "b.md"]
+    assert files("brown NEAR/1 bear") == ["a.md"]
+    assert files('"brown bear"') == ["a.md"]
+    assert files("dogs NOT cats") == ["c.md"]
+    assert all(r["snippets"] for r in service.search("cats OR bear")["results"])
+
+    # Lower-case "or" is a search term, so it must not share the cached OR result
+    assert len(service.search("cats OR bear", rank=True)["results"]) == 2
+    lowered = service.search("cats or bear", rank=True)
+    assert not lowered["cached"] and lowered["results"] == []
+
+
+def test_rejects_foreign_origins(server):
+    server, _ = server
+    body = json.dumps({"jsonrpc": "2.0", "method": "ping", "id": 1}).encode()
+    for origin, allowed in (("http://localhost:3000", True), ("https://evil.example", False)):
+        request = urllib.request.Request(server.url + "/rpc", data=body, headers={"Origin": origin})
+        try:
+            with urllib.request.urlopen(request) as response:
+                assert allowed and response.headers["Access-Control-Allow-Origin"] == origin
+        except urllib.error.HTTPError as e:
+            assert not allowed and e.code == 403
+
+
+def test_hot_reload_on_new_generation(server):
+    server, index_file = server
+    before = call(server.url, "indexes")[0]["generation"]
+    assert call(server.url, "search", query="flame")["results"][0]["file"] == "b.md"
+
+    _write_index(index_file.parent, {"a.md": "moon ritual", "c.md": "flame keeper"})
+    after = call(server.url, "search", query="flame")
+    assert after["generation"] != before and not after["cached"]
+    assert [r["file"] for r in after["results"]] == ["c.md"]
+    assert call(server.url, "indexes")[0]["reloads"] == 1
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming SMS Backup & Restore parsing.
+"""
+
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from modules.sms_parser import SMSParser
+from modules.xml_parser import iter_sms_backup, parse_sms_smsbackup
+
+
+def _write_backup(path, messages, attachment_bytes):
+    attachment = "QUJD" * (attachment_bytes // 4)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<smses count="%d">\n' % (2 * messages))
+        for i in range(messages):
+            f.write(f'  <sms address="+1269" date="{1700000000000 + 2000 * i}" type="1" '
+                    f'body="good night &quot;moon&quot; {i}" readable_date="d{i}" contact_name="Amanda" />\n')
+            f.write(f'  <mms date="{1700000000000 + 2000 * i + 1000}" msg_box="2" address="+1269" contact_name="Amanda">'
+                    f'<parts><part ct="image/jpeg" name="photo{i}.jpg" data="{attachment}" />'
+                    f'<part ct="text/plain" text="sleep well {i}" /></parts></mms>\n')
+        f.write("</smses>\n")
+
+
+def test_streamed_entries_match_document_order(tmp_path):
+    backup = tmp_path / "sms.xml"
+    _write_backup(backup, 5, 3000)
+
+    tags = [(elem.tag, elem.get("date")) for elem in iter_sms_backup(backup, chunk_size=7)]
+    assert [tag for tag, _ in tags] == ["sms", "mms"] * 5
+    parser = SMSParser()
+    entries = parser.parse_sms_file(backup)
+    assert [e.conversation_type for e in entries] == ["sms", "mms"] * 5
+    assert entries[0].content == 'good night "moon" 0' and entries[0].sender == "Amanda"
+    assert entries[1].content == "[Image: photo0.jpg] sleep well 0" and entries[1].receiver == "Amanda"
+
+    structured = parse_sms_smsbackup(backup)
+    assert [item["type"] for item in structured] == ["header"] + ["text"] * 5
+    assert structured[1]["role"] == "received" and structured[1]["timestamp"] == "d0"
+
+    (tmp_path / "broken.xml").write_text("<smses><sms body='x'/>", encoding="utf-8")
+    assert SMSParser().parse_sms_file(tmp_path / "broken.xml") == []
+    assert parse_sms_smsbackup(tmp_path / "broken.xml")[0]["type"] == "error"
+
+
+def test_attachments_are_never_loaded(tmp_path):
+    backup = tmp_path / "sms.xml"
+    _write_backup(backup, 40, 1_000_000)
+
+    tracemalloc.start()
+    count = sum(1 for _ in SMSParser().iter_entries(backup))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert count == 80
+    assert peak < backup.stat().st_size / 10
+
+
+def test_skipped_messages_are_released(tmp_path):
+    backup = tmp_path / "sms.xml"
+    with open(backup, "w", encoding="utf-8") as f:
+        f.write('<smses count="80">\n')
+        for i in range(40):
+            f.write(f'  <sms date="{i}" type="2" body="moon {i}" />\n')
+            f.write(f'  <mms date="{i}"><parts><part ct="text/plain" text="{"x" * 200_000}" /></parts></mms>\n')
+        f.write("</smses>\n")
+
+    tracemalloc.start()
+    count = sum(1 for _ in iter_sms_backup(backup, tags=("sms",), chunk_size=1 << 16))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert count == 40
+    assert peak < backup.stat().st_size / 4
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for mmap-based snippet extraction and stored line offsets.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.binary_index import load_index_file
+from modules.index_builder import IndexBuilder
+from modules.indexer import search_with_context
+from modules.snippets import extract_snippets, line_start_offsets
+
+TEXT = "intro line\r\nthe White Rose blooms\r\nmiddle\r\nwhite rose again\r\nlast line\r\n"
+
+
+def _readlines_snippets(path, phrase, context_lines):
+    """The previous readlines()-based extraction, for comparison."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = f.readlines()
+    snippets = []
+    for idx, line in enumerate(lines):
+        if phrase.lower() in line.lower():
+            start = max(0, idx - context_lines)
+            snippets.append("".join(lines[start:idx + context_lines + 1]).strip())
+    return snippets
+
+
+def test_matches_readlines_extraction_with_and_without_offsets(tmp_path):
+    path = tmp_path / "chat.md"
+    path.write_bytes(TEXT.encode("utf-8"))
+    offsets = line_start_offsets(TEXT.encode("utf-8"))
+    assert offsets == [0, 12, 35, 43, 61]
+    for context in (0, 1, 3):
+        expected = _readlines_snippets(path, "white rose", context)
+        assert extract_snippets(path, "white rose", context) == expected
+        assert extract_snippets(path, "white rose", context, line_offsets=offsets) == expected
+    assert extract_snippets(path, "white rose", 0, case_sensitive=True) == ["white rose again"]
+
+
+def test_stale_offsets_and_snippet_limit(tmp_path):
+    path = tmp_path / "chat.md"
+    path.write_bytes(TEXT.encode("utf-8"))
+    stale = [0, 5, 9]
+    assert extract_snippets(path, "rose", 0, line_offsets=stale) == ["the White Rose blooms", "white rose again"]
+    assert extract_snippets(path, "rose", 0, max_snippets=1) == ["the White Rose blooms"]
+
+
+def test_line_offsets_persist_and_feed_search_budget(tmp_path):
+    loaded = load_index_file(write_index(tmp_path, {"a.md": TEXT, "b.md": TEXT}, fmt="binary"))
+    assert loaded["index"]["line_offsets"]["1"] == [0, 12, 35, 43, 61]
+
+    # Untouched files keep their offsets; re-indexed ones drop the stale list.
+    rebuilt = IndexBuilder.from_index(loaded["index"])
+    rebuilt.remove_postings(0)
+    assert set(rebuilt.materialize()["line_offsets"]) == {"1"}
+
+    results, err = search_with_context("rose", loaded, context_lines=0, snippet_budget=3)
+    assert err is None
+    assert [len(r[4]) for r in results] == [2, 1]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for the stemmed-token postings used by semantic search.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.indexer import search_semantic
+from modules.stem_index import build_stem_postings, stem_token
+
+TEXTS = {
+    "a.md": "Running rituals under the moon",
+    "b.md": "the ritual ran at moonrise!",
+    "c.md": "nothing related here",
+}
+
+
+def test_stem_postings_merge_tokens_and_skip_punctuation():
+    stems = build_stem_postings({"ritual": ["0"], "rituals": ["1"], "!": ["1"]})
+    assert set(stems) == {stem_token("ritual"), stem_token("rituals")}
+    assert "0" in stems[stem_token("ritual")] and "1" in stems[stem_token("rituals")]
+
+
+def test_semantic_search_scores_from_index_like_a_file_scan(tmp_path):
+    loaded = write_index(tmp_path, TEXTS)
+    from_index, err = search_semantic("ritual moon", loaded, threshold=0.0)
+    assert err is None
+
+    scan = {"metadata": loaded["metadata"], "index": {k: loaded["index"][k] for k in ("files", "file_details")}}
+    from_files, err = search_semantic("ritual moon", scan, threshold=0.0)
+    assert err is None
+    assert [(r[0], r[2]) for r in from_index] == [(r[0], r[2]) for r in from_files]
+
+    # Scoring never touches the files themselves
+    for name in TEXTS:
+        (tmp_path / name).unlink()
+    again, _ = search_semantic("ritual moon", loaded, threshold=0.5)
+    assert [r[0] for r in again] == [r[0] for r in from_index if r[2] >= 0.5]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the TF-IDF / LSA vector index.
+"""
+
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from conftest import write_index
+from modules.binary_index import load_index_file
+from modules.indexer import build_vector_index, load_vector_index, semantic_search, similar_files
+from modules.vector_index import NUMPY_AVAILABLE, VectorIndex
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="NumPy not installed")
+
+TEXTS = {
+    "ritual.md": "candle ritual under the full moon, candle flame and moon water",
+    "moon.md": "moon phases and the moon ritual calendar",
+    "code.md": "python code review and unit tests for the python parser",
+    "tests.md": "writing unit tests in python",
+}
+
+
+def _index(folder):
+    index_file = write_index(folder, TEXTS, fmt="binary", metadata={"created_at": "t1"})
+    return index_file, load_index_file(index_file)
+
+
+def _cosine_by_hand(index, query_tokens):
+    """Dense reference implementation of the same TF-IDF weighting."""
+    tokens, freqs, files = index["tokens"], index["term_freqs"], index["files"]
+    n = len(files)
+    vocab = [t for t in tokens if t.isalnum()]
+    idf = {t: math.log((1 + n) / (1 + len(tokens[t]))) + 1 for t in vocab}
+    docs = {fid: {} for fid in files}
+    for t in vocab:
+        for fid, tf in zip(tokens[t], freqs[t]):
+            docs[fid][t] = (1 + math.log(tf)) * idf[t]
+    query = {}
+    for t in query_tokens:
+        if t in idf:
+            query[t] = query.get(t, 0) + 1
+    query = {t: (1 + math.log(c)) * idf[t] for t, c in query.items()}
+
+    def norm(v):
+        return math.sqrt(sum(x * x for x in v.values())) or 1.0
+
+    return {
+        fid: sum(w * vec.get(t, 0) for t, w in query.items()) / (norm(query) * norm(vec))
+        for fid, vec in docs.items()
+    }
+
+
+def test_sparse_scores_are_tfidf_cosines(tmp_path):
+    _, loaded = _index(tmp_path)
+    vectors = VectorIndex.build(loaded)
+    expected = _cosine_by_hand(loaded["index"], ["moon", "ritual"])
+    hits = vectors.search(["moon", "ritual"], k=10)
+    assert [fid for _, fid in hits] == sorted((f for f in expected if expected[f] > 0), key=lambda f: -expected[f])
+    for score, fid in hits:
+        assert score == pytest.approx(expected[fid], rel=1e-5)
+
+
+def test_similar_files_and_lsa(tmp_path):
+    index_file, loaded = _index(tmp_path)
+    for lsa_dims in (0, 2):
+        build_vector_index(index_file, lsa_dims=lsa_dims, loaded_index=loaded)
+        vectors = load_vector_index(index_file, loaded)
+        assert vectors.has_lsa == bool(lsa_dims)
+        results, err = similar_files("code.md", loaded, vectors, top_n=3)
+        assert err is None
+        assert results[0][0] == "tests.md"
+        assert "code.md" not in [r[0] for r in results]
+        found, err = semantic_search("python tests", loaded, vectors=vectors, top_n=2)
+        assert err is None and {r[0] for r in found} == {"code.md", "tests.md"}
+
+
+def test_stale_vectors_are_ignored(tmp_path):
+    index_file, loaded = _index(tmp_path)
+    build_vector_index(index_file, loaded_index=loaded)
+    rebuilt = dict(loaded, metadata=dict(loaded["metadata"], created_at="t2"))
+    assert load_vector_index(index_file, loaded) is not None
+    assert load_vector_index(index_file, rebuilt) is None